@@ -1,17 +1,39 @@
-from flask import Flask
-from flask_bcrypt import Bcrypt
-from flask_jwt_extended import JWTManager
-from flask_sqlalchemy import SQLAlchemy
-from flask_restx import Api
-from config import DevelopmentConfig
-from flask_cors import CORS
+from importlib import import_module
+from app.startup import timer
+
+with timer.phase('import extensions'):
+    from flask import Flask
+    from flask_bcrypt import Bcrypt
+    from flask_jwt_extended import JWTManager
+    from flask_sqlalchemy import SQLAlchemy
+    from flask_restx import Api
+    from config import DevelopmentConfig, config_by_name
+    from flask_cors import CORS
 
 bcrypt = Bcrypt()
 jwt = JWTManager()
 db = SQLAlchemy()
 
+# (module, URL prefix) of every API namespace, imported by create_app()
+NAMESPACES = [
+    ('app.api.v1.users', '/api/v1/users'),
+    ('app.api.v1.places', '/api/v1/places'),
+    ('app.api.v1.amenities', '/api/v1/amenities'),
+    ('app.api.v1.reviews', '/api/v1/reviews'),
+    ('app.api.v1.auth', '/api/v1/auth'),
+    ('app.api.v1.health', '/api/v1/health'),
+    ('app.api.v1.photos', '/api/v1/photos'),
+]
+
 def create_app(config_class=DevelopmentConfig):
+    with timer.phase('create_app'):
+        return _create_app(config_class)
+
+def _create_app(config_class):
     app = Flask(__name__)
+    # Accepte aussi un nom de configuration ('testing', 'production', ...)
+    if isinstance(config_class, str):
+        config_class = config_by_name[config_class]
     app.config.from_object(config_class)
     
     # Disable automatic slash redirection
@@ -42,26 +64,35 @@ def create_app(config_class=DevelopmentConfig):
             return response
 
     # Initialize extensions
-    bcrypt.init_app(app)
-    jwt.init_app(app)
-    db.init_app(app)
+    with timer.phase('init extensions'):
+        bcrypt.init_app(app)
+        jwt.init_app(app)
+        db.init_app(app)
+
+    # Fichiers SQLite des partitions de reviews (REVIEW_PARTITIONS > 1)
+    with timer.phase('review partitions'):
+        from app.persistence import partitions
+        partitions.init_app(app)
     
     # Create API instance
     api = Api(app, version='1.0', title='HBnB API', 
               description='HBnB RESTful API', doc=False)
     
     # Import and register namespaces
-    from app.api.v1.users import api as users_ns
-    from app.api.v1.places import api as places_ns
-    from app.api.v1.amenities import api as amenities_ns
-    from app.api.v1.reviews import api as reviews_ns
-    from app.api.v1.auth import api as auth_ns
-    
-    # Register namespaces with API
-    api.add_namespace(users_ns, path='/api/v1/users')
-    api.add_namespace(places_ns, path='/api/v1/places')
-    api.add_namespace(amenities_ns, path='/api/v1/amenities')
-    api.add_namespace(reviews_ns, path='/api/v1/reviews')
-    api.add_namespace(auth_ns, path='/api/v1/auth')
+    for module_name, path in NAMESPACES:
+        with timer.phase(f'namespace {module_name.rsplit(".", 1)[-1]}'):
+            api.add_namespace(import_module(module_name).api, path=path)
+
+    # Compte les requêtes servies par ce worker (voir /api/v1/health)
+    from app.services import health
+
+    @app.after_request
+    def record_request(response):
+        health.record_request(response.status_code)
+        return response
+
+    # Register CLI commands (flask reindex-places, ...)
+    from app.cli import register_commands
+    register_commands(app)
     
     return app
\ No newline at end of file
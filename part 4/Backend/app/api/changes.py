@@ -0,0 +1,58 @@
+"""
+Shared implementation of the ``GET /api/v1/<resource>/changes`` endpoints.
+
+    GET /api/v1/places/changes?since=<cursor>&limit=500&fields=id,title
+
+    {"upserts": [...], "deleted": ["<id>", ...], "cursor": "<next cursor>",
+     "has_more": false}
+
+Start without ``since`` to get everything, then keep the returned cursor
+and ask again with it; repeat while ``has_more`` is true.  410 means the
+cursor is older than the tombstone retention: download the full list again.
+"""
+from flask_restx import abort, fields, reqparse
+from app.services import facade
+from app.api.serializers import dumps, json_response, requested_serializer
+from app.persistence.changes import CursorExpired, DEFAULT_LIMIT, InvalidCursor
+
+changes_parser = reqparse.RequestParser()
+changes_parser.add_argument('since', type=str, location='args',
+                            help='Cursor returned by the previous call (omit for a full sync)')
+changes_parser.add_argument('limit', type=int, default=DEFAULT_LIMIT, location='args',
+                            help='Maximum number of changes per page')
+changes_parser.add_argument('fields', type=str, location='args',
+                            help='Comma-separated fields of the upserted objects')
+
+
+def changes_model(api, item_model):
+    return api.model(f'{item_model.name}Changes', {
+        'upserts': fields.List(fields.Nested(item_model)),
+        'deleted': fields.List(fields.String, description='IDs deleted since the cursor'),
+        'cursor': fields.String(description='Cursor for the next call'),
+        'has_more': fields.Boolean(description='More changes are waiting: call again now'),
+    })
+
+
+def changes_response(resource, serializer, context=None):
+    """
+    Answer a changes request for ``resource``; ``context(rows, serializer)``
+    builds the serializer context of the upserted rows.
+    """
+    args = changes_parser.parse_args()
+    serializer, columns = requested_serializer(serializer)
+    if args['limit'] < 1:
+        abort(400, "limit must be positive")
+    try:
+        upserts, deleted, cursor, has_more = facade.get_changes(
+            resource, args['since'], fields=columns, limit=args['limit'])
+    except InvalidCursor as e:
+        abort(400, str(e))
+    except CursorExpired as e:
+        abort(410, str(e))
+    body = {
+        'upserts': serializer.many(upserts, context(upserts, serializer) if context else None),
+        'deleted': deleted,
+        'cursor': cursor,
+        'has_more': has_more,
+    }
+    return json_response(dumps(body))
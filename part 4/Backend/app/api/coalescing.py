@@ -0,0 +1,34 @@
+"""
+Coalescing of identical concurrent GET requests (see ``app.services.singleflight``).
+
+    def get(self, place_id):
+        serializer, columns = requested_serializer(place_serializer)
+
+        def build():
+            ...
+            return serializer.response(place)
+        return shared_response(('places.get', place_id, tuple(columns)), build)
+
+``build()`` runs once for the requests of the same key arriving while it
+runs; the key holds everything the response depends on (path parameters,
+normalized query parameters).  The leader's response is shared as bytes
+and every request gets its own ``Response``: the ORM objects loaded by
+the leader never leave its thread.  ``SINGLE_FLIGHT = False`` turns the
+coalescing off.
+"""
+from flask import Response, current_app
+from app.api.serializers import to_response
+from app.services.singleflight import group
+
+
+def _frozen(build):
+    response = to_response(build())
+    return response.status_code, response.get_data(), response.content_type
+
+
+def shared_response(key, build):
+    """Response of ``build()``, computed once for concurrent requests of ``key``"""
+    if not current_app.config.get('SINGLE_FLIGHT', True):
+        return build()
+    status, body, content_type = group.do(key, lambda: _frozen(build))
+    return Response(body, status=status, content_type=content_type)
@@ -0,0 +1,80 @@
+"""
+``Idempotency-Key`` support for the write endpoints.
+
+    @jwt_required()
+    @idempotent
+    def post(self):
+        ...
+
+A client that may retry a POST or PUT (timeouts on mobile networks) sends
+a unique ``Idempotency-Key`` header with it.  The first successful (2xx)
+response is stored for the user and key (``app.persistence.idempotency``)
+and sent back as is, with ``Idempotent-Replayed: true``, to every retry:
+the resource method and the facade are not run again.  A retry arriving
+while the original is running waits for it; after
+``IDEMPOTENCY_WAIT_SECONDS`` it gets ``409``.  Reusing a key for another
+request (other path or body) gets ``422``.  Requests without the header
+are not affected.
+
+The decorator must come after ``@jwt_required()``: keys are per user.
+"""
+import hashlib
+from functools import wraps
+from flask import Response, request
+from flask_jwt_extended import get_jwt_identity
+from flask_restx import abort
+from app.api.serializers import to_response
+from app.persistence import idempotency
+
+HEADER = 'Idempotency-Key'
+
+
+def request_fingerprint():
+    """Hash of what makes two requests the same: method, path and body"""
+    digest = hashlib.sha256()
+    for part in (request.method.encode(), request.path.encode(), request.get_data(cache=True)):
+        digest.update(len(part).to_bytes(8, 'big'))
+        digest.update(part)
+    return digest.hexdigest()
+
+
+def _replay(stored):
+    response = Response(stored.body, status=stored.status_code, content_type=stored.content_type)
+    response.headers['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def idempotent(f):
+    """Replay the stored response of a request already made with the same key"""
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        key = request.headers.get(HEADER)
+        if key is None:
+            return f(*args, **kwargs)
+        if not key or len(key) > idempotency.MAX_KEY_LENGTH:
+            abort(400, f"{HEADER} must be 1 to {idempotency.MAX_KEY_LENGTH} characters")
+        user_id = get_jwt_identity()['id']
+        fingerprint = request_fingerprint()
+        try:
+            state = idempotency.begin(user_id, key, fingerprint)
+            if state is idempotency.IN_FLIGHT:
+                state = idempotency.wait(user_id, key, fingerprint)
+        except idempotency.KeyReused as e:
+            abort(422, str(e))
+        if state is idempotency.IN_FLIGHT:
+            abort(409, f"A request with this {HEADER} is still in progress")
+        if state is not None:
+            return _replay(state)
+
+        try:
+            response = to_response(f(*args, **kwargs))
+        except BaseException:
+            idempotency.release(user_id, key)
+            raise
+        if 200 <= response.status_code < 300 and not response.is_streamed:
+            idempotency.finish(user_id, key, idempotency.StoredResponse(
+                response.status_code, response.get_data(), response.content_type))
+        else:
+            idempotency.release(user_id, key)
+        return response
+    return decorated_function
@@ -1,53 +1,80 @@
 from flask_restx import Namespace, Resource, fields
-from app.services.facade import HBnBFacade
+from app.services import facade
+from app.api.serializers import Serializer, requested_serializer
+from app.api.changes import changes_model, changes_parser, changes_response
 from flask_jwt_extended import jwt_required, get_jwt_identity
+from app.api.idempotency import idempotent
+from app.api.coalescing import shared_response
 from app.services.auth import admin_required
 
 api = Namespace('amenities', description='Amenity operations')
-facade = HBnBFacade()
 
 amenity_model = api.model('Amenity', {
     'id': fields.String(readOnly=True, description='Amenity ID'),
     'name': fields.String(required=True, description='Name of the amenity')
 })
 
+amenity_serializer = Serializer('Amenity', {
+    'id': 'id',
+    'name': 'name',
+})
+
+@api.route('/changes')
+class AmenityChanges(Resource):
+    @api.expect(changes_parser)
+    @api.response(200, 'Amenities created, updated or deleted since the cursor',
+                  changes_model(api, amenity_model))
+    @api.response(410, 'Cursor expired: download the full list again')
+    def get(self):
+        """Delta sync: amenities changed since a cursor"""
+        return changes_response('amenities', amenity_serializer)
+
 @api.route('/')
 class AmenityList(Resource):
-    @api.response(200, 'Liste des commodités')
+    @api.response(200, 'Liste des commodités', [amenity_model])
+    @api.param('fields', 'Comma-separated fields to return')
     def get(self):
         """Obtenir la liste de toutes les commodités"""
-        amenities = facade.get_all_amenities()
-        return [vars(amenity) for amenity in amenities], 200
+        serializer, columns = requested_serializer(amenity_serializer)
+        amenities = facade.list_amenities(fields=columns)
+        return serializer.list_response(amenities)
 
     @api.expect(amenity_model, validate=True)
     @api.response(201, 'Commodité créée')
     @jwt_required()
     @admin_required
+    @idempotent
     def post(self):
         """Créer une nouvelle commodité (Admin only)"""
         data = api.payload
         new_amenity = facade.create_amenity(data)
-        return vars(new_amenity), 201
+        return amenity_serializer.response(new_amenity, 201)
 
 @api.route('/<string:amenity_id>')
 @api.param('amenity_id', 'ID de la commodité')
 class AmenityResource(Resource):
-    @api.marshal_with(amenity_model)
+    @api.response(200, 'Amenity details', amenity_model)
+    @api.param('fields', 'Comma-separated fields to return')
     def get(self, amenity_id):
         """Retrieve a specific amenity"""
-        amenity = facade.get_amenity(amenity_id)
-        if not amenity:
-            api.abort(404, "Amenity not found")
-        return vars(amenity)
+        serializer, columns = requested_serializer(amenity_serializer)
+
+        def build():
+            amenity = facade.get_amenity(amenity_id, fields=columns)
+            if not amenity:
+                api.abort(404, "Amenity not found")
+            return serializer.response(amenity)
+        return shared_response(('amenities.get', amenity_id, tuple(columns)), build)
 
     @api.expect(amenity_model, validate=True)
     @api.response(200, 'Commodité mise à jour')
     @api.response(404, 'Commodité non trouvée')
     @jwt_required()
     @admin_required
+    @idempotent
     def put(self, amenity_id):
         """Mettre à jour une commodité (Admin only)"""
         updated = facade.update_amenity(amenity_id, api.payload)
         if not updated:
             return {'error': 'Commodité non trouvée'}, 404
-        return vars(updated), 200
+        return amenity_serializer.response(updated)
@@ -1,10 +1,9 @@
 from flask_restx import Namespace, Resource, fields
 from flask_jwt_extended import create_access_token
 from flask import request
-from app.services.facade import HBnBFacade
+from app.services import facade
 
 api = Namespace('auth', description='Authentication operations')
-facade = HBnBFacade()
 
 login_model = api.model('Login', {
     'email': fields.String(required=True, description='User email'),
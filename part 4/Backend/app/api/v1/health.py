@@ -0,0 +1,46 @@
+from flask_restx import Namespace, Resource, fields
+from sqlalchemy import text
+from app import db
+from app.persistence import object_cache
+from app.services import health
+from app.services.singleflight import group
+
+api = Namespace('health', description='Worker health')
+
+worker_model = api.model('WorkerHealth', {
+    'pid': fields.Integer(description='Worker process ID'),
+    'started_at': fields.Float(description='Worker start time (UNIX timestamp)'),
+    'uptime': fields.Float(description='Seconds since the worker started'),
+    'requests': fields.Integer(description='Requests served by this worker'),
+    'errors': fields.Integer(description='5xx answers sent by this worker'),
+    'max_requests': fields.Integer(description='Requests before the worker is recycled (0 = never)'),
+})
+
+health_model = api.model('Health', {
+    'status': fields.String(description='ok or error'),
+    'database': fields.String(description='ok or error'),
+    'worker': fields.Nested(worker_model),
+    'coalescing': fields.Raw(description='Per resource: requests, executions, collapsed '
+                                         '(served by another request in flight), max_waiters, '
+                                         'in_flight'),
+    'object_cache': fields.Raw(description='Per resource: entries, bytes, hits, misses, hit_rate, '
+                                           'evictions, invalidations'),
+})
+
+@api.route('/')
+class Health(Resource):
+    @api.marshal_with(health_model)
+    @api.response(200, 'Worker healthy')
+    @api.response(503, 'Database unreachable')
+    def get(self):
+        """Report the health of the worker that answers"""
+        try:
+            db.session.execute(text('SELECT 1'))
+            database = 'ok'
+        except Exception:
+            db.session.rollback()
+            database = 'error'
+        status = 'ok' if database == 'ok' else 'error'
+        body = {'status': status, 'database': database, 'worker': health.worker_stats(),
+                'coalescing': group.stats(), 'object_cache': object_cache.cache_stats()}
+        return body, 200 if status == 'ok' else 503
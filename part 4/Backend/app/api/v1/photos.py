@@ -0,0 +1,27 @@
+import os
+from flask import send_file
+from flask_restx import Namespace, Resource
+from app.services import photos
+
+api = Namespace('photos', description='Place photo files')
+
+# A URL names one content hash: its bytes never change
+IMMUTABLE = 'public, max-age=31536000, immutable'
+
+@api.route('/<string:content_hash>/<string:variant>')
+@api.param('content_hash', 'sha256 of the uploaded photo')
+@api.param('variant', 'File name, e.g. small.webp or original.jpg')
+class PhotoFile(Resource):
+    @api.response(200, 'Image file')
+    @api.response(404, 'Unknown photo or variant not generated yet')
+    def get(self, content_hash, variant):
+        """Serve a photo variant"""
+        path = photos.variant_path(content_hash, variant)
+        if path is None or not os.path.isfile(path):
+            api.abort(404, "Photo not found")
+        # send_file hands the path to the server (wsgi.file_wrapper, i.e.
+        # sendfile() under gunicorn, or X-Sendfile with USE_X_SENDFILE)
+        response = send_file(path, mimetype=photos.MIMETYPES[variant.rsplit('.', 1)[1]],
+                             conditional=True, etag=content_hash + variant)
+        response.headers['Cache-Control'] = IMMUTABLE
+        return response
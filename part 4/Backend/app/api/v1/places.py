@@ -1,8 +1,17 @@
+from datetime import date
+from flask import Response, request
 from flask_restx import Namespace, Resource, fields, reqparse
-from app.services.facade import HBnBFacade
+from app.services import facade
+from app.services.pubsub import subscribe_place_reviews
+from app.services.photos import PhotoTooLarge, photo_urls
+from app.api.serializers import Serializer, dumps, json_response, requested_serializer
+from app.api.changes import changes_model, changes_parser, changes_response
+from app.persistence import search, amenity_index, availability, facets
 from flask_jwt_extended import jwt_required, get_jwt_identity
+from app.api.idempotency import idempotent
+from app.api.coalescing import shared_response
+from app.services.singleflight import group
 
-facade = HBnBFacade()
 api = Namespace('places', description='Places management')
 
 place_model = api.model('Place', {
@@ -24,31 +33,148 @@ update_parser.add_argument('latitude', type=float)
 update_parser.add_argument('longitude', type=float)
 update_parser.add_argument('amenities', type=str, action='append')
 
-def serialize_place(place):
-    """Helper function to properly serialize a place object"""
-    place_data = vars(place).copy()
-    # Remove SQLAlchemy internal attributes
-    place_data.pop('_sa_instance_state', None)
-    
-    # Convert amenities relationship to list of IDs
-    if hasattr(place, 'amenities') and place.amenities:
-        place_data['amenities'] = [amenity.id for amenity in place.amenities]
+def iso_date(value):
+    """YYYY-MM-DD request argument"""
+    return date.fromisoformat(value)
+
+iso_date.__schema__ = {'type': 'string', 'format': 'date'}
+
+list_parser = reqparse.RequestParser()
+list_parser.add_argument('amenities', type=str, location='args',
+                         help='Comma-separated amenity IDs to filter on')
+list_parser.add_argument('amenity_match', type=str, default=amenity_index.MATCH_ALL,
+                         choices=(amenity_index.MATCH_ALL, amenity_index.MATCH_ANY), location='args',
+                         help='Require all the amenities (default) or any of them')
+list_parser.add_argument('check_in', type=iso_date, location='args',
+                         help='Only places free from this date (YYYY-MM-DD), with check_out')
+list_parser.add_argument('check_out', type=iso_date, location='args',
+                         help='Only places free until this date (departure day)')
+
+search_parser = list_parser.copy()
+search_parser.add_argument('q', type=str, required=True, location='args', help='Search text')
+search_parser.add_argument('page', type=int, default=1, location='args')
+search_parser.add_argument('per_page', type=int, default=20, location='args')
+
+facets_parser = list_parser.copy()
+facets_parser.add_argument('price_buckets', type=str, location='args',
+                           help='Comma-separated price bucket edges (default: quantiles)')
+
+list_parser.add_argument('fields', type=str, location='args',
+                         help='Comma-separated fields to return (e.g. id,title,price)')
+
+def parse_price_edges(value):
+    """Split ?price_buckets=50,100,200 into sorted, distinct positive edges"""
+    if not value:
+        return None
+    try:
+        edges = sorted({float(edge) for edge in value.split(',') if edge.strip()})
+    except ValueError:
+        api.abort(400, "price_buckets must be comma-separated numbers")
+    edges = [edge for edge in edges if edge > 0]
+    if len(edges) > facets.MAX_PRICE_BUCKETS:
+        api.abort(400, f"At most {facets.MAX_PRICE_BUCKETS} price buckets")
+    return edges
+
+def parse_amenity_ids(value):
+    """Split the ?amenities=id1,id2 filter into a list of IDs"""
+    return [amenity_id.strip() for amenity_id in (value or '').split(',') if amenity_id.strip()]
+
+search_result_model = api.model('PlaceSearchResult', {
+    'id': fields.String(description='Place ID'),
+    'title': fields.String(description='Title of the place'),
+    'price': fields.Float(description='Price per night'),
+    'title_highlight': fields.String(description='HTML-escaped title, matches wrapped in <mark>'),
+    'snippet': fields.String(description='HTML-escaped description excerpt, matches wrapped in <mark>'),
+    'score': fields.Float(description='BM25 relevance (higher is better)'),
+})
+
+search_page_model = api.model('PlaceSearchPage', {
+    'query': fields.String,
+    'page': fields.Integer,
+    'per_page': fields.Integer,
+    'has_more': fields.Boolean,
+    'results': fields.List(fields.Nested(search_result_model)),
+})
+
+def place_amenities(place, context):
+    """Amenity IDs of a place, from the batch lookup when there is one"""
+    if context is not None:
+        return context['amenities'].get(place.id, [])
+    return facade.get_amenity_ids_by_place([place.id])[place.id]
+
+def place_photo(place, context):
+    """URLs of the cover photo (first ready photo) of a place, or None"""
+    if context is not None:
+        photo = context['photos'].get(place.id)
     else:
-        place_data['amenities'] = []
-    
-    return place_data
+        photo = facade.get_cover_photos([place.id]).get(place.id)
+    return photo_urls(photo) if photo else None
+
+place_serializer = Serializer('Place', {
+    'id': 'id',
+    'title': 'title',
+    'description': 'description',
+    'price': ('price', float),
+    'latitude': ('latitude', float),
+    'longitude': ('longitude', float),
+    'owner_id': 'owner_id',
+    'amenities': place_amenities,
+    'photo': place_photo,
+})
+
+def places_context(places, serializer=place_serializer):
+    """Load the amenities and cover photos of a list of places in batch"""
+    place_ids = [place.id for place in places]
+    context = {'amenities': {}, 'photos': {}}
+    if 'amenities' in serializer.fields:
+        context['amenities'] = facade.get_amenity_ids_by_place(place_ids)
+    if 'photo' in serializer.fields:
+        context['photos'] = facade.get_cover_photos(place_ids)
+    return context
+
+def places_response(places, serializer=place_serializer):
+    """Serialize a list of places"""
+    return serializer.list_response(places, context=places_context(places, serializer))
+
+photo_model = api.model('PlacePhoto', {
+    'id': fields.String(readOnly=True, description='Photo ID'),
+    'place_id': fields.String(readOnly=True, description='Place ID'),
+    'status': fields.String(readOnly=True, description='pending, ready or failed'),
+    'urls': fields.Raw(readOnly=True, description='Variant -> format -> URL (immutable)'),
+})
+
+photo_serializer = Serializer('PlacePhoto', {
+    'id': 'id',
+    'place_id': 'place_id',
+    'status': 'status',
+    'urls': lambda photo, context: photo_urls(photo),
+})
 
 @api.route('/')
 class PlaceList(Resource):
-    @api.marshal_list_with(place_model)
+    @api.expect(list_parser)
+    @api.response(200, 'List of places', [place_model])
     def get(self):
-        """Return all places"""
-        places = facade.get_all_places()
-        return [serialize_place(place) for place in places]
+        """Return all places, optionally filtered by amenities"""
+        args = list_parser.parse_args()
+        serializer, columns = requested_serializer(place_serializer)
+        amenity_ids = tuple(sorted(set(parse_amenity_ids(args['amenities']))))
+
+        def build():
+            try:
+                places = facade.list_places(fields=columns, amenity_ids=amenity_ids,
+                                            match=args['amenity_match'],
+                                            check_in=args['check_in'], check_out=args['check_out'])
+            except ValueError as e:
+                api.abort(400, str(e))
+            return places_response(places, serializer)
+        return shared_response(('places.list', tuple(columns), amenity_ids, args['amenity_match'],
+                                args['check_in'], args['check_out']), build)
 
     @api.expect(place_model, validate=True)
-    @api.marshal_with(place_model, code=201)
+    @api.response(201, 'Place created', place_model)
     @jwt_required()
+    @idempotent
     def post(self):
         """Create a new place"""
         data = api.payload
@@ -60,26 +186,115 @@ class PlaceList(Resource):
             api.abort(400, "Latitude must be between -90 and 90")
         if not (-180 <= data.get('longitude', 0) <= 180):
             api.abort(400, "Longitude must be between -180 and 180")
-        owner = facade.get_user(data['owner_id'])
-        if not owner:
-            api.abort(400, "The specified owner does not exist")
-        place = facade.create_place(data)
-        return serialize_place(place), 201
+        try:
+            place = facade.create_place(data)
+        except ValueError as e:
+            if str(e) == "Owner not found":
+                api.abort(400, "The specified owner does not exist")
+            raise
+        return place_serializer.response(place, 201)
+
+@api.route('/changes')
+class PlaceChanges(Resource):
+    @api.expect(changes_parser)
+    @api.response(200, 'Places created, updated or deleted since the cursor',
+                  changes_model(api, place_model))
+    @api.response(410, 'Cursor expired: download the full list again')
+    def get(self):
+        """Delta sync: places changed since a cursor"""
+        return changes_response('places', place_serializer, places_context)
+
+price_bucket_model = api.model('PriceBucket', {
+    'from': fields.Float(description='Lowest price of the bucket (included)'),
+    'to': fields.Float(description='Highest price (excluded), None for the last bucket'),
+    'count': fields.Integer,
+})
+
+facets_model = api.model('PlaceFacets', {
+    'total': fields.Integer(description='Number of matching places'),
+    'price': fields.Nested(api.model('PriceFacet', {
+        'min': fields.Float,
+        'max': fields.Float,
+        'buckets': fields.List(fields.Nested(price_bucket_model)),
+    })),
+    'amenities': fields.List(fields.Nested(api.model('AmenityFacet', {
+        'id': fields.String(description='Amenity ID'),
+        'count': fields.Integer,
+    })), description='Amenities of the matching places, most common first'),
+    'ratings': fields.List(fields.Nested(api.model('RatingFacet', {
+        'rating': fields.Integer(description='Average rating rounded down'),
+        'count': fields.Integer,
+    }))),
+    'unrated': fields.Integer(description='Matching places without reviews'),
+})
+
+@api.route('/facets')
+class PlaceFacets(Resource):
+    @api.expect(facets_parser)
+    @api.marshal_with(facets_model)
+    def get(self):
+        """Price histogram, amenity and rating counts of the places matching the filters"""
+        args = facets_parser.parse_args()
+        amenity_ids = tuple(sorted(set(parse_amenity_ids(args['amenities']))))
+        edges = parse_price_edges(args['price_buckets'])
+        try:
+            # Plain dicts: safe to share with the concurrent identical requests
+            return group.do(('places.facets', amenity_ids, args['amenity_match'],
+                             args['check_in'], args['check_out'], tuple(edges or ())),
+                            lambda: facade.get_place_facets(
+                                amenity_ids=amenity_ids, match=args['amenity_match'],
+                                check_in=args['check_in'], check_out=args['check_out'],
+                                price_edges=edges))
+        except ValueError as e:
+            api.abort(400, str(e))
+
+@api.route('/search')
+class PlaceSearch(Resource):
+    @api.expect(search_parser)
+    @api.marshal_with(search_page_model)
+    def get(self):
+        """Full-text search on place titles and descriptions"""
+        args = search_parser.parse_args()
+        if args['page'] < 1 or args['per_page'] < 1:
+            api.abort(400, "page and per_page must be positive")
+        if not search.build_match_query(args['q']):
+            api.abort(400, "Search query must contain at least one word")
+        per_page = min(args['per_page'], search.MAX_PER_PAGE)
+        try:
+            results, has_more = facade.search_places(
+                args['q'], page=args['page'], per_page=per_page,
+                amenity_ids=parse_amenity_ids(args['amenities']), match=args['amenity_match'],
+                check_in=args['check_in'], check_out=args['check_out'])
+        except ValueError as e:
+            api.abort(400, str(e))
+        return {
+            'query': args['q'],
+            'page': args['page'],
+            'per_page': per_page,
+            'has_more': has_more,
+            'results': results,
+        }
 
 @api.route('/<string:place_id>')
 @api.param('place_id', 'Place identifier')
 class PlaceResource(Resource):
-    @api.marshal_with(place_model)
+    @api.response(200, 'Place details', place_model)
+    @api.param('fields', 'Comma-separated fields to return')
     def get(self, place_id):
         """Return a specific place"""
-        place = facade.get_place(place_id)
-        if not place:
-            api.abort(404, "Place not found")
-        return serialize_place(place)
+        serializer, columns = requested_serializer(place_serializer)
+
+        def build():
+            place = facade.get_place_view(place_id, place_serializer.one)
+            if place is None:
+                api.abort(404, "Place not found")
+            return json_response(dumps({name: place[name] for name in serializer.fields}))
+        return shared_response(('places.get', place_id, tuple(columns)), build)
 
     @api.expect(update_parser)
-    @api.marshal_with(place_model)
+    @api.response(200, 'Place updated', place_model)
     @jwt_required()
+    @idempotent
     def put(self, place_id):
         """Update an existing place"""
         current_user = get_jwt_identity()
@@ -100,4 +315,203 @@ class PlaceResource(Resource):
         if 'longitude' in clean_data and not (-180 <= clean_data['longitude'] <= 180):
             api.abort(400, "Longitude must be between -180 and 180")
         place = facade.update_place(place_id, clean_data)
-        return serialize_place(place)
+        return place_serializer.response(place)
+
+
+# Seconds between keep-alive comments, and reconnection delay for browsers
+STREAM_KEEPALIVE = 15
+STREAM_RETRY_MS = 3000
+
+
+@api.route('/<string:place_id>/reviews/stream')
+@api.param('place_id', 'Place identifier')
+class PlaceReviewStream(Resource):
+    @api.response(200, 'text/event-stream of review.created/updated/deleted events')
+    @api.response(404, 'Place not found')
+    def get(self, place_id):
+        """Stream the review changes of a place (Server-Sent Events)"""
+        if not facade.place_exists(place_id):
+            api.abort(404, "Place not found")
+        last_event_id = (request.headers.get('Last-Event-ID')
+                         or request.args.get('last_event_id'))
+        subscription, missed, complete = subscribe_place_reviews(place_id, last_event_id)
+
+        def generate():
+            try:
+                yield f'retry: {STREAM_RETRY_MS}\n\n'.encode()
+                if not complete:
+                    # Events were lost: the client must reload the reviews
+                    yield b'event: reset\ndata: {}\n\n'
+                for event in missed:
+                    yield event.encoded
+                while True:
+                    event = subscription.get(STREAM_KEEPALIVE)
+                    if event is not None:
+                        yield event.encoded
+                    elif subscription.overflowed:
+                        # Too slow: drop the connection, the browser resumes
+                        # from its Last-Event-ID
+                        break
+                    else:
+                        yield b': keepalive\n\n'
+            finally:
+                subscription.close()
+
+        # Not wrapped in stream_with_context: the request (and its DB session)
+        # ends here instead of staying open for the lifetime of the stream
+        return Response(generate(), mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+def _check_place_owner(place_id):
+    """Abort unless the place exists and belongs to the current user (or admin)"""
+    current_user = get_jwt_identity()
+    place = facade.get_place(place_id, fields=['id', 'owner_id'])
+    if not place:
+        api.abort(404, "Place not found")
+    if not current_user.get('is_admin', False) and place.owner_id != current_user['id']:
+        api.abort(403, "Unauthorized action")
+
+
+@api.route('/<string:place_id>/photos')
+@api.param('place_id', 'Place identifier')
+class PlacePhotoList(Resource):
+    @api.response(200, 'Photos of the place', [photo_model])
+    def get(self, place_id):
+        """List the photos of a place"""
+        if not facade.place_exists(place_id):
+            api.abort(404, "Place not found")
+        return photo_serializer.list_response(facade.get_place_photos(place_id))
+
+    @api.response(202, 'Photo stored, thumbnails are being generated', photo_model)
+    @api.response(413, 'Photo too large')
+    @jwt_required()
+    def post(self, place_id):
+        """
+        Upload a photo: raw image body (Content-Type: image/...) or
+        multipart field "photo".  The body is streamed to disk.
+        """
+        _check_place_owner(place_id)
+        if request.mimetype == 'multipart/form-data':
+            upload = request.files.get('photo')
+            if upload is None:
+                api.abort(400, "Missing 'photo' file field")
+            stream = upload.stream
+        else:
+            stream = request.stream
+        try:
+            photo = facade.add_place_photo(place_id, stream)
+        except PhotoTooLarge as e:
+            api.abort(413, str(e))
+        except ValueError as e:
+            api.abort(400, str(e))
+        return photo_serializer.response(photo, 202 if photo.status == 'pending' else 200)
+
+
+@api.route('/<string:place_id>/photos/<string:photo_id>')
+@api.param('place_id', 'Place identifier')
+@api.param('photo_id', 'Photo identifier')
+class PlacePhotoResource(Resource):
+    @jwt_required()
+    def delete(self, place_id, photo_id):
+        """Delete a photo of a place"""
+        _check_place_owner(place_id)
+        photo = facade.get_place_photo(photo_id)
+        if not photo or photo.place_id != place_id:
+            api.abort(404, "Photo not found")
+        facade.delete_place_photo(photo_id)
+        return {'message': 'Photo deleted'}, 200
+
+
+booking_model = api.model('Booking', {
+    'id': fields.String(readOnly=True, description='Booking ID'),
+    'place_id': fields.String(readOnly=True, description='Place ID'),
+    'user_id': fields.String(readOnly=True, description='Guest ID (None for blocked dates)'),
+    'check_in': fields.Date(required=True, description='First night (YYYY-MM-DD)'),
+    'check_out': fields.Date(required=True, description='Departure day (YYYY-MM-DD)'),
+    'kind': fields.String(description="'booked' (default) or 'blocked' (owner only)"),
+})
+
+booking_serializer = Serializer('Booking', {
+    'id': 'id',
+    'place_id': 'place_id',
+    'user_id': 'user_id',
+    'check_in': ('check_in', date.isoformat),
+    'check_out': ('check_out', date.isoformat),
+    'kind': 'kind',
+})
+
+# The public calendar does not tell who booked
+calendar_serializer = booking_serializer.subset(['id', 'check_in', 'check_out', 'kind'])
+
+calendar_parser = reqparse.RequestParser()
+calendar_parser.add_argument('from', type=iso_date, location='args',
+                             help='Only the bookings ending after this date')
+calendar_parser.add_argument('to', type=iso_date, location='args',
+                             help='Only the bookings starting before this date')
+
+
+@api.route('/<string:place_id>/calendar')
+@api.param('place_id', 'Place identifier')
+class PlaceCalendar(Resource):
+    @api.expect(calendar_parser)
+    @api.response(200, 'Booked and blocked date ranges of the place')
+    def get(self, place_id):
+        """Taken date ranges of a place, by check-in date"""
+        if not facade.place_exists(place_id):
+            api.abort(404, "Place not found")
+        args = calendar_parser.parse_args()
+        bookings = facade.get_place_calendar(place_id, args['from'], args['to'])
+        return calendar_serializer.list_response(bookings)
+
+
+@api.route('/<string:place_id>/bookings')
+@api.param('place_id', 'Place identifier')
+class PlaceBookingList(Resource):
+    @api.expect(booking_model, validate=True)
+    @api.response(201, 'Dates booked', booking_model)
+    @api.response(409, 'The dates overlap another booking')
+    @jwt_required()
+    @idempotent
+    def post(self, place_id):
+        """Book a stay, or block dates (owner)"""
+        current_user = get_jwt_identity()
+        place = facade.get_place(place_id, fields=['id', 'owner_id'])
+        if not place:
+            api.abort(404, "Place not found")
+        is_owner = current_user.get('is_admin', False) or place.owner_id == current_user['id']
+        data = api.payload
+        kind = data.get('kind') or 'booked'
+        if kind == 'blocked' and not is_owner:
+            api.abort(403, "Only the owner can block dates")
+        if kind == 'booked' and place.owner_id == current_user['id']:
+            api.abort(400, "You cannot book your own place")
+        try:
+            booking = facade.book_place(place_id, {
+                'check_in': iso_date(data['check_in']),
+                'check_out': iso_date(data['check_out']),
+                'kind': kind,
+                'user_id': current_user['id'] if kind == 'booked' else None,
+            })
+        except availability.BookingConflict as e:
+            api.abort(409, str(e))
+        except ValueError as e:
+            api.abort(400, str(e))
+        return booking_serializer.response(booking, 201)
+
+
+@api.route('/<string:place_id>/bookings/<string:booking_id>')
+@api.param('place_id', 'Place identifier')
+@api.param('booking_id', 'Booking identifier')
+class PlaceBookingResource(Resource):
+    @jwt_required()
+    def delete(self, place_id, booking_id):
+        """Cancel a booking (guest, owner or admin) or unblock dates"""
+        current_user = get_jwt_identity()
+        booking = facade.get_booking(booking_id)
+        if not booking or booking.place_id != place_id:
+            api.abort(404, "Booking not found")
+        if booking.user_id != current_user['id']:
+            _check_place_owner(place_id)
+        facade.cancel_booking(booking_id)
+        return {'message': 'Booking cancelled'}, 200
@@ -1,9 +1,12 @@
 from flask_restx import Namespace, Resource, fields
-from app.services.facade import HBnBFacade
+from app.services import facade
+from app.api.serializers import Serializer, requested_serializer
+from app.api.changes import changes_model, changes_parser, changes_response
 from flask_jwt_extended import jwt_required, get_jwt_identity
+from app.api.idempotency import idempotent
+from app.api.coalescing import shared_response
 
 api = Namespace('reviews', description='Endpoints for managing reviews')
-facade = HBnBFacade()
 
 review_model = api.model('Review', {
     'id': fields.String(readOnly=True, description='Unique review ID'),
@@ -13,48 +16,78 @@ review_model = api.model('Review', {
     'place_id': fields.String(required=True, description='ID of the place')
 })
 
+review_update_model = api.model('ReviewUpdate', {
+    'text': fields.String(description='Review content'),
+    'rating': fields.Integer(description='Rating (1-5)'),
+})
+
+review_serializer = Serializer('Review', {
+    'id': 'id',
+    'text': 'text',
+    'rating': ('rating', int),
+    'user_id': 'user_id',
+    'place_id': 'place_id',
+})
+
+@api.route('/changes')
+class ReviewChanges(Resource):
+    @api.expect(changes_parser)
+    @api.response(200, 'Reviews created, updated or deleted since the cursor',
+                  changes_model(api, review_model))
+    @api.response(410, 'Cursor expired: download the full list again')
+    def get(self):
+        """Delta sync: reviews changed since a cursor"""
+        return changes_response('reviews', review_serializer)
+
 @api.route('/')
 class ReviewList(Resource):
-    @api.marshal_list_with(review_model)
+    @api.response(200, 'List of reviews', [review_model])
+    @api.param('fields', 'Comma-separated fields to return')
     def get(self):
         """Get all reviews"""
-        reviews = facade.get_all_reviews()
-        return [vars(review) for review in reviews], 200
+        serializer, columns = requested_serializer(review_serializer)
+        reviews = facade.list_reviews(fields=columns)
+        return serializer.list_response(reviews)
 
     @api.expect(review_model, validate=True)
-    @api.marshal_with(review_model, code=201)
+    @api.response(201, 'Review created', review_model)
     @jwt_required()
+    @idempotent
     def post(self):
         """Create a new review"""
         data = api.payload
         current_user = get_jwt_identity()
         data['user_id'] = current_user['id']
-        place = facade.get_place(data['place_id'])
+        place = facade.get_place(data['place_id'], fields=['owner_id'])
         if not place:
             api.abort(400, "Place not found")
         if place.owner_id == current_user['id']:
             api.abort(400, "You cannot review your own place")
-        # Check if user already reviewed this place
-        reviews = facade.get_reviews_by_place(data['place_id'])
-        for review in reviews:
-            if review.user_id == current_user['id']:
-                api.abort(400, "You have already reviewed this place")
+        if facade.has_reviewed(current_user['id'], data['place_id']):
+            api.abort(400, "You have already reviewed this place")
         review = facade.create_review(data)
-        return vars(review), 201
+        return review_serializer.response(review, 201)
 
 @api.route('/<string:review_id>')
 class ReviewResource(Resource):
-    @api.marshal_with(review_model)
+    @api.response(200, 'Review details', review_model)
+    @api.param('fields', 'Comma-separated fields to return')
     def get(self, review_id):
         """Get a review by its ID"""
-        review = facade.get_review(review_id)
-        if not review:
-            api.abort(404, "Review not found")
-        return vars(review)
+        serializer, columns = requested_serializer(review_serializer)
 
-    @api.expect(review_model, validate=True)
-    @api.marshal_with(review_model)
+        def build():
+            review = facade.get_review(review_id, fields=columns)
+            if not review:
+                api.abort(404, "Review not found")
+            return serializer.response(review)
+        return shared_response(('reviews.get', review_id, tuple(columns)), build)
+
+    @api.expect(review_update_model, validate=True)
+    @api.response(200, 'Review updated', review_model)
+    @api.response(400, 'Invalid rating')
     @jwt_required()
+    @idempotent
     def put(self, review_id):
         """Update a review"""
         current_user = get_jwt_identity()
@@ -67,8 +100,11 @@ class ReviewResource(Resource):
         data = api.payload
         if 'user_id' in data or 'place_id' in data:
             api.abort(400, "You cannot modify user_id or place_id")
-        review = facade.update_review(review_id, data)
-        return vars(review)
+        try:
+            review = facade.update_review(review_id, data)
+        except ValueError as e:
+            api.abort(400, str(e))
+        return review_serializer.response(review)
 
     @jwt_required()
     def delete(self, review_id):
@@ -1,7 +1,11 @@
 from flask_restx import Namespace, Resource, fields
 from flask import request
 from app.services import facade
+from app.api.serializers import Serializer, dumps, json_response, requested_serializer
+from app.api.changes import changes_model, changes_parser, changes_response
 from flask_jwt_extended import jwt_required, get_jwt_identity
+from app.api.idempotency import idempotent
+from app.api.coalescing import shared_response
 from app.services.auth import admin_required
 
 api = Namespace('users', description='Operations related to users')
@@ -21,23 +25,34 @@ user_response_model = api.model('UserResponse', {
     'email': fields.String(description='User\'s email address'),
 })
 
+user_serializer = Serializer('User', {
+    'id': 'id',
+    'first_name': 'first_name',
+    'last_name': 'last_name',
+    'email': 'email',
+})
+
 @api.route('/<string:user_id>')
 class UserResource(Resource):
-    @api.marshal_with(user_response_model)
-    @api.response(200, 'User details retrieved successfully')
+    @api.response(200, 'User details retrieved successfully', user_response_model)
     @api.response(404, 'User not found')
+    @api.param('fields', 'Comma-separated fields to return')
     def get(self, user_id):
         """Retrieve user details by ID"""
-        user = facade.get_user(user_id)
-        if not user:
-            return {'error': 'User not found'}, 404
-        return user.to_dict(), 200
+        serializer, columns = requested_serializer(user_serializer)
+
+        def build():
+            user = facade.get_user_view(user_id, user_serializer.one)
+            if user is None:
+                return {'error': 'User not found'}, 404
+            return json_response(dumps({name: user[name] for name in serializer.fields}))
+        return shared_response(('users.get', user_id, tuple(columns)), build)
 
     @api.expect(user_model, validate=True)
-    @api.marshal_with(user_response_model)
-    @api.response(200, 'User updated successfully')
+    @api.response(200, 'User updated successfully', user_response_model)
     @api.response(404, 'User not found')
     @jwt_required()
+    @idempotent
     def put(self, user_id):
         """Update user information"""
         current_user = get_jwt_identity()
@@ -47,7 +62,7 @@ class UserResource(Resource):
             updated_user = facade.update_user(user_id, user_data)
             if not updated_user:
                 return {'error': 'User not found'}, 404
-            return updated_user.to_dict(), 200
+            return user_serializer.response(updated_user)
 
         if user_id != current_user['id']:
             return {'error': 'Unauthorized action'}, 403
@@ -58,28 +73,98 @@ class UserResource(Resource):
         updated_user = facade.update_user(user_id, user_data)
         if not updated_user:
             return {'error': 'User not found'}, 404
-        return updated_user.to_dict(), 200
+        return user_serializer.response(updated_user)
+
+    @api.response(202, 'User deletion queued')
+    @api.response(403, 'Unauthorized action')
+    @api.response(404, 'User not found')
+    @jwt_required()
+    def delete(self, user_id):
+        """Delete a user with their places and reviews (admin, or the user), in the background"""
+        current_user = get_jwt_identity()
+        if not current_user.get('is_admin', False) and user_id != current_user['id']:
+            return {'error': 'Unauthorized action'}, 403
+        job_id = facade.delete_user_later(user_id)
+        if job_id is None:
+            return {'error': 'User not found'}, 404
+        return {'message': 'User deletion queued', 'job_id': job_id}, 202
+
+@api.route('/changes')
+class UserChanges(Resource):
+    @api.expect(changes_parser)
+    @api.response(200, 'Users created, updated or deleted since the cursor',
+                  changes_model(api, user_response_model))
+    @api.response(410, 'Cursor expired: download the full list again')
+    def get(self):
+        """Delta sync: users changed since a cursor"""
+        return changes_response('users', user_serializer)
 
 @api.route('/')
 class UserList(Resource):
-    @api.marshal_list_with(user_response_model)
-    @api.response(200, 'User list retrieved successfully')
+    @api.response(200, 'User list retrieved successfully', [user_response_model])
+    @api.param('fields', 'Comma-separated fields to return')
     def get(self):
         """Retrieve the list of all users"""
-        users = facade.get_all_users()
-        return [user.to_dict() for user in users], 200
+        serializer, columns = requested_serializer(user_serializer)
+        users = facade.list_users(fields=columns)
+        return serializer.list_response(users)
 
     @api.expect(user_model, validate=True)
-    @api.marshal_with(user_response_model, code=201)
-    @api.response(201, 'User created successfully')
+    @api.response(201, 'User created successfully', user_response_model)
     @api.response(400, 'Invalid data')
     @jwt_required()
     @admin_required
+    @idempotent
     def post(self):
         """Register a new user (public endpoint)"""
         user_data = request.json
         try:
             new_user = facade.create_user(user_data)
-            return new_user.to_dict(), 201
+            return user_serializer.response(new_user, 201)
+        except ValueError as e:
+            return {'error': str(e)}, 400
+
+BULK_MAX_USERS = 1000
+
+bulk_users_model = api.model('UserBulk', {
+    'users': fields.List(fields.Raw, required=True,
+                         description=f'Users to create (User objects, at most {BULK_MAX_USERS}; '
+                                     'use `flask --app run import-users` for more)'),
+})
+
+bulk_result_model = api.model('UserBulkResult', {
+    'index': fields.Integer(description='Position in the request'),
+    'email': fields.String,
+    'id': fields.String(description='ID of the created user'),
+    'error': fields.String(description='Why the user was not created'),
+})
+
+bulk_response_model = api.model('UserBulkResponse', {
+    'created': fields.Integer,
+    'failed': fields.Integer,
+    'results': fields.List(fields.Nested(bulk_result_model, skip_none=True)),
+})
+
+@api.route('/bulk')
+class UserBulk(Resource):
+    @api.expect(bulk_users_model, validate=True)
+    @api.response(200, 'Users processed, with one result per item', bulk_response_model)
+    @api.response(400, 'Invalid data')
+    @jwt_required()
+    @admin_required
+    @idempotent
+    def post(self):
+        """Create many users at once (admin); failures are reported per item"""
+        items = request.json['users']
+        if len(items) > BULK_MAX_USERS:
+            return {'error': f'At most {BULK_MAX_USERS} users per request'}, 400
+        try:
+            results = facade.create_users(items)
         except ValueError as e:
             return {'error': str(e)}, 400
+        failed = sum(1 for result in results if 'error' in result)
+        return api.marshal({
+            'created': len(results) - failed,
+            'failed': failed,
+            'results': results,
+        }, bulk_response_model), 200
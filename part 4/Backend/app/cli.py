@@ -0,0 +1,108 @@
+"""Flask CLI commands (``flask --app run <command>``)"""
+import click
+
+
+def register_commands(app):
+    """Attach the maintenance commands to the application"""
+
+    @app.cli.command('reindex-places')
+    def reindex_places():
+        """Rebuild the full-text search index of places"""
+        from app.persistence.search import rebuild_search_index
+        count = rebuild_search_index()
+        click.echo(f"Search index rebuilt: {count} places indexed")
+
+    @app.cli.command('prune-tombstones')
+    @click.option('--days', type=int, default=None,
+                  help='Keep this many days (default: TOMBSTONE_RETENTION_DAYS)')
+    def prune_tombstones(days):
+        """Delete the delta-sync tombstones past their retention"""
+        from app.persistence.changes import prune_tombstones
+        count = prune_tombstones(days)
+        click.echo(f"{count} tombstones deleted")
+
+    @app.cli.command('build-frontend')
+    @click.option('--source', default=None, help='Frontend directory (default: ../Frontend)')
+    @click.option('--dest', default=None, help='Output directory (default: <source>/dist)')
+    def build_frontend(source, dest):
+        """Build the fingerprinted, precompressed Frontend"""
+        import os
+        from app.services.static_assets import build_assets
+        source = source or os.path.join(app.root_path, '..', '..', 'Frontend')
+        dest = dest or os.path.join(source, 'dist')
+        manifest = build_assets(source, dest)
+        click.echo(f"Frontend built in {os.path.abspath(dest)}: {len(manifest)} fingerprinted assets")
+
+    @app.cli.command('jobs-status')
+    def jobs_status():
+        """Show the depth and latency of the background job queue"""
+        from app.persistence import job_queue
+        stats = job_queue.stats()
+        click.echo("Jobs: " + ", ".join(f"{count} {status}"
+                                        for status, count in stats['by_status'].items()))
+        by_priority = ", ".join(f"{count} at priority {priority}"
+                                for priority, count in stats['ready_by_priority'].items())
+        click.echo(f"Ready: {stats['ready']}" + (f" ({by_priority})" if by_priority else ""))
+        click.echo(f"Oldest ready job waiting for {stats['oldest_ready_seconds']:.1f}s")
+        if stats['finished_recently']:
+            click.echo(f"Latency over the last {job_queue.STATS_WINDOW}s "
+                       f"({stats['finished_recently']} jobs): "
+                       f"p50 {stats['latency_p50']:.2f}s, p95 {stats['latency_p95']:.2f}s")
+        for job in job_queue.failed_jobs():
+            error = (job.last_error or '').strip().splitlines()[-1:] or ['']
+            click.echo(f"Failed #{job.id} {job.name} after {job.attempts} attempts: {error[0]}")
+
+    @app.cli.command('jobs-work')
+    @click.option('--threads', type=int, default=None, help='Worker threads (default: JOB_THREADS)')
+    @click.option('--once', is_flag=True, help='Run the available jobs, then exit')
+    @click.option('--retry-failed', is_flag=True, help='Queue the failed jobs again first')
+    def jobs_work(threads, once, retry_failed):
+        """Run background jobs in this process"""
+        import time
+        from app.persistence import job_queue
+        from app.services import jobs
+        if retry_failed:
+            click.echo(f"{job_queue.retry_failed()} failed jobs queued again")
+        if once:
+            click.echo(f"{jobs.run_pending()} jobs run")
+            return
+        pool = jobs.start_workers(app, threads)
+        click.echo(f"Running jobs with {pool.threads} threads (Ctrl+C to stop)")
+        try:
+            while pool.alive:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            pool.stop(timeout=30)
+
+    @app.cli.command('import-users')
+    @click.argument('path', type=click.Path(exists=True, dir_okay=False))
+    @click.option('--batch-size', type=int, default=None,
+                  help='Users per transaction (default: BULK_USERS_BATCH_SIZE)')
+    @click.option('--workers', type=int, default=None,
+                  help='Password hashing processes (default: one per core)')
+    def import_users(path, batch_size, workers):
+        """Create the users of a CSV, JSON or JSON lines file"""
+        from app.services import facade
+        from app.services.provisioning import read_users_file
+        try:
+            items = read_users_file(path)
+        except ValueError as e:
+            raise click.ClickException(f"Cannot read {path}: {e}")
+        try:
+            results = facade.create_users(items, batch_size=batch_size, workers=workers)
+        except ValueError as e:
+            raise click.ClickException(f"Cannot import {path}: {e}")
+        failed = [result for result in results if 'error' in result]
+        for result in failed:
+            click.echo(f"#{result['index']} {result['email']}: {result['error']}", err=True)
+        click.echo(f"{len(results) - len(failed)} users created, {len(failed)} failed")
+
+    @app.cli.command('partition-reviews')
+    def partition_reviews():
+        """Move the reviews of the main database into the review partitions"""
+        from app.persistence.partitions import move_reviews_to_partitions
+        try:
+            count = move_reviews_to_partitions()
+        except RuntimeError as e:
+            raise click.ClickException(str(e))
+        click.echo(f"{count} reviews moved")
@@ -2,5 +2,30 @@ from .user import User
 from .place import Place
 from .review import Review
 from .amenity import Amenity
+from .photo import PlacePhoto
+from .booking import Booking
 
-__all__ = ['User', 'Place', 'Review', 'Amenity']
\ No newline at end of file
+# Enregistre l'index FTS5 des places sur la création/suppression du schéma
+from app.persistence import search  # noqa: E402,F401
+# Tombstones et index updated_at pour la synchronisation différentielle
+from app.persistence import changes  # noqa: E402,F401
+# Outbox transactionnelle (invalidation des caches entre workers)
+from app.persistence import outbox  # noqa: E402,F401
+# File de jobs persistante (travail différé hors requête)
+from app.persistence import job_queue  # noqa: E402,F401
+# Réponses stockées des requêtes avec Idempotency-Key
+from app.persistence import idempotency  # noqa: E402,F401
+# Maintient l'index bitmap des amenities à chaque commit
+from app.persistence import amenity_index  # noqa: E402,F401
+# Index des calendriers de disponibilité (recherche par dates)
+from app.persistence import availability  # noqa: E402,F401
+# Agrégats des facettes (histogramme des prix, notes)
+from app.persistence import facets  # noqa: E402,F401
+# Invalide le cache des places et utilisateurs sérialisés
+from app.persistence import object_cache  # noqa: E402,F401
+# Tables recopiées en mémoire (MEMORY_TIER)
+from app.persistence import memory_tier  # noqa: E402,F401
+# Table schema_info (version du schéma)
+from app.persistence import schema  # noqa: E402,F401
+
+__all__ = ['User', 'Place', 'Review', 'Amenity', 'PlacePhoto', 'Booking']
@@ -0,0 +1,37 @@
+from app import db
+from sqlalchemy import Column, String, Date, ForeignKey, Index
+from app.models.base_model import BaseModel
+import uuid
+
+class Booking(BaseModel, db.Model):
+    """A night range [check_in, check_out) taken on the calendar of a place"""
+    __tablename__ = 'bookings'
+
+    place_id = Column(String(36), ForeignKey('places.id'), nullable=False)
+    # Guest who booked; None for dates blocked by the owner
+    user_id = Column(String(36), ForeignKey('users.id'), nullable=True, index=True)
+    check_in = Column(Date, nullable=False)
+    # Departure day: the night before it is the last one taken
+    check_out = Column(Date, nullable=False)
+    # booked (by a guest) or blocked (by the owner)
+    kind = Column(String(8), nullable=False, default='booked')
+
+    # Last booking starting before a date: one seek (see find_conflict)
+    __table_args__ = (Index('ix_bookings_place_id_check_in', 'place_id', 'check_in'),)
+
+    KINDS = ('booked', 'blocked')
+
+    def __init__(self, place_id, check_in, check_out, kind='booked', user_id=None, id=None):
+        if id:
+            self.id = id
+        else:
+            self.id = str(uuid.uuid4())
+        if check_out <= check_in:
+            raise ValueError("check_out must be after check_in")
+        if kind not in self.KINDS:
+            raise ValueError("kind must be 'booked' or 'blocked'")
+        self.place_id = place_id
+        self.check_in = check_in
+        self.check_out = check_out
+        self.kind = kind
+        self.user_id = user_id
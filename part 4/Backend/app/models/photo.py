@@ -0,0 +1,29 @@
+from app import db
+from sqlalchemy import Column, String, ForeignKey, JSON
+from sqlalchemy.orm import relationship, backref
+from app.models.base_model import BaseModel
+import uuid
+
+class PlacePhoto(BaseModel, db.Model):
+    __tablename__ = 'place_photos'
+
+    place_id = Column(String(36), ForeignKey('places.id'), nullable=False, index=True)
+    # sha256 of the uploaded file: names its directory and its URLs
+    content_hash = Column(String(64), nullable=False, index=True)
+    # pending -> ready | failed, set by the photos.thumbnails job
+    status = Column(String(16), nullable=False, default='pending')
+    # Files available for this photo, e.g. ['original.jpg', 'small.webp', ...]
+    variants = Column(JSON, nullable=False, default=list)
+
+    place = relationship('Place', backref=backref('photos', lazy='dynamic',
+                                                  cascade='all, delete-orphan'))
+
+    def __init__(self, place_id, content_hash, variants, id=None):
+        if id:
+            self.id = id
+        else:
+            self.id = str(uuid.uuid4())
+        self.place_id = place_id
+        self.content_hash = content_hash
+        self.status = 'pending'
+        self.variants = list(variants)
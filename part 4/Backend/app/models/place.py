@@ -13,7 +13,7 @@ class Place(BaseModel, db.Model):
     price = Column(Float, nullable=False)
     latitude = Column(Float, nullable=False)
     longitude = Column(Float, nullable=False)
-    owner_id = Column(String(36), ForeignKey('users.id'), nullable=False)
+    owner_id = Column(String(36), ForeignKey('users.id'), nullable=False, index=True)
     
     # Relations
     reviews = relationship('Review', backref='place', lazy=True, cascade='all, delete-orphan')
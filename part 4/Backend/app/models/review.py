@@ -8,8 +8,8 @@ class Review(BaseModel, db.Model):
 
     text = Column(Text, nullable=False)
     rating = Column(Integer, nullable=False)
-    user_id = Column(String(36), ForeignKey('users.id'), nullable=False)
-    place_id = Column(String(36), ForeignKey('places.id'), nullable=False)
+    user_id = Column(String(36), ForeignKey('users.id'), nullable=False, index=True)
+    place_id = Column(String(36), ForeignKey('places.id'), nullable=False, index=True)
     
     def __init__(self, text, rating, user_id, place_id, id=None):
         if id:
@@ -27,7 +27,11 @@ class User(db.Model):
         self.first_name = first_name
         self.last_name = last_name
         self.email = email
-        self.hash_password(password)
+        # Hash déjà calculé (import en masse, voir services/provisioning.py)
+        if 'password_hash' in kwargs:
+            self.password_hash = kwargs['password_hash']
+        else:
+            self.hash_password(password)
         self.is_admin = is_admin
         
         # ID personnalisé si fourni
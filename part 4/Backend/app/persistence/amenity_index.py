@@ -0,0 +1,316 @@
+"""
+In-process bitmap index over ``place_amenity``.
+
+Each amenity owns a compressed bitset of place "rows" (small dense integers
+assigned by the index, one per place).  "WiFi AND Pool AND Parking" then
+becomes an intersection of three bitsets instead of one join per amenity.
+
+The index lives in ``app.extensions['amenity_index']``; it is loaded from
+``place_amenity`` on first use (``run.py`` warms it at startup) and then kept
+up to date by ORM events: appends/removals on ``Place.amenities`` (which is
+what ``Place.add_amenity``/``remove_amenity`` do) and place/amenity deletion.
+Changes are staged on the session and only applied once the transaction
+commits, so a rollback never leaks into the index.  Changes committed by
+other workers arrive through the outbox (``app.persistence.outbox``).
+"""
+import threading
+from flask import current_app, has_app_context
+from sqlalchemy import event, inspect, select
+from sqlalchemy.orm import Session, object_session
+from app import db
+from app.models.associations import place_amenity
+from app.models.place import Place
+from app.models.amenity import Amenity
+from app.persistence import outbox
+
+CHUNK_SHIFT = 16
+CHUNK_MASK = (1 << CHUNK_SHIFT) - 1
+
+MATCH_ALL = 'all'
+MATCH_ANY = 'any'
+
+
+class Bitmap:
+    """
+    Compressed bitset of non-negative integers.
+
+    Rows are split in chunks of 65536 bits, each chunk being a Python int
+    used as a bit array; empty chunks are not stored, so sparse sets stay
+    small and set operations only touch chunks present on both sides.
+    """
+    __slots__ = ('_chunks',)
+
+    def __init__(self, rows=()):
+        self._chunks = {}
+        for row in rows:
+            self.add(row)
+
+    def add(self, row):
+        key = row >> CHUNK_SHIFT
+        self._chunks[key] = self._chunks.get(key, 0) | (1 << (row & CHUNK_MASK))
+
+    def discard(self, row):
+        key = row >> CHUNK_SHIFT
+        bits = self._chunks.get(key, 0) & ~(1 << (row & CHUNK_MASK))
+        if bits:
+            self._chunks[key] = bits
+        else:
+            self._chunks.pop(key, None)
+
+    def copy(self):
+        result = Bitmap()
+        result._chunks = dict(self._chunks)
+        return result
+
+    def __contains__(self, row):
+        return bool(self._chunks.get(row >> CHUNK_SHIFT, 0) >> (row & CHUNK_MASK) & 1)
+
+    def __len__(self):
+        return sum(bits.bit_count() for bits in self._chunks.values())
+
+    def __bool__(self):
+        return bool(self._chunks)
+
+    def __and__(self, other):
+        small, large = sorted((self._chunks, other._chunks), key=len)
+        result = Bitmap()
+        for key, bits in small.items():
+            common = bits & large.get(key, 0)
+            if common:
+                result._chunks[key] = common
+        return result
+
+    def __or__(self, other):
+        result = self.copy()
+        for key, bits in other._chunks.items():
+            result._chunks[key] = result._chunks.get(key, 0) | bits
+        return result
+
+    def __iter__(self):
+        """Yield the rows in ascending order"""
+        for key in sorted(self._chunks):
+            base = key << CHUNK_SHIFT
+            # bin() + str.find scans the bits in C instead of bit by bit
+            bits = bin(self._chunks[key])[:1:-1]
+            position = bits.find('1')
+            while position != -1:
+                yield base + position
+                position = bits.find('1', position + 1)
+
+
+class AmenityIndex:
+    """Amenity id -> Bitmap of place rows, with the place id <-> row mapping"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._bitmaps = {}
+        self._row_of = {}
+        self._place_ids = []
+        self._free_rows = []
+        self.loaded = False
+
+    def load(self):
+        """(Re)build the index from the ``place_amenity`` table"""
+        rows = db.session.execute(
+            select(place_amenity.c.place_id, place_amenity.c.amenity_id)
+        ).all()
+        with self._lock:
+            self._bitmaps = {}
+            self._row_of = {}
+            self._place_ids = []
+            self._free_rows = []
+            for place_id, amenity_id in rows:
+                self._add(place_id, amenity_id)
+            self.loaded = True
+        return len(rows)
+
+    def _row(self, place_id):
+        row = self._row_of.get(place_id)
+        if row is None:
+            if self._free_rows:
+                row = self._free_rows.pop()
+                self._place_ids[row] = place_id
+            else:
+                row = len(self._place_ids)
+                self._place_ids.append(place_id)
+            self._row_of[place_id] = row
+        return row
+
+    def _add(self, place_id, amenity_id):
+        bitmap = self._bitmaps.get(amenity_id)
+        if bitmap is None:
+            bitmap = self._bitmaps[amenity_id] = Bitmap()
+        bitmap.add(self._row(place_id))
+
+    def add(self, place_id, amenity_id):
+        with self._lock:
+            self._add(place_id, amenity_id)
+
+    def remove(self, place_id, amenity_id):
+        with self._lock:
+            row = self._row_of.get(place_id)
+            bitmap = self._bitmaps.get(amenity_id)
+            if row is not None and bitmap is not None:
+                bitmap.discard(row)
+
+    def reload_place(self, place_id):
+        """Re-read the amenities of one place (changed by another process)"""
+        amenity_ids = db.session.execute(
+            select(place_amenity.c.amenity_id).where(place_amenity.c.place_id == place_id)
+        ).scalars().all()
+        with self._lock:
+            row = self._row_of.get(place_id)
+            if row is not None:
+                for bitmap in self._bitmaps.values():
+                    bitmap.discard(row)
+            for amenity_id in amenity_ids:
+                self._add(place_id, amenity_id)
+
+    def remove_place(self, place_id):
+        with self._lock:
+            row = self._row_of.pop(place_id, None)
+            if row is None:
+                return
+            for bitmap in self._bitmaps.values():
+                bitmap.discard(row)
+            self._place_ids[row] = None
+            self._free_rows.append(row)
+
+    def remove_amenity(self, amenity_id):
+        with self._lock:
+            self._bitmaps.pop(amenity_id, None)
+
+    def _match(self, amenity_ids, mode):
+        if mode not in (MATCH_ALL, MATCH_ANY):
+            raise ValueError("mode must be 'all' or 'any'")
+        bitmaps = [self._bitmaps.get(amenity_id, Bitmap()) for amenity_id in set(amenity_ids)]
+        if not bitmaps:
+            return Bitmap()
+        if mode == MATCH_ANY:
+            result = Bitmap()
+            for bitmap in bitmaps:
+                result = result | bitmap
+            return result
+        # Intersect the smallest sets first so the result shrinks fast
+        bitmaps.sort(key=len)
+        result = bitmaps[0]
+        for bitmap in bitmaps[1:]:
+            if not result:
+                break
+            result = result & bitmap
+        return result
+
+    def match(self, amenity_ids, mode=MATCH_ALL):
+        """Return the Bitmap of places having all (or any) of the amenities"""
+        with self._lock:
+            return self._match(amenity_ids, mode).copy()
+
+    def place_ids(self, amenity_ids, mode=MATCH_ALL):
+        """Return the ids of the places matching the amenity filter"""
+        with self._lock:
+            return [self._place_ids[row] for row in self._match(amenity_ids, mode)]
+
+    def counts(self, place_ids=None):
+        """Return the number of places per amenity id, among ``place_ids`` if given"""
+        with self._lock:
+            if place_ids is None:
+                return {amenity_id: len(bitmap) for amenity_id, bitmap in self._bitmaps.items()}
+            rows = Bitmap(self._row_of[place_id] for place_id in place_ids
+                          if place_id in self._row_of)
+            return {amenity_id: len(bitmap & rows) for amenity_id, bitmap in self._bitmaps.items()}
+
+
+def get_amenity_index():
+    """Return the index of the current application, loading it if needed"""
+    index = current_app.extensions.get('amenity_index')
+    if index is None:
+        index = current_app.extensions['amenity_index'] = AmenityIndex()
+    if not index.loaded:
+        index.load()
+    return index
+
+
+# --- ORM events -----------------------------------------------------------
+
+def _object_id(obj):
+    """
+    Return the primary key without loading anything: reading ``obj.id`` on
+    an expired instance from inside a collection event would refresh it and
+    lose the pending changes of its dynamic collections.
+    """
+    state = inspect(obj)
+    if state.identity:
+        return state.identity[0]
+    return state.dict.get('id')
+
+
+def stage(session, op, *args):
+    """Apply ``index.<op>(*args)`` once ``session`` commits (bulk SQL writers)"""
+    session.info.setdefault('amenity_index_ops', []).append((op, args))
+
+
+def _stage(target, op, *args):
+    if not has_app_context():
+        return
+    stage(object_session(target) or db.session(), op, *args)
+
+
+@event.listens_for(Place.amenities, 'append')
+def _on_amenity_append(place, amenity, initiator):
+    _stage(place, 'add', _object_id(place), _object_id(amenity))
+
+
+@event.listens_for(Place.amenities, 'remove')
+def _on_amenity_remove(place, amenity, initiator):
+    _stage(place, 'remove', _object_id(place), _object_id(amenity))
+
+
+@event.listens_for(Place, 'after_delete')
+def _on_place_delete(mapper, connection, place):
+    _stage(place, 'remove_place', place.id)
+
+
+@event.listens_for(Amenity, 'after_delete')
+def _on_amenity_delete(mapper, connection, amenity):
+    _stage(amenity, 'remove_amenity', amenity.id)
+
+
+@event.listens_for(Session, 'after_commit')
+def _apply_staged_ops(session):
+    ops = session.info.pop('amenity_index_ops', None)
+    if not ops or not has_app_context():
+        return
+    index = current_app.extensions.get('amenity_index')
+    if index is None or not index.loaded:
+        # Not built yet: the next load() reads the committed rows anyway
+        return
+    for op, args in ops:
+        getattr(index, op)(*args)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_staged_ops(session):
+    session.info.pop('amenity_index_ops', None)
+
+
+@outbox.register
+def _apply_foreign_changes(events):
+    """Replay the place/amenity writes of other processes"""
+    index = current_app.extensions.get('amenity_index')
+    if index is None or not index.loaded:
+        return
+    if events is None:
+        index.loaded = False
+        return
+    reload_ids = set()
+    for change in events:
+        if change.resource == 'places':
+            if change.op == outbox.DELETE:
+                reload_ids.discard(change.object_id)
+                index.remove_place(change.object_id)
+            else:
+                reload_ids.add(change.object_id)
+        elif change.resource == 'amenities' and change.op == outbox.DELETE:
+            index.remove_amenity(change.object_id)
+    for place_id in reload_ids:
+        index.reload_place(place_id)
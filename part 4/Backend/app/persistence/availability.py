@@ -0,0 +1,221 @@
+"""
+In-process availability index: the upcoming bookings of every place as
+sorted interval lists.
+
+A place is free for a stay ``[check_in, check_out)`` when none of its
+bookings overlaps it.  The bookings of one place never overlap (writes are
+refused on conflict, see ``BookingRepository.add_if_free``), so they sort
+the same by start and by end, and only the last booking starting before
+``check_out`` can overlap: one ``bisect`` per place, O(log n), instead of
+reading booking rows for every place of a search.
+
+The index lives in ``app.extensions['availability_index']``.  It is loaded
+with the bookings that are not over yet (``run.py`` warms it at startup),
+then kept up to date like the amenity index: booking inserts and deletes
+are staged on the session and applied once the transaction commits, and
+the bookings written by other workers arrive through the outbox.
+"""
+import threading
+from bisect import bisect_left, insort
+from datetime import date, timedelta
+from flask import current_app, has_app_context
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session, object_session
+from app import db
+from app.models.booking import Booking
+from app.persistence import outbox
+
+MAX_NIGHTS = 365
+
+
+class BookingConflict(ValueError):
+    pass
+
+
+def validate_stay(check_in, check_out):
+    """Raise ValueError unless ``[check_in, check_out)`` is a valid stay"""
+    if check_in is None or check_out is None:
+        raise ValueError("check_in and check_out go together")
+    if check_out <= check_in:
+        raise ValueError("check_out must be after check_in")
+    if check_out - check_in > timedelta(days=MAX_NIGHTS):
+        raise ValueError(f"A stay cannot exceed {MAX_NIGHTS} nights")
+
+
+class Calendar:
+    """Bookings of one place: (check_in, check_out, id), sorted"""
+    __slots__ = ('entries',)
+
+    def __init__(self):
+        self.entries = []
+
+    def add(self, booking_id, check_in, check_out):
+        insort(self.entries, (check_in, check_out, booking_id))
+
+    def remove(self, booking_id, check_in):
+        position = bisect_left(self.entries, (check_in,))
+        while position < len(self.entries) and self.entries[position][0] == check_in:
+            if self.entries[position][2] == booking_id:
+                del self.entries[position]
+                return
+            position += 1
+
+    def is_free(self, check_in, check_out):
+        # Last booking starting before check_out; (check_out,) sorts before
+        # every entry starting on check_out
+        position = bisect_left(self.entries, (check_out,)) - 1
+        return position < 0 or self.entries[position][1] <= check_in
+
+
+class AvailabilityIndex:
+    """Place id -> Calendar, with booking id -> (place id, check_in)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calendars = {}
+        self._bookings = {}
+        self.loaded = False
+
+    def load(self, today=None):
+        """(Re)build the index from the bookings not over by ``today``"""
+        today = today or date.today()
+        rows = db.session.execute(
+            select(Booking.id, Booking.place_id, Booking.check_in, Booking.check_out)
+            .where(Booking.check_out > today)
+        ).all()
+        with self._lock:
+            self._calendars = {}
+            self._bookings = {}
+            for row in rows:
+                self._add(*row)
+            self.loaded = True
+        return len(rows)
+
+    def _add(self, booking_id, place_id, check_in, check_out):
+        if booking_id in self._bookings:
+            return
+        calendar = self._calendars.get(place_id)
+        if calendar is None:
+            calendar = self._calendars[place_id] = Calendar()
+        calendar.add(booking_id, check_in, check_out)
+        self._bookings[booking_id] = (place_id, check_in)
+
+    def add(self, booking_id, place_id, check_in, check_out):
+        with self._lock:
+            self._add(booking_id, place_id, check_in, check_out)
+
+    def remove(self, booking_id):
+        with self._lock:
+            entry = self._bookings.pop(booking_id, None)
+            if entry is None:
+                return
+            place_id, check_in = entry
+            calendar = self._calendars[place_id]
+            calendar.remove(booking_id, check_in)
+            if not calendar.entries:
+                del self._calendars[place_id]
+
+    def reload_booking(self, booking_id):
+        """Re-read one booking (written by another process)"""
+        row = db.session.execute(
+            select(Booking.id, Booking.place_id, Booking.check_in, Booking.check_out)
+            .where(Booking.id == booking_id)
+        ).first()
+        self.remove(booking_id)
+        if row is not None:
+            self.add(*row)
+
+    def remove_place(self, place_id):
+        with self._lock:
+            calendar = self._calendars.pop(place_id, None)
+            for _, _, booking_id in calendar.entries if calendar else ():
+                self._bookings.pop(booking_id, None)
+
+    def is_free(self, place_id, check_in, check_out):
+        with self._lock:
+            calendar = self._calendars.get(place_id)
+            return calendar is None or calendar.is_free(check_in, check_out)
+
+    def free_place_ids(self, place_ids, check_in, check_out):
+        """The ids of ``place_ids`` free for the stay, in the same order"""
+        with self._lock:
+            calendars = self._calendars
+            return [place_id for place_id in place_ids
+                    if place_id not in calendars
+                    or calendars[place_id].is_free(check_in, check_out)]
+
+    def busy_place_ids(self, check_in, check_out):
+        """Ids of the places with a booking overlapping the stay"""
+        with self._lock:
+            return {place_id for place_id, calendar in self._calendars.items()
+                    if not calendar.is_free(check_in, check_out)}
+
+
+def get_availability_index():
+    """Return the index of the current application, loading it if needed"""
+    index = current_app.extensions.get('availability_index')
+    if index is None:
+        index = current_app.extensions['availability_index'] = AvailabilityIndex()
+    if not index.loaded:
+        index.load()
+    return index
+
+
+# --- ORM events -----------------------------------------------------------
+
+def stage(session, op, *args):
+    """Apply ``index.<op>(*args)`` once ``session`` commits (bulk SQL writers)"""
+    session.info.setdefault('availability_ops', []).append((op, args))
+
+
+def _stage(target, op, *args):
+    if not has_app_context():
+        return
+    stage(object_session(target) or db.session(), op, *args)
+
+
+@event.listens_for(Booking, 'after_insert')
+def _on_booking_insert(mapper, connection, booking):
+    _stage(booking, 'add', booking.id, booking.place_id, booking.check_in, booking.check_out)
+
+
+@event.listens_for(Booking, 'after_delete')
+def _on_booking_delete(mapper, connection, booking):
+    _stage(booking, 'remove', booking.id)
+
+
+@event.listens_for(Session, 'after_commit')
+def _apply_staged_ops(session):
+    ops = session.info.pop('availability_ops', None)
+    if not ops or not has_app_context():
+        return
+    index = current_app.extensions.get('availability_index')
+    if index is None or not index.loaded:
+        # Not built yet: the next load() reads the committed rows anyway
+        return
+    for op, args in ops:
+        getattr(index, op)(*args)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_staged_ops(session):
+    session.info.pop('availability_ops', None)
+
+
+@outbox.register
+def _apply_foreign_changes(events):
+    """Replay the bookings written by other processes"""
+    index = current_app.extensions.get('availability_index')
+    if index is None or not index.loaded:
+        return
+    if events is None:
+        index.loaded = False
+        return
+    for change in events:
+        if change.resource == 'bookings':
+            if change.op == outbox.DELETE:
+                index.remove(change.object_id)
+            else:
+                index.reload_booking(change.object_id)
+        elif change.resource == 'places' and change.op == outbox.DELETE:
+            index.remove_place(change.object_id)
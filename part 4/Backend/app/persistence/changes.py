@@ -0,0 +1,172 @@
+"""
+Delta sync: what changed in a table since a cursor.
+
+Upserts come from the ``updated_at`` column, read through a composite
+``(updated_at, id)`` index.  Deletions are recorded in ``tombstones`` by a
+mapper ``after_delete`` event, so they are written in the same transaction
+as the DELETE itself, for repository deletes and ORM cascades alike.
+Code deleting rows with bulk SQL (bypassing the ORM) must record them
+itself: ``record_tombstones()``, or ``purge.delete_rows()`` which does it
+with an ``INSERT ... SELECT``.
+
+The cursor is opaque to clients: ``(timestamp, id)`` of the last change
+returned, base64-encoded.  Changes are read in ``(timestamp, id)`` order
+with a keyset condition, so paging through a large backlog never uses
+OFFSET.  Rows written less than ``CHANGES_SETTLE_SECONDS`` ago are not
+returned yet: a transaction that took its ``updated_at`` before ours but
+commits after would otherwise land behind the cursor and be missed.
+
+Tombstones older than ``TOMBSTONE_RETENTION_DAYS`` are pruned
+(``flask prune-tombstones``); a cursor older than that cannot be served
+(``CursorExpired``) and the client must download the full list again.
+"""
+import base64
+from datetime import datetime, timedelta
+from flask import current_app, has_app_context
+from sqlalchemy import (Column, DateTime, Index, Integer, String, Table, and_, event,
+                        insert, or_, select)
+from app import db
+from app.models.user import User
+from app.models.place import Place
+from app.models.review import Review
+from app.models.amenity import Amenity
+from app.models.photo import PlacePhoto
+from app.models.booking import Booking
+
+SETTLE_SECONDS = 1.0
+TOMBSTONE_RETENTION_DAYS = 30
+DEFAULT_LIMIT = 500
+MAX_LIMIT = 1000
+
+TRACKED_MODELS = (User, Place, Review, Amenity, PlacePhoto, Booking)
+
+tombstones = Table(
+    'tombstones',
+    db.Model.metadata,
+    Column('id', Integer, primary_key=True, autoincrement=True),
+    Column('resource', String(32), nullable=False),
+    Column('object_id', String(36), nullable=False),
+    Column('deleted_at', DateTime, nullable=False),
+    Index('ix_tombstones_resource_deleted_at', 'resource', 'deleted_at', 'object_id'),
+)
+
+for _model in TRACKED_MODELS:
+    _table = _model.__table__
+    Index(f'ix_{_table.name}_updated_at_id', _table.c.updated_at, _table.c.id)
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+class CursorExpired(ValueError):
+    pass
+
+
+def encode_cursor(timestamp, object_id):
+    raw = f'{timestamp.isoformat()}|{object_id}'.encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Return ``(timestamp, id)``, or None for an empty cursor (full sync)"""
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        timestamp, object_id = raw.split('|', 1)
+        return datetime.fromisoformat(timestamp), object_id
+    except ValueError:
+        raise InvalidCursor("Invalid cursor") from None
+
+
+def record_tombstones(connection, resource, object_ids, deleted_at=None):
+    """Insert tombstones for rows deleted without the ORM"""
+    deleted_at = deleted_at or datetime.utcnow()
+    rows = [{'resource': resource, 'object_id': object_id, 'deleted_at': deleted_at}
+            for object_id in object_ids]
+    if rows:
+        connection.execute(insert(tombstones), rows)
+
+
+def _after_delete(mapper, connection, target):
+    record_tombstones(connection, mapper.local_table.name, [target.id])
+
+
+for _model in TRACKED_MODELS:
+    event.listen(_model, 'after_delete', _after_delete)
+
+
+def _setting(name, default):
+    if has_app_context():
+        return current_app.config.get(name, default)
+    return default
+
+
+def read_changes(model, cursor=None, columns=None, limit=DEFAULT_LIMIT, sessions=None):
+    """
+    Return ``(upserts, deleted_ids, next_cursor, has_more)``.
+
+    ``upserts`` are Core rows with ``columns`` (plus ``id`` and
+    ``updated_at``); ``next_cursor`` is the cursor to send next time (the
+    same one when nothing changed).  A table spread over several databases
+    is read from each of ``sessions`` (default: ``db.session``).
+    """
+    table = model.__table__
+    position = decode_cursor(cursor)
+    now = datetime.utcnow()
+    if position is not None:
+        retention = timedelta(days=_setting('TOMBSTONE_RETENTION_DAYS', TOMBSTONE_RETENTION_DAYS))
+        if position[0] < now - retention:
+            raise CursorExpired("Cursor is too old, download the full list again")
+    until = now - timedelta(seconds=_setting('CHANGES_SETTLE_SECONDS', SETTLE_SECONDS))
+    limit = min(max(int(limit), 1), MAX_LIMIT)
+
+    names = ['id', 'updated_at'] + [name for name in (columns or table.columns.keys())
+                                     if name not in ('id', 'updated_at') and name in table.columns]
+    upsert_query = (select(*[table.c[name] for name in names])
+                    .where(table.c.updated_at <= until)
+                    .order_by(table.c.updated_at, table.c.id)
+                    .limit(limit + 1))
+    delete_query = (select(tombstones.c.deleted_at, tombstones.c.object_id)
+                    .where(tombstones.c.resource == table.name, tombstones.c.deleted_at <= until)
+                    .order_by(tombstones.c.deleted_at, tombstones.c.object_id)
+                    .limit(limit + 1))
+    if position is not None:
+        upsert_query = upsert_query.where(_after(table.c.updated_at, table.c.id, position))
+        delete_query = delete_query.where(
+            _after(tombstones.c.deleted_at, tombstones.c.object_id, position))
+
+    # Merge every stream by (timestamp, id) and keep the first `limit` changes
+    changes = []
+    for session in sessions or [db.session]:
+        changes += [(row.updated_at, row.id, row) for row in session.execute(upsert_query)]
+        changes += [(row.deleted_at, row.object_id, None) for row in session.execute(delete_query)]
+    changes.sort(key=lambda change: change[:2])
+    has_more = len(changes) > limit
+    changes = changes[:limit]
+
+    upserts = [row for _, _, row in changes if row is not None]
+    deleted_ids = [object_id for _, object_id, row in changes if row is None]
+    last = changes[-1][:2] if changes else (until, '')
+    if not has_more:
+        # Everything up to `until` was read: move the cursor there so that a
+        # quiet table does not leave clients with a cursor that ages out
+        last = max(last, (until, ''))
+    return upserts, deleted_ids, encode_cursor(*last), has_more
+
+
+def _after(timestamp_column, id_column, position):
+    """Keyset condition (timestamp, id) > position, written so that it uses the index"""
+    timestamp, object_id = position
+    return or_(timestamp_column > timestamp,
+               and_(timestamp_column == timestamp, id_column > object_id))
+
+
+def prune_tombstones(older_than_days=None):
+    """Delete the tombstones past the retention period; return their count"""
+    days = older_than_days or _setting('TOMBSTONE_RETENTION_DAYS', TOMBSTONE_RETENTION_DAYS)
+    result = db.session.execute(
+        tombstones.delete().where(tombstones.c.deleted_at < datetime.utcnow() - timedelta(days=days)))
+    db.session.commit()
+    return result.rowcount
@@ -0,0 +1,331 @@
+"""
+In-process aggregates behind ``GET /places/facets``: the price of every
+place, kept sorted, and the review count and rating sum of every place.
+
+Facets of the whole catalog cost one ``bisect`` per price bucket and a
+read of five rating counters, whatever the number of places.  A filter
+(amenities, dates) either selects a set of places, whose facets are
+computed from those places only, or excludes a set (places booked on the
+dates), whose contribution is subtracted from the catalog facets: the
+cost follows the size of the filter, never the size of the catalog.
+
+The index lives in ``app.extensions['facet_index']`` and is kept up to
+date like the amenity index: place and review writes are staged on the
+session and applied once the transaction commits, and the writes of
+other workers arrive through the outbox.  A review deleted by another
+worker does not say which place it belonged to, so it marks the ratings
+stale and the next request reloads them (one ``GROUP BY`` per review
+database).
+"""
+import threading
+from bisect import bisect_left, insort
+from flask import current_app, has_app_context
+from sqlalchemy import event, func, inspect, select
+from sqlalchemy.orm import Session, object_session
+from app import db
+from app.models.place import Place
+from app.models.review import Review
+from app.persistence import outbox, partitions
+
+PRICE_BUCKETS = 5
+MAX_PRICE_BUCKETS = 50
+RATINGS = (1, 2, 3, 4, 5)
+
+
+def price_edges(sorted_prices, count=PRICE_BUCKETS):
+    """
+    Bucket edges splitting ``sorted_prices`` in ``count`` groups of about
+    the same size, rounded to two significant digits
+    """
+    edges = []
+    for i in range(1, count):
+        if not sorted_prices:
+            break
+        edge = float(f'{sorted_prices[len(sorted_prices) * i // count]:.2g}')
+        if edge > 0 and (not edges or edge > edges[-1]):
+            edges.append(edge)
+    return edges
+
+
+def histogram(sorted_prices, edges):
+    """Counts of ``[0, e1), [e1, e2), ..., [en, inf)`` in ``sorted_prices``"""
+    positions = [0] + [bisect_left(sorted_prices, edge) for edge in edges] + [len(sorted_prices)]
+    return [high - low for low, high in zip(positions, positions[1:])]
+
+
+def rating_bucket(total, count):
+    """
+    Average rating rounded down (1 to 5), or None without reviews.  Clamped:
+    ratings were not validated on update before, rows may be out of range.
+    """
+    return min(max(total // count, RATINGS[0]), RATINGS[-1]) if count else None
+
+
+class FacetIndex:
+    """Place id -> price (plus a sorted copy) and place id -> [rating sum, count]"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._prices = {}
+        self._sorted_prices = []
+        self._ratings = {}
+        self._rating_counts = dict.fromkeys(RATINGS, 0)
+        self.loaded = False
+        self.ratings_stale = False
+
+    def load(self):
+        """(Re)build the index from the places and reviews tables"""
+        prices = db.session.execute(select(Place.id, Place.price)).all()
+        ratings = self._read_ratings()
+        with self._lock:
+            self._prices = dict(prices)
+            self._sorted_prices = sorted(self._prices.values())
+            self._set_ratings(ratings)
+            self.loaded = True
+        return len(prices)
+
+    def _read_ratings(self, place_ids=None):
+        query = select(Review.place_id, func.sum(Review.rating), func.count()) \
+            .group_by(Review.place_id)
+        if place_ids is not None:
+            query = query.where(Review.place_id.in_(place_ids))
+        ratings = {}
+        for session in partitions.review_sessions():
+            for place_id, total, count in session.execute(query):
+                entry = ratings.setdefault(place_id, [0, 0])
+                entry[0] += total
+                entry[1] += count
+        return ratings
+
+    def _set_ratings(self, ratings):
+        self._ratings = ratings
+        self._rating_counts = dict.fromkeys(RATINGS, 0)
+        for total, count in ratings.values():
+            self._rating_counts[rating_bucket(total, count)] += 1
+        self.ratings_stale = False
+
+    def reload_ratings(self):
+        ratings = self._read_ratings()
+        with self._lock:
+            self._set_ratings(ratings)
+
+    def set_price(self, place_id, price):
+        with self._lock:
+            old = self._prices.get(place_id)
+            if old == price:
+                return
+            if old is not None:
+                del self._sorted_prices[bisect_left(self._sorted_prices, old)]
+            self._prices[place_id] = price
+            insort(self._sorted_prices, price)
+
+    def remove_place(self, place_id):
+        with self._lock:
+            price = self._prices.pop(place_id, None)
+            if price is not None:
+                del self._sorted_prices[bisect_left(self._sorted_prices, price)]
+            self._update_rating(place_id, None)
+
+    def _update_rating(self, place_id, delta):
+        """Apply ``(rating delta, review count delta)`` (None: forget the place)"""
+        entry = self._ratings.get(place_id)
+        if entry is not None:
+            self._rating_counts[rating_bucket(*entry)] -= 1
+        if delta is None:
+            self._ratings.pop(place_id, None)
+            return
+        entry = self._ratings.setdefault(place_id, [0, 0])
+        entry[0] += delta[0]
+        entry[1] += delta[1]
+        if entry[1] > 0:
+            self._rating_counts[rating_bucket(*entry)] += 1
+        else:
+            del self._ratings[place_id]
+
+    def add_rating(self, place_id, rating):
+        with self._lock:
+            self._update_rating(place_id, (rating, 1))
+
+    def remove_rating(self, place_id, rating):
+        with self._lock:
+            self._update_rating(place_id, (-rating, -1))
+
+    def change_rating(self, place_id, old, new):
+        with self._lock:
+            self._update_rating(place_id, (new - old, 0))
+
+    def reload_place(self, place_id):
+        """Re-read the price and ratings of one place (written by another process)"""
+        price = db.session.execute(select(Place.price).where(Place.id == place_id)).scalar()
+        ratings = self._read_ratings([place_id]) if price is not None else {}
+        with self._lock:
+            self._update_rating(place_id, None)
+            if place_id in ratings:
+                self._update_rating(place_id, tuple(ratings[place_id]))
+        if price is None:
+            self.remove_place(place_id)
+        else:
+            self.set_price(place_id, price)
+
+    def reload_review(self, review_id):
+        """Re-read the ratings of the place of a review written by another process"""
+        for session in partitions.review_sessions():
+            place_id = session.execute(
+                select(Review.place_id).where(Review.id == review_id)).scalar()
+            if place_id is not None:
+                self.reload_place(place_id)
+                return
+
+    def facets(self, place_ids=None, exclude_ids=(), edges=None):
+        """
+        Price histogram and rating counts of ``place_ids`` (every place when
+        None) minus ``exclude_ids``; ``edges`` default to price quantiles.
+        """
+        if self.ratings_stale:
+            self.reload_ratings()
+        with self._lock:
+            if place_ids is None:
+                prices = self._sorted_prices
+                rating_counts = dict(self._rating_counts)
+                removed = [place_id for place_id in exclude_ids if place_id in self._prices]
+            else:
+                wanted = set(place_ids).difference(exclude_ids)
+                prices = sorted(self._prices[place_id] for place_id in wanted
+                                if place_id in self._prices)
+                rating_counts = dict.fromkeys(RATINGS, 0)
+                for place_id in wanted:
+                    entry = self._ratings.get(place_id)
+                    if entry is not None and place_id in self._prices:
+                        rating_counts[rating_bucket(*entry)] += 1
+                removed = []
+            removed_prices = sorted(self._prices[place_id] for place_id in removed)
+            for place_id in removed:
+                entry = self._ratings.get(place_id)
+                if entry is not None:
+                    rating_counts[rating_bucket(*entry)] -= 1
+            if edges is None:
+                edges = price_edges(prices)
+            counts = histogram(prices, edges)
+            if removed_prices:
+                counts = [count - minus for count, minus
+                          in zip(counts, histogram(removed_prices, edges))]
+            total = len(prices) - len(removed_prices)
+            low = _first_kept(prices, removed_prices)
+            high = _first_kept(prices, removed_prices, last=True)
+        bounds = [0.0] + edges + [None]
+        return {
+            'total': total,
+            'price': {
+                'min': low,
+                'max': high,
+                'buckets': [{'from': start, 'to': end, 'count': count}
+                            for start, end, count in zip(bounds, bounds[1:], counts)],
+            },
+            'ratings': [{'rating': rating, 'count': rating_counts[rating]}
+                        for rating in reversed(RATINGS)],
+            'unrated': total - sum(rating_counts.values()),
+        }
+
+
+def _first_kept(prices, removed, last=False):
+    """Lowest (or highest) of ``prices`` once ``removed`` (sorted too) are taken out"""
+    order = range(len(prices) - 1, -1, -1) if last else range(len(prices))
+    skipped = removed[::-1] if last else removed
+    position = 0
+    for i in order:
+        if position < len(skipped) and skipped[position] == prices[i]:
+            position += 1
+            continue
+        return prices[i]
+    return None
+
+
+def get_facet_index():
+    """Return the index of the current application, loading it if needed"""
+    index = current_app.extensions.get('facet_index')
+    if index is None:
+        index = current_app.extensions['facet_index'] = FacetIndex()
+    if not index.loaded:
+        index.load()
+    return index
+
+
+# --- ORM events -----------------------------------------------------------
+
+def stage(session, op, *args):
+    """Apply ``index.<op>(*args)`` once ``session`` commits (bulk SQL writers)"""
+    session.info.setdefault('facet_index_ops', []).append((op, args))
+
+
+def _stage(target, op, *args):
+    if not has_app_context():
+        return
+    stage(object_session(target) or db.session(), op, *args)
+
+
+@event.listens_for(Place, 'after_insert')
+@event.listens_for(Place, 'after_update')
+def _on_place_write(mapper, connection, place):
+    _stage(place, 'set_price', place.id, place.price)
+
+
+@event.listens_for(Place, 'after_delete')
+def _on_place_delete(mapper, connection, place):
+    _stage(place, 'remove_place', place.id)
+
+
+@event.listens_for(Review, 'after_insert')
+def _on_review_insert(mapper, connection, review):
+    _stage(review, 'add_rating', review.place_id, review.rating)
+
+
+@event.listens_for(Review, 'after_update')
+def _on_review_update(mapper, connection, review):
+    history = inspect(review).attrs.rating.history
+    if history.deleted and history.added:
+        _stage(review, 'change_rating', review.place_id, history.deleted[0], history.added[0])
+
+
+@event.listens_for(Review, 'after_delete')
+def _on_review_delete(mapper, connection, review):
+    _stage(review, 'remove_rating', review.place_id, review.rating)
+
+
+@event.listens_for(Session, 'after_commit')
+def _apply_staged_ops(session):
+    ops = session.info.pop('facet_index_ops', None)
+    if not ops or not has_app_context():
+        return
+    index = current_app.extensions.get('facet_index')
+    if index is None or not index.loaded:
+        # Not built yet: the next load() reads the committed rows anyway
+        return
+    for op, args in ops:
+        getattr(index, op)(*args)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_staged_ops(session):
+    session.info.pop('facet_index_ops', None)
+
+
+@outbox.register
+def _apply_foreign_changes(events):
+    """Replay the place and review writes of other processes"""
+    index = current_app.extensions.get('facet_index')
+    if index is None or not index.loaded:
+        return
+    if events is None:
+        index.loaded = False
+        return
+    for change in events:
+        if change.resource == 'places':
+            if change.op == outbox.DELETE:
+                index.remove_place(change.object_id)
+            else:
+                index.reload_place(change.object_id)
+        elif change.resource == 'reviews':
+            if change.op == outbox.DELETE:
+                index.ratings_stale = True
+            else:
+                index.reload_review(change.object_id)
@@ -0,0 +1,174 @@
+"""
+Stored responses of the requests sent with an ``Idempotency-Key`` header.
+
+A row of ``idempotency_keys`` belongs to one user and one key.  The first
+request inserts it *in flight* (``status_code`` NULL) and commits before
+running; the primary key makes a concurrent duplicate fail that insert
+and find the row instead.  Once the request succeeds, its response
+(status, body, content type) is stored in the row, and every retry with
+the same key gets that response back without running the request again.
+
+A duplicate arriving while the original is still running waits for it:
+on an ``Event`` when both run in this process, otherwise by polling the
+row, for at most ``IDEMPOTENCY_WAIT_SECONDS``.
+
+The key is bound to the request it was first used with (method, path,
+body hash): reusing it for another request raises ``KeyReused``.  Failed
+requests release their key, so they can be retried with it.  Rows expire
+after ``IDEMPOTENCY_TTL_SECONDS`` (24 h) and are pruned by the job
+workers; an in-flight row older than ``IDEMPOTENCY_LOCK_SECONDS`` belongs
+to a request that died and is taken over.
+"""
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime, timedelta
+from flask import current_app, has_app_context
+from sqlalchemy import (Column, DateTime, Index, Integer, LargeBinary, PrimaryKeyConstraint,
+                        String, Table, and_, delete, insert, select, update)
+from sqlalchemy.exc import IntegrityError
+from app import db
+
+TTL_SECONDS = 24 * 3600
+LOCK_SECONDS = 60
+WAIT_SECONDS = 10.0
+POLL_INTERVAL = 0.05
+MAX_KEY_LENGTH = 255
+
+idempotency_keys = Table(
+    'idempotency_keys',
+    db.Model.metadata,
+    Column('user_id', String(36), nullable=False),
+    Column('key', String(MAX_KEY_LENGTH), nullable=False),
+    Column('fingerprint', String(64), nullable=False),
+    # NULL while the first request is running
+    Column('status_code', Integer),
+    Column('body', LargeBinary),
+    Column('content_type', String(128)),
+    Column('created_at', DateTime, nullable=False),
+    Column('expires_at', DateTime, nullable=False),
+    PrimaryKeyConstraint('user_id', 'key'),
+    Index('ix_idempotency_keys_expires_at', 'expires_at'),
+)
+
+StoredResponse = namedtuple('StoredResponse', 'status_code body content_type')
+
+IN_FLIGHT = object()
+
+# (user_id, key) -> Event set when the request of this process finishes
+_running = {}
+_running_lock = threading.Lock()
+
+
+class KeyReused(ValueError):
+    pass
+
+
+def _setting(name, default):
+    if has_app_context():
+        return current_app.config.get(name, default)
+    return default
+
+
+def _where(user_id, key):
+    return and_(idempotency_keys.c.user_id == user_id, idempotency_keys.c.key == key)
+
+
+def begin(user_id, key, fingerprint):
+    """
+    Claim ``key`` for a request.  Returns None when the caller owns it and
+    must run the request, a ``StoredResponse`` to replay, or ``IN_FLIGHT``.
+    """
+    now = datetime.utcnow()
+    ttl = _setting('IDEMPOTENCY_TTL_SECONDS', TTL_SECONDS)
+    try:
+        db.session.execute(insert(idempotency_keys).values(
+            user_id=user_id, key=key, fingerprint=fingerprint,
+            created_at=now, expires_at=now + timedelta(seconds=ttl)))
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+    else:
+        with _running_lock:
+            _running[(user_id, key)] = threading.Event()
+        return None
+
+    row = db.session.execute(select(idempotency_keys).where(_where(user_id, key))).first()
+    db.session.rollback()
+    if row is None:
+        # Released or pruned in the meantime
+        return begin(user_id, key, fingerprint)
+    if row.fingerprint != fingerprint:
+        raise KeyReused("Idempotency-Key already used for another request")
+    if row.expires_at <= now or (row.status_code is None and row.created_at <= now - timedelta(
+            seconds=_setting('IDEMPOTENCY_LOCK_SECONDS', LOCK_SECONDS))):
+        _take_over(user_id, key, row.created_at)
+        return begin(user_id, key, fingerprint)
+    if row.status_code is None:
+        return IN_FLIGHT
+    return StoredResponse(row.status_code, row.body, row.content_type)
+
+
+def _take_over(user_id, key, created_at):
+    # Only the first of several concurrent takers deletes the row
+    db.session.execute(delete(idempotency_keys).where(
+        _where(user_id, key), idempotency_keys.c.created_at == created_at))
+    db.session.commit()
+
+
+def _done(user_id, key):
+    with _running_lock:
+        event = _running.pop((user_id, key), None)
+    if event is not None:
+        event.set()
+
+
+def finish(user_id, key, response):
+    """Store the response of the request owning ``key`` (a StoredResponse)"""
+    try:
+        db.session.execute(update(idempotency_keys).where(_where(user_id, key)).values(
+            status_code=response.status_code, body=response.body,
+            content_type=response.content_type))
+        db.session.commit()
+    finally:
+        _done(user_id, key)
+
+
+def release(user_id, key):
+    """Forget ``key`` after a failed request, so that it can be retried"""
+    try:
+        db.session.rollback()
+        db.session.execute(delete(idempotency_keys).where(_where(user_id, key)))
+        db.session.commit()
+    finally:
+        _done(user_id, key)
+
+
+def wait(user_id, key, fingerprint, timeout=None):
+    """
+    Wait for the in-flight request holding ``key``, then ``begin()`` again:
+    returns the stored response, None (the original failed: run it), or
+    ``IN_FLIGHT`` after ``timeout`` seconds.
+    """
+    timeout = timeout if timeout is not None else _setting('IDEMPOTENCY_WAIT_SECONDS',
+                                                           WAIT_SECONDS)
+    deadline = time.monotonic() + timeout
+    while True:
+        with _running_lock:
+            event = _running.get((user_id, key))
+        remaining = deadline - time.monotonic()
+        if event is not None:
+            event.wait(max(remaining, 0))
+        else:
+            time.sleep(max(min(POLL_INTERVAL, remaining), 0))
+        state = begin(user_id, key, fingerprint)
+        if state is not IN_FLIGHT or time.monotonic() >= deadline:
+            return state
+
+
+def prune():
+    """Delete the expired keys; return their count"""
+    result = db.session.execute(
+        delete(idempotency_keys).where(idempotency_keys.c.expires_at < datetime.utcnow()))
+    db.session.commit()
+    return result.rowcount
@@ -0,0 +1,210 @@
+"""
+Durable job queue stored in the database.
+
+A job is a row of ``jobs``: a task name, a JSON payload, a priority and
+the time it becomes available.  A worker claims the most urgent available
+job with a single ``UPDATE ... WHERE id = (SELECT ...) RETURNING``, which
+also moves its ``available_at`` ``JOB_VISIBILITY_TIMEOUT`` seconds ahead:
+if the worker dies with the job, the job becomes available again once
+that delay has passed.  Jobs are therefore run *at least once*, and tasks
+must be idempotent.
+
+A failed attempt is retried after an exponential backoff (``RETRY_BASE``
+seconds doubled at each attempt, with jitter, at most ``RETRY_MAX``) until
+``max_attempts``; the job then stays ``failed`` for inspection.  Finished
+jobs are kept ``JOB_RETENTION_SECONDS`` for the latency statistics.
+
+Enqueueing with ``commit=False`` makes the job part of the caller's
+transaction: it is visible to the workers if and only if the write that
+needed it is committed.
+"""
+import random
+from collections import namedtuple
+from datetime import datetime, timedelta
+from flask import current_app, has_app_context
+from sqlalchemy import (JSON, Column, DateTime, Index, Integer, String, Table, Text, and_,
+                        func, insert, or_, select, update)
+from app import db
+
+HIGH, NORMAL, LOW = 10, 0, -10
+QUEUED, RUNNING, DONE, FAILED = 'queued', 'running', 'done', 'failed'
+
+VISIBILITY_TIMEOUT = 300
+MAX_ATTEMPTS = 5
+RETRY_BASE = 2.0
+RETRY_MAX = 600.0
+RETENTION_SECONDS = 3600
+STATS_WINDOW = 300
+
+jobs = Table(
+    'jobs',
+    db.Model.metadata,
+    Column('id', Integer, primary_key=True, autoincrement=True),
+    Column('name', String(64), nullable=False),
+    Column('payload', JSON, nullable=False),
+    Column('priority', Integer, nullable=False, default=NORMAL),
+    Column('status', String(8), nullable=False, default=QUEUED),
+    Column('attempts', Integer, nullable=False, default=0),
+    Column('max_attempts', Integer, nullable=False, default=MAX_ATTEMPTS),
+    Column('enqueued_at', DateTime, nullable=False),
+    # Queued: when it may start.  Running: when its claim expires
+    Column('available_at', DateTime, nullable=False),
+    Column('started_at', DateTime),
+    Column('finished_at', DateTime),
+    Column('claimed_by', String(64)),
+    Column('last_error', Text),
+    Index('ix_jobs_status_available_at', 'status', 'available_at'),
+    Index('ix_jobs_status_finished_at', 'status', 'finished_at'),
+    sqlite_autoincrement=True,
+)
+
+Job = namedtuple('Job', 'id name payload attempts max_attempts')
+
+
+def _setting(name, default):
+    if has_app_context():
+        return current_app.config.get(name, default)
+    return default
+
+
+def enqueue(name, payload=None, priority=NORMAL, delay=0, max_attempts=None, commit=True):
+    """Add a job; return its id"""
+    now = datetime.utcnow()
+    result = db.session.execute(insert(jobs).values(
+        name=name,
+        payload=payload or {},
+        priority=priority,
+        status=QUEUED,
+        attempts=0,
+        max_attempts=max_attempts or _setting('JOB_MAX_ATTEMPTS', MAX_ATTEMPTS),
+        enqueued_at=now,
+        available_at=now + timedelta(seconds=delay),
+    ))
+    if commit:
+        db.session.commit()
+    return result.inserted_primary_key[0]
+
+
+def _claimable(now):
+    # An expired claim whose attempts are used up is left to prune()
+    return and_(jobs.c.available_at <= now,
+                or_(jobs.c.status == QUEUED,
+                    and_(jobs.c.status == RUNNING, jobs.c.attempts < jobs.c.max_attempts)))
+
+
+def claim(worker, visibility_timeout=None):
+    """Take the most urgent available job, or return None"""
+    now = datetime.utcnow()
+    timeout = visibility_timeout or _setting('JOB_VISIBILITY_TIMEOUT', VISIBILITY_TIMEOUT)
+    candidate = (select(jobs.c.id)
+                 .where(_claimable(now))
+                 .order_by(jobs.c.priority.desc(), jobs.c.available_at, jobs.c.id)
+                 .limit(1)
+                 .scalar_subquery())
+    # The condition is repeated: another worker may claim the same candidate first
+    statement = (update(jobs)
+                 .where(jobs.c.id == candidate, _claimable(now))
+                 .values(status=RUNNING, attempts=jobs.c.attempts + 1, claimed_by=worker[:64],
+                         started_at=now, available_at=now + timedelta(seconds=timeout))
+                 .returning(jobs.c.id, jobs.c.name, jobs.c.payload, jobs.c.attempts,
+                            jobs.c.max_attempts))
+    try:
+        row = db.session.execute(statement).first()
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return Job(*row) if row else None
+
+
+def _attempt(job):
+    # A job claimed again after its timeout has a new attempt number: the
+    # late worker's outcome is ignored
+    return and_(jobs.c.id == job.id, jobs.c.attempts == job.attempts, jobs.c.status == RUNNING)
+
+
+def complete(job):
+    db.session.execute(update(jobs).where(_attempt(job)).values(
+        status=DONE, finished_at=datetime.utcnow(), last_error=None))
+    db.session.commit()
+
+
+def retry_delay(attempt):
+    """Seconds before the next attempt, after ``attempt`` failures"""
+    base = _setting('JOB_RETRY_BASE', RETRY_BASE)
+    delay = min(base * 2 ** (attempt - 1), _setting('JOB_RETRY_MAX', RETRY_MAX))
+    return delay * random.uniform(0.5, 1.0)
+
+
+def fail(job, error):
+    """Record a failed attempt: schedule a retry, or give up"""
+    now = datetime.utcnow()
+    if job.attempts >= job.max_attempts:
+        values = {'status': FAILED, 'finished_at': now}
+    else:
+        values = {'status': QUEUED,
+                  'available_at': now + timedelta(seconds=retry_delay(job.attempts))}
+    db.session.execute(update(jobs).where(_attempt(job)).values(last_error=error[:2000], **values))
+    db.session.commit()
+
+
+def prune(retention=None):
+    """Delete old finished jobs and fail abandoned ones; return the deleted count"""
+    now = datetime.utcnow()
+    retention = retention or _setting('JOB_RETENTION_SECONDS', RETENTION_SECONDS)
+    db.session.execute(update(jobs).where(
+        jobs.c.status == RUNNING, jobs.c.available_at <= now,
+        jobs.c.attempts >= jobs.c.max_attempts,
+    ).values(status=FAILED, finished_at=now, last_error='Visibility timeout expired'))
+    result = db.session.execute(jobs.delete().where(
+        jobs.c.status == DONE, jobs.c.finished_at < now - timedelta(seconds=retention)))
+    db.session.commit()
+    return result.rowcount
+
+
+def retry_failed():
+    """Queue the failed jobs again with fresh attempts; return their count"""
+    result = db.session.execute(update(jobs).where(jobs.c.status == FAILED).values(
+        status=QUEUED, attempts=0, available_at=datetime.utcnow(), finished_at=None))
+    db.session.commit()
+    return result.rowcount
+
+
+def _percentile(values, fraction):
+    return values[min(int(len(values) * fraction), len(values) - 1)] if values else None
+
+
+def stats(window=STATS_WINDOW):
+    """
+    Queue depth and latency: jobs by status, ready jobs by priority, age
+    of the oldest ready job, and the enqueue-to-finish latency (p50/p95,
+    seconds) of the jobs finished during the last ``window`` seconds.
+    """
+    now = datetime.utcnow()
+    by_status = dict(db.session.execute(
+        select(jobs.c.status, func.count()).group_by(jobs.c.status)).all())
+    ready = and_(jobs.c.status == QUEUED, jobs.c.available_at <= now)
+    by_priority = dict(db.session.execute(
+        select(jobs.c.priority, func.count()).where(ready).group_by(jobs.c.priority)).all())
+    oldest = db.session.execute(select(func.min(jobs.c.available_at)).where(ready)).scalar()
+    finished = db.session.execute(
+        select(jobs.c.enqueued_at, jobs.c.finished_at)
+        .where(jobs.c.status == DONE, jobs.c.finished_at >= now - timedelta(seconds=window))
+    ).all()
+    db.session.rollback()
+    latencies = sorted((row.finished_at - row.enqueued_at).total_seconds() for row in finished)
+    return {
+        'by_status': {status: by_status.get(status, 0) for status in (QUEUED, RUNNING, DONE, FAILED)},
+        'ready': sum(by_priority.values()),
+        'ready_by_priority': dict(sorted(by_priority.items(), reverse=True)),
+        'oldest_ready_seconds': (now - oldest).total_seconds() if oldest else 0.0,
+        'finished_recently': len(latencies),
+        'latency_p50': _percentile(latencies, 0.5),
+        'latency_p95': _percentile(latencies, 0.95),
+    }
+
+
+def failed_jobs(limit=10):
+    return db.session.execute(
+        select(jobs.c.id, jobs.c.name, jobs.c.attempts, jobs.c.last_error)
+        .where(jobs.c.status == FAILED).order_by(jobs.c.finished_at.desc()).limit(limit)).all()
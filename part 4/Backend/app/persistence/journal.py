@@ -0,0 +1,383 @@
+"""
+Durable ``InMemoryRepository``: append-only log plus compacted snapshots.
+
+    repo = DurableRepository('instance/memory/users', User, indexes=('email',))
+    repo.add(user)          # returns once the write is on disk
+
+Every write (put, update, delete, clear) is applied in memory and appended
+to the current log file as one frame (``op``, length, CRC32, marshalled
+values); the write returns after the frame is fsynced.  Writers arriving
+while an fsync runs queue their frames, and the next fsync covers all of
+them (group commit): concurrent writers share the cost of one fsync
+instead of paying one each.  ``fsync=False`` only flushes to the OS.
+
+Once the log reaches ``snapshot_log_bytes`` (None: never), a background
+thread writes a snapshot: every record at one instant, as one marshalled
+list of tuples behind a small binary header (magic, generation, count, length,
+CRC32).  The log is rotated at the same instant
+(``<path>.<generation>.log``), so writes go on during the snapshot, and
+the logs it covers are deleted once it is renamed into place.
+
+Opening the repository recovers it: the snapshot is memory-mapped and
+decoded without copying the file, then the newer logs are replayed; a
+frame torn by a crash (bad length or checksum) ends the replay and is cut
+off.  Replaying a frame twice is harmless (each holds a whole record), so
+a crash between a snapshot and the deletion of its logs loses nothing.
+
+Records are encoded with ``marshal``, which only builds plain values (no
+code runs when a file is read, unlike ``pickle``): a ``datetime`` or
+``date`` column is written as a ``(type, ISO string)`` tuple, the only
+tuples a record holds.  Any other type is refused when written.
+"""
+import glob
+import marshal
+import mmap
+import os
+import struct
+import threading
+import zlib
+from datetime import date, datetime
+from app.persistence.repository import InMemoryRepository
+
+SNAPSHOT_LOG_BYTES = 64 * 1024 * 1024
+
+MAGIC = b'HBNBSNP2'
+# magic, generation, record count, body length, body CRC32
+SNAPSHOT_HEADER = struct.Struct('<8sQQQI')
+# op, payload length, payload CRC32
+FRAME_HEADER = struct.Struct('<BII')
+FIELDS, PUT, DELETE, CLEAR = 0, 1, 2, 3
+
+TEMPORAL_TYPES = {datetime: 'datetime', date: 'date'}
+TEMPORAL_PARSERS = {'datetime': datetime.fromisoformat, 'date': date.fromisoformat}
+
+
+def _encode_values(values):
+    """Record values -> marshallable tuple"""
+    return tuple((TEMPORAL_TYPES[type(value)], value.isoformat())
+                 if type(value) in TEMPORAL_TYPES else value for value in values)
+
+
+def _decode_values(values):
+    return tuple(TEMPORAL_PARSERS[value[0]](value[1]) if type(value) is tuple else value
+                 for value in values)
+
+
+def _loads(data, path):
+    try:
+        return marshal.loads(data)
+    except (EOFError, ValueError, TypeError):
+        raise ValueError(f"{path} is not in the current format") from None
+
+
+def _frame(op, value):
+    if op == PUT:
+        value = _encode_values(value)
+    payload = marshal.dumps(value)
+    return FRAME_HEADER.pack(op, len(payload), zlib.crc32(payload)) + payload
+
+
+def _read_frames(path):
+    """Yield the ``(op, value)`` of a log file; return the length of its valid prefix"""
+    with open(path, 'rb') as f:
+        data = f.read()
+    position = 0
+    while position + FRAME_HEADER.size <= len(data):
+        op, length, crc = FRAME_HEADER.unpack_from(data, position)
+        start = position + FRAME_HEADER.size
+        payload = data[start:start + length]
+        if len(payload) < length or zlib.crc32(payload) != crc:
+            break
+        value = _loads(payload, path)
+        yield op, _decode_values(value) if op == PUT else value
+        position = start + length
+    return position
+
+
+def _fsync_directory(path):
+    fd = os.open(os.path.dirname(path) or '.', os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class _Log:
+    """One log file, written by group commit"""
+
+    def __init__(self, path, fields, fsync=True):
+        self.path = path
+        self.fsync = fsync
+        self._file = open(path, 'ab')
+        self._lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+        self._buffer = []
+        self._appended = self._synced = 0
+        self.size = self._file.tell()
+        self.syncs = 0
+        self.append(FIELDS, fields)
+
+    def append(self, op, value):
+        """Queue a frame; return the ticket to pass to ``sync``"""
+        frame = _frame(op, value)
+        with self._lock:
+            self._buffer.append(frame)
+            self._appended += 1
+            self.size += len(frame)
+            return self, self._appended
+
+    def sync(self, upto):
+        """Write and fsync the frames queued up to ``upto``, with the ones queued since"""
+        with self._sync_lock:
+            if self._synced >= upto:
+                # Covered by the fsync of another writer
+                return
+            with self._lock:
+                frames, self._buffer = self._buffer, []
+                last = self._appended
+            self._file.write(b''.join(frames))
+            self._file.flush()
+            if self.fsync:
+                os.fsync(self._file.fileno())
+            self._synced = last
+            self.syncs += 1
+
+    def close(self):
+        self.sync(self._appended)
+        self._file.close()
+
+
+class DurableRepository(InMemoryRepository):
+    """``InMemoryRepository`` persisted to ``<path>.snapshot`` and ``<path>.*.log``"""
+
+    def __init__(self, path, model=None, fields=None, indexes=(), sorted_indexes=(),
+                 fsync=True, snapshot_log_bytes=SNAPSHOT_LOG_BYTES):
+        super().__init__(model, fields, indexes, sorted_indexes)
+        self.path = path
+        self.fsync = fsync
+        self.snapshot_log_bytes = snapshot_log_bytes
+        self._lock = threading.RLock()
+        self._ticket = None
+        self._snapshotting = None
+        self._log = None
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        generation = self._recover()
+        self._log = _Log(self._log_path(generation + 1), self.fields, fsync)
+        self.generation = generation + 1
+
+    # --- files ------------------------------------------------------------
+
+    def _log_path(self, generation):
+        return f'{self.path}.{generation:08d}.log'
+
+    def _log_generations(self):
+        generations = []
+        for name in glob.glob(glob.escape(self.path) + '.*.log'):
+            number = name[len(self.path) + 1:-len('.log')]
+            if number.isdigit():
+                generations.append(int(number))
+        return sorted(generations)
+
+    def _recover(self):
+        """
+        Load the snapshot and replay the newer logs into the records, then
+        build the indexes once; return the last generation
+        """
+        generation = self._load_snapshot()
+        last = generation
+        for number in self._log_generations():
+            path = self._log_path(number)
+            if number < generation:
+                os.remove(path)
+                continue
+            valid = self._replay(path)
+            if valid < os.path.getsize(path):
+                with open(path, 'r+b') as f:
+                    f.truncate(valid)
+            last = number
+        self._reindex()
+        return last
+
+    def _load_snapshot(self):
+        path = f'{self.path}.snapshot'
+        if not os.path.exists(path) or not os.path.getsize(path):
+            return 0
+        with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            magic, generation, count, length, crc = SNAPSHOT_HEADER.unpack_from(data)
+            if magic != MAGIC:
+                raise ValueError(f"{path} is not a snapshot in the current format")
+            view = memoryview(data)[SNAPSHOT_HEADER.size:SNAPSHOT_HEADER.size + length]
+            try:
+                if len(view) != length or zlib.crc32(view) != crc:
+                    raise ValueError(f"{path} is corrupted")
+                fields, rows = _loads(view, path)
+            finally:
+                view.release()
+        self._restore(fields, rows)
+        return generation
+
+    def _restore(self, fields, rows):
+        storage = self._storage
+        if tuple(fields) == self.fields:
+            make = self.record
+            for values in rows:
+                record = make(*_decode_values(values))
+                storage[record.id] = record
+        else:
+            # Columns added or removed since the snapshot
+            for values in rows:
+                record = self._to_record(dict(zip(fields, _decode_values(values))))
+                storage[record.id] = record
+
+    def _replay(self, path):
+        """Apply a log to the records (not the indexes); return the length of its valid prefix"""
+        frames = _read_frames(path)
+        storage = self._storage
+        fields = self.fields
+        while True:
+            try:
+                op, value = next(frames)
+            except StopIteration as stop:
+                return stop.value
+            if op == FIELDS:
+                fields = tuple(value)
+            elif op == PUT:
+                if fields == self.fields:
+                    record = self.record(*value)
+                else:
+                    record = self._to_record(dict(zip(fields, value)))
+                storage[record.id] = record
+            elif op == DELETE:
+                storage.pop(value, None)
+            elif op == CLEAR:
+                storage.clear()
+
+    # --- logged writes ----------------------------------------------------
+
+    def _store(self, record):
+        super()._store(record)
+        if self._log is not None:
+            self._ticket = self._log.append(PUT, record._astuple())
+        return record
+
+    def _store_many(self, records):
+        records = list(records)
+        super()._store_many(records)
+        if self._log is not None:
+            for record in records:
+                self._ticket = self._log.append(PUT, record._astuple())
+
+    def _remove(self, obj_id):
+        removed = super()._remove(obj_id)
+        if removed and self._log is not None:
+            self._ticket = self._log.append(DELETE, obj_id)
+        return removed
+
+    def _write(self, method, *args):
+        with self._lock:
+            self._ticket = None
+            result = method(self, *args)
+            ticket = self._ticket
+            snapshotting = None
+            if (self.snapshot_log_bytes and self._log.size >= self.snapshot_log_bytes
+                    and self._snapshotting is None):
+                snapshotting = self._snapshotting = threading.Thread(
+                    target=self.snapshot, name='memory-snapshot', daemon=True)
+        if ticket is not None:
+            log, upto = ticket
+            log.sync(upto)
+        if snapshotting is not None:
+            snapshotting.start()
+        return result
+
+    def add(self, obj):
+        return self._write(InMemoryRepository.add, obj)
+
+    def put(self, obj):
+        return self._write(InMemoryRepository.put, obj)
+
+    def update(self, obj_id, data):
+        return self._write(InMemoryRepository.update, obj_id, data)
+
+    def delete(self, obj_id):
+        return self._write(InMemoryRepository.delete, obj_id)
+
+    def load(self, objs):
+        return self._write(InMemoryRepository.load, objs)
+
+    def clear(self):
+        def clear(self):
+            InMemoryRepository.clear(self)
+            if self._log is not None:
+                self._ticket = self._log.append(CLEAR, None)
+        return self._write(clear)
+
+    # --- reads (writers replace records, they never change them) ----------
+
+    def get(self, obj_id, fields=None):
+        with self._lock:
+            return super().get(obj_id)
+
+    def get_all(self, fields=None):
+        with self._lock:
+            return super().get_all()
+
+    def get_many(self, obj_ids, chunk_size=None, fields=None):
+        with self._lock:
+            return super().get_many(obj_ids)
+
+    def find(self, attr_name, attr_value):
+        with self._lock:
+            return super().find(attr_name, attr_value)
+
+    def range(self, attr_name, low=None, high=None, include_high=False,
+              offset=0, limit=None, descending=False):
+        with self._lock:
+            return super().range(attr_name, low, high, include_high, offset, limit, descending)
+
+    def page(self, offset=0, limit=None, order_by=None, descending=False):
+        with self._lock:
+            return super().page(offset, limit, order_by, descending)
+
+    # --- snapshots --------------------------------------------------------
+
+    def snapshot(self):
+        """Write a snapshot of the current records and drop the logs it covers"""
+        with self._lock:
+            records = list(self._storage.values())
+            old_log = self._log
+            self.generation += 1
+            self._log = _Log(self._log_path(self.generation), self.fields, self.fsync)
+            generation = self.generation
+        try:
+            old_log.close()
+            rows = [_encode_values(record._astuple()) for record in records]
+            body = marshal.dumps((self.fields, rows))
+            path = f'{self.path}.snapshot'
+            with open(path + '.tmp', 'wb') as f:
+                f.write(SNAPSHOT_HEADER.pack(MAGIC, generation, len(rows), len(body),
+                                             zlib.crc32(body)))
+                f.write(body)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(path + '.tmp', path)
+            _fsync_directory(path)
+            for number in self._log_generations():
+                if number < generation:
+                    os.remove(self._log_path(number))
+        finally:
+            with self._lock:
+                if self._snapshotting is threading.current_thread():
+                    self._snapshotting = None
+
+    def close(self):
+        snapshotting = self._snapshotting
+        if snapshotting is not None and snapshotting.is_alive():
+            snapshotting.join()
+        with self._lock:
+            self._log.close()
+
+    def stats(self):
+        with self._lock:
+            return {'records': len(self._storage), 'generation': self.generation,
+                    'log_bytes': self._log.size, 'fsyncs': self._log.syncs}
@@ -0,0 +1,357 @@
+"""
+Read-through in-memory tier for whole tables.
+
+With ``MEMORY_TIER = ('users', 'places')`` in the config, the first read of
+a listed table loads all its rows into an indexed ``InMemoryRepository``
+(``app.persistence.repository``), and the read-only paths of the
+repositories answer from memory from then on:
+
+* ``read_rows`` (the list endpoints), with or without ids;
+* ``get_user_by_email``: the ``email`` hash index tells whether the
+  address exists, and only then is the user loaded by primary key.
+
+The tier never serves stale rows: mapper events stage the column values of
+the inserted and updated objects (and the ids of the deleted ones) and the
+tier applies them once the transaction commits, like the amenity index;
+bulk deletes go through ``purge.delete_rows``, which stages their ids,
+and the writes of other workers arrive through the outbox.  Writes always
+go to the database.  Columns filled by the database itself (the
+``CURRENT_TIMESTAMP`` defaults of ``users``) keep their previous value, or
+None, until the row is reloaded; no endpoint reads them from the tier.
+
+Each table declares its hash indexes (equality) and sorted indexes (range
+queries and ordered pages) in ``TABLES``.  ``reviews`` is only mirrored
+without review partitions.  The default, ``()``, keeps every read in SQL.
+
+With ``MEMORY_TIER_DIR`` set, the tables are ``DurableRepository`` stores
+(``app.persistence.journal``) instead: every change applied to the tier is
+logged, so a restarted process replays its snapshot and log instead of
+reading whole tables.  It then catches up with what the database got
+meanwhile (rows updated and tombstones written since its last load, see
+``app.persistence.changes``); past ``TOMBSTONE_RETENTION_DAYS`` it loads
+the tables again.  Each process locks a directory of its own
+(``<MEMORY_TIER_DIR>/<n>``): a recycled worker takes over the files of the
+one it replaces.  ``MEMORY_TIER_FSYNC = False`` only flushes the log.
+"""
+import fcntl
+import os
+import threading
+from datetime import datetime, timedelta
+from flask import current_app, has_app_context
+from sqlalchemy import event, inspect, select
+from sqlalchemy.orm import Session, object_session
+from app import db
+from app.models.place import Place
+from app.models.review import Review
+from app.models.user import User
+from app.persistence import changes, outbox, partitions
+from app.persistence import repository
+
+# table -> (model, hash indexes, sorted indexes)
+TABLES = {
+    'users': (User, ('email',), ()),
+    'places': (Place, ('owner_id',), ('price',)),
+    'reviews': (Review, ('place_id', 'user_id'), ('rating',)),
+}
+
+
+class TierTable:
+    """A table mirrored in memory; every access holds the table lock"""
+
+    def __init__(self, model, indexes=(), sorted_indexes=(), path=None, fsync=True):
+        self.model = model
+        self.path = path
+        if path is None:
+            self.repo = repository.InMemoryRepository(model, indexes=indexes,
+                                                      sorted_indexes=sorted_indexes)
+        else:
+            from app.persistence.journal import DurableRepository
+            self.repo = DurableRepository(path, model, indexes=indexes,
+                                          sorted_indexes=sorted_indexes, fsync=fsync)
+        self.recovered = len(self.repo)
+        self.caught_up = 0
+        self.loaded = False
+        self._lock = threading.RLock()
+
+    def load(self):
+        if self.path is not None and self._catch_up():
+            return
+        started = datetime.utcnow()
+        rows = db.session.execute(select(self.model.__table__)).all()
+        with self._lock:
+            if self.path is not None:
+                self.repo.clear()
+            self.repo.load(rows)
+            self.loaded = True
+        self._synced(started)
+
+    def _catch_up(self):
+        """Apply the changes made since the store was last synced; False if it cannot"""
+        try:
+            with open(self.path + '.synced') as f:
+                since = datetime.fromisoformat(f.read().strip())
+        except (OSError, ValueError):
+            return False
+        retention = current_app.config.get('TOMBSTONE_RETENTION_DAYS',
+                                           changes.TOMBSTONE_RETENTION_DAYS)
+        if since < datetime.utcnow() - timedelta(days=retention):
+            # The tombstones of that period may be pruned
+            return False
+        started = datetime.utcnow()
+        table = self.model.__table__
+        rows = db.session.execute(select(table).where(table.c.updated_at >= since)).all()
+        deleted = db.session.execute(
+            select(changes.tombstones.c.object_id).where(
+                changes.tombstones.c.resource == table.name,
+                changes.tombstones.c.deleted_at >= since)).scalars().all()
+        with self._lock:
+            for row in rows:
+                self.repo.put(row)
+            for obj_id in deleted:
+                self.repo.delete(obj_id)
+            self.caught_up = len(rows) + len(deleted)
+            self.loaded = True
+        self._synced(started)
+        return True
+
+    def _synced(self, started):
+        """Record that the store holds every change up to ``started``"""
+        if self.path is None:
+            return
+        # Transactions still running at `started` may carry earlier timestamps
+        settle = current_app.config.get('CHANGES_SETTLE_SECONDS', changes.SETTLE_SECONDS)
+        with open(self.path + '.synced.tmp', 'w') as f:
+            f.write((started - timedelta(seconds=settle)).isoformat())
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(self.path + '.synced.tmp', self.path + '.synced')
+
+    def read_rows(self, ids=None):
+        with self._lock:
+            return self.repo.read_rows(ids=ids)
+
+    def get(self, obj_id):
+        with self._lock:
+            return self.repo.get(obj_id)
+
+    def find(self, attr_name, attr_value):
+        with self._lock:
+            return self.repo.find(attr_name, attr_value)
+
+    def range(self, attr_name, low=None, high=None, **options):
+        with self._lock:
+            return self.repo.range(attr_name, low, high, **options)
+
+    def merge(self, values):
+        """Apply the committed column values of one object"""
+        with self._lock:
+            record = self.repo.get(values['id'])
+            if record is not None:
+                self.repo.update(values['id'], values)
+            else:
+                self.repo.put(values)
+
+    def delete(self, *obj_ids):
+        with self._lock:
+            for obj_id in obj_ids:
+                self.repo.delete(obj_id)
+
+    def reload(self, obj_ids):
+        """Read ``obj_ids`` from the database again (changes of other workers)"""
+        table = self.model.__table__
+        rows = {row.id: row for row in db.session.execute(
+            select(table).where(table.c.id.in_(list(obj_ids))))}
+        with self._lock:
+            for obj_id in obj_ids:
+                if obj_id in rows:
+                    self.repo.put(rows[obj_id])
+                else:
+                    self.repo.delete(obj_id)
+
+    def close(self):
+        if self.path is not None:
+            with self._lock:
+                self.repo.close()
+
+    def stats(self):
+        with self._lock:
+            stats = {'rows': len(self.repo), 'loaded': self.loaded}
+            if self.path is not None:
+                stats.update(self.repo.stats(), recovered=self.recovered,
+                             caught_up=self.caught_up)
+            return stats
+
+
+# (pid, locked file, directory) of the durable tier of this process
+_directory = None
+_directory_lock = threading.RLock()
+
+
+def _tier_directory():
+    """The directory of this process under ``MEMORY_TIER_DIR`` (locked), or None"""
+    global _directory
+    base = current_app.config.get('MEMORY_TIER_DIR')
+    if not base:
+        return None
+    with _directory_lock:
+        if _directory is not None and _directory[0] == os.getpid():
+            return _directory[2]
+        # Locks inherited through a fork belong to the parent: claim our own
+        os.makedirs(base, exist_ok=True)
+        number = 0
+        while True:
+            lock_file = open(os.path.join(base, f'{number}.lock'), 'a')
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                lock_file.close()
+                number += 1
+                continue
+            directory = os.path.join(base, str(number))
+            os.makedirs(directory, exist_ok=True)
+            _directory = (os.getpid(), lock_file, directory)
+            return directory
+
+
+def close_tiers(app):
+    """Close the durable tables of ``app`` and release the directory of this process"""
+    global _directory
+    for tier in (app.extensions.pop('memory_tier', None) or {}).values():
+        tier.close()
+    with _directory_lock:
+        if _directory is not None and _directory[0] == os.getpid():
+            _directory[1].close()
+            _directory = None
+
+
+def _enabled(table):
+    if table not in current_app.config.get('MEMORY_TIER', ()):
+        return False
+    return table != 'reviews' or partitions.get_partitions() is None
+
+
+def _tables():
+    tables = current_app.extensions.get('memory_tier')
+    if tables is None:
+        tables = current_app.extensions['memory_tier'] = {}
+    return tables
+
+
+def get_tier(table):
+    """The mirrored ``table`` of the current application, loading it if needed; None if off"""
+    if not has_app_context() or table not in TABLES or not _enabled(table):
+        return None
+    tables = _tables()
+    tier = tables.get(table)
+    if tier is None:
+        with _directory_lock:
+            # One store per file: never open it twice
+            tier = tables.get(table)
+            if tier is None:
+                model, indexes, sorted_indexes = TABLES[table]
+                directory = _tier_directory()
+                tier = tables[table] = TierTable(
+                    model, indexes, sorted_indexes,
+                    path=os.path.join(directory, table) if directory else None,
+                    fsync=current_app.config.get('MEMORY_TIER_FSYNC', True))
+    if not tier.loaded:
+        tier.load()
+    return tier
+
+
+def warm_up(app):
+    """Load (or replay and catch up) the mirrored tables before the first request"""
+    with app.app_context():
+        for table in app.config.get('MEMORY_TIER', ()):
+            get_tier(table)
+
+
+def _loaded(table):
+    tier = (current_app.extensions.get('memory_tier') or {}).get(table)
+    return tier if tier is not None and tier.loaded else None
+
+
+def tier_stats():
+    if not has_app_context():
+        return {}
+    return {table: tier.stats() for table, tier in
+            (current_app.extensions.get('memory_tier') or {}).items()}
+
+
+# --- ORM events -----------------------------------------------------------
+
+def stage(session, table, op, *args):
+    """Apply ``tier.<op>(*args)`` once ``session`` commits"""
+    session.info.setdefault('memory_tier_ops', []).append((table, op, args))
+
+
+def stage_bulk_delete(session, table, condition):
+    """Stage the removal of the rows ``DELETE ... WHERE condition`` is about to delete"""
+    if not has_app_context() or _loaded(table.name) is None:
+        return
+    ids = session.execute(select(table.c.id).where(condition)).scalars().all()
+    if ids:
+        stage(session, table.name, 'delete', *ids)
+
+
+def _snapshot(obj):
+    """Column values of a flushed object, without loading anything"""
+    state = inspect(obj)
+    return {column.key: state.dict[column.key] for column in obj.__table__.columns
+            if column.key in state.dict}
+
+
+def _on_write(mapper, connection, target):
+    if has_app_context():
+        stage(object_session(target) or db.session(), target.__tablename__, 'merge',
+              _snapshot(target))
+
+
+def _on_delete(mapper, connection, target):
+    if has_app_context():
+        stage(object_session(target) or db.session(), target.__tablename__, 'delete', target.id)
+
+
+for _model, _indexes, _sorted_indexes in TABLES.values():
+    event.listen(_model, 'after_insert', _on_write)
+    event.listen(_model, 'after_update', _on_write)
+    event.listen(_model, 'after_delete', _on_delete)
+
+
+@event.listens_for(Session, 'after_commit')
+def _apply_staged_ops(session):
+    ops = session.info.pop('memory_tier_ops', None)
+    if not ops or not has_app_context():
+        return
+    for table, op, args in ops:
+        tier = _loaded(table)
+        # Not loaded yet: the load will read the committed rows anyway
+        if tier is not None:
+            getattr(tier, op)(*args)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_staged_ops(session):
+    session.info.pop('memory_tier_ops', None)
+
+
+@outbox.register
+def _apply_foreign_changes(events):
+    """Replay the writes of other processes on the mirrored tables"""
+    tables = current_app.extensions.get('memory_tier') or {}
+    if events is None:
+        for tier in tables.values():
+            tier.loaded = False
+        return
+    reload_ids = {}
+    for change in events:
+        tier = tables.get(change.resource)
+        if tier is None or not tier.loaded:
+            continue
+        if change.op == outbox.DELETE:
+            reload_ids.get(change.resource, set()).discard(change.object_id)
+            tier.delete(change.object_id)
+        else:
+            reload_ids.setdefault(change.resource, set()).add(change.object_id)
+    for table, obj_ids in reload_ids.items():
+        tables[table].reload(list(obj_ids))
@@ -0,0 +1,246 @@
+"""
+Per-process cache of serialized places and users.
+
+``GET /places/<id>`` and ``GET /users/<id>`` (and the owner checks of
+``create_place``) used to run their queries every time.  The facade now
+keeps the serialized form (the JSON-ready dict of the full serializer) of
+the places and users it served, in one ``ObjectCache`` per resource:
+
+* bounded: least recently used entries are evicted beyond
+  ``OBJECT_CACHE_MAX_ENTRIES`` entries or ``OBJECT_CACHE_MAX_BYTES`` bytes
+  (JSON size) per resource, and entries expire after ``OBJECT_CACHE_TTL``
+  seconds (a safety net, not the invalidation mechanism);
+* invalidated by id: mapper events stage the ids of the places and users
+  written by a session (a photo invalidates its place, a deleted amenity
+  the places it was linked to), and the entries
+  are dropped once the transaction commits; writes of other workers
+  arrive through the outbox, and the bulk deletes of ``purge`` stage their
+  ids themselves.  A load racing with an invalidation is not stored;
+* observable: hits, misses, evictions and invalidations per resource are
+  reported by ``GET /api/v1/health``.
+
+``OBJECT_CACHE_RESOURCES`` lists the cached resources (default both):
+remove one to disable its cache.
+"""
+import threading
+import time
+from collections import OrderedDict
+from flask import current_app, has_app_context
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session, object_session
+from app import db
+from app.api.serializers import dumps
+from app.models.amenity import Amenity
+from app.models.associations import place_amenity
+from app.models.place import Place
+from app.models.photo import PlacePhoto
+from app.models.user import User
+from app.persistence import outbox
+
+RESOURCES = ('places', 'users')
+MAX_ENTRIES = 10000
+MAX_BYTES = 32 * 1024 * 1024
+TTL = 300.0
+
+
+class ObjectCache:
+    """LRU + TTL cache of JSON-ready values by object id"""
+
+    def __init__(self, name, max_entries=MAX_ENTRIES, max_bytes=MAX_BYTES, ttl=TTL):
+        self.name = name
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._bytes = 0
+        # id -> loads in progress, and the ids invalidated during one of them
+        self._loading = {}
+        self._stale = set()
+        self.hits = self.misses = self.evictions = self.invalidations = 0
+
+    def get(self, obj_id):
+        """Cached value of ``obj_id``, or None"""
+        with self._lock:
+            entry = self._entries.get(obj_id)
+            if entry is not None and entry[2] < time.monotonic():
+                self._drop(obj_id)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(obj_id)
+            self.hits += 1
+            return entry[0]
+
+    def get_or_load(self, obj_id, load):
+        """Cached value, or ``load()`` stored for next time (None is not cached)"""
+        value = self.get(obj_id)
+        if value is not None:
+            return value
+        with self._lock:
+            self._loading[obj_id] = self._loading.get(obj_id, 0) + 1
+        try:
+            value = load()
+        finally:
+            with self._lock:
+                stale = obj_id in self._stale
+                self._loading[obj_id] -= 1
+                if not self._loading[obj_id]:
+                    del self._loading[obj_id]
+                    self._stale.discard(obj_id)
+        if value is not None and not stale:
+            self.put(obj_id, value)
+        return value
+
+    def put(self, obj_id, value):
+        size = len(dumps(value))
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if obj_id in self._entries:
+                self._drop(obj_id)
+            self._entries[obj_id] = (value, size, time.monotonic() + self.ttl)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._drop(next(iter(self._entries)))
+                self.evictions += 1
+
+    def _drop(self, obj_id):
+        _, size, _ = self._entries.pop(obj_id)
+        self._bytes -= size
+
+    def invalidate(self, obj_ids):
+        with self._lock:
+            for obj_id in obj_ids:
+                if obj_id in self._entries:
+                    self._drop(obj_id)
+                    self.invalidations += 1
+                if obj_id in self._loading:
+                    self._stale.add(obj_id)
+
+    def clear(self):
+        with self._lock:
+            self._stale.update(self._loading)
+            self.invalidations += len(self._entries)
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else None,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+            }
+
+
+def get_cache(resource):
+    """The cache of ``resource`` for the current application, or None if disabled"""
+    caches = current_app.extensions.get('object_caches')
+    if caches is None:
+        config = current_app.config
+        caches = current_app.extensions['object_caches'] = {
+            name: ObjectCache(name,
+                              max_entries=config.get('OBJECT_CACHE_MAX_ENTRIES', MAX_ENTRIES),
+                              max_bytes=config.get('OBJECT_CACHE_MAX_BYTES', MAX_BYTES),
+                              ttl=config.get('OBJECT_CACHE_TTL', TTL))
+            for name in config.get('OBJECT_CACHE_RESOURCES', RESOURCES)
+        }
+    return caches.get(resource)
+
+
+def cache_stats():
+    """Counters of every cache of the current application"""
+    if not has_app_context():
+        return {}
+    caches = current_app.extensions.get('object_caches') or {}
+    return {name: cache.stats() for name, cache in caches.items()}
+
+
+# --- ORM events -----------------------------------------------------------
+
+def stage(session, resource, *obj_ids):
+    """Invalidate ``obj_ids`` once ``session`` commits (bulk SQL writers)"""
+    session.info.setdefault('object_cache_ops', []).append((resource, obj_ids))
+
+
+def _stage(target, resource, obj_id):
+    if not has_app_context():
+        return
+    stage(object_session(target) or db.session(), resource, obj_id)
+
+
+@event.listens_for(Place, 'after_update')
+@event.listens_for(Place, 'after_delete')
+def _on_place_write(mapper, connection, place):
+    _stage(place, 'places', place.id)
+
+
+@event.listens_for(PlacePhoto, 'after_insert')
+@event.listens_for(PlacePhoto, 'after_update')
+@event.listens_for(PlacePhoto, 'after_delete')
+def _on_photo_write(mapper, connection, photo):
+    _stage(photo, 'places', photo.place_id)
+
+
+@event.listens_for(Session, 'before_flush')
+def _on_amenity_delete(session, flush_context, instances):
+    # The cached places list the amenity: read them before the flush unlinks them
+    amenity_ids = [obj.id for obj in session.deleted if isinstance(obj, Amenity)]
+    if not amenity_ids or not has_app_context():
+        return
+    place_ids = session.connection().execute(
+        select(place_amenity.c.place_id).where(place_amenity.c.amenity_id.in_(amenity_ids)))
+    stage(session, 'places', *place_ids.scalars())
+
+
+@event.listens_for(User, 'after_update')
+@event.listens_for(User, 'after_delete')
+def _on_user_write(mapper, connection, user):
+    _stage(user, 'users', user.id)
+
+
+@event.listens_for(Session, 'after_commit')
+def _apply_staged_ops(session):
+    ops = session.info.pop('object_cache_ops', None)
+    if not ops or not has_app_context():
+        return
+    caches = current_app.extensions.get('object_caches') or {}
+    for resource, obj_ids in ops:
+        cache = caches.get(resource)
+        if cache is not None:
+            cache.invalidate(obj_ids)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_staged_ops(session):
+    session.info.pop('object_cache_ops', None)
+
+
+@outbox.register
+def _apply_foreign_changes(events):
+    """Drop the places and users written by other processes"""
+    caches = current_app.extensions.get('object_caches') or {}
+    if events is None:
+        for cache in caches.values():
+            cache.clear()
+        return
+    places, users = caches.get('places'), caches.get('users')
+    for change in events:
+        if change.resource == 'places' and places is not None:
+            places.invalidate([change.object_id])
+        elif change.resource == 'place_photos' and places is not None:
+            # The event does not say which place the photo belongs to
+            places.clear()
+        elif change.resource == 'amenities' and change.op == outbox.DELETE \
+                and places is not None:
+            # Nor which places listed the deleted amenity
+            places.clear()
+        elif change.resource == 'users' and users is not None:
+            users.invalidate([change.object_id])
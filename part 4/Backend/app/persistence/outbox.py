@@ -0,0 +1,328 @@
+"""
+Transactional outbox: a change feed shared by every worker.
+
+Each flush that inserts, updates or deletes a tracked model also appends
+one row per object to ``outbox``, in the same transaction: a change is in
+the feed if and only if it was committed.  Every process runs an
+``OutboxTailer`` thread that reads the rows written by the *other*
+processes every ``OUTBOX_POLL_INTERVAL`` seconds and hands them to the
+registered handlers, which drop or refresh their local caches.  Local
+writes are already applied by the process that made them.
+
+The feed lives in the database, so it works the same with one SQLite file
+and several workers, or with a shared server database and several nodes.
+Ids are read in order; an id seen missing (a transaction still running on
+a database where ids are not committed in order) is re-read for
+``GAP_TIMEOUT`` seconds before being given up.  Rows older than
+``OUTBOX_RETENTION_SECONDS`` are pruned by the tailers.
+
+Review partitions (``app.persistence.partitions``) write the outbox rows of
+their reviews in their own database, in the same transaction as the
+review: the tailer reads and prunes every partition's outbox too, with a
+position per database.
+
+Rows of reviews also carry the place (``parent_id``), so that the live
+review streams (``app.services.pubsub``) are fed from the outbox of every
+worker, and replayed from it after a reconnection: those handlers register
+with ``own=True`` to get the changes of their own process as well.
+
+    def on_changes(events):
+        for event in events:
+            if event.resource == 'places':
+                cache.pop(event.object_id, None)
+
+    outbox.register(on_changes)
+"""
+import os
+import socket
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import (Column, DateTime, Integer, String, Table, event, func, insert, inspect,
+                        select)
+from sqlalchemy.orm import Session
+from app import db
+from app.persistence.changes import TRACKED_MODELS
+
+POLL_INTERVAL = 0.5
+RETENTION_SECONDS = 300
+PRUNE_EVERY = 60
+BATCH_SIZE = 1000
+GAP_TIMEOUT = 10
+MAX_GAPS = 1000
+
+ADD, UPDATE, DELETE = 'add', 'update', 'delete'
+
+outbox = Table(
+    'outbox',
+    db.Model.metadata,
+    Column('id', Integer, primary_key=True, autoincrement=True),
+    Column('resource', String(32), nullable=False),
+    Column('object_id', String(36), nullable=False),
+    Column('op', String(8), nullable=False),
+    Column('origin', String(64), nullable=False),
+    # Place of a review: the topic of its live events
+    Column('parent_id', String(36), nullable=True),
+    Column('created_at', DateTime, nullable=False, index=True),
+    # Never reuse an id, even after the table was emptied by pruning
+    sqlite_autoincrement=True,
+)
+
+# ``database``: 0 for the main database, 1 + n for the review partition n
+OutboxEvent = namedtuple('OutboxEvent', 'id resource object_id op origin parent_id database',
+                         defaults=(None, 0))
+
+# Resource -> attribute recorded as parent_id
+PARENTS = {'reviews': 'place_id'}
+
+_TRACKED = tuple(TRACKED_MODELS)
+_handlers = []
+_own_handlers = set()
+_origin = None
+
+
+def origin():
+    """Identifier of this process, renewed after a fork"""
+    global _origin
+    pid = os.getpid()
+    if _origin is None or _origin[0] != pid:
+        _origin = (pid, f'{socket.gethostname()}:{pid}:{time.time_ns():x}'[:64])
+    return _origin[1]
+
+
+def register(handler=None, own=False):
+    """
+    Call ``handler(events)`` with the changes made by other processes (by
+    every process, this one included, with ``own=True``), or
+    ``handler(None)`` when some changes may have been lost (drop everything).
+    Usable as ``@register`` or ``@register(own=True)``.
+    """
+    if handler is None:
+        return lambda func: register(func, own)
+    if handler not in _handlers:
+        _handlers.append(handler)
+    if own:
+        _own_handlers.add(handler)
+    return handler
+
+
+def unregister(handler):
+    if handler in _handlers:
+        _handlers.remove(handler)
+    _own_handlers.discard(handler)
+
+
+def upgrade(engine):
+    """Add the columns of newer versions to an existing outbox table"""
+    columns = {column['name'] for column in inspect(engine).get_columns('outbox')}
+    if 'parent_id' not in columns:
+        with engine.begin() as connection:
+            connection.exec_driver_sql('ALTER TABLE outbox ADD COLUMN parent_id VARCHAR(36)')
+
+
+def _parent_id(obj):
+    # Loaded state only: a row deleted by a cascade can no longer be refreshed
+    attribute = PARENTS.get(obj.__tablename__)
+    return inspect(obj).dict.get(attribute) if attribute else None
+
+
+@event.listens_for(Session, 'after_flush')
+def _append_to_outbox(session, flush_context):
+    # session.new/dirty/deleted still describe what was just flushed
+    changes = [(obj, ADD) for obj in session.new]
+    changes += [(obj, UPDATE) for obj in session.dirty if session.is_modified(obj)]
+    changes += [(obj, DELETE) for obj in session.deleted]
+    now = datetime.utcnow()
+    rows = [{'resource': obj.__tablename__, 'object_id': obj.id, 'op': op,
+             'origin': origin(), 'created_at': now,
+             'parent_id': _parent_id(obj)}
+            for obj, op in changes if isinstance(obj, _TRACKED)]
+    if rows:
+        session.connection().execute(insert(outbox), rows)
+
+
+def _outbox_sessions():
+    """Sessions of every database with an outbox: the main one, then the review partitions"""
+    parts = current_app.extensions.get('review_partitions')
+    if parts is None:
+        return [db.session]
+    return [db.session] + parts.sessions
+
+
+def read_since(database, after_id, resource, parent_id, limit=BATCH_SIZE):
+    """
+    Changes of ``resource`` under ``parent_id`` after the row ``after_id``
+    of the outbox of ``database`` (see OutboxEvent), for every origin.
+    Returns ``(events, complete)``: ``complete`` is False when rows after
+    ``after_id`` may have been pruned, or when there are more than ``limit``.
+    """
+    sessions = _outbox_sessions()
+    if database >= len(sessions):
+        return [], False
+    session = sessions[database]
+    oldest = session.execute(select(func.min(outbox.c.id))).scalar()
+    rows = session.execute(
+        select(outbox)
+        .where(outbox.c.id > after_id, outbox.c.resource == resource,
+               outbox.c.parent_id == parent_id)
+        .order_by(outbox.c.id).limit(limit + 1)).all()
+    session.rollback()
+    # Pruning removes the oldest rows: none after after_id is gone while
+    # the oldest row left comes right after it, or before
+    complete = oldest is not None and oldest <= after_id + 1 and len(rows) <= limit
+    return [OutboxEvent(row.id, row.resource, row.object_id, row.op, row.origin,
+                        row.parent_id, database) for row in rows[:limit]], complete
+
+
+class _Feed:
+    """Read position in the outbox of one database"""
+
+    def __init__(self, session, last_id=None, database=0):
+        self.session = session
+        self.last_id = last_id
+        self.database = database
+        self._gaps = {}
+
+    def read(self):
+        """Events committed since the last read, of every origin"""
+        if self.last_id is None:
+            # Start from the current end: earlier changes are already loaded
+            self.last_id = self.session.execute(select(func.max(outbox.c.id))).scalar() or 0
+            self.session.rollback()
+            return []
+        low = min(self._gaps) - 1 if self._gaps else self.last_id
+        rows = self.session.execute(
+            select(outbox).where(outbox.c.id > low).order_by(outbox.c.id).limit(BATCH_SIZE)).all()
+        self.session.rollback()
+
+        now = time.monotonic()
+        events = []
+        for row in rows:
+            if row.id <= self.last_id:
+                if self._gaps.pop(row.id, None) is None:
+                    continue
+            else:
+                if row.id - self.last_id - 1 <= MAX_GAPS:
+                    for missing in range(self.last_id + 1, row.id):
+                        self._gaps[missing] = now
+                self.last_id = row.id
+            events.append(OutboxEvent(row.id, row.resource, row.object_id, row.op, row.origin,
+                                      row.parent_id, self.database))
+        for missing, seen in list(self._gaps.items()):
+            if now - seen > GAP_TIMEOUT:
+                del self._gaps[missing]
+        return events
+
+    def prune(self, cutoff):
+        self.session.execute(outbox.delete().where(outbox.c.created_at < cutoff))
+        self.session.commit()
+
+
+class OutboxTailer:
+    """
+    Reads the outbox of every database (the main one and the review
+    partitions, each with its own position) and dispatches foreign changes
+    """
+
+    def __init__(self, app, interval=None, position=None):
+        self.app = app
+        self.interval = interval or app.config.get('OUTBOX_POLL_INTERVAL', POLL_INTERVAL)
+        self.retention = app.config.get('OUTBOX_RETENTION_SECONDS', RETENTION_SECONDS)
+        self._last_ids = ()
+        self._lost = False
+        if position is not None:
+            last_ids, taken_at = position
+            if time.time() - taken_at < self.retention:
+                self._last_ids = tuple(last_ids)
+            else:
+                # The rows written since may already be pruned
+                self._lost = True
+        self._feeds = None
+        self._last_prune = 0.0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def feeds(self):
+        if self._feeds is None:
+            sessions = _outbox_sessions()
+            # Databases without a known position start from their current end
+            last_ids = list(self._last_ids[:len(sessions)])
+            last_ids += [None] * (len(sessions) - len(last_ids))
+            self._feeds = [_Feed(session, last_id, database)
+                           for database, (session, last_id) in enumerate(zip(sessions, last_ids))]
+        return self._feeds
+
+    def poll(self):
+        """Read the new rows once; return the foreign events dispatched"""
+        events = []
+        for feed in self.feeds():
+            events += feed.read()
+        if self._lost:
+            self._lost = False
+            self._dispatch(None, None)
+            return []
+        foreign = [change for change in events if change.origin != origin()]
+        self._dispatch(events, foreign)
+        return foreign
+
+    def _dispatch(self, events, foreign):
+        for handler in list(_handlers):
+            batch = events if handler in _own_handlers else foreign
+            if batch == []:
+                continue
+            try:
+                handler(batch)
+            except Exception:
+                self.app.logger.exception("Outbox handler %r failed", handler)
+
+    def prune(self):
+        cutoff = datetime.utcnow() - timedelta(seconds=self.retention)
+        for feed in self.feeds():
+            feed.prune(cutoff)
+
+    def run(self):
+        while not self._stop.is_set():
+            try:
+                with self.app.app_context():
+                    self.poll()
+                    if time.monotonic() - self._last_prune > PRUNE_EVERY:
+                        self._last_prune = time.monotonic()
+                        self.prune()
+            except Exception:
+                self.app.logger.exception("Outbox tailer error")
+            self._stop.wait(self.interval)
+
+    def start(self):
+        self._thread = threading.Thread(target=self.run, name='outbox-tailer', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+
+def current_position():
+    """
+    ``(last ids, time)`` of the feed, one id per database.  Take it *before*
+    loading a cache that forked workers inherit, and give it to
+    ``start_tailer`` so they replay the changes made in between.
+    """
+    last_ids = []
+    for session in _outbox_sessions():
+        last_ids.append(session.execute(select(func.max(outbox.c.id))).scalar() or 0)
+    return tuple(last_ids), time.time()
+
+
+def start_tailer(app, position=None):
+    """Start the tailer of this process (call it after forking)"""
+    tailer = app.extensions.get('outbox_tailer')
+    if tailer is not None and tailer._thread is not None and tailer._thread.is_alive():
+        return tailer
+    if position is None:
+        position = app.extensions.get('outbox_position')
+    tailer = app.extensions['outbox_tailer'] = OutboxTailer(app, position=position).start()
+    return tailer
@@ -0,0 +1,190 @@
+"""
+Hash-partitioned review storage.
+
+SQLite lets one writer at a time into a database file, so every review
+write used to wait for the same lock.  With ``REVIEW_PARTITIONS = N``
+(N > 1) reviews are spread over N database files (``REVIEW_PARTITION_URI``,
+default ``sqlite:///reviews_{index}.db`` in the instance folder) by a hash
+of their ``place_id``: reviews of different places are written under
+different locks.
+
+Each partition holds a ``reviews`` table and its own ``tombstones`` and
+``outbox`` tables, written by the usual ORM hooks in the same transaction
+as the review.  Review ids are drawn so that they hash to the partition of
+their place, so a review is found from its id alone.  Lists and delta sync
+read every partition and merge the results (scatter-gather).
+
+Go through ``ReviewRepository``: the ORM relationships ``Place.reviews``
+and ``User.reviews`` only see the main database.  Reviews already stored in
+the main database are moved with ``flask --app run partition-reviews``.
+
+Without ``REVIEW_PARTITIONS`` everything stays in the main database.
+"""
+import hashlib
+import os
+import uuid
+from flask import current_app, has_app_context
+from flask_sqlalchemy.session import _app_ctx_id
+from sqlalchemy import create_engine, insert, select
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import scoped_session, sessionmaker
+from app import db
+from app.models.review import Review
+from app.persistence.changes import tombstones
+from app.persistence.outbox import outbox, upgrade as outbox_upgrade
+
+PARTITION_URI = 'sqlite:///reviews_{index}.db'
+# Tables created in every partition
+TABLES = [Review.__table__, tombstones, outbox]
+
+
+def partition_of(key, count):
+    """Stable partition number of ``key`` (same in every process)"""
+    digest = hashlib.blake2b(key.encode(), digest_size=8).digest()
+    return int.from_bytes(digest, 'big') % count
+
+
+def _resolve(app, uri):
+    # Relative SQLite paths live in the instance folder, like the main database
+    url = make_url(uri)
+    if url.drivername.startswith('sqlite') and url.database not in (None, '', ':memory:') \
+            and not os.path.isabs(url.database):
+        os.makedirs(app.instance_path, exist_ok=True)
+        url = url.set(database=os.path.join(app.instance_path, url.database))
+    return url
+
+
+class ReviewPartitions:
+    """Engines and sessions of the review partitions of one application"""
+
+    def __init__(self, app, count):
+        self.count = count
+        template = app.config.get('REVIEW_PARTITION_URI', PARTITION_URI)
+        self.engines = [create_engine(_resolve(app, template.format(index=index)))
+                        for index in range(count)]
+        # Scoped like db.session: one session per application context
+        self.sessions = [scoped_session(sessionmaker(bind=engine), scopefunc=_app_ctx_id)
+                         for engine in self.engines]
+
+    def create_all(self):
+        for engine in self.engines:
+            for table in TABLES:
+                table.create(engine, checkfirst=True)
+            outbox_upgrade(engine)
+
+    def drop_all(self):
+        for engine in self.engines:
+            for table in reversed(TABLES):
+                table.drop(engine, checkfirst=True)
+
+    def session(self, index):
+        return self.sessions[index]()
+
+    def index_of(self, key):
+        return partition_of(key, self.count)
+
+    def for_place(self, place_id):
+        return self.session(self.index_of(place_id))
+
+    def new_id(self, place_id):
+        """A review id hashing to the partition of ``place_id`` (N draws on average)"""
+        index = self.index_of(place_id)
+        while True:
+            candidate = str(uuid.uuid4())
+            if self.index_of(candidate) == index:
+                return candidate
+
+    def lookup_order(self, review_id):
+        """Sessions to search for a review: its own partition first"""
+        first = self.index_of(review_id)
+        return [self.session(first)] + [self.session(index) for index in range(self.count)
+                                        if index != first]
+
+    def remove(self):
+        for session in self.sessions:
+            session.remove()
+
+    def dispose(self, close=True):
+        for engine in self.engines:
+            engine.dispose(close=close)
+
+
+def init_app(app):
+    """Set up the review partitions configured for ``app``, if any"""
+    count = int(app.config.get('REVIEW_PARTITIONS') or 1)
+    if count <= 1:
+        return None
+    partitions = app.extensions['review_partitions'] = ReviewPartitions(app, count)
+    partitions.create_all()
+
+    @app.teardown_appcontext
+    def remove_partition_sessions(exception=None):
+        partitions.remove()
+
+    return partitions
+
+
+def get_partitions():
+    if not has_app_context():
+        return None
+    return current_app.extensions.get('review_partitions')
+
+
+def dispose_engines(app, close=True):
+    partitions = app.extensions.get('review_partitions')
+    if partitions is not None:
+        partitions.dispose(close=close)
+
+
+def review_sessions():
+    """Sessions of every database holding reviews"""
+    partitions = get_partitions()
+    if partitions is None:
+        return [db.session()]
+    return [partitions.session(index) for index in range(partitions.count)]
+
+
+def session_for_place(place_id):
+    """Session of the database holding the reviews of ``place_id``"""
+    partitions = get_partitions()
+    if partitions is None:
+        return db.session()
+    return partitions.for_place(place_id)
+
+
+def group_by_partition(place_ids):
+    """``[(session, place_ids)]``: the places whose reviews each database holds"""
+    partitions = get_partitions()
+    if partitions is None:
+        return [(db.session(), list(place_ids))]
+    groups = {}
+    for place_id in place_ids:
+        groups.setdefault(partitions.index_of(place_id), []).append(place_id)
+    return [(partitions.session(index), ids) for index, ids in sorted(groups.items())]
+
+
+def move_reviews_to_partitions(chunk_size=500):
+    """
+    Move the reviews stored in the main database into their partitions;
+    return their count.  Safe to run again after an interruption.
+    """
+    partitions = get_partitions()
+    if partitions is None:
+        raise RuntimeError("REVIEW_PARTITIONS is not set")
+    table = Review.__table__
+    moved = 0
+    while True:
+        rows = db.session.execute(select(table).limit(chunk_size)).mappings().all()
+        if not rows:
+            return moved
+        by_partition = {}
+        for row in rows:
+            by_partition.setdefault(partitions.index_of(row['place_id']), []).append(dict(row))
+        for index, values in by_partition.items():
+            session = partitions.session(index)
+            # Already copied by an interrupted run: keep that copy
+            session.execute(insert(table).prefix_with('OR IGNORE'), values)
+            session.commit()
+        db.session.execute(table.delete().where(table.c.id.in_([row['id'] for row in rows])))
+        db.session.commit()
+        moved += len(rows)
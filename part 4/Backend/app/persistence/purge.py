@@ -0,0 +1,163 @@
+"""
+Set-based deletes of places, reviews and users.
+
+Deleting through the ORM loads every child into the session (cascades)
+and issues one DELETE per row.  These helpers delete with one statement
+per table instead::
+
+    DELETE FROM reviews WHERE place_id IN (...)
+    DELETE FROM place_amenity WHERE place_id IN (...)
+    DELETE FROM place_photos WHERE place_id IN (...)
+    DELETE FROM bookings WHERE place_id IN (...)
+    DELETE FROM places WHERE id IN (...)
+
+Bulk SQL bypasses the mapper and flush events, so ``delete_rows`` writes
+the tombstones (delta sync) and the outbox rows (other workers) itself,
+with ``INSERT ... SELECT`` in the same transaction, and the removals from
+the amenity, availability and facet indexes are staged for the commit.
+
+Reviews stored in review partitions (``app.persistence.partitions``) are
+deleted in their own database first, in a transaction of their own.
+
+A user may own thousands of places: ``chunks()`` walks them
+``PURGE_CHUNK_SIZE`` at a time, one transaction per chunk, so a purge
+never holds the write lock for long.  An interrupted purge is resumed by
+running it again.
+"""
+from datetime import datetime
+from flask import current_app, has_app_context
+from sqlalchemy import DateTime, String, delete, insert, literal, select
+from app import db
+from app.models.associations import place_amenity
+from app.models.place import Place
+from app.models.review import Review
+from app.models.photo import PlacePhoto
+from app.models.booking import Booking
+from app.persistence import (amenity_index, availability, facets, memory_tier, object_cache,
+                             outbox, partitions)
+from app.persistence.changes import TRACKED_MODELS, tombstones
+
+CHUNK_SIZE = 500
+
+
+def chunk_size():
+    if has_app_context():
+        return current_app.config.get('PURGE_CHUNK_SIZE', CHUNK_SIZE)
+    return CHUNK_SIZE
+
+
+def delete_rows(target, condition, now=None, session=None):
+    """
+    ``DELETE FROM target WHERE condition`` (a model or a Table), recording
+    the tombstones and outbox rows of tracked models.  Returns the count.
+    """
+    session = session or db.session()
+    table = getattr(target, '__table__', target)
+    now = now or datetime.utcnow()
+    if any(model.__table__ is table for model in TRACKED_MODELS):
+        resource = literal(table.name, String)
+        deleted_at = literal(now, DateTime)
+        session.execute(insert(tombstones).from_select(
+            ['resource', 'object_id', 'deleted_at'],
+            select(resource, table.c.id, deleted_at).where(condition)))
+        parent = outbox.PARENTS.get(table.name)
+        parent_id = table.c[parent] if parent else literal(None, String)
+        session.execute(insert(outbox.outbox).from_select(
+            ['resource', 'object_id', 'op', 'origin', 'created_at', 'parent_id'],
+            select(resource, table.c.id, literal(outbox.DELETE, String),
+                   literal(outbox.origin(), String), deleted_at, parent_id).where(condition)))
+    memory_tier.stage_bulk_delete(session, table, condition)
+    statement = delete(target).where(condition)
+    if table is not target:
+        # Mark the matching objects of the session as deleted, without loading any
+        statement = statement.execution_options(synchronize_session='evaluate')
+    return session.execute(statement).rowcount
+
+
+def purge_places(place_ids):
+    """
+    Delete places with their reviews, photos and amenity links, in one
+    committed transaction.  Returns ``(place count, photo content hashes)``.
+    """
+    place_ids = list(place_ids)
+    if not place_ids:
+        return 0, set()
+    session = db.session()
+    hashes = set(session.execute(
+        select(PlacePhoto.content_hash).where(PlacePhoto.place_id.in_(place_ids))).scalars())
+    now = datetime.utcnow()
+    for review_session, ids in partitions.group_by_partition(place_ids):
+        if review_session is session:
+            continue
+        # Review partition: its own transaction, committed before the places
+        _commit(review_session, delete_rows, Review, Review.place_id.in_(ids), now, review_session)
+    try:
+        if partitions.get_partitions() is None:
+            delete_rows(Review, Review.place_id.in_(place_ids), now)
+        delete_rows(PlacePhoto, PlacePhoto.place_id.in_(place_ids), now)
+        delete_rows(Booking, Booking.place_id.in_(place_ids), now)
+        delete_rows(place_amenity, place_amenity.c.place_id.in_(place_ids), now)
+        count = delete_rows(Place, Place.id.in_(place_ids), now)
+        for place_id in place_ids:
+            amenity_index.stage(session, 'remove_place', place_id)
+            availability.stage(session, 'remove_place', place_id)
+            facets.stage(session, 'remove_place', place_id)
+        object_cache.stage(session, 'places', *place_ids)
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    return count, hashes
+
+
+def _commit(session, func, *args):
+    try:
+        result = func(*args)
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    return result
+
+
+def purge_user_reviews(user_id, size=None):
+    """
+    Delete the reviews written by a user, one transaction per chunk, in
+    every review database.  Yields the ``(id, place_id, rating)`` rows of
+    each deleted chunk.
+    """
+    query = select(Review.id, Review.place_id, Review.rating).where(Review.user_id == user_id)
+    for session in partitions.review_sessions():
+        for rows in chunks(query, size, session):
+            for row in rows:
+                facets.stage(session, 'remove_rating', row.place_id, row.rating)
+            _commit(session, delete_rows, Review, Review.id.in_([row.id for row in rows]),
+                    None, session)
+            yield rows
+
+
+def purge_user_bookings(user_id, size=None):
+    """Delete the bookings of a guest, one transaction per chunk; return their count"""
+    session = db.session()
+    count = 0
+    for rows in chunks(select(Booking.id).where(Booking.user_id == user_id), size):
+        ids = [row.id for row in rows]
+        for booking_id in ids:
+            availability.stage(session, 'remove', booking_id)
+        count += _commit(session, delete_rows, Booking, Booking.id.in_(ids))
+    return count
+
+
+def chunks(query, size=None, session=None):
+    """
+    Yield the rows of ``query`` ``size`` at a time, re-running it each time:
+    the caller must delete every row it is given before asking for more.
+    """
+    session = session or db.session()
+    size = size or chunk_size()
+    while True:
+        rows = session.execute(query.limit(size)).all()
+        session.rollback()
+        if not rows:
+            return
+        yield rows
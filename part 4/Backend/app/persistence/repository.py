@@ -1,5 +1,10 @@
 from abc import ABC, abstractmethod
+from bisect import bisect_left, bisect_right, insort
+from operator import itemgetter
+from sqlalchemy import and_, exists, func, or_, select
+from sqlalchemy.orm import load_only
 from app import db
+from app.persistence import changes, memory_tier
 
 class Repository(ABC):
     @abstractmethod
@@ -27,47 +32,466 @@ class Repository(ABC):
         pass
 
 
+def record_type(name, fields):
+    """
+    Build a compact record class for ``fields``: ``__slots__`` instead of
+    a ``__dict__`` per object, attribute access like the rows of
+    ``read_rows``.  ``__init__`` and ``_astuple`` are generated, like the
+    serializers, to assign and read the slots without a loop.
+    """
+    fields = tuple(fields)
+    source = (f"def __init__(self, {', '.join(f'{field}=None' for field in fields)}):\n"
+              + ''.join(f"    self.{field} = {field}\n" for field in fields)
+              + "def _astuple(self):\n"
+              + f"    return ({''.join(f'self.{field}, ' for field in fields)})\n")
+    namespace = {}
+    exec(compile(source, f'<record {name}>', 'exec'), namespace)
+
+    def __repr__(self):
+        values = ', '.join(f'{field}={getattr(self, field)!r}' for field in fields)
+        return f'{name}({values})'
+
+    def _asdict(self):
+        return dict(zip(fields, self._astuple()))
+
+    return type(name, (), {'__slots__': fields, '_fields': fields,
+                           '__init__': namespace['__init__'], '_astuple': namespace['_astuple'],
+                           '__repr__': __repr__, '_asdict': _asdict})
+
+
 class InMemoryRepository(Repository):
-    def __init__(self):
+    """
+    In-memory storage engine with the interface of ``SQLAlchemyRepository``.
+
+    Objects are copied into ``__slots__`` records of the model columns (or
+    of ``fields``): ``get`` and ``read_rows`` return records, not the
+    objects that were added.  Secondary indexes are declared up front:
+
+        repo = InMemoryRepository(User, indexes=('email',))
+        repo.get_by_attribute('email', 'a@b.c')     # dict lookup, no scan
+
+        repo = InMemoryRepository(Place, sorted_indexes=('price',))
+        repo.range('price', 50, 100, limit=20)      # bisect, 50 <= price < 100
+
+    ``indexes`` are hash indexes (equality); ``sorted_indexes`` keep
+    ``(value, id)`` pairs in order for range queries and ordered pages
+    (``None`` values are not indexed).  Filtering on an attribute without
+    an index falls back to a scan.
+    """
+
+    def __init__(self, model=None, fields=None, indexes=(), sorted_indexes=()):
+        self.model = model
+        if fields is None:
+            fields = [column.key for column in model.__table__.columns]
+        if 'id' not in fields:
+            fields = ['id'] + list(fields)
+        self.fields = tuple(fields)
+        name = model.__name__ if model is not None else 'Record'
+        self.record = record_type(f'{name}Record', self.fields)
         self._storage = {}
+        self._hash = {attr: {} for attr in indexes}
+        self._sorted = {attr: [] for attr in sorted_indexes}
+
+    # --- records and indexes ----------------------------------------------
+
+    def _to_record(self, obj):
+        if isinstance(obj, dict):
+            return self.record(*(obj.get(field) for field in self.fields))
+        return self.record(*(getattr(obj, field, None) for field in self.fields))
+
+    def _index(self, record):
+        for attr, index in self._hash.items():
+            index.setdefault(getattr(record, attr), {})[record.id] = None
+        for attr, entries in self._sorted.items():
+            value = getattr(record, attr)
+            if value is not None:
+                insort(entries, (value, record.id))
+
+    def _unindex(self, record):
+        for attr, index in self._hash.items():
+            value = getattr(record, attr)
+            ids = index.get(value)
+            if ids is not None:
+                ids.pop(record.id, None)
+                if not ids:
+                    del index[value]
+        for attr, entries in self._sorted.items():
+            value = getattr(record, attr)
+            if value is not None:
+                position = bisect_left(entries, (value, record.id))
+                if position < len(entries) and entries[position] == (value, record.id):
+                    del entries[position]
+
+    def _store(self, record):
+        old = self._storage.get(record.id)
+        if old is not None:
+            self._unindex(old)
+        self._storage[record.id] = record
+        self._index(record)
+        return record
+
+    def _remove(self, obj_id):
+        record = self._storage.pop(obj_id, None)
+        if record is None:
+            return False
+        self._unindex(record)
+        return True
+
+    def put(self, obj):
+        """Insert or replace the record of ``obj`` (a model instance, row or dict)"""
+        return self._store(self._to_record(obj))
+
+    def _reindex(self):
+        """Rebuild the indexes in bulk: one sort per sorted index, not one insort per record"""
+        storage = self._storage
+        for attr, index in self._hash.items():
+            index.clear()
+            for record in storage.values():
+                index.setdefault(getattr(record, attr), {})[record.id] = None
+        for attr, entries in self._sorted.items():
+            entries.clear()
+            entries.extend((getattr(record, attr), record.id) for record in storage.values()
+                           if getattr(record, attr) is not None)
+            entries.sort()
+
+    def _store_many(self, records):
+        if self._storage:
+            for record in records:
+                self._store(record)
+            return
+        storage = self._storage
+        for record in records:
+            storage[record.id] = record
+        self._reindex()
+
+    def load(self, objs):
+        """Replace the whole content with ``objs``"""
+        self.clear()
+        self._store_many(self._to_record(obj) for obj in objs)
+
+    def clear(self):
+        self._storage.clear()
+        for index in self._hash.values():
+            index.clear()
+        for entries in self._sorted.values():
+            entries.clear()
+
+    def __len__(self):
+        return len(self._storage)
+
+    def __contains__(self, obj_id):
+        return obj_id in self._storage
+
+    # --- Repository interface ---------------------------------------------
 
     def add(self, obj):
-        self._storage[obj.id] = obj
+        self.put(obj)
+        return obj
 
-    def get(self, obj_id):
+    def get(self, obj_id, fields=None):
         return self._storage.get(obj_id)
 
-    def get_all(self):
+    def get_all(self, fields=None):
         return list(self._storage.values())
 
+    def get_many(self, obj_ids, chunk_size=None, fields=None):
+        """Records of ``obj_ids`` (unknown ids skipped), in the same order"""
+        storage = self._storage
+        return [storage[obj_id] for obj_id in obj_ids if obj_id in storage]
+
+    def read_rows(self, fields=None, ids=None, chunk_size=None, session=None):
+        if ids is None:
+            return self.get_all()
+        return self.get_many(ids)
+
     def update(self, obj_id, data):
-        obj = self.get(obj_id)
-        if obj:
-            obj.update(data)
+        record = self._storage.get(obj_id)
+        if record is None:
+            return None
+        values = record._asdict()
+        values.update((key, value) for key, value in data.items() if key in values)
+        return self.put(values)
 
     def delete(self, obj_id):
-        if obj_id in self._storage:
-            del self._storage[obj_id]
+        return self._remove(obj_id)
 
     def get_by_attribute(self, attr_name, attr_value):
-        return next((obj for obj in self._storage.values()
-                     if getattr(obj, attr_name, None) == attr_value), None)
+        return next(iter(self.find(attr_name, attr_value)), None)
+
+    # --- queries ----------------------------------------------------------
+
+    def find(self, attr_name, attr_value):
+        """Records whose ``attr_name`` equals ``attr_value``"""
+        index = self._hash.get(attr_name)
+        if index is not None:
+            return self.get_many(index.get(attr_value, ()))
+        if attr_name in self._sorted:
+            return self.range(attr_name, attr_value, attr_value, include_high=True)
+        return [record for record in self._storage.values()
+                if getattr(record, attr_name, None) == attr_value]
+
+    def range(self, attr_name, low=None, high=None, include_high=False,
+              offset=0, limit=None, descending=False):
+        """
+        Records with ``low <= attr_name < high`` (``<= high`` with
+        ``include_high``; ``None`` bounds are open), ordered by the
+        attribute then id, ``offset``/``limit`` applied.
+        """
+        entries = self._sorted.get(attr_name)
+        if entries is None:
+            raise ValueError(f"No sorted index on {attr_name}")
+        start = 0 if low is None else bisect_left(entries, low, key=itemgetter(0))
+        if high is None:
+            end = len(entries)
+        elif include_high:
+            end = bisect_right(entries, high, key=itemgetter(0))
+        else:
+            end = bisect_left(entries, high, key=itemgetter(0))
+        if descending:
+            stop = end - offset
+            first = start if limit is None else max(start, stop - limit)
+            selected = reversed(entries[first:max(stop, first)])
+        else:
+            first = start + offset
+            selected = entries[first:end if limit is None else min(end, first + limit)]
+        storage = self._storage
+        return [storage[obj_id] for _, obj_id in selected]
+
+    def page(self, offset=0, limit=None, order_by=None, descending=False):
+        """
+        One page of every record, in insertion order or by a sorted index
+        (records without a value for it come last)
+        """
+        if order_by is None:
+            records = list(self._storage.values())
+            if descending:
+                records.reverse()
+            return records[offset:None if limit is None else offset + limit]
+        records = self.range(order_by, descending=descending)
+        indexed = {record.id for record in records} if len(records) < len(self._storage) else None
+        if indexed is not None:
+            records += [record for record in self._storage.values() if record.id not in indexed]
+        return records[offset:None if limit is None else offset + limit]
+
+    def count(self, attr_name=None, attr_value=None):
+        if attr_name is None:
+            return len(self._storage)
+        return len(self.find(attr_name, attr_value))
+
+
+FILTER_OPERATORS = {
+    'eq': lambda column, value: column == value,
+    'ne': lambda column, value: column != value,
+    'lt': lambda column, value: column < value,
+    'lte': lambda column, value: column <= value,
+    'gt': lambda column, value: column > value,
+    'gte': lambda column, value: column >= value,
+    'in': lambda column, value: column.in_(list(value)),
+}
 
 
 class SQLAlchemyRepository(Repository):
+    """
+    Repository of one model, with a query-spec API compiled to one
+    statement per call (per database for partitioned models):
+
+        repo.find({'price__gte': 50, 'owner_id': owner_id},
+                  order_by='-price', limit=20, after=cursor, fields=['title'])
+        repo.find_rows(...)          # same spec, plain rows (projection)
+        repo.first(email=email)
+        repo.count(place_id=place_id)
+        repo.exists(email=email, id__ne=user_id)
+        repo.get_many(ids)
+
+    Filters are ``column`` (equality) or ``column__<op>`` with ``op`` in
+    ``FILTER_OPERATORS``, given as a dict and/or keyword arguments.
+    ``order_by`` takes column names (``-name`` for descending); ``id`` is
+    always the last key, so pages are stable and ``cursor(row, order_by)``
+    gives the ``after`` value of the next page (keyset pagination: no
+    OFFSET scan).
+    """
+
     def __init__(self, model):
         self.model = model
 
+    def _sessions(self, session=None):
+        """Sessions a query runs on (several for partitioned models)"""
+        return [session or db.session]
+
+    def lock_for_write(self, session=None):
+        """
+        Take the write lock of the database now, not at the first write of
+        the transaction, so that a check and the write it guards see the
+        same data.  Relies on SQLite, whose lock covers the whole database
+        (``BEGIN IMMEDIATE``, held until commit or rollback; waits up to the
+        busy timeout of the connection, 5 s by default).  A session already
+        in a SQLite transaction has written, hence holds the lock.  Other
+        databases would need the rows locked (``SELECT ... FOR UPDATE``).
+        """
+        connection = (session or db.session).connection()
+        if (connection.dialect.name == 'sqlite'
+                and not connection.connection.driver_connection.in_transaction):
+            connection.exec_driver_sql('BEGIN IMMEDIATE')
+
+    def _query(self, fields=None, session=None):
+        """Base query, loading only the ``fields`` columns when given"""
+        query = self.model.query if session is None else session.query(self.model)
+        if fields:
+            columns = [getattr(self.model, name) for name in fields
+                       if name in self.model.__table__.columns]
+            query = query.options(load_only(*columns))
+        return query
+
     def add(self, obj):
         db.session.add(obj)
         db.session.commit()
         return obj
 
-    def get(self, obj_id):
-        return self.model.query.get(obj_id)
+    def _columns(self, fields=None):
+        """Table columns to select: the primary key plus ``fields``"""
+        table = self.model.__table__
+        if not fields:
+            return list(table.columns)
+        names = ['id'] + [name for name in fields if name != 'id' and name in table.columns]
+        return [table.columns[name] for name in names]
 
-    def get_all(self):
-        return self.model.query.all()
+    # --- query spec -------------------------------------------------------
+
+    def _conditions(self, filters=None, equals=None):
+        """WHERE clauses of a filter spec"""
+        table = self.model.__table__
+        conditions = []
+        for key, value in {**(filters or {}), **(equals or {})}.items():
+            name, _, op = key.partition('__')
+            if name not in table.columns:
+                raise ValueError(f"Unknown column: {name}")
+            if op not in FILTER_OPERATORS and op:
+                raise ValueError(f"Unknown filter operator: {op}")
+            conditions.append(FILTER_OPERATORS[op or 'eq'](table.columns[name], value))
+        return conditions
+
+    def _order(self, order_by=None):
+        """``[(column name, descending)]``, ending with the primary key"""
+        if isinstance(order_by, str):
+            order_by = [order_by]
+        keys = [(name.lstrip('-'), name.startswith('-')) for name in order_by or ()]
+        if 'id' not in (name for name, _ in keys):
+            keys.append(('id', False))
+        return keys
+
+    def _after(self, keys, after):
+        """Keyset condition: rows strictly after ``after`` in ``keys`` order"""
+        table = self.model.__table__
+        clauses = []
+        for position, (name, descending) in enumerate(keys):
+            column = table.columns[name]
+            step = [table.columns[previous] == value
+                    for (previous, _), value in zip(keys[:position], after)]
+            step.append(column < after[position] if descending else column > after[position])
+            clauses.append(and_(*step))
+        return or_(*clauses)
+
+    def _select(self, columns, filters=None, equals=None, order_by=None, limit=None,
+                after=None):
+        statement = select(*columns).where(*self._conditions(filters, equals))
+        if order_by is None and limit is None and after is None:
+            return statement
+        keys = self._order(order_by)
+        if after is not None:
+            statement = statement.where(self._after(keys, after))
+        table = self.model.__table__
+        statement = statement.order_by(*(table.columns[name].desc() if descending
+                                         else table.columns[name] for name, descending in keys))
+        return statement if limit is None else statement.limit(limit)
+
+    def _merge(self, results, order_by=None, limit=None):
+        """Concatenate per-session results, keeping the order and limit of the spec"""
+        if len(results) == 1:
+            return results[0]
+        merged = [item for result in results for item in result]
+        if order_by is not None or limit is not None:
+            # Stable sorts, last key first; NULL first, as in SQLite
+            for name, descending in reversed(self._order(order_by)):
+                merged.sort(key=lambda item, name=name: (getattr(item, name) is not None,
+                                                          getattr(item, name)),
+                            reverse=descending)
+        return merged if limit is None else merged[:limit]
+
+    def find(self, filters=None, order_by=None, limit=None, after=None, fields=None,
+             session=None, **equals):
+        """ORM objects matching the spec (only ``fields`` loaded when given)"""
+        statement = self._select([self.model], filters, equals, order_by, limit, after)
+        if fields:
+            statement = statement.options(load_only(*[
+                getattr(self.model, column.key) for column in self._columns(fields)]))
+        return self._merge([each.execute(statement).scalars().all()
+                            for each in self._sessions(session)], order_by, limit)
+
+    def find_rows(self, filters=None, order_by=None, limit=None, after=None, fields=None,
+                  session=None, **equals):
+        """Read-only rows (``id`` plus ``fields``) matching the spec"""
+        columns = self._columns(fields)
+        return self._merge([each.execute(self._select(columns, filters, equals, order_by,
+                                                       limit, after)).all()
+                            for each in self._sessions(session)], order_by, limit)
+
+    def first(self, filters=None, order_by=None, fields=None, session=None, **equals):
+        found = self.find(filters, order_by, 1, fields=fields, session=session, **equals)
+        return found[0] if found else None
+
+    def count(self, filters=None, session=None, **equals):
+        """Number of matching rows: ``SELECT count(*)``"""
+        statement = (select(func.count()).select_from(self.model.__table__)
+                     .where(*self._conditions(filters, equals)))
+        return sum(each.execute(statement).scalar() for each in self._sessions(session))
+
+    def exists(self, filters=None, session=None, **equals):
+        """Whether a row matches: ``SELECT EXISTS (...)``, stops at the first row"""
+        statement = select(exists().where(*self._conditions(filters, equals)))
+        return any(each.execute(statement).scalar() for each in self._sessions(session))
+
+    def cursor(self, row, order_by=None):
+        """``after`` value to read the page that follows ``row``"""
+        return tuple(getattr(row, name) for name, _ in self._order(order_by))
+
+    # --- objects ----------------------------------------------------------
+
+    def read_rows(self, fields=None, ids=None, chunk_size=500, session=None):
+        """
+        Read-only path for list endpoints: run a Core SELECT and return
+        plain rows (tuples with attribute access) instead of ORM instances,
+        skipping the identity map and attribute instrumentation.
+        """
+        if session is None:
+            tier = memory_tier.get_tier(self.model.__tablename__)
+            if tier is not None:
+                return tier.read_rows(ids)
+        session = session or db.session
+        columns = self._columns(fields)
+        if ids is None:
+            return session.execute(select(*columns)).all()
+        ids = list(ids)
+        found = {}
+        for start in range(0, len(ids), chunk_size):
+            chunk = ids[start:start + chunk_size]
+            for row in session.execute(select(*columns).where(self.model.id.in_(chunk))):
+                found[row.id] = row
+        return [found[obj_id] for obj_id in ids if obj_id in found]
+
+    def get(self, obj_id, fields=None):
+        return self._query(fields).get(obj_id)
+
+    def get_all(self, fields=None):
+        return self._query(fields).all()
+
+    def get_many(self, obj_ids, chunk_size=500, fields=None):
+        """Load several objects by id, keeping the order of ``obj_ids``"""
+        obj_ids = list(obj_ids)
+        found = {}
+        for start in range(0, len(obj_ids), chunk_size):
+            for obj in self.find(id__in=obj_ids[start:start + chunk_size], fields=fields):
+                found[obj.id] = obj
+        return [found[obj_id] for obj_id in obj_ids if obj_id in found]
 
     def update(self, obj_id, data):
         obj = self.get(obj_id)
@@ -85,5 +509,9 @@ class SQLAlchemyRepository(Repository):
             return True
         return False
 
+    def changes(self, cursor=None, fields=None, limit=changes.DEFAULT_LIMIT):
+        """Upserts and deletions since ``cursor`` (see app.persistence.changes)"""
+        return changes.read_changes(self.model, cursor, fields, limit)
+
     def get_by_attribute(self, attr_name, attr_value):
-        return self.model.query.filter_by(**{attr_name: attr_value}).first()
+        return self.first({attr_name: attr_value})
@@ -0,0 +1,64 @@
+"""
+Schema versioning.
+
+Booting used to call ``db.create_all()``, which inspects every table on each
+start.  ``ensure_schema()`` instead reads a single row from ``schema_info``
+and only runs ``create_all()`` when the stored version differs from
+``SCHEMA_VERSION``.
+
+Bump ``SCHEMA_VERSION`` whenever a model adds a table or an index
+(``create_all()`` does not alter existing tables, so the missing indexes of
+existing tables are created separately; column changes still need a manual
+migration).
+"""
+from sqlalchemy import Column, Integer, Table, inspect, select
+from sqlalchemy.exc import OperationalError, ProgrammingError
+from app import db
+
+SCHEMA_VERSION = 9
+
+schema_info = Table(
+    'schema_info',
+    db.Model.metadata,
+    Column('version', Integer, nullable=False)
+)
+
+
+def current_schema_version():
+    """Return the version stored in the database, or None if unversioned"""
+    try:
+        return db.session.execute(select(schema_info.c.version)).scalar()
+    except (OperationalError, ProgrammingError):
+        db.session.rollback()
+        return None
+
+
+def ensure_schema():
+    """
+    Create the missing tables if the database is not at SCHEMA_VERSION.
+
+    Returns True when the schema had to be (re)created.
+    """
+    version = current_schema_version()
+    if version == SCHEMA_VERSION:
+        return False
+    if version is not None and version > SCHEMA_VERSION:
+        raise RuntimeError(
+            f"Database schema version {version} is newer than this code ({SCHEMA_VERSION})")
+
+    had_places = inspect(db.engine).has_table('places')
+    db.create_all()
+    for table in db.Model.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(db.engine, checkfirst=True)
+    if had_places and db.engine.dialect.name == 'sqlite':
+        # Base antérieure à l'index FTS5 : le créer et l'alimenter
+        from app.persistence.search import rebuild_search_index
+        rebuild_search_index()
+    from app.persistence import outbox
+    outbox.upgrade(db.engine)
+
+    db.session.execute(schema_info.delete())
+    db.session.execute(schema_info.insert().values(version=SCHEMA_VERSION))
+    db.session.commit()
+    return True
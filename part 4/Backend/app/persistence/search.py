@@ -0,0 +1,168 @@
+"""
+Full-text search over places (titre + description) with SQLite FTS5.
+
+The ``places_fts`` virtual table is an external-content FTS5 index: it stores
+only the inverted index and reads the text back from ``places`` through the
+rowid.  Triggers keep it in sync with every INSERT/UPDATE/DELETE on
+``places``, whether it comes from the ORM or from raw SQL.
+
+Note: ``places`` has a string primary key, so its rowids may be renumbered by
+``VACUUM``.  Run ``flask reindex-places`` after a VACUUM (or any bulk import
+done with triggers disabled) to rebuild the index.
+"""
+import html
+import json
+import re
+from sqlalchemy import DDL, event, text
+from app import db
+from app.models.place import Place
+
+FTS_TABLE = 'places_fts'
+
+# BM25 weights: a match in the title counts more than one in the description
+TITLE_WEIGHT = 10.0
+DESCRIPTION_WEIGHT = 1.0
+
+MAX_PER_PAGE = 100
+
+# highlight()/snippet() delimiters, turned into <mark> tags once the
+# user-written text around them is HTML-escaped
+MARK_START, MARK_END = '\x02', '\x03'
+
+_SEARCH_DDL = [
+    # prefix='2 3' keeps short prefix queries ("pa*", "par*") index-only
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        title, description,
+        content='places', content_rowid='rowid',
+        tokenize='unicode61 remove_diacritics 2',
+        prefix='2 3'
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS places_fts_ai AFTER INSERT ON places BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, title, description)
+        VALUES (new.rowid, new.title, new.description);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS places_fts_ad AFTER DELETE ON places BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, description)
+        VALUES ('delete', old.rowid, old.title, old.description);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS places_fts_au AFTER UPDATE OF title, description ON places BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, description)
+        VALUES ('delete', old.rowid, old.title, old.description);
+        INSERT INTO {FTS_TABLE}(rowid, title, description)
+        VALUES (new.rowid, new.title, new.description);
+    END""",
+]
+
+for _statement in _SEARCH_DDL:
+    event.listen(Place.__table__, 'after_create',
+                 DDL(_statement).execute_if(dialect='sqlite'))
+event.listen(Place.__table__, 'before_drop',
+             DDL(f"DROP TABLE IF EXISTS {FTS_TABLE}").execute_if(dialect='sqlite'))
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def build_match_query(query, prefix=True):
+    """
+    Turn free user input into a safe FTS5 MATCH expression.
+
+    Every word is quoted (so FTS5 operators typed by the user are treated as
+    text) and the terms are AND-ed.  With ``prefix`` the last word also
+    matches as a prefix, which gives search-as-you-type behaviour.
+    Returns None when the input contains no searchable word.
+    """
+    tokens = _TOKEN_RE.findall(query or '')
+    if not tokens:
+        return None
+    terms = [f'"{token}"' for token in tokens]
+    if prefix:
+        terms[-1] += '*'
+    return ' '.join(terms)
+
+
+def ensure_search_index():
+    """Create the FTS table and its triggers if they are missing"""
+    with db.engine.begin() as conn:
+        for statement in _SEARCH_DDL:
+            conn.execute(text(statement))
+
+
+def rebuild_search_index():
+    """Rebuild the whole index from ``places`` and merge its b-trees"""
+    ensure_search_index()
+    with db.engine.begin() as conn:
+        conn.execute(text(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"))
+        conn.execute(text(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('optimize')"))
+        return conn.execute(text(f"SELECT count(*) FROM {FTS_TABLE}")).scalar()
+
+
+def mark_up(value):
+    """HTML-escape a highlight()/snippet() result, then mark its matches"""
+    if value is None:
+        return None
+    # html.escape() leaves the control-character delimiters alone
+    return html.escape(value).replace(MARK_START, '<mark>').replace(MARK_END, '</mark>')
+
+
+def search_places(query, page=1, per_page=20, prefix=True, place_ids=None, exclude_ids=None):
+    """
+    Search places ranked by BM25, best match first.
+
+    Returns ``(results, has_more)`` where ``results`` is a list of dicts with
+    the place id, title, price, a highlighted title and a description snippet.
+    ``has_more`` is computed by fetching one extra row, so no COUNT(*) over the
+    whole match set is needed.
+
+    ``place_ids`` (a set) restricts the results, e.g. to the output of the
+    amenity index, and ``exclude_ids`` (a set) removes some, e.g. the places
+    booked for the requested dates.  Both are filters of the query, each
+    bound as one JSON array (``json_each``, whatever the number of ids), so
+    only the requested page leaves SQLite.
+    """
+    match = build_match_query(query, prefix=prefix)
+    if match is None:
+        return [], False
+    page = max(int(page), 1)
+    per_page = min(max(int(per_page), 1), MAX_PER_PAGE)
+
+    filters = ''
+    params = {}
+    if place_ids is not None:
+        filters += ' AND p.id IN (SELECT value FROM json_each(:place_ids))'
+        params['place_ids'] = json.dumps(list(place_ids))
+    if exclude_ids:
+        filters += ' AND p.id NOT IN (SELECT value FROM json_each(:exclude_ids))'
+        params['exclude_ids'] = json.dumps(list(exclude_ids))
+    sql = text(f"""
+        SELECT p.id, p.title, p.price,
+               highlight({FTS_TABLE}, 0, :mark_start, :mark_end) AS title_highlight,
+               snippet({FTS_TABLE}, 1, :mark_start, :mark_end, '…', 16) AS snippet,
+               bm25({FTS_TABLE}, :title_weight, :description_weight) AS score
+        FROM {FTS_TABLE}
+        JOIN places AS p ON p.rowid = {FTS_TABLE}.rowid
+        WHERE {FTS_TABLE} MATCH :match{filters}
+        ORDER BY score
+        LIMIT :limit OFFSET :offset
+    """)
+    params.update({
+        'match': match,
+        'mark_start': MARK_START,
+        'mark_end': MARK_END,
+        'title_weight': TITLE_WEIGHT,
+        'description_weight': DESCRIPTION_WEIGHT,
+        'limit': per_page + 1,
+        'offset': (page - 1) * per_page,
+    })
+    rows = db.session.execute(sql, params).mappings().all()
+
+    has_more = len(rows) > per_page
+    results = [{
+        'id': row['id'],
+        'title': row['title'],
+        'price': row['price'],
+        'title_highlight': mark_up(row['title_highlight']),
+        'snippet': mark_up(row['snippet']),
+        # bm25() is negative, lower is better: expose a positive relevance
+        'score': -row['score'],
+    } for row in rows[:per_page]]
+    return results, has_more
@@ -0,0 +1,47 @@
+from app import db
+from app.models.booking import Booking
+from app.persistence.repository import SQLAlchemyRepository
+
+class BookingRepository(SQLAlchemyRepository):
+    def __init__(self):
+        super().__init__(Booking)
+
+    def find_conflict(self, place_id, check_in, check_out):
+        """
+        Booking of the place overlapping [check_in, check_out), or None.
+
+        The bookings of a place never overlap, so only the last one starting
+        before ``check_out`` can: one descending seek on
+        (place_id, check_in), whatever the length of the calendar.
+        """
+        filters = {'place_id': place_id, 'check_in__lt': check_out}
+        last = self.first(filters, order_by='-check_in')
+        return last if last is not None and last.check_out > check_in else None
+
+    def add_if_free(self, booking):
+        """
+        Insert ``booking`` unless it overlaps another one; return it, or None.
+
+        Relies on SQLite, whose write lock covers the whole database: the
+        check and the insert run in a ``BEGIN IMMEDIATE`` transaction
+        (``lock_for_write``), so a concurrent booking waits for this one to
+        commit before doing its own check.  Other databases have no such
+        lock: they would need the place row locked (``SELECT ... FOR
+        UPDATE``) or an exclusion constraint instead.
+        """
+        self.lock_for_write()
+        if self.find_conflict(booking.place_id, booking.check_in, booking.check_out):
+            db.session.rollback()
+            return None
+        db.session.add(booking)
+        db.session.commit()
+        return booking
+
+    def get_by_place(self, place_id, start=None, end=None):
+        """Bookings of a place overlapping [start, end), by check_in"""
+        filters = {'place_id': place_id}
+        if end is not None:
+            filters['check_in__lt'] = end
+        if start is not None:
+            filters['check_out__gt'] = start
+        return self.find(filters, order_by='check_in')
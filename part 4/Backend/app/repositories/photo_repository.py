@@ -0,0 +1,25 @@
+from app.models.photo import PlacePhoto
+from app.persistence.repository import SQLAlchemyRepository
+
+class PhotoRepository(SQLAlchemyRepository):
+    def __init__(self):
+        super().__init__(PlacePhoto)
+
+    def get_by_place(self, place_id):
+        return self.find(place_id=place_id, order_by='created_at')
+
+    def get_by_hash(self, place_id, content_hash):
+        return self.first(place_id=place_id, content_hash=content_hash)
+
+    def count_by_hash(self, content_hash):
+        return self.count(content_hash=content_hash)
+
+    def get_covers(self, place_ids, chunk_size=500):
+        """Map each place id to its first ready photo, one query per chunk"""
+        place_ids = list(place_ids)
+        covers = {}
+        for start in range(0, len(place_ids), chunk_size):
+            chunk = place_ids[start:start + chunk_size]
+            for photo in self.find(place_id__in=chunk, status='ready', order_by='created_at'):
+                covers.setdefault(photo.place_id, photo)
+        return covers
@@ -0,0 +1,23 @@
+from sqlalchemy import select
+from app import db
+from app.models.place import Place
+from app.models.associations import place_amenity
+from app.persistence.repository import SQLAlchemyRepository
+
+class PlaceRepository(SQLAlchemyRepository):
+    def __init__(self):
+        super().__init__(Place)
+
+    def get_amenity_ids(self, place_ids, chunk_size=500):
+        """Map each place id to its amenity ids with one query per chunk"""
+        place_ids = list(place_ids)
+        result = {place_id: [] for place_id in place_ids}
+        for start in range(0, len(place_ids), chunk_size):
+            chunk = place_ids[start:start + chunk_size]
+            rows = db.session.execute(
+                select(place_amenity.c.place_id, place_amenity.c.amenity_id)
+                .where(place_amenity.c.place_id.in_(chunk))
+            )
+            for place_id, amenity_id in rows:
+                result[place_id].append(amenity_id)
+        return result
@@ -0,0 +1,84 @@
+from sqlalchemy.orm import object_session
+from app.models.review import Review
+from app.persistence import changes, partitions
+from app.persistence.repository import SQLAlchemyRepository
+
+class ReviewRepository(SQLAlchemyRepository):
+    """
+    Reviews of the main database, or of the review partitions when the
+    application has some (see app.persistence.partitions): writes go to
+    the partition of the place, lists read every partition.
+    """
+
+    def __init__(self):
+        super().__init__(Review)
+
+    def _sessions(self, session=None):
+        return [session] if session is not None else partitions.review_sessions()
+
+    def add(self, review):
+        parts = partitions.get_partitions()
+        if parts is None:
+            return super().add(review)
+        if parts.index_of(review.id) != parts.index_of(review.place_id):
+            # Let get() find the review from its id alone
+            review.id = parts.new_id(review.place_id)
+        session = parts.for_place(review.place_id)
+        session.add(review)
+        session.commit()
+        return review
+
+    def get(self, obj_id, fields=None):
+        parts = partitions.get_partitions()
+        if parts is None:
+            return super().get(obj_id, fields)
+        # Reviews moved from the main database keep ids of any partition
+        for session in parts.lookup_order(obj_id):
+            review = self._query(fields, session).get(obj_id)
+            if review is not None:
+                return review
+        return None
+
+    def get_all(self, fields=None):
+        return [review for session in partitions.review_sessions()
+                for review in self._query(fields, session).all()]
+
+    def read_rows(self, fields=None, ids=None, chunk_size=500, session=None):
+        if session is not None or partitions.get_partitions() is None:
+            return super().read_rows(fields, ids, chunk_size, session)
+        rows = []
+        for session in partitions.review_sessions():
+            rows += super().read_rows(fields, ids, chunk_size, session)
+        if ids is None:
+            return rows
+        found = {row.id: row for row in rows}
+        return [found[obj_id] for obj_id in ids if obj_id in found]
+
+    def update(self, obj_id, data):
+        """Update a review; raises ValueError on an invalid rating"""
+        review = self.get(obj_id)
+        if review:
+            session = object_session(review)
+            try:
+                review.update(data)
+            except ValueError:
+                session.rollback()
+                raise
+            session.commit()
+        return review
+
+    def delete(self, obj_id):
+        review = self.get(obj_id)
+        if review:
+            session = object_session(review)
+            session.delete(review)
+            session.commit()
+            return True
+        return False
+
+    def changes(self, cursor=None, fields=None, limit=changes.DEFAULT_LIMIT):
+        return changes.read_changes(self.model, cursor, fields, limit,
+                                    sessions=partitions.review_sessions())
+
+    def get_by_place(self, place_id):
+        return self.find(place_id=place_id, session=partitions.session_for_place(place_id))
@@ -1,9 +1,15 @@
 from app.models.user import User
-from app.repositories.sqlalchemy_repository import SQLAlchemyRepository
+from app.persistence import memory_tier
+from app.persistence.repository import SQLAlchemyRepository
 
 class UserRepository(SQLAlchemyRepository):
     def __init__(self):
         super().__init__(User)
 
     def get_user_by_email(self, email):
-        return self.model.query.filter_by(email=email).first()
+        tier = memory_tier.get_tier('users')
+        if tier is not None:
+            # Unknown addresses (sign-up, failed logins) never reach the database
+            rows = tier.find('email', email)
+            return self.get(rows[0].id) if rows else None
+        return self.first(email=email)
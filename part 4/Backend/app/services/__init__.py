@@ -1,3 +1,6 @@
 from app.services.facade import HBnBFacade
 
 facade = HBnBFacade()
+
+# Enregistre les tâches exécutées par les workers de jobs
+from app.services import tasks  # noqa: E402,F401
@@ -1,21 +1,42 @@
+from datetime import datetime
+from sqlalchemy import select
+from app import db
 from app.repositories.user_repository import UserRepository
+from app.repositories.place_repository import PlaceRepository
+from app.repositories.photo_repository import PhotoRepository
+from app.repositories.review_repository import ReviewRepository
+from app.repositories.booking_repository import BookingRepository
 from app.persistence.repository import SQLAlchemyRepository
 from app.models.user import User
 from app.models.place import Place
 from app.models.review import Review
 from app.models.amenity import Amenity
+from app.models.photo import PlacePhoto
+from app.models.booking import Booking
+from app.persistence import (search, amenity_index, availability, facets, object_cache,
+                             partitions, purge)
+from app.services import photos, jobs, provisioning
 
 class HBnBFacade:
     def __init__(self):
         self.user_repo = UserRepository()
-        self.place_repo = SQLAlchemyRepository(Place)
-        self.review_repo = SQLAlchemyRepository(Review)
+        self.place_repo = PlaceRepository()
+        self.review_repo = ReviewRepository()
         self.amenity_repo = SQLAlchemyRepository(Amenity)
+        self.photo_repo = PhotoRepository()
+        self.booking_repo = BookingRepository()
+        # Resources exposed by the delta-sync endpoints (/<resource>/changes)
+        self._repos_by_resource = {
+            'users': self.user_repo,
+            'places': self.place_repo,
+            'reviews': self.review_repo,
+            'amenities': self.amenity_repo,
+        }
 
     # USER METHODS
     def create_user(self, data):
         # Vérifie unicité de l'email
-        if self.user_repo.get_user_by_email(data['email']):
+        if self.user_repo.exists(email=data['email']):
             raise ValueError("Email already exists")
         user = User(
             email=data['email'],
@@ -26,36 +47,66 @@ class HBnBFacade:
         )
         return self.user_repo.add(user)
 
-    def get_user(self, user_id):
-        return self.user_repo.get(user_id)
+    def create_users(self, items, batch_size=None, workers=None):
+        """Bulk creation; one ``{'index', 'email', 'id' | 'error'}`` result per item"""
+        return provisioning.provision_users(items, batch_size=batch_size, workers=workers)
 
-    def get_all_users(self):
-        return self.user_repo.get_all()
+    def get_user(self, user_id, fields=None):
+        return self.user_repo.get(user_id, fields=fields)
+
+    def get_user_view(self, user_id, serialize):
+        """``serialize(user)``, from the object cache when possible; None if unknown"""
+        return self._cached_view('users', self.user_repo, user_id, serialize)
+
+    def user_exists(self, user_id):
+        cache = object_cache.get_cache('users')
+        if cache is not None and cache.get(user_id) is not None:
+            return True
+        return self.user_repo.exists(id=user_id)
+
+    def get_all_users(self, fields=None):
+        return self.user_repo.get_all(fields=fields)
+
+    def list_users(self, fields=None):
+        return self.user_repo.read_rows(fields)
 
     def update_user(self, user_id, data):
         # Si email dans data, vérifie unicité
-        if 'email' in data:
-            existing = self.user_repo.get_user_by_email(data['email'])
-            if existing and existing.id != user_id:
-                raise ValueError("Email already exists")
+        if 'email' in data and self.user_repo.exists(email=data['email'], id__ne=user_id):
+            raise ValueError("Email already exists")
         return self.user_repo.update(user_id, data)
 
     def delete_user(self, user_id):
-        return self.user_repo.delete(user_id)
+        """
+        Delete a user with their places, reviews and bookings, chunk by
+        chunk: one transaction per PURGE_CHUNK_SIZE rows.
+        """
+        if not self.user_repo.exists(id=user_id):
+            return False
+        hashes = set()
+        for rows in purge.chunks(select(Place.id).where(Place.owner_id == user_id)):
+            hashes |= purge.purge_places([row.id for row in rows])[1]
+        for _ in purge.purge_user_reviews(user_id):
+            pass
+        purge.purge_user_bookings(user_id)
+        deleted = self.user_repo.delete(user_id)
+        self._remove_unused_photo_files_later(hashes)
+        return deleted
+
+    def delete_user_later(self, user_id):
+        """Queue the purge of a user; return the job id, or None if unknown"""
+        if not self.user_repo.exists(id=user_id):
+            return None
+        return jobs.enqueue('users.purge', {'user_id': user_id}, priority=jobs.LOW)
 
     def get_user_by_email(self, email):
         return self.user_repo.get_user_by_email(email)
 
     # PLACE METHODS
     def create_place(self, place_data):
-        owner = self.user_repo.get(place_data['owner_id'])
-        if not owner:
+        if not self.user_exists(place_data['owner_id']):
             raise ValueError("Owner not found")
-        if 'amenities' in place_data and place_data['amenities']:
-            for amenity_id in place_data['amenities']:
-                amenity = self.amenity_repo.get(amenity_id)
-                if not amenity:
-                    raise ValueError(f"Amenity {amenity_id} not found")
+        amenities = self._resolve_amenities(place_data.get('amenities') or [])
         place = Place(
             title=place_data['title'],
             description=place_data['description'],
@@ -65,19 +116,226 @@ class HBnBFacade:
             owner_id=place_data['owner_id'],
             amenities=place_data.get('amenities', [])
         )
+        for amenity in amenities:
+            place.add_amenity(amenity)
         return self.place_repo.add(place)
 
-    def get_place(self, place_id):
-        return self.place_repo.get(place_id)
+    def _resolve_amenities(self, amenity_ids):
+        amenities = self.amenity_repo.get_many(amenity_ids)
+        if len(amenities) < len(amenity_ids):
+            found = {amenity.id for amenity in amenities}
+            missing = next(amenity_id for amenity_id in amenity_ids if amenity_id not in found)
+            raise ValueError(f"Amenity {missing} not found")
+        return amenities
+
+    def get_place(self, place_id, fields=None):
+        return self.place_repo.get(place_id, fields=fields)
+
+    def place_exists(self, place_id):
+        return self.place_repo.exists(id=place_id)
 
-    def get_all_places(self):
-        return self.place_repo.get_all()
+    def get_place_view(self, place_id, serialize):
+        """``serialize(place)``, from the object cache when possible; None if unknown"""
+        return self._cached_view('places', self.place_repo, place_id, serialize)
+
+    def _cached_view(self, resource, repo, obj_id, serialize):
+        def load():
+            obj = repo.get(obj_id)
+            return serialize(obj) if obj else None
+        cache = object_cache.get_cache(resource)
+        if cache is None:
+            return load()
+        return cache.get_or_load(obj_id, load)
+
+    def get_all_places(self, fields=None):
+        return self.place_repo.get_all(fields=fields)
+
+    def list_places(self, fields=None, amenity_ids=None, match=amenity_index.MATCH_ALL,
+                    check_in=None, check_out=None):
+        """
+        Read-only rows of places, optionally filtered by amenities and by
+        availability for the stay [check_in, check_out)
+        """
+        if amenity_ids:
+            place_ids = amenity_index.get_amenity_index().place_ids(amenity_ids, match)
+            if check_in or check_out:
+                availability.validate_stay(check_in, check_out)
+                place_ids = availability.get_availability_index().free_place_ids(
+                    place_ids, check_in, check_out)
+            return self.place_repo.read_rows(fields, ids=place_ids)
+        rows = self.place_repo.read_rows(fields)
+        busy = self._busy_place_ids(check_in, check_out)
+        return [row for row in rows if row.id not in busy] if busy else rows
+
+    def _busy_place_ids(self, check_in, check_out):
+        if not (check_in or check_out):
+            return set()
+        availability.validate_stay(check_in, check_out)
+        return availability.get_availability_index().busy_place_ids(check_in, check_out)
+
+    def search_places(self, query, page=1, per_page=20, amenity_ids=None,
+                      match=amenity_index.MATCH_ALL, check_in=None, check_out=None):
+        place_ids = None
+        if amenity_ids:
+            place_ids = set(amenity_index.get_amenity_index().place_ids(amenity_ids, match))
+        return search.search_places(query, page=page, per_page=per_page, place_ids=place_ids,
+                                    exclude_ids=self._busy_place_ids(check_in, check_out))
+
+    def get_place_facets(self, amenity_ids=None, match=amenity_index.MATCH_ALL,
+                         check_in=None, check_out=None, price_edges=None):
+        """
+        Price histogram, amenity counts and rating counts of the places
+        matching the same filters as ``list_places``
+        """
+        place_ids = None
+        if amenity_ids:
+            place_ids = amenity_index.get_amenity_index().place_ids(amenity_ids, match)
+        busy = self._busy_place_ids(check_in, check_out)
+        result = facets.get_facet_index().facets(place_ids, busy, price_edges)
+        index = amenity_index.get_amenity_index()
+        if place_ids is None and busy:
+            counts = index.counts()
+            for amenity_id, count in index.counts(busy).items():
+                counts[amenity_id] -= count
+        else:
+            counts = index.counts(None if place_ids is None else set(place_ids) - busy)
+        result['amenities'] = [{'id': amenity_id, 'count': count}
+                               for amenity_id, count in sorted(counts.items(),
+                                                               key=lambda item: -item[1])
+                               if count]
+        return result
+
+    def get_amenity_ids_by_place(self, place_ids):
+        return self.place_repo.get_amenity_ids(place_ids)
+
+    def get_places_by_amenities(self, amenity_ids, match=amenity_index.MATCH_ALL, fields=None):
+        place_ids = amenity_index.get_amenity_index().place_ids(amenity_ids, match)
+        return self.place_repo.get_many(place_ids, fields=fields)
 
     def update_place(self, place_id, data):
+        if 'amenities' in data:
+            data = dict(data)
+            amenities = self._resolve_amenities(data.pop('amenities') or [])
+            place = self.place_repo.get(place_id)
+            if not place:
+                return None
+            wanted = {amenity.id for amenity in amenities}
+            for current in list(place.amenities):
+                if current.id not in wanted:
+                    place.remove_amenity(current)
+            for amenity in amenities:
+                place.add_amenity(amenity)
+            # The row itself may not change: bump it for delta-sync clients
+            data['updated_at'] = datetime.utcnow()
         return self.place_repo.update(place_id, data)
 
     def delete_place(self, place_id):
-        return self.place_repo.delete(place_id)
+        # Reviews, photos and amenity links go with set-based DELETEs
+        count, hashes = purge.purge_places([place_id])
+        self._remove_unused_photo_files_later(hashes)
+        return count > 0
+
+    # AVAILABILITY
+    def book_place(self, place_id, data):
+        """
+        Take [check_in, check_out) on the calendar of a place; raises
+        BookingConflict when the dates overlap another booking
+        """
+        availability.validate_stay(data['check_in'], data['check_out'])
+        booking = Booking(
+            place_id=place_id,
+            check_in=data['check_in'],
+            check_out=data['check_out'],
+            kind=data.get('kind', 'booked'),
+            user_id=data.get('user_id'),
+        )
+        if self.booking_repo.add_if_free(booking) is None:
+            raise availability.BookingConflict("These dates are not available")
+        return booking
+
+    def get_booking(self, booking_id):
+        return self.booking_repo.get(booking_id)
+
+    def get_place_calendar(self, place_id, start=None, end=None):
+        return self.booking_repo.get_by_place(place_id, start, end)
+
+    def is_place_available(self, place_id, check_in, check_out):
+        availability.validate_stay(check_in, check_out)
+        return availability.get_availability_index().is_free(place_id, check_in, check_out)
+
+    def cancel_booking(self, booking_id):
+        return self.booking_repo.delete(booking_id)
+
+    # DELTA SYNC
+    def get_changes(self, resource, cursor=None, fields=None, limit=500):
+        """Return ``(upserts, deleted_ids, next_cursor, has_more)`` for a resource"""
+        return self._repos_by_resource[resource].changes(cursor, fields=fields, limit=limit)
+
+    # PHOTO METHODS
+    def add_place_photo(self, place_id, stream):
+        """Store an uploaded photo and queue its thumbnails"""
+        if not self.place_repo.exists(id=place_id):
+            raise ValueError("Place not found")
+        content_hash, original, tmp_path = photos.receive_upload(stream)
+        published = False
+        try:
+            # photos.remove_unused checks and deletes under the same lock
+            self.photo_repo.lock_for_write()
+            published = photos.publish_upload(content_hash, original, tmp_path)
+            photo = self.photo_repo.get_by_hash(place_id, content_hash)
+            if photo:
+                db.session.rollback()
+                return photo
+            photo = PlacePhoto(place_id, content_hash, [original])
+            # Committed with the photo: no pending photo without its job
+            jobs.enqueue('photos.thumbnails', {'photo_id': photo.id}, priority=jobs.HIGH,
+                         commit=False)
+            return self.photo_repo.add(photo)
+        except BaseException:
+            # Still under the lock: no other row can reference the files yet
+            if published:
+                photos.remove_files(content_hash)
+            db.session.rollback()
+            raise
+        finally:
+            photos.discard_upload(tmp_path)
+
+    def get_place_photo(self, photo_id):
+        return self.photo_repo.get(photo_id)
+
+    def get_place_photos(self, place_id):
+        return self.photo_repo.get_by_place(place_id)
+
+    def get_cover_photos(self, place_ids):
+        return self.photo_repo.get_covers(place_ids)
+
+    def delete_place_photo(self, photo_id):
+        photo = self.photo_repo.get(photo_id)
+        if not photo:
+            return False
+        content_hash = photo.content_hash
+        place_id = photo.place_id
+        deleted = self.photo_repo.delete(photo_id)
+        self._remove_unused_photo_files_later({content_hash})
+        # The cover photo of the place may have changed
+        self.place_repo.update(place_id, {'updated_at': datetime.utcnow()})
+        return deleted
+
+    def _remove_unused_photo_files_later(self, hashes):
+        if hashes:
+            jobs.enqueue('photos.remove_unused', {'hashes': sorted(hashes)}, priority=jobs.LOW)
+
+    def remove_unused_photo_files(self, hashes):
+        # Several places may share the same file (same content hash).  Under
+        # the write lock: an upload of the same file cannot publish it and
+        # insert its row between the check and the removal
+        for content_hash in hashes:
+            self.photo_repo.lock_for_write()
+            try:
+                if not self.photo_repo.exists(content_hash=content_hash):
+                    photos.remove_files(content_hash)
+            finally:
+                db.session.rollback()
 
     # REVIEW METHODS
     def create_review(self, data):
@@ -89,11 +347,14 @@ class HBnBFacade:
         )
         return self.review_repo.add(review)
 
-    def get_review(self, review_id):
-        return self.review_repo.get(review_id)
+    def get_review(self, review_id, fields=None):
+        return self.review_repo.get(review_id, fields=fields)
 
-    def get_all_reviews(self):
-        return self.review_repo.get_all()
+    def get_all_reviews(self, fields=None):
+        return self.review_repo.get_all(fields=fields)
+
+    def list_reviews(self, fields=None):
+        return self.review_repo.read_rows(fields)
 
     def update_review(self, review_id, data):
         return self.review_repo.update(review_id, data)
@@ -102,25 +363,28 @@ class HBnBFacade:
         return self.review_repo.delete(review_id)
 
     def get_reviews_by_place(self, place_id):
-        return [review for review in self.review_repo.get_all() if review.place_id == place_id]
+        return self.review_repo.get_by_place(place_id)
+
+    def has_reviewed(self, user_id, place_id):
+        return self.review_repo.exists(place_id=place_id, user_id=user_id,
+                                       session=partitions.session_for_place(place_id))
 
     # AMENITY METHODS
     def create_amenity(self, data):
         amenity = Amenity(name=data['name'])
         return self.amenity_repo.add(amenity)
 
-    def get_amenity(self, amenity_id):
-        return self.amenity_repo.get(amenity_id)
+    def get_amenity(self, amenity_id, fields=None):
+        return self.amenity_repo.get(amenity_id, fields=fields)
 
-    def get_all_amenities(self):
-        return self.amenity_repo.get_all()
+    def get_all_amenities(self, fields=None):
+        return self.amenity_repo.get_all(fields=fields)
+
+    def list_amenities(self, fields=None):
+        return self.amenity_repo.read_rows(fields)
 
     def update_amenity(self, amenity_id, data):
         return self.amenity_repo.update(amenity_id, data)
 
     def delete_amenity(self, amenity_id):
-        amenity = self.amenity_repo.get(amenity_id)
-        if not amenity:
-            return False
-        self.amenity_repo.delete(amenity_id)
-        return True
+        return self.amenity_repo.delete(amenity_id)
@@ -0,0 +1,52 @@
+"""
+Per-process health counters.
+
+Each worker process keeps its own counters: they are reset right after the
+fork (see ``gunicorn.conf.py``) and exposed by ``GET /api/v1/health``, so a
+load balancer or an operator can see which worker answered and how close it
+is to being recycled.
+"""
+import os
+import threading
+import time
+
+_lock = threading.Lock()
+_stats = {}
+
+
+def _reset(max_requests):
+    _stats.clear()
+    _stats.update({
+        'pid': os.getpid(),
+        'started_at': time.time(),
+        'requests': 0,
+        'errors': 0,
+        'max_requests': max_requests,
+    })
+
+
+def reset_worker_stats(max_requests=0):
+    """Start fresh counters for the current process"""
+    with _lock:
+        _reset(max_requests)
+
+
+def record_request(status_code):
+    """Count a finished request (5xx answers also count as errors)"""
+    with _lock:
+        if _stats.get('pid') != os.getpid():
+            # Counters inherited through a fork without reset_worker_stats()
+            _reset(_stats.get('max_requests', 0))
+        _stats['requests'] += 1
+        if status_code >= 500:
+            _stats['errors'] += 1
+
+
+def worker_stats():
+    """Return a snapshot of the counters of the current process"""
+    with _lock:
+        if _stats.get('pid') != os.getpid():
+            _reset(_stats.get('max_requests', 0))
+        stats = dict(_stats)
+    stats['uptime'] = round(time.time() - stats['started_at'], 3)
+    return stats
@@ -0,0 +1,150 @@
+"""
+Background jobs: tasks run outside the request by a pool of worker threads.
+
+    @task('photos.remove_unused')
+    def remove_unused_photos(hashes):
+        ...
+
+    jobs.enqueue('photos.remove_unused', {'hashes': [...]}, priority=jobs.LOW)
+
+The queue is the ``jobs`` table (``app.persistence.job_queue``), so a job
+survives a restart and every process sharing the database can run it:
+each gunicorn worker runs ``HBNB_JOB_THREADS`` worker threads (default 1),
+and ``flask --app run jobs-work`` runs a dedicated worker process.
+An idle thread polls every ``JOB_POLL_INTERVAL`` seconds; an enqueue wakes
+the threads of its own process right away.
+
+Tasks receive the payload as keyword arguments and must be idempotent:
+a job is retried after a failure and may run twice if a worker dies.
+"""
+import os
+import socket
+import threading
+import time
+import traceback
+from flask import current_app
+from app import db
+from app.persistence import idempotency, job_queue
+from app.persistence.job_queue import HIGH, NORMAL, LOW  # noqa: F401
+
+POLL_INTERVAL = 1.0
+PRUNE_EVERY = 60
+JOB_THREADS = 1
+
+_tasks = {}
+_wakeup = threading.Event()
+
+
+def task(name):
+    """Register the decorated function as the task ``name``"""
+    def decorator(func):
+        _tasks[name] = func
+        return func
+    return decorator
+
+
+def enqueue(name, payload=None, **options):
+    """
+    Queue a run of the task ``name``; return the job id.
+
+    Options: ``priority`` (HIGH, NORMAL, LOW or any int), ``delay``
+    (seconds), ``max_attempts``, ``commit`` (False: commit with the caller).
+    """
+    if name not in _tasks:
+        raise ValueError(f"Unknown task: {name}")
+    job_id = job_queue.enqueue(name, payload, **options)
+    _wakeup.set()
+    return job_id
+
+
+def worker_name():
+    return f'{socket.gethostname()}:{os.getpid()}:{threading.current_thread().name}'
+
+
+def run_job(job):
+    """Run one claimed job and record its outcome"""
+    func = _tasks.get(job.name)
+    try:
+        if func is None:
+            raise LookupError(f"Unknown task: {job.name}")
+        func(**job.payload)
+    except Exception:
+        db.session.rollback()
+        current_app.logger.exception("Job %s (%s) failed, attempt %s/%s",
+                                     job.id, job.name, job.attempts, job.max_attempts)
+        job_queue.fail(job, traceback.format_exc())
+        return False
+    job_queue.complete(job)
+    return True
+
+
+def run_pending(limit=None):
+    """Run the available jobs in the current thread; return how many ran"""
+    count = 0
+    while limit is None or count < limit:
+        job = job_queue.claim(worker_name())
+        if job is None:
+            break
+        run_job(job)
+        count += 1
+    return count
+
+
+class WorkerPool:
+    """Threads claiming and running jobs until stopped"""
+
+    def __init__(self, app, threads=None, poll_interval=None):
+        self.app = app
+        self.threads = threads if threads is not None else app.config.get('JOB_THREADS', JOB_THREADS)
+        self.poll_interval = poll_interval or app.config.get('JOB_POLL_INTERVAL', POLL_INTERVAL)
+        self._stop = threading.Event()
+        self._threads = []
+        self._last_prune = 0.0
+        self._prune_lock = threading.Lock()
+
+    def run(self):
+        while not self._stop.is_set():
+            ran = False
+            try:
+                with self.app.app_context():
+                    self._maybe_prune()
+                    ran = run_pending(limit=1) > 0
+            except Exception:
+                self.app.logger.exception("Job worker error")
+            if not ran:
+                _wakeup.wait(self.poll_interval)
+                _wakeup.clear()
+
+    def _maybe_prune(self):
+        with self._prune_lock:
+            if time.monotonic() - self._last_prune < PRUNE_EVERY:
+                return
+            self._last_prune = time.monotonic()
+        job_queue.prune()
+        idempotency.prune()
+
+    def start(self):
+        for number in range(self.threads):
+            thread = threading.Thread(target=self.run, name=f'jobs-{number}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        _wakeup.set()
+        for thread in self._threads:
+            thread.join(timeout)
+
+    @property
+    def alive(self):
+        return any(thread.is_alive() for thread in self._threads)
+
+
+def start_workers(app, threads=None):
+    """Start the job threads of this process (call it after forking)"""
+    pool = app.extensions.get('job_workers')
+    if pool is not None and pool.alive:
+        return pool
+    pool = app.extensions['job_workers'] = WorkerPool(app, threads).start()
+    return pool
@@ -0,0 +1,206 @@
+"""
+Place photos: upload storage and thumbnails.
+
+An upload is copied to disk chunk by chunk while it is hashed, so a large
+photo never sits in memory.  Files are stored under ``PHOTO_ROOT`` by
+content hash::
+
+    <PHOTO_ROOT>/ab/abcdef.../original.jpg
+                             /small.webp  /small.jpg
+                             /medium.webp /medium.jpg
+                             /large.webp  /large.jpg
+
+and served as ``/api/v1/photos/<hash>/<variant>``.  A URL therefore always
+designates the same bytes and can be cached forever (``immutable``).
+
+Several photos may share a directory (same content).  An upload is first
+received in ``<PHOTO_ROOT>/tmp``, then published in its directory under the
+database write lock, in the transaction inserting its row, and unpublished
+if that transaction fails; ``photos.remove_unused`` rechecks the references
+of a directory and deletes it under the same lock, so it never removes
+files a new row is about to reference.
+
+Resizing is a background job (``photos.thumbnails``, ``app.services.jobs``)
+queued in the same transaction as the photo, never done on the request
+thread: the upload answers as soon as the original is stored, with the
+photo in ``pending`` state, and the job marks it ``ready`` once its
+variants are written.  The job survives restarts and is retried like any
+other.  Variants need Pillow; without it only the original is published.
+"""
+import hashlib
+import os
+import re
+import shutil
+import tempfile
+from datetime import datetime
+from flask import current_app
+
+try:
+    from PIL import Image, ImageOps
+    # Retrying would fail the same way
+    UNDECODABLE = (Image.UnidentifiedImageError, Image.DecompressionBombError)
+except ImportError:  # pragma: no cover - depends on the environment
+    Image = None
+    UNDECODABLE = ()
+
+CHUNK_SIZE = 64 * 1024
+MAX_PHOTO_BYTES = 10 * 1024 * 1024
+
+# Variant name -> longest side in pixels
+SIZES = {'small': 320, 'medium': 800, 'large': 1600}
+FORMATS = {'webp': ('WEBP', {'quality': 80, 'method': 4}),
+           'jpg': ('JPEG', {'quality': 82, 'optimize': True, 'progressive': True})}
+
+MIMETYPES = {'jpg': 'image/jpeg', 'png': 'image/png', 'webp': 'image/webp'}
+
+HASH_RE = re.compile(r'^[0-9a-f]{64}$')
+VARIANT_RE = re.compile(r'^(original|small|medium|large)\.(jpg|png|webp)$')
+
+
+class PhotoTooLarge(ValueError):
+    pass
+
+
+def photo_root():
+    return current_app.config.get('PHOTO_ROOT') or os.path.join(
+        current_app.instance_path, 'photos')
+
+
+def photo_dir(content_hash, root=None):
+    return os.path.join(root or photo_root(), content_hash[:2], content_hash)
+
+
+def variant_path(content_hash, variant):
+    """Path of a stored file, or None if the name is not a valid variant"""
+    if not HASH_RE.match(content_hash) or not VARIANT_RE.match(variant):
+        return None
+    return os.path.join(photo_dir(content_hash), variant)
+
+
+def sniff_extension(head):
+    """Recognise JPEG, PNG and WebP from their first bytes"""
+    if head.startswith(b'\xff\xd8\xff'):
+        return 'jpg'
+    if head.startswith(b'\x89PNG\r\n\x1a\n'):
+        return 'png'
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return 'webp'
+    return None
+
+
+def receive_upload(stream, max_bytes=MAX_PHOTO_BYTES):
+    """
+    Copy an uploaded file to a temporary file, hashing it on the way.
+
+    Returns ``(content_hash, original_variant, tmp_path)``, to give to
+    ``publish_upload``.  Raises ValueError for an empty or unsupported file
+    and PhotoTooLarge above ``max_bytes``.
+    """
+    root = photo_root()
+    tmp_dir = os.path.join(root, 'tmp')
+    os.makedirs(tmp_dir, exist_ok=True)
+    digest = hashlib.sha256()
+    size = 0
+    head = b''
+    fd, tmp_path = tempfile.mkstemp(dir=tmp_dir)
+    try:
+        with os.fdopen(fd, 'wb') as out:
+            while True:
+                chunk = stream.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > max_bytes:
+                    raise PhotoTooLarge(f"Photo exceeds {max_bytes // (1024 * 1024)} MB")
+                if len(head) < 16:
+                    head += chunk[:16]
+                digest.update(chunk)
+                out.write(chunk)
+        extension = sniff_extension(head)
+        if extension is None:
+            raise ValueError("Photo must be a JPEG, PNG or WebP image")
+        return digest.hexdigest(), f'original.{extension}', tmp_path
+    except BaseException:
+        discard_upload(tmp_path)
+        raise
+
+
+def publish_upload(content_hash, original, tmp_path):
+    """
+    Move a received upload to its directory (call it under the database
+    write lock).  Returns True when the file was not stored yet.
+    """
+    directory = photo_dir(content_hash)
+    os.makedirs(directory, exist_ok=True)
+    if os.path.exists(os.path.join(directory, original)):
+        discard_upload(tmp_path)
+        return False
+    os.replace(tmp_path, os.path.join(directory, original))
+    return True
+
+
+def discard_upload(tmp_path):
+    if os.path.exists(tmp_path):
+        os.unlink(tmp_path)
+
+
+def remove_files(content_hash):
+    shutil.rmtree(photo_dir(content_hash), ignore_errors=True)
+
+
+def render_variants(content_hash, original):
+    """Write every resized variant of a photo; return the variant names"""
+    if Image is None:
+        return []
+    directory = photo_dir(content_hash)
+    written = []
+    with Image.open(os.path.join(directory, original)) as source:
+        # Decode at a reduced scale when the format allows it (JPEG)
+        source.draft('RGB', (max(SIZES.values()),) * 2)
+        image = ImageOps.exif_transpose(source).convert('RGB')
+    # Largest first: each variant is resized from the previous one
+    for name, size in sorted(SIZES.items(), key=lambda item: -item[1]):
+        image.thumbnail((size, size), Image.LANCZOS)
+        for extension, (fmt, options) in FORMATS.items():
+            variant = f'{name}.{extension}'
+            fd, tmp_path = tempfile.mkstemp(dir=directory)
+            with os.fdopen(fd, 'wb') as out:
+                image.save(out, fmt, **options)
+            os.replace(tmp_path, os.path.join(directory, variant))
+            written.append(variant)
+    return written
+
+
+def process_photo(photo_id):
+    """
+    Render the variants of an uploaded photo and publish them (the
+    ``photos.thumbnails`` job).  An image Pillow cannot decode marks the
+    photo ``failed``; any other error is raised, so the job is retried.
+    """
+    from app import db
+    from app.models.photo import PlacePhoto
+
+    photo = db.session.get(PlacePhoto, photo_id)
+    if photo is None or photo.status != 'pending':
+        return
+    original = photo.variants[0]
+    try:
+        variants = render_variants(photo.content_hash, original)
+    except UNDECODABLE:
+        current_app.logger.exception("Cannot decode photo %s", photo_id)
+        photo.status = 'failed'
+    else:
+        photo.variants = [original] + variants
+        photo.status = 'ready'
+        # New cover photo: let delta-sync clients see the place change
+        photo.place.updated_at = datetime.utcnow()
+    db.session.commit()
+
+
+def photo_urls(photo):
+    """``{'small': {'webp': url, 'jpg': url}, ..., 'original': {...}}``"""
+    urls = {}
+    for variant in photo.variants:
+        name, extension = variant.split('.')
+        urls.setdefault(name, {})[extension] = f'/api/v1/photos/{photo.content_hash}/{variant}'
+    return urls
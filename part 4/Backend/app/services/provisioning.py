@@ -0,0 +1,252 @@
+"""
+Bulk user provisioning: create thousands of users in one call.
+
+    results = provision_users([{'first_name': ..., 'last_name': ...,
+                                'email': ..., 'password': ...}, ...])
+
+``HBnBFacade.create_user`` checks the email with one query, hashes the
+password on the calling thread and commits, per user.  Here:
+
+* emails already taken are found with one ``IN`` query per 500 emails;
+* passwords are hashed by a process pool (bcrypt holds the GIL for the
+  whole hash), ``BULK_HASH_WORKERS`` processes, by default one per core,
+  started once per server worker with ``forkserver`` (never by forking
+  the multi-threaded worker) and stopped when it exits;
+* users are inserted ``BULK_USERS_BATCH_SIZE`` per transaction, as the
+  hashes arrive, so inserts overlap the hashing of the next users.
+
+Every item gets a result, in input order: ``{'index', 'email', 'id'}`` when
+created, ``{'index', 'email', 'error'}`` otherwise.  A batch failing on an
+email taken in the meantime is retried one user at a time, so only that
+user fails.
+"""
+import atexit
+import csv
+import hashlib
+import json
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from functools import partial
+import bcrypt
+from flask import current_app
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from app import db
+from app.models.user import User
+
+BATCH_SIZE = 500
+EMAIL_CHUNK_SIZE = 500
+REQUIRED_FIELDS = ('first_name', 'last_name', 'email', 'password')
+# Accepted spellings of is_admin in files and JSON strings
+TRUE_STRINGS = ('1', 'true', 'yes')
+FALSE_STRINGS = ('0', 'false', 'no', '')
+
+
+def _hash_password(password, rounds, prefix, long_passwords):
+    """Same hash as ``Bcrypt.generate_password_hash``, in a worker process"""
+    password = password.encode('utf-8')
+    if long_passwords:
+        password = hashlib.sha256(password).hexdigest().encode('utf-8')
+    salt = bcrypt.gensalt(rounds=rounds, prefix=prefix.encode('utf-8'))
+    return bcrypt.hashpw(password, salt).decode('utf-8')
+
+
+# Hashing pools of this process, by size: {workers: executor}
+_pools = {}
+_pools_pid = None
+_pools_lock = threading.Lock()
+
+
+def _mp_context():
+    # Never fork a (multi-threaded) server worker: a lock held by another
+    # thread at fork time would stay locked forever in the child
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+
+
+def hash_pool(workers):
+    """The ``workers``-process hashing pool of this process, started on first use"""
+    global _pools, _pools_pid
+    with _pools_lock:
+        if _pools_pid != os.getpid():
+            # Pools inherited from the parent of a fork belong to the parent
+            _pools, _pools_pid = {}, os.getpid()
+        pool = _pools.get(workers)
+        if pool is None:
+            pool = _pools[workers] = ProcessPoolExecutor(workers, mp_context=_mp_context())
+        return pool
+
+
+def shutdown_hash_pools():
+    """Stop the hashing processes of this process (worker exit)"""
+    global _pools
+    with _pools_lock:
+        pools, _pools = (_pools if _pools_pid == os.getpid() else {}), {}
+    for pool in pools.values():
+        pool.shutdown()
+
+
+atexit.register(shutdown_hash_pools)
+
+
+@contextmanager
+def password_hasher(workers=None):
+    """
+    Yield a ``map``-like function hashing passwords lazily, in order, in
+    ``workers`` processes (in this process when there is a single one)
+    """
+    config = current_app.config
+    hash_one = partial(_hash_password,
+                       rounds=config.get('BCRYPT_LOG_ROUNDS', 12),
+                       prefix=config.get('BCRYPT_HASH_PREFIX', '2b'),
+                       long_passwords=config.get('BCRYPT_HANDLE_LONG_PASSWORDS', False))
+    workers = workers or config.get('BULK_HASH_WORKERS') or os.cpu_count() or 1
+    if workers <= 1:
+        yield partial(map, hash_one)
+        return
+    yield partial(hash_pool(workers).map, hash_one, chunksize=8)
+
+
+def hash_passwords(passwords, workers=None):
+    """Return the bcrypt hashes of ``passwords``, in order"""
+    with password_hasher(workers) as hash_all:
+        return list(hash_all(passwords))
+
+
+def existing_emails(emails):
+    """Return the subset of ``emails`` already used by a user"""
+    emails = list(emails)
+    found = set()
+    for start in range(0, len(emails), EMAIL_CHUNK_SIZE):
+        chunk = emails[start:start + EMAIL_CHUNK_SIZE]
+        found.update(db.session.execute(
+            select(User.email).where(User.email.in_(chunk))).scalars())
+    return found
+
+
+def parse_is_admin(value):
+    """``is_admin`` of an input item: a boolean, or one of the accepted strings"""
+    if value is None or isinstance(value, bool):
+        return bool(value)
+    if isinstance(value, str):
+        if value.strip().lower() in TRUE_STRINGS:
+            return True
+        if value.strip().lower() in FALSE_STRINGS:
+            return False
+    raise ValueError(f"Invalid is_admin value: {value!r}")
+
+
+def check_admin_flags(items):
+    """
+    Raise ValueError on the first item whose ``is_admin`` is not a boolean
+    (``bool("false")`` would grant admin rights: refuse the whole request)
+    """
+    for index, item in enumerate(items):
+        if isinstance(item, dict):
+            try:
+                parse_is_admin(item.get('is_admin'))
+            except ValueError as e:
+                raise ValueError(f"users[{index}]: {e}")
+
+
+def _validate(item):
+    """Return the error of one input item, or None"""
+    if not isinstance(item, dict):
+        return "Expected an object"
+    missing = [name for name in REQUIRED_FIELDS
+               if not isinstance(item.get(name), str) or not item[name]]
+    if missing:
+        return f"Missing or invalid field(s): {', '.join(missing)}"
+    if not User.validate_email(item['email']):
+        return "Invalid email format"
+    return None
+
+
+def provision_users(items, batch_size=None, workers=None):
+    """
+    Create the users described by ``items``; return one result per item.
+    Raise ValueError, creating nobody, if an ``is_admin`` is not a boolean.
+    """
+    check_admin_flags(items)
+    batch_size = batch_size or current_app.config.get('BULK_USERS_BATCH_SIZE', BATCH_SIZE)
+    results = [None] * len(items)
+    valid = []
+    seen = set()
+    for index, item in enumerate(items):
+        email = item.get('email') if isinstance(item, dict) else None
+        error = _validate(item)
+        if error is None and email in seen:
+            error = "Duplicate email in the request"
+        if error is not None:
+            results[index] = {'index': index, 'email': email, 'error': error}
+            continue
+        seen.add(email)
+        valid.append(index)
+
+    taken = existing_emails(seen)
+    db.session.rollback()
+    pending = []
+    for index in valid:
+        if items[index]['email'] in taken:
+            results[index] = {'index': index, 'email': items[index]['email'],
+                              'error': "Email already exists"}
+        else:
+            pending.append(index)
+
+    with password_hasher(workers) as hash_all:
+        hashes = hash_all(items[index]['password'] for index in pending)
+        batch = []
+        for index, password_hash in zip(pending, hashes):
+            item = items[index]
+            batch.append((index, User(first_name=item['first_name'],
+                                      last_name=item['last_name'],
+                                      email=item['email'],
+                                      password=None,
+                                      password_hash=password_hash,
+                                      is_admin=parse_is_admin(item.get('is_admin')))))
+            if len(batch) >= batch_size:
+                _insert(batch, results)
+                batch = []
+        _insert(batch, results)
+    return results
+
+
+def _insert(batch, results):
+    """Insert ``[(index, user)]`` in one transaction, one by one on a conflict"""
+    if not batch:
+        return
+    # Read before the commit expires the users (one SELECT each otherwise)
+    created = [{'index': index, 'email': user.email, 'id': user.id} for index, user in batch]
+    try:
+        db.session.add_all(user for _, user in batch)
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        if len(batch) > 1:
+            for entry in batch:
+                _insert([entry], results)
+            return
+        results[created[0]['index']] = {'index': created[0]['index'],
+                                        'email': created[0]['email'],
+                                        'error': "Email already exists"}
+        return
+    for result in created:
+        results[result['index']] = result
+
+
+def read_users_file(path):
+    """
+    Load users from a CSV file (header ``first_name,last_name,email,password``
+    and optionally ``is_admin``), a JSON array or JSON lines
+    """
+    with open(path, newline='', encoding='utf-8') as f:
+        if path.lower().endswith('.csv'):
+            return [dict(row, is_admin=(row.get('is_admin') or '').strip().lower() in TRUE_STRINGS)
+                    for row in csv.DictReader(f)]
+        text = f.read()
+    if text.lstrip().startswith('['):
+        return json.loads(text)
+    return [json.loads(line) for line in text.splitlines() if line.strip()]
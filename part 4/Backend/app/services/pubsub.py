@@ -0,0 +1,213 @@
+"""
+Publish/subscribe for live updates (Server-Sent Events), across workers.
+
+Review writes are not published by the process that makes them: they are
+read back from the transactional outbox (``app.persistence.outbox``) by the
+tailer of every worker, so a client gets the changes made through any
+worker, ``OUTBOX_POLL_INTERVAL`` seconds later at most.
+
+Event ids are outbox positions, ``<database>-<outbox id>``, the same in
+every worker: a client which reconnects with ``Last-Event-ID``, to any
+worker, gets what it missed read again from the outbox.  When those rows
+may already be pruned (``OUTBOX_RETENTION_SECONDS``), the client is asked
+to resynchronise (``reset`` event) instead of silently missing events.
+
+Each subscriber has a bounded buffer (``max_bytes``).  A slow client whose
+buffer fills up is disconnected rather than making the process grow; the
+browser reconnects by itself and resumes from its last event id.
+"""
+import json
+import threading
+from collections import deque
+from flask import current_app
+from app.persistence import outbox
+
+SUBSCRIBER_MAX_BYTES = 256 * 1024
+REPLAY_LIMIT = 1000
+
+REVIEW_EVENT_TYPES = {outbox.ADD: 'review.created', outbox.UPDATE: 'review.updated',
+                      outbox.DELETE: 'review.deleted'}
+
+
+class Event:
+    """One published event, with its SSE encoding computed once"""
+    __slots__ = ('id', 'type', 'data', 'encoded')
+
+    def __init__(self, id, type, data):
+        self.id = id
+        self.type = type
+        self.data = data
+        head = f'id: {id}\n' if id is not None else ''
+        self.encoded = f'{head}event: {type}\ndata: {json.dumps(data)}\n\n'.encode('utf-8')
+
+
+# Sent when events may have been lost: the client must reload
+RESET = Event(None, 'reset', {})
+
+
+def event_position(event_id):
+    """``(database, outbox id)`` of an event id, or None if malformed"""
+    database, _, row_id = (event_id or '').partition('-')
+    if not (database.isdigit() and row_id.isdigit()):
+        return None
+    return int(database), int(row_id)
+
+
+class Subscription:
+    """Bounded event buffer of one connection"""
+
+    def __init__(self, broker, topic, max_bytes):
+        self.broker = broker
+        self.topic = topic
+        self.max_bytes = max_bytes
+        self.overflowed = False
+        # Position already delivered, per database: later copies are skipped
+        self.seen = {}
+        self._events = deque()
+        self._size = 0
+        self._condition = threading.Condition()
+
+    def skip_until(self, database, row_id):
+        """Drop the events up to ``row_id`` of ``database``, queued or to come"""
+        def replayed(event):
+            position = event_position(event.id)
+            return position is not None and position[0] == database and position[1] <= row_id
+
+        with self._condition:
+            self.seen[database] = max(self.seen.get(database, 0), row_id)
+            self._events = deque(event for event in self._events if not replayed(event))
+            self._size = sum(len(event.encoded) for event in self._events)
+
+    def push(self, event):
+        with self._condition:
+            if self.overflowed:
+                return
+            position = event_position(event.id)
+            if position is not None:
+                database, row_id = position
+                if row_id <= self.seen.get(database, 0):
+                    return
+                self.seen[database] = row_id
+            if self._size + len(event.encoded) > self.max_bytes:
+                self.overflowed = True
+            else:
+                self._events.append(event)
+                self._size += len(event.encoded)
+            self._condition.notify()
+
+    def get(self, timeout):
+        """Wait for the next event; None on timeout or overflow"""
+        with self._condition:
+            if not self._events and not self.overflowed:
+                self._condition.wait(timeout)
+            if not self._events:
+                return None
+            event = self._events.popleft()
+            self._size -= len(event.encoded)
+            return event
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+class Broker:
+    """Topics -> subscribers of this process"""
+
+    def __init__(self, max_bytes=SUBSCRIBER_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._subscribers = {}
+
+    def publish(self, topic, event):
+        with self._lock:
+            subscribers = list(self._subscribers.get(topic, ()))
+        for subscription in subscribers:
+            subscription.push(event)
+        return event
+
+    def publish_all(self, event):
+        """Push ``event`` to every subscriber of every topic"""
+        with self._lock:
+            subscribers = [subscription for topic in self._subscribers.values()
+                           for subscription in topic]
+        for subscription in subscribers:
+            subscription.push(event)
+
+    def subscribe(self, topic):
+        subscription = Subscription(self, topic, self.max_bytes)
+        with self._lock:
+            self._subscribers.setdefault(topic, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.topic)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[subscription.topic]
+
+    def subscriber_count(self, topic):
+        with self._lock:
+            return len(self._subscribers.get(topic, ()))
+
+
+broker = Broker()
+
+
+def place_reviews_topic(place_id):
+    return f'place:{place_id}:reviews'
+
+
+def review_events(changes):
+    """Stream events of outbox review changes, in order (needs an app context)"""
+    from app.repositories.review_repository import ReviewRepository
+    ids = list({change.object_id for change in changes if change.op != outbox.DELETE})
+    reviews = {review.id: review for review in ReviewRepository().read_rows(
+        ['id', 'text', 'rating', 'user_id', 'place_id'], ids)} if ids else {}
+    events = []
+    for change in changes:
+        data = {'id': change.object_id, 'place_id': change.parent_id}
+        if change.op != outbox.DELETE:
+            review = reviews.get(change.object_id)
+            if review is None:
+                # Deleted since: its own event follows
+                continue
+            data = {'id': review.id, 'text': review.text, 'rating': review.rating,
+                    'user_id': review.user_id, 'place_id': review.place_id}
+        events.append(Event(f'{change.database}-{change.id}', REVIEW_EVENT_TYPES[change.op], data))
+    return events
+
+
+def subscribe_place_reviews(place_id, last_event_id=None):
+    """
+    Subscribe to the review changes of a place.  Returns ``(subscription,
+    missed, complete)``: ``missed`` are the events after ``last_event_id``,
+    ``complete`` is False when some of them may have been lost.
+    """
+    subscription = broker.subscribe(place_reviews_topic(place_id))
+    if not last_event_id:
+        return subscription, [], True
+    position = event_position(last_event_id)
+    if position is None:
+        return subscription, [], False
+    database, row_id = position
+    # Subscribed first: what the tailer delivers meanwhile is either read
+    # here too (and dropped from the subscription) or newer
+    changes, complete = outbox.read_since(database, row_id, 'reviews', place_id,
+                                          current_app.config.get('SSE_REPLAY_LIMIT',
+                                                                 REPLAY_LIMIT))
+    subscription.skip_until(database, changes[-1].id if changes else row_id)
+    return subscription, review_events(changes), complete
+
+
+@outbox.register(own=True)
+def _publish_review_changes(changes):
+    """Feed the review streams from the outbox, the writes of this process included"""
+    if changes is None:
+        broker.publish_all(RESET)
+        return
+    changes = [change for change in changes if change.resource == 'reviews'
+               and broker.subscriber_count(place_reviews_topic(change.parent_id))]
+    for event in review_events(changes):
+        broker.publish(place_reviews_topic(event.data['place_id']), event)
@@ -0,0 +1,129 @@
+"""
+Request coalescing ("single flight") for hot reads.
+
+When a popular place is linked from outside, hundreds of identical
+``GET /places/<id>`` arrive at once and each used to run its own queries.
+``group.do(key, func)`` runs ``func`` once per key at a time: the first
+caller (the leader) runs it, the callers arriving while it runs wait and
+get the same result (or exception).  Nothing is kept once the leader is
+done, so results are never stale; the database load of a stampede is
+bounded by the number of distinct keys instead of the number of requests.
+
+Keys start with the name of the resource, e.g. ``('places.get', id,
+columns)``; per-resource counters (requests, executions, collapsed) are
+exposed by ``GET /api/v1/health``.  Results are shared between threads:
+they must not be ORM objects (see ``app.api.coalescing``).
+
+A follower only joins a call started after the last commit of the
+process: a client which has just written gets a read made after its
+write, never the result of a call that was already running.  Any commit
+starts new flights (``SingleFlight.invalidate``), since a key does not
+say which tables its result was read from.
+
+A follower waits at most ``SINGLE_FLIGHT_TIMEOUT`` seconds, then runs
+``func`` itself.
+"""
+import threading
+from flask import current_app, has_app_context
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+TIMEOUT = 30.0
+
+
+class _Call:
+    __slots__ = ('generation', 'event', 'result', 'error', 'waiters')
+
+    def __init__(self, generation):
+        self.generation = generation
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """Run one call per key at a time and share its outcome"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._stats = {}
+        # Commits seen: a call started before the last one is not joined
+        self._generation = 0
+
+    def _counters(self, name):
+        counters = self._stats.get(name)
+        if counters is None:
+            counters = self._stats[name] = {'requests': 0, 'executions': 0, 'collapsed': 0,
+                                            'max_waiters': 0}
+        return counters
+
+    def do(self, key, func, timeout=None):
+        """Return ``func()``, shared with the concurrent calls of the same key"""
+        with self._lock:
+            counters = self._counters(key[0])
+            counters['requests'] += 1
+            call = self._calls.get(key)
+            leader = call is None or call.generation != self._generation
+            if leader:
+                # A call older than the last commit finishes for its own callers
+                call = self._calls[key] = _Call(self._generation)
+                counters['executions'] += 1
+            else:
+                call.waiters += 1
+                counters['collapsed'] += 1
+                counters['max_waiters'] = max(counters['max_waiters'], call.waiters)
+        if not leader:
+            if timeout is None:
+                timeout = _setting('SINGLE_FLIGHT_TIMEOUT', TIMEOUT)
+            if call.event.wait(timeout):
+                if call.error is not None:
+                    raise call.error
+                return call.result
+            with self._lock:
+                counters['collapsed'] -= 1
+                counters['executions'] += 1
+            return func()
+        try:
+            call.result = func()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                if self._calls.get(key) is call:
+                    del self._calls[key]
+            call.event.set()
+        return call.result
+
+    def invalidate(self):
+        """Make the calls in flight unjoinable: later callers start new ones"""
+        with self._lock:
+            self._generation += 1
+
+    def stats(self):
+        """Counters per resource, with the calls in flight right now"""
+        with self._lock:
+            stats = {name: dict(counters, in_flight=0) for name, counters in self._stats.items()}
+            for key in self._calls:
+                stats[key[0]]['in_flight'] += 1
+        return stats
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+
+
+def _setting(name, default):
+    if has_app_context():
+        return current_app.config.get(name, default)
+    return default
+
+
+group = SingleFlight()
+
+
+@event.listens_for(Session, 'after_commit')
+def _start_new_flights(session):
+    group.invalidate()
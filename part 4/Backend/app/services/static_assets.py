@@ -0,0 +1,176 @@
+"""
+Fingerprinted, precompressed serving of the Frontend.
+
+``build_assets(source, dest)`` copies the Frontend into ``dest`` with every
+asset renamed after its content (``scripts.js`` -> ``scripts.3f9c1a2b7d.js``)
+and rewrites the references to them in the CSS, JS and HTML files.  Text
+files also get ``.gz`` (and ``.br`` when the ``brotli`` module is installed)
+variants, compressed once at build time with the highest settings.
+
+``create_static_app(dest)`` serves the result:
+
+- fingerprinted files with ``Cache-Control: immutable``, so a repeat visit
+  does not even revalidate the JS, CSS and images;
+- HTML pages (their names are linked to, so they keep them) with
+  ``no-cache`` and an ETag: a reload costs a 304;
+- the precompressed variant matching ``Accept-Encoding``.
+
+Run ``flask build-frontend`` at deploy time, or ``Frontend/run.py`` which
+builds at startup.
+"""
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import re
+import shutil
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - depends on the environment
+    brotli = None
+
+MANIFEST = 'manifest.json'
+HASH_LENGTH = 10
+IMMUTABLE = 'public, max-age=31536000, immutable'
+
+# Files kept under their name: they are the entry points of the site
+PAGE_EXTENSIONS = {'.html'}
+# Files whose references to other assets are rewritten, in build order
+REWRITTEN_EXTENSIONS = ['.css', '.js', '.html']
+COMPRESSED_EXTENSIONS = {'.html', '.css', '.js', '.svg', '.json', '.txt', '.xml'}
+MIN_COMPRESS_SIZE = 256
+# Not part of the site
+IGNORED = {'run.py', '__pycache__', 'dist'}
+
+# Encoding -> file suffix, by order of preference
+ENCODINGS = [('br', '.br'), ('gzip', '.gz')]
+
+
+def _fingerprint(name, content):
+    stem, extension = os.path.splitext(name)
+    digest = hashlib.sha256(content).hexdigest()[:HASH_LENGTH]
+    return f'{stem}.{digest}{extension}'
+
+
+def _reference_pattern(names):
+    """Match a quoted/url() reference to one of ``names`` (optionally ./ or / prefixed)"""
+    alternatives = '|'.join(re.escape(name) for name in sorted(names, key=len, reverse=True))
+    return re.compile(r'''(?P<before>["'`(=]\s*)(?P<prefix>\.?/)?(?P<name>%s)(?=[\s"'`)?#])'''
+                      % alternatives)
+
+
+def _rewrite(content, manifest):
+    if not manifest:
+        return content
+    pattern = _reference_pattern(manifest)
+
+    def replace(match):
+        return f"{match['before']}{match['prefix'] or ''}{manifest[match['name']]}"
+
+    return pattern.sub(replace, content.decode('utf-8')).encode('utf-8')
+
+
+def _compress(path, content):
+    if os.path.splitext(path)[1] not in COMPRESSED_EXTENSIONS or len(content) < MIN_COMPRESS_SIZE:
+        return
+    variants = [('.gz', gzip.compress(content, compresslevel=9, mtime=0))]
+    if brotli is not None:
+        variants.append(('.br', brotli.compress(content, quality=11)))
+    for suffix, data in variants:
+        if len(data) < len(content):
+            with open(path + suffix, 'wb') as out:
+                out.write(data)
+
+
+def _site_files(source):
+    for directory, subdirs, files in os.walk(source):
+        subdirs[:] = sorted(d for d in subdirs if d not in IGNORED and not d.startswith('.'))
+        for filename in sorted(files):
+            if filename in IGNORED or filename.startswith('.'):
+                continue
+            path = os.path.join(directory, filename)
+            yield os.path.relpath(path, source).replace(os.sep, '/')
+
+
+def build_assets(source, dest):
+    """
+    Build the fingerprinted site of ``source`` into ``dest`` (replaced).
+
+    Returns the manifest: original name -> fingerprinted name.
+    """
+    names = list(_site_files(source))
+    order = {extension: index + 1 for index, extension in enumerate(REWRITTEN_EXTENSIONS)}
+    # Plain assets first, then the files that reference them (CSS -> JS -> HTML)
+    names.sort(key=lambda name: order.get(os.path.splitext(name)[1], 0))
+
+    tmp_dest = dest.rstrip('/\\') + '.tmp'
+    shutil.rmtree(tmp_dest, ignore_errors=True)
+    manifest = {}
+    for name in names:
+        with open(os.path.join(source, name), 'rb') as f:
+            content = f.read()
+        extension = os.path.splitext(name)[1]
+        if extension in REWRITTEN_EXTENSIONS:
+            content = _rewrite(content, manifest)
+        if extension in PAGE_EXTENSIONS:
+            built = name
+        else:
+            built = manifest[name] = _fingerprint(name, content)
+        path = os.path.join(tmp_dest, built)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as out:
+            out.write(content)
+        _compress(path, content)
+
+    with open(os.path.join(tmp_dest, MANIFEST), 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    # Swap the directories so a running server never sees a half-built site
+    shutil.rmtree(dest, ignore_errors=True)
+    os.replace(tmp_dest, dest)
+    return manifest
+
+
+def load_manifest(dest):
+    with open(os.path.join(dest, MANIFEST)) as f:
+        return json.load(f)
+
+
+def create_static_app(dest):
+    """Flask app serving a directory built by ``build_assets``"""
+    from flask import Flask, abort, request, send_file
+    from werkzeug.security import safe_join
+
+    app = Flask(__name__, static_folder=None)
+    manifest = load_manifest(dest)
+    fingerprinted = set(manifest.values())
+
+    @app.route('/', defaults={'filename': 'index.html'})
+    @app.route('/<path:filename>')
+    def serve(filename):
+        # Old unversioned URLs still work, they just are not cached forever
+        built = manifest.get(filename, filename)
+        path = safe_join(dest, built)
+        if path is None or built == MANIFEST or not os.path.isfile(path):
+            abort(404)
+
+        mimetype = mimetypes.guess_type(built)[0] or 'application/octet-stream'
+        encoding = None
+        for candidate, suffix in ENCODINGS:
+            if request.accept_encodings[candidate] and os.path.isfile(path + suffix):
+                encoding, path = candidate, path + suffix
+                break
+
+        immutable = built in fingerprinted and built == filename
+        response = send_file(path, mimetype=mimetype, conditional=True,
+                             etag=True if not immutable else f'{built}-{encoding or "identity"}')
+        # send_file names the (possibly .gz) file: not wanted for inline assets
+        response.headers.pop('Content-Disposition', None)
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+        response.headers['Vary'] = 'Accept-Encoding'
+        response.headers['Cache-Control'] = IMMUTABLE if immutable else 'no-cache'
+        return response
+
+    return app
@@ -0,0 +1,23 @@
+"""Background tasks of the facade (see ``app.services.jobs``)"""
+from app.services.jobs import task
+
+
+@task('photos.remove_unused')
+def remove_unused_photos(hashes):
+    """Delete the files of photos no place refers to anymore"""
+    from app.services import facade
+    facade.remove_unused_photo_files(hashes)
+
+
+@task('photos.thumbnails')
+def render_thumbnails(photo_id):
+    """Write the resized variants of an uploaded photo"""
+    from app.services import photos
+    photos.process_photo(photo_id)
+
+
+@task('users.purge')
+def purge_user(user_id):
+    """Delete a user with their places and reviews"""
+    from app.services import facade
+    facade.delete_user(user_id)
@@ -0,0 +1,54 @@
+"""
+Startup timing, printed in the format of ``python -X importtime``.
+
+Set ``HBNB_STARTUP_TIMING=1`` to get, on stderr, the self and cumulative
+time (in microseconds) of every startup phase, nested phases indented:
+
+    startup: self [us] | cumulative | phase
+    startup:      1843 |       1843 |   namespace users
+    ...
+"""
+import os
+import sys
+import time
+from contextlib import contextmanager
+
+
+class StartupTimer:
+    """Measure nested startup phases"""
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.records = []
+        self._children = []
+
+    @contextmanager
+    def phase(self, name):
+        if not self.enabled:
+            yield
+            return
+        depth = len(self._children)
+        self._children.append(0.0)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            total = time.perf_counter() - start
+            children = self._children.pop()
+            if self._children:
+                self._children[-1] += total
+            self.records.append((depth, name, total - children, total))
+
+    def report(self, stream=None):
+        """Print the phases in completion order, like -X importtime"""
+        if not self.enabled or not self.records:
+            return
+        stream = stream or sys.stderr
+        print("startup: self [us] | cumulative | phase", file=stream)
+        for depth, name, own, total in self.records:
+            print(f"startup: {own * 1e6:9.0f} | {total * 1e6:10.0f} | {'  ' * (depth + 1)}{name}",
+                  file=stream)
+        self.records = []
+
+
+timer = StartupTimer(enabled=bool(os.environ.get('HBNB_STARTUP_TIMING')))
@@ -0,0 +1,117 @@
+import unittest
+from app import create_app, db
+from app.persistence.amenity_index import Bitmap, get_amenity_index
+from app.services.facade import HBnBFacade
+
+
+class TestBitmap(unittest.TestCase):
+    """Test cases for the compressed bitset"""
+
+    def test_add_discard_contains(self):
+        """Test basic membership across chunks"""
+        bitmap = Bitmap([0, 5, 70000, 1 << 20])
+        self.assertIn(70000, bitmap)
+        self.assertNotIn(6, bitmap)
+        bitmap.discard(70000)
+        self.assertNotIn(70000, bitmap)
+        self.assertEqual(len(bitmap), 3)
+        self.assertEqual(list(bitmap), [0, 5, 1 << 20])
+
+    def test_set_operations(self):
+        """Test intersection and union"""
+        a = Bitmap([1, 2, 3, 100000])
+        b = Bitmap([2, 3, 4, 200000])
+        self.assertEqual(list(a & b), [2, 3])
+        self.assertEqual(list(a | b), [1, 2, 3, 4, 100000, 200000])
+        self.assertFalse(Bitmap([1]) & Bitmap([70000]))
+
+
+class TestAmenityIndex(unittest.TestCase):
+    """Test cases for the amenity bitmap index"""
+
+    def setUp(self):
+        """Set up test fixtures before each test method"""
+        self.app = create_app('testing')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        self.client = self.app.test_client()
+
+        self.facade = HBnBFacade()
+        self.user = self.facade.create_user({
+            'first_name': 'John',
+            'last_name': 'Doe',
+            'email': 'john.doe@example.com',
+            'password': 'securepassword123'
+        })
+        self.wifi = self.facade.create_amenity({'name': 'WiFi'})
+        self.pool = self.facade.create_amenity({'name': 'Pool'})
+        self.parking = self.facade.create_amenity({'name': 'Parking'})
+        self.flat = self._create_place('Flat', [self.wifi.id])
+        self.villa = self._create_place('Villa', [self.wifi.id, self.pool.id, self.parking.id])
+
+    def tearDown(self):
+        """Tear down test fixtures after each test method"""
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def _create_place(self, title, amenity_ids):
+        return self.facade.create_place({
+            'title': title,
+            'description': 'Nice',
+            'price': 80.0,
+            'latitude': 45.0,
+            'longitude': 4.0,
+            'owner_id': self.user.id,
+            'amenities': amenity_ids,
+        })
+
+    def test_build_from_table(self):
+        """Test that the index is built from place_amenity"""
+        index = get_amenity_index()
+        self.assertEqual(sorted(index.place_ids([self.wifi.id])), sorted([self.flat.id, self.villa.id]))
+        self.assertEqual(index.place_ids([self.wifi.id, self.pool.id]), [self.villa.id])
+        self.assertEqual(index.counts()[self.parking.id], 1)
+
+    def test_any_match(self):
+        """Test OR filters"""
+        index = get_amenity_index()
+        self.assertEqual(len(index.place_ids([self.pool.id, self.wifi.id], 'any')), 2)
+        self.assertEqual(index.place_ids(['unknown', self.pool.id], 'any'), [self.villa.id])
+        self.assertEqual(index.place_ids(['unknown', self.pool.id]), [])
+
+    def test_maintained_on_commit(self):
+        """Test that add/remove_amenity and deletions update the index"""
+        index = get_amenity_index()
+        self.flat.add_amenity(self.pool)
+        self.assertEqual(index.place_ids([self.pool.id]), [self.villa.id])
+        db.session.commit()
+        self.assertEqual(len(index.place_ids([self.pool.id])), 2)
+
+        self.villa.remove_amenity(self.parking)
+        db.session.commit()
+        self.assertEqual(index.place_ids([self.parking.id]), [])
+
+        self.facade.delete_place(self.flat.id)
+        self.assertEqual(index.place_ids([self.wifi.id]), [self.villa.id])
+
+    def test_rollback_is_ignored(self):
+        """Test that rolled back changes never reach the index"""
+        index = get_amenity_index()
+        self.flat.add_amenity(self.parking)
+        db.session.rollback()
+        self.assertEqual(index.place_ids([self.parking.id]), [self.villa.id])
+
+    def test_places_endpoint_filter(self):
+        """Test GET /api/v1/places?amenities="""
+        response = self.client.get(f'/api/v1/places/?amenities={self.wifi.id},{self.pool.id}')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([p['id'] for p in response.get_json()], [self.villa.id])
+
+        response = self.client.get(f'/api/v1/places/search?q=flat&amenities={self.pool.id}')
+        self.assertEqual(response.get_json()['results'], [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,206 @@
+import threading
+import time
+import unittest
+from datetime import date, timedelta
+from unittest import mock
+from sqlalchemy import func, select
+from app import create_app, db
+from app.models.booking import Booking
+from app.persistence import availability
+from app.persistence.availability import AvailabilityIndex, BookingConflict, Calendar
+from app.repositories.booking_repository import BookingRepository
+from app.services.facade import HBnBFacade
+
+
+def day(n):
+    return date(2030, 1, 1) + timedelta(days=n)
+
+
+class TestCalendar(unittest.TestCase):
+    """Test cases for the sorted interval list of one place"""
+
+    def test_is_free(self):
+        """Test overlaps with the bookings around a stay"""
+        calendar = Calendar()
+        calendar.add('a', day(10), day(15))
+        calendar.add('b', day(20), day(22))
+        self.assertTrue(calendar.is_free(day(0), day(10)))    # leaves on arrival day
+        self.assertTrue(calendar.is_free(day(15), day(20)))   # between the two
+        self.assertTrue(calendar.is_free(day(22), day(30)))
+        self.assertFalse(calendar.is_free(day(9), day(11)))
+        self.assertFalse(calendar.is_free(day(14), day(16)))
+        self.assertFalse(calendar.is_free(day(0), day(40)))   # covers both
+        self.assertFalse(calendar.is_free(day(21), day(22)))
+
+        calendar.remove('a', day(10))
+        self.assertTrue(calendar.is_free(day(9), day(16)))
+        self.assertEqual(len(calendar.entries), 1)
+
+    def test_index(self):
+        """Test the per-place lookups of the index"""
+        index = AvailabilityIndex()
+        index.loaded = True
+        index.add('b1', 'p1', day(0), day(5))
+        index.add('b2', 'p2', day(3), day(4))
+        self.assertEqual(index.free_place_ids(['p1', 'p2', 'p3'], day(4), day(6)),
+                         ['p2', 'p3'])
+        self.assertEqual(index.busy_place_ids(day(3), day(4)), {'p1', 'p2'})
+        index.remove('b1')
+        self.assertTrue(index.is_free('p1', day(0), day(5)))
+        index.remove_place('p2')
+        self.assertEqual(index.busy_place_ids(day(0), day(10)), set())
+
+
+class TestAvailability(unittest.TestCase):
+    """Test cases for bookings and date-range search"""
+
+    def setUp(self):
+        """Set up test fixtures before each test method"""
+        self.app = create_app('testing')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        self.client = self.app.test_client()
+
+        self.facade = HBnBFacade()
+        self.owner = self._create_user('owner@example.com')
+        self.guest = self._create_user('guest@example.com')
+        self.places = [self.facade.create_place({
+            'title': f'Flat {i}',
+            'description': 'Nice',
+            'price': 80.0,
+            'latitude': 45.0,
+            'longitude': 4.0,
+            'owner_id': self.owner.id,
+        }) for i in range(3)]
+
+    def tearDown(self):
+        """Tear down test fixtures after each test method"""
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def _create_user(self, email):
+        return self.facade.create_user({
+            'first_name': 'John',
+            'last_name': 'Doe',
+            'email': email,
+            'password': 'securepassword123'
+        })
+
+    def _book(self, place, check_in, check_out, kind='booked'):
+        return self.facade.book_place(place.id, {
+            'check_in': check_in, 'check_out': check_out, 'kind': kind,
+            'user_id': self.guest.id if kind == 'booked' else None})
+
+    def _listed_ids(self, query):
+        response = self.client.get('/api/v1/places/' + query)
+        self.assertEqual(response.status_code, 200)
+        return {place['id'] for place in response.get_json()}
+
+    def test_book_place_refuses_overlaps(self):
+        """Test that overlapping bookings are refused and adjacent ones accepted"""
+        self._book(self.places[0], day(10), day(15))
+        with self.assertRaises(BookingConflict):
+            self._book(self.places[0], day(12), day(20))
+        with self.assertRaises(BookingConflict):
+            self._book(self.places[0], day(5), day(11), kind='blocked')
+        self._book(self.places[0], day(15), day(18))
+        self._book(self.places[1], day(12), day(20))
+        with self.assertRaises(ValueError):
+            self._book(self.places[0], day(30), day(30))
+        count = db.session.execute(select(func.count()).select_from(Booking)).scalar()
+        self.assertEqual(count, 3)
+        self.assertEqual([b.check_in for b in self.facade.get_place_calendar(self.places[0].id)],
+                         [day(10), day(15)])
+
+    def test_list_places_by_dates(self):
+        """Test the check_in/check_out filter of GET /places/"""
+        index = availability.get_availability_index()
+        booking = self._book(self.places[0], day(10), day(15))
+        self._book(self.places[1], day(0), day(11), kind='blocked')
+        all_ids = {place.id for place in self.places}
+
+        self.assertEqual(self._listed_ids(''), all_ids)
+        query = f'?check_in={day(10).isoformat()}&check_out={day(12).isoformat()}'
+        self.assertEqual(self._listed_ids(query), {self.places[2].id})
+        query = f'?check_in={day(15).isoformat()}&check_out={day(16).isoformat()}'
+        self.assertEqual(self._listed_ids(query), all_ids)
+        self.assertFalse(index.is_free(self.places[0].id, day(14), day(15)))
+
+        self.facade.cancel_booking(booking.id)
+        self.assertTrue(index.is_free(self.places[0].id, day(14), day(15)))
+
+        response = self.client.get('/api/v1/places/?check_in=2030-01-05')
+        self.assertEqual(response.status_code, 400)
+        response = self.client.get('/api/v1/places/?check_in=2030-01-05&check_out=nope')
+        self.assertEqual(response.status_code, 400)
+
+    def test_calendar_endpoint(self):
+        """Test the public calendar, without the guests"""
+        self._book(self.places[0], day(20), day(25))
+        self._book(self.places[0], day(1), day(3), kind='blocked')
+        response = self.client.get(f'/api/v1/places/{self.places[0].id}/calendar')
+        self.assertEqual(response.status_code, 200)
+        data = response.get_json()
+        self.assertEqual([(b['check_in'], b['kind']) for b in data],
+                         [(day(1).isoformat(), 'blocked'), (day(20).isoformat(), 'booked')])
+        self.assertNotIn('user_id', data[0])
+
+        response = self.client.get(
+            f'/api/v1/places/{self.places[0].id}/calendar?from={day(3).isoformat()}')
+        self.assertEqual(len(response.get_json()), 1)
+        response = self.client.get('/api/v1/places/nope/calendar')
+        self.assertEqual(response.status_code, 404)
+        response = self.client.post(f'/api/v1/places/{self.places[0].id}/bookings',
+                                    json={'check_in': '2030-02-01', 'check_out': '2030-02-03'})
+        self.assertEqual(response.status_code, 401)
+
+    def test_purges_delete_bookings(self):
+        """Test that deleting a place or a guest deletes their bookings"""
+        self._book(self.places[0], day(1), day(2))
+        self._book(self.places[1], day(1), day(2))
+        index = availability.get_availability_index()
+        self.facade.delete_place(self.places[0].id)
+        self.assertTrue(index.is_free(self.places[0].id, day(1), day(2)))
+        self.facade.delete_user(self.guest.id)
+        self.assertTrue(index.is_free(self.places[1].id, day(1), day(2)))
+        count = db.session.execute(select(func.count()).select_from(Booking)).scalar()
+        self.assertEqual(count, 0)
+
+    def test_concurrent_bookings(self):
+        """Test that two sessions booking the same dates at once get one booking"""
+        place_id, guest_id = self.places[0].id, self.guest.id
+        find_conflict = BookingRepository.find_conflict
+        barrier = threading.Barrier(2)
+        results = []
+
+        def slow_find_conflict(repo, *args):
+            # Leave the other session time to check the dates too
+            conflict = find_conflict(repo, *args)
+            time.sleep(0.2)
+            return conflict
+
+        def book():
+            # One application context, hence one session and connection, per thread
+            with self.app.app_context():
+                booking = Booking(place_id=place_id, check_in=day(10), check_out=day(15),
+                                  kind='booked', user_id=guest_id)
+                barrier.wait()
+                results.append(BookingRepository().add_if_free(booking))
+                db.session.remove()
+
+        with mock.patch.object(BookingRepository, 'find_conflict', slow_find_conflict):
+            threads = [threading.Thread(target=book) for _ in range(2)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(len(results), 2)
+        self.assertEqual(sum(result is not None for result in results), 1)
+        count = db.session.execute(select(func.count()).select_from(Booking)).scalar()
+        self.assertEqual(count, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
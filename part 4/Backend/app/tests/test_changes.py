@@ -0,0 +1,113 @@
+import unittest
+from datetime import datetime, timedelta
+from app import create_app, db
+from app.persistence import changes
+from app.services.facade import HBnBFacade
+
+
+class TestChanges(unittest.TestCase):
+    """Test cases for the delta-sync endpoints"""
+
+    def setUp(self):
+        """Set up test fixtures before each test method"""
+        self.app = create_app('testing')
+        self.app.config['CHANGES_SETTLE_SECONDS'] = 0
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        self.client = self.app.test_client()
+
+        self.facade = HBnBFacade()
+        self.user = self.facade.create_user({
+            'first_name': 'John',
+            'last_name': 'Doe',
+            'email': 'john.doe@example.com',
+            'password': 'securepassword123'
+        })
+        self.wifi = self.facade.create_amenity({'name': 'WiFi'})
+        self.flat = self._create_place('Flat')
+        self.villa = self._create_place('Villa')
+
+    def tearDown(self):
+        """Tear down test fixtures after each test method"""
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def _create_place(self, title):
+        return self.facade.create_place({
+            'title': title,
+            'description': 'Nice',
+            'price': 80.0,
+            'latitude': 45.0,
+            'longitude': 4.0,
+            'owner_id': self.user.id,
+        })
+
+    def _changes(self, resource, since=None, **params):
+        if since:
+            params['since'] = since
+        response = self.client.get(f'/api/v1/{resource}/changes', query_string=params)
+        self.assertEqual(response.status_code, 200)
+        return response.get_json()
+
+    def test_full_then_incremental_sync(self):
+        """Test that a cursor only returns what changed after it"""
+        first = self._changes('places')
+        self.assertEqual({p['id'] for p in first['upserts']}, {self.flat.id, self.villa.id})
+        self.assertEqual(first['deleted'], [])
+        self.assertFalse(first['has_more'])
+
+        quiet = self._changes('places', first['cursor'])
+        self.assertEqual((quiet['upserts'], quiet['deleted']), ([], []))
+
+        self.facade.update_place(self.flat.id, {'price': 95.0})
+        self.facade.delete_place(self.villa.id)
+        delta = self._changes('places', quiet['cursor'])
+        self.assertEqual([p['id'] for p in delta['upserts']], [self.flat.id])
+        self.assertEqual(delta['upserts'][0]['price'], 95.0)
+        self.assertEqual(delta['deleted'], [self.villa.id])
+
+    def test_amenity_change_bumps_place(self):
+        """Test that editing the amenities of a place reports the place"""
+        cursor = self._changes('places')['cursor']
+        self.facade.update_place(self.flat.id, {'amenities': [self.wifi.id]})
+        delta = self._changes('places', cursor)
+        self.assertEqual(delta['upserts'][0]['amenities'], [self.wifi.id])
+
+    def test_pagination(self):
+        """Test keyset paging with has_more"""
+        page = self._changes('places', limit=1, fields='id')
+        self.assertEqual(len(page['upserts']), 1)
+        self.assertTrue(page['has_more'])
+        self.assertEqual(set(page['upserts'][0]), {'id'})
+        rest = self._changes('places', page['cursor'], limit=1)
+        self.assertEqual(len(rest['upserts']), 1)
+        self.assertNotEqual(rest['upserts'][0]['id'], page['upserts'][0]['id'])
+        self.assertFalse(self._changes('places', rest['cursor'])['upserts'])
+
+    def test_cascade_deletes_leave_tombstones(self):
+        """Test that rows deleted by an ORM cascade are reported too"""
+        review = self.facade.create_review({
+            'text': 'Great', 'rating': 5, 'user_id': self.user.id, 'place_id': self.flat.id})
+        review_id = review.id
+        cursor = self._changes('reviews')['cursor']
+        self.facade.delete_place(self.flat.id)
+        self.assertEqual(self._changes('reviews', cursor)['deleted'], [review_id])
+
+    def test_invalid_and_expired_cursors(self):
+        """Test 400 for garbage and 410 past the tombstone retention"""
+        response = self.client.get('/api/v1/places/changes?since=@@@')
+        self.assertEqual(response.status_code, 400)
+        old = changes.encode_cursor(datetime.utcnow() - timedelta(days=365), '')
+        response = self.client.get(f'/api/v1/places/changes?since={old}')
+        self.assertEqual(response.status_code, 410)
+
+    def test_settle_window(self):
+        """Test that very recent writes wait for the next call"""
+        self.app.config['CHANGES_SETTLE_SECONDS'] = 3600
+        self.assertEqual(self._changes('amenities')['upserts'], [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,186 @@
+import unittest
+from datetime import date
+from flask_jwt_extended import create_access_token
+from sqlalchemy import update
+from app import create_app, db
+from app.models.review import Review
+from app.persistence import facets
+from app.persistence.facets import FacetIndex, histogram, price_edges
+from app.services.facade import HBnBFacade
+
+
+class TestFacetHelpers(unittest.TestCase):
+    """Test cases for the histogram helpers and the index bookkeeping"""
+
+    def test_histogram(self):
+        """Test bucket counts and quantile edges"""
+        prices = [10.0, 20.0, 50.0, 50.0, 99.0, 250.0]
+        self.assertEqual(histogram(prices, [50, 100]), [2, 3, 1])
+        self.assertEqual(histogram([], [50]), [0, 0])
+        self.assertEqual(price_edges([float(p) for p in range(1, 101)], 4), [26.0, 51.0, 76.0])
+        self.assertEqual(price_edges([]), [])
+
+    def test_incremental_updates(self):
+        """Test that price and rating changes move places between buckets"""
+        index = FacetIndex()
+        index.loaded = True
+        index.set_price('a', 40.0)
+        index.set_price('b', 120.0)
+        index.add_rating('a', 5)
+        index.add_rating('a', 3)
+        result = index.facets(edges=[100.0])
+        self.assertEqual([b['count'] for b in result['price']['buckets']], [1, 1])
+        self.assertEqual(result['ratings'][1], {'rating': 4, 'count': 1})
+        self.assertEqual(result['unrated'], 1)
+
+        index.set_price('a', 150.0)
+        index.change_rating('a', 3, 5)
+        index.remove_rating('a', 5)
+        result = index.facets(edges=[100.0])
+        self.assertEqual([b['count'] for b in result['price']['buckets']], [0, 2])
+        self.assertEqual((result['price']['min'], result['price']['max']), (120.0, 150.0))
+        self.assertEqual(result['ratings'][0], {'rating': 5, 'count': 1})
+
+        result = index.facets(exclude_ids={'b'}, edges=[100.0])
+        self.assertEqual(result['total'], 1)
+        self.assertEqual((result['price']['min'], result['price']['max']), (150.0, 150.0))
+        index.remove_place('a')
+        self.assertEqual(index.facets()['unrated'], 1)
+
+
+class TestPlaceFacets(unittest.TestCase):
+    """Test cases for GET /api/v1/places/facets"""
+
+    def setUp(self):
+        """Set up test fixtures before each test method"""
+        self.app = create_app('testing')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        self.client = self.app.test_client()
+
+        self.facade = HBnBFacade()
+        self.owner = self._create_user('owner@example.com')
+        self.guest = self._create_user('guest@example.com')
+        self.wifi = self.facade.create_amenity({'name': 'WiFi'})
+        self.pool = self.facade.create_amenity({'name': 'Pool'})
+        self.places = [
+            self._create_place(30.0, [self.wifi.id]),
+            self._create_place(80.0, [self.wifi.id, self.pool.id]),
+            self._create_place(200.0, []),
+        ]
+
+    def tearDown(self):
+        """Tear down test fixtures after each test method"""
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def _create_user(self, email):
+        return self.facade.create_user({
+            'first_name': 'John',
+            'last_name': 'Doe',
+            'email': email,
+            'password': 'securepassword123'
+        })
+
+    def _create_place(self, price, amenities):
+        return self.facade.create_place({
+            'title': 'Flat',
+            'description': 'Nice',
+            'price': price,
+            'latitude': 45.0,
+            'longitude': 4.0,
+            'owner_id': self.owner.id,
+            'amenities': amenities,
+        })
+
+    def _facets(self, query=''):
+        response = self.client.get('/api/v1/places/facets?price_buckets=50,100' + query)
+        self.assertEqual(response.status_code, 200)
+        return response.get_json()
+
+    def _price_counts(self, data):
+        return [bucket['count'] for bucket in data['price']['buckets']]
+
+    def test_catalog_facets(self):
+        """Test the facets of every place, kept up to date by writes"""
+        index = facets.get_facet_index()
+        data = self._facets()
+        self.assertEqual(data['total'], 3)
+        self.assertEqual(self._price_counts(data), [1, 1, 1])
+        self.assertEqual(data['price']['buckets'][-1], {'from': 100.0, 'to': None, 'count': 1})
+        self.assertEqual(data['amenities'], [{'id': self.wifi.id, 'count': 2},
+                                             {'id': self.pool.id, 'count': 1}])
+        self.assertEqual(data['unrated'], 3)
+
+        review = self.facade.create_review({'text': 'Great', 'rating': 4,
+                                            'user_id': self.guest.id,
+                                            'place_id': self.places[0].id})
+        self.facade.update_place(self.places[2].id, {'price': 60.0})
+        data = self._facets()
+        self.assertEqual(self._price_counts(data), [1, 2, 0])
+        self.assertEqual({r['rating']: r['count'] for r in data['ratings']}[4], 1)
+        self.assertEqual(data['unrated'], 2)
+
+        self.facade.update_review(review.id, {'rating': 2})
+        self.assertEqual({r['rating']: r['count'] for r in index.facets()['ratings']}[2], 1)
+        self.facade.delete_review(review.id)
+        self.facade.delete_place(self.places[1].id)
+        data = self._facets()
+        self.assertEqual(data['total'], 2)
+        self.assertEqual(data['unrated'], 2)
+        self.assertEqual(data['amenities'], [{'id': self.wifi.id, 'count': 1}])
+
+    def test_filtered_facets(self):
+        """Test that the facets follow the amenity and date filters"""
+        data = self._facets(f'&amenities={self.wifi.id}')
+        self.assertEqual(data['total'], 2)
+        self.assertEqual(self._price_counts(data), [1, 1, 0])
+        self.assertEqual(data['amenities'], [{'id': self.wifi.id, 'count': 2},
+                                             {'id': self.pool.id, 'count': 1}])
+
+        self.facade.book_place(self.places[1].id, {
+            'check_in': date(2030, 5, 1), 'check_out': date(2030, 5, 4),
+            'user_id': self.guest.id})
+        dates = '&check_in=2030-05-02&check_out=2030-05-03'
+        data = self._facets(dates)
+        self.assertEqual(data['total'], 2)
+        self.assertEqual(self._price_counts(data), [1, 0, 1])
+        self.assertEqual(data['amenities'], [{'id': self.wifi.id, 'count': 1}])
+        data = self._facets(f'&amenities={self.pool.id}' + dates)
+        self.assertEqual(data['total'], 0)
+        self.assertIsNone(data['price']['min'])
+
+        default = self.client.get('/api/v1/places/facets').get_json()
+        self.assertEqual(sum(self._price_counts(default)), 3)
+        response = self.client.get('/api/v1/places/facets?price_buckets=cheap')
+        self.assertEqual(response.status_code, 400)
+
+    def test_out_of_range_ratings(self):
+        """Test that PUT refuses a bad rating and the index survives rows out of range"""
+        # Identities are dicts: let the test decode its own tokens
+        self.app.config['JWT_VERIFY_SUB'] = False
+        index = facets.get_facet_index()
+        review = self.facade.create_review({'text': 'Great', 'rating': 4,
+                                            'user_id': self.guest.id,
+                                            'place_id': self.places[0].id})
+        token = create_access_token(identity={'id': self.guest.id, 'is_admin': False})
+        response = self.client.put(f'/api/v1/reviews/{review.id}',
+                                   json={'text': 'Great', 'rating': 9},
+                                   headers={'Authorization': f'Bearer {token}'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('Rating must be', response.get_json()['message'])
+        self.assertEqual({r['rating']: r['count'] for r in self._facets()['ratings']}[4], 1)
+
+        # Written before ratings were validated on update
+        db.session.execute(update(Review).where(Review.id == review.id).values(rating=9))
+        db.session.commit()
+        index.load()
+        self.assertEqual({r['rating']: r['count'] for r in self._facets()['ratings']}[5], 1)
+        self.facade.delete_review(review.id)
+        self.assertEqual(self._facets()['unrated'], 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,45 @@
+import unittest
+from app import create_app, db
+from app.services import health
+
+
+class TestHealth(unittest.TestCase):
+    """Test cases for the per-worker health endpoint"""
+
+    def setUp(self):
+        """Set up test fixtures before each test method"""
+        self.app = create_app('testing')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        self.client = self.app.test_client()
+        health.reset_worker_stats(max_requests=100)
+
+    def tearDown(self):
+        """Tear down test fixtures after each test method"""
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def test_health_endpoint(self):
+        """Test that the endpoint reports the database and worker counters"""
+        self.client.get('/api/v1/places/')
+        response = self.client.get('/api/v1/health')
+        self.assertEqual(response.status_code, 200)
+        data = response.get_json()
+        self.assertEqual(data['status'], 'ok')
+        self.assertEqual(data['database'], 'ok')
+        self.assertEqual(data['worker']['requests'], 1)
+        self.assertEqual(data['worker']['max_requests'], 100)
+
+    def test_server_errors_are_counted(self):
+        """Test that 5xx answers are counted as errors"""
+        health.record_request(200)
+        health.record_request(503)
+        stats = health.worker_stats()
+        self.assertEqual(stats['requests'], 2)
+        self.assertEqual(stats['errors'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,122 @@
+import threading
+import unittest
+from datetime import datetime, timedelta
+from flask_jwt_extended import create_access_token
+from sqlalchemy import func, select, update
+from app import create_app, db
+from app.models.amenity import Amenity
+from app.persistence import idempotency
+from app.services.facade import HBnBFacade
+
+
+class TestIdempotencyKeys(unittest.TestCase):
+    """Test cases for the Idempotency-Key header of the write endpoints"""
+
+    def setUp(self):
+        """Set up test fixtures before each test method"""
+        self.app = create_app('testing')
+        # Identities are dicts: let the tests decode their own tokens
+        self.app.config['JWT_VERIFY_SUB'] = False
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        self.client = self.app.test_client()
+        self.facade = HBnBFacade()
+        self.admin = self.facade.create_user({
+            'first_name': 'Admin',
+            'last_name': 'Doe',
+            'email': 'admin@example.com',
+            'password': 'securepassword123',
+            'is_admin': True,
+        })
+        self.token = create_access_token(identity={'id': self.admin.id, 'is_admin': True})
+
+    def tearDown(self):
+        """Tear down test fixtures after each test method"""
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def _post_amenity(self, name, key, token=None):
+        headers = {'Authorization': f'Bearer {token or self.token}'}
+        if key is not None:
+            headers['Idempotency-Key'] = key
+        return self.client.post('/api/v1/amenities/', json={'name': name}, headers=headers)
+
+    def _amenity_count(self):
+        return db.session.execute(select(func.count()).select_from(Amenity)).scalar()
+
+    def test_retry_replays_the_stored_response(self):
+        """Test that a retry gets the first response without a second write"""
+        first = self._post_amenity('Spa', 'key-1')
+        self.assertEqual(first.status_code, 201)
+        retry = self._post_amenity('Spa', 'key-1')
+        self.assertEqual(retry.status_code, 201)
+        self.assertEqual(retry.headers['Idempotent-Replayed'], 'true')
+        self.assertEqual(retry.get_json(), first.get_json())
+        self.assertEqual(self._amenity_count(), 1)
+
+        # Other key, or no key: a new request
+        self.assertEqual(self._post_amenity('Sauna', 'key-2').status_code, 201)
+        self.assertEqual(self._post_amenity('Gym', None).status_code, 201)
+        self.assertEqual(self._amenity_count(), 3)
+
+    def test_keys_are_per_user_and_per_request(self):
+        """Test key reuse with another body, and the same key for another user"""
+        self._post_amenity('Spa', 'key-1')
+        self.assertEqual(self._post_amenity('Sauna', 'key-1').status_code, 422)
+        other = create_access_token(identity={'id': 'other-admin', 'is_admin': True})
+        response = self._post_amenity('Sauna', 'key-1', other)
+        self.assertEqual(response.status_code, 201)
+        self.assertNotIn('Idempotent-Replayed', response.headers)
+        self.assertEqual(self._amenity_count(), 2)
+        self.assertEqual(self._post_amenity('Spa', 'x' * 300).status_code, 400)
+
+    def test_failed_requests_release_their_key(self):
+        """Test that an error response is not stored"""
+        response = self.client.put('/api/v1/amenities/nope', json={'name': 'Spa'}, headers={
+            'Authorization': f'Bearer {self.token}', 'Idempotency-Key': 'key-1'})
+        self.assertEqual(response.status_code, 404)
+        stored = db.session.execute(select(func.count()).select_from(
+            idempotency.idempotency_keys)).scalar()
+        self.assertEqual(stored, 0)
+
+    def test_duplicate_waits_for_the_original(self):
+        """Test that a duplicate of an in-flight request gets its response"""
+        fingerprint = 'f' * 64
+        self.assertIsNone(idempotency.begin('u1', 'key', fingerprint))
+        self.assertIs(idempotency.begin('u1', 'key', fingerprint), idempotency.IN_FLIGHT)
+        results = []
+
+        def duplicate():
+            with self.app.app_context():
+                results.append(idempotency.wait('u1', 'key', fingerprint, timeout=5))
+
+        thread = threading.Thread(target=duplicate)
+        thread.start()
+        idempotency.finish('u1', 'key', idempotency.StoredResponse(201, b'{}', 'application/json'))
+        thread.join()
+        self.assertEqual(results, [idempotency.StoredResponse(201, b'{}', 'application/json')])
+
+        self.assertIsNone(idempotency.begin('u1', 'other', fingerprint))
+        self.assertIs(idempotency.wait('u1', 'other', fingerprint, timeout=0.1),
+                      idempotency.IN_FLIGHT)
+        idempotency.release('u1', 'other')
+
+    def test_expired_and_abandoned_keys(self):
+        """Test that expired keys are pruned and abandoned ones taken over"""
+        table = idempotency.idempotency_keys
+        idempotency.begin('u1', 'done', 'a')
+        idempotency.finish('u1', 'done', idempotency.StoredResponse(200, b'', 'text/plain'))
+        idempotency.begin('u1', 'stuck', 'b')
+        past = datetime.utcnow() - timedelta(hours=1)
+        db.session.execute(update(table).where(table.c.key == 'stuck').values(created_at=past))
+        db.session.execute(update(table).where(table.c.key == 'done').values(expires_at=past))
+        db.session.commit()
+
+        self.assertIsNone(idempotency.begin('u1', 'stuck', 'b'))
+        self.assertEqual(idempotency.prune(), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
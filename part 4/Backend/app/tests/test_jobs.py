@@ -0,0 +1,164 @@
+import time
+import unittest
+from datetime import datetime, timedelta
+from flask_jwt_extended import create_access_token
+from sqlalchemy import select, update
+from app import create_app, db
+from app.persistence import job_queue
+from app.services import jobs
+from app.services.facade import HBnBFacade
+
+calls = []
+
+
+@jobs.task('tests.record')
+def record(value):
+    calls.append(value)
+
+
+@jobs.task('tests.flaky')
+def flaky(fail_times):
+    calls.append('attempt')
+    if calls.count('attempt') <= fail_times:
+        raise RuntimeError('boom')
+
+
+class TestJobQueue(unittest.TestCase):
+    """Test cases for the durable background job queue"""
+
+    def setUp(self):
+        """Set up test fixtures before each test method"""
+        self.app = create_app('testing')
+        self.app.config['JOB_RETRY_BASE'] = 60
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        calls.clear()
+
+    def tearDown(self):
+        """Tear down test fixtures after each test method"""
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def _job(self, job_id):
+        return db.session.execute(select(job_queue.jobs).where(job_queue.jobs.c.id == job_id)).one()
+
+    def test_priority_order(self):
+        """Test that urgent jobs run first, then in enqueue order"""
+        jobs.enqueue('tests.record', {'value': 'low'}, priority=jobs.LOW)
+        jobs.enqueue('tests.record', {'value': 'first'})
+        jobs.enqueue('tests.record', {'value': 'high'}, priority=jobs.HIGH)
+        jobs.enqueue('tests.record', {'value': 'second'})
+        jobs.enqueue('tests.record', {'value': 'later'}, delay=60)
+        self.assertEqual(jobs.run_pending(), 4)
+        self.assertEqual(calls, ['high', 'first', 'second', 'low'])
+        self.assertEqual(job_queue.stats()['by_status']['queued'], 1)
+
+    def test_retry_with_backoff_then_fail(self):
+        """Test that failed attempts are retried, then given up"""
+        job_id = jobs.enqueue('tests.flaky', {'fail_times': 1}, max_attempts=3)
+        self.assertEqual(jobs.run_pending(), 1)
+        row = self._job(job_id)
+        self.assertEqual((row.status, row.attempts), ('queued', 1))
+        self.assertIn('boom', row.last_error)
+        self.assertGreater(row.available_at, datetime.utcnow())
+
+        db.session.execute(update(job_queue.jobs).values(available_at=datetime.utcnow()))
+        db.session.commit()
+        jobs.run_pending()
+        self.assertEqual(self._job(job_id).status, 'done')
+
+        calls.clear()
+        job_id = jobs.enqueue('tests.flaky', {'fail_times': 5}, max_attempts=1)
+        jobs.run_pending()
+        self.assertEqual(self._job(job_id).status, 'failed')
+        self.assertEqual(job_queue.retry_failed(), 1)
+        self.assertEqual(self._job(job_id).status, 'queued')
+
+    def test_visibility_timeout(self):
+        """Test that an abandoned claim is taken over, and a late outcome ignored"""
+        job_id = jobs.enqueue('tests.record', {'value': 1})
+        stale = job_queue.claim('dead-worker', visibility_timeout=60)
+        self.assertIsNone(job_queue.claim('other'))
+
+        db.session.execute(update(job_queue.jobs).values(
+            available_at=datetime.utcnow() - timedelta(seconds=1)))
+        db.session.commit()
+        fresh = job_queue.claim('other')
+        self.assertEqual((fresh.id, fresh.attempts), (job_id, 2))
+        job_queue.fail(stale, 'too late')
+        self.assertEqual(self._job(job_id).status, 'running')
+        jobs.run_job(fresh)
+        self.assertEqual(self._job(job_id).status, 'done')
+
+    def test_worker_pool(self):
+        """Test that the pool threads pick up new jobs"""
+        pool = jobs.WorkerPool(self.app, threads=2, poll_interval=0.05).start()
+        try:
+            for value in range(5):
+                jobs.enqueue('tests.record', {'value': value})
+            deadline = time.monotonic() + 5
+            while len(calls) < 5 and time.monotonic() < deadline:
+                time.sleep(0.05)
+        finally:
+            pool.stop(timeout=5)
+        self.assertEqual(sorted(calls), list(range(5)))
+        stats = job_queue.stats()
+        self.assertEqual(stats['by_status']['done'], 5)
+        self.assertIsNotNone(stats['latency_p95'])
+
+    def test_unknown_task(self):
+        """Test that enqueueing an unregistered task is refused"""
+        with self.assertRaises(ValueError):
+            jobs.enqueue('tests.missing')
+
+    def test_delete_user_later(self):
+        """Test the queued purge of a user"""
+        facade = HBnBFacade()
+        user = facade.create_user({
+            'first_name': 'John',
+            'last_name': 'Doe',
+            'email': 'john.doe@example.com',
+            'password': 'securepassword123'
+        })
+        user_id = user.id
+        self.assertIsNotNone(facade.delete_user_later(user_id))
+        self.assertIsNotNone(facade.get_user(user_id))
+        jobs.run_pending()
+        self.assertIsNone(facade.get_user(user_id))
+        self.assertIsNone(facade.delete_user_later(user_id))
+
+    def test_delete_user_endpoint(self):
+        """Test that DELETE /users/<id> queues the purge for the user or an admin"""
+        # Identities are dicts: let the test decode its own tokens
+        self.app.config['JWT_VERIFY_SUB'] = False
+        facade = HBnBFacade()
+        user = facade.create_user({
+            'first_name': 'John',
+            'last_name': 'Doe',
+            'email': 'john.doe@example.com',
+            'password': 'securepassword123'
+        })
+        user_id = user.id
+        client = self.app.test_client()
+
+        def delete(identity, target):
+            token = create_access_token(identity=identity)
+            return client.delete(f'/api/v1/users/{target}',
+                                 headers={'Authorization': f'Bearer {token}'})
+
+        response = delete({'id': 'someone-else', 'is_admin': False}, user_id)
+        self.assertEqual(response.status_code, 403)
+        response = delete({'id': user_id, 'is_admin': False}, user_id)
+        self.assertEqual(response.status_code, 202)
+        self.assertIsNotNone(response.json['job_id'])
+        self.assertIsNotNone(facade.get_user(user_id))
+        jobs.run_pending()
+        self.assertIsNone(facade.get_user(user_id))
+        response = delete({'id': 'admin', 'is_admin': True}, user_id)
+        self.assertEqual(response.status_code, 404)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,161 @@
+import os
+import pickle
+import shutil
+import tempfile
+import threading
+import unittest
+import zlib
+from datetime import datetime
+from app.models.place import Place
+from app.persistence import journal
+from app.persistence.journal import DurableRepository
+
+
+class _Exploit:
+    """Pickles to a call of ``_Exploit.run``"""
+    ran = False
+
+    @classmethod
+    def run(cls):
+        cls.ran = True
+
+    def __reduce__(self):
+        return _Exploit.run, ()
+
+
+class TestDurableRepository(unittest.TestCase):
+    """Test cases for the log and snapshot persistence of the in-memory engine"""
+
+    def setUp(self):
+        """Set up test fixtures before each test method"""
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'places')
+
+    def tearDown(self):
+        """Tear down test fixtures after each test method"""
+        shutil.rmtree(self.directory)
+
+    def _open(self, **options):
+        return DurableRepository(self.path, Place, indexes=('owner_id',),
+                                 sorted_indexes=('price',), **options)
+
+    def _place(self, i, price=10.0):
+        return {'id': f'p{i}', 'title': f'Place {i}', 'price': price, 'owner_id': 'u1'}
+
+    def test_writes_survive_a_restart(self):
+        """Test that the log is replayed, with the indexes rebuilt"""
+        repo = self._open()
+        for i in range(3):
+            repo.add(self._place(i, 10.0 * (i + 1)))
+        repo.update('p0', {'price': 99.0})
+        repo.delete('p1')
+        repo.close()
+
+        repo = self._open()
+        self.assertEqual(sorted(r.id for r in repo.get_all()), ['p0', 'p2'])
+        self.assertEqual([r.id for r in repo.range('price', 50.0)], ['p0'])
+        self.assertEqual(len(repo.find('owner_id', 'u1')), 2)
+        repo.close()
+
+    def test_snapshot_and_compaction(self):
+        """Test that a snapshot replaces the logs it covers"""
+        repo = self._open()
+        for i in range(5):
+            repo.add(self._place(i))
+        repo.snapshot()
+        repo.delete('p4')
+        repo.close()
+        logs = [name for name in os.listdir(self.directory) if name.endswith('.log')]
+        self.assertEqual(len(logs), 1)
+
+        repo = self._open()
+        self.assertEqual(len(repo), 4)
+        repo.close()
+
+    def test_automatic_snapshot(self):
+        """Test that a large log triggers a background snapshot"""
+        repo = self._open(snapshot_log_bytes=2000)
+        for i in range(50):
+            repo.add(self._place(i))
+        repo.close()
+        self.assertTrue(os.path.exists(self.path + '.snapshot'))
+        repo = self._open()
+        self.assertEqual(len(repo), 50)
+        repo.close()
+
+    def test_torn_tail_is_cut_off(self):
+        """Test recovery from a frame half-written by a crash"""
+        repo = self._open()
+        repo.add(self._place(0))
+        repo.add(self._place(1))
+        log_path = repo._log.path
+        repo.close()
+        torn_size = os.path.getsize(log_path) - 3
+        with open(log_path, 'r+b') as f:
+            f.truncate(torn_size)
+
+        repo = self._open()
+        self.assertEqual([r.id for r in repo.get_all()], ['p0'])
+        repo.close()
+        self.assertLess(os.path.getsize(log_path), torn_size)
+
+    def test_corrupted_snapshot_is_refused(self):
+        """Test the snapshot checksum"""
+        repo = self._open()
+        repo.add(self._place(0))
+        repo.snapshot()
+        repo.close()
+        with open(self.path + '.snapshot', 'r+b') as f:
+            f.seek(journal.SNAPSHOT_HEADER.size + 5)
+            f.write(b'\xff')
+        with self.assertRaises(ValueError):
+            self._open()
+
+    def test_dates_survive_a_snapshot_and_a_replay(self):
+        """Test that datetime values are encoded as data and read back"""
+        created = datetime(2024, 5, 1, 12, 30, 15, 250)
+        repo = self._open()
+        repo.add(dict(self._place(0), created_at=created))
+        repo.snapshot()
+        repo.add(dict(self._place(1), created_at=created))
+        repo.close()
+
+        repo = self._open()
+        self.assertEqual(repo.get('p0').created_at, created)
+        self.assertEqual(repo.get('p1').created_at, created)
+        repo.close()
+
+    def test_pickled_frame_is_not_loaded(self):
+        """Test that a pickle written into a log is refused, never run"""
+        repo = self._open()
+        log_path = repo._log.path
+        repo.close()
+        payload = pickle.dumps(_Exploit())
+        with open(log_path, 'ab') as f:
+            f.write(journal.FRAME_HEADER.pack(journal.PUT, len(payload), zlib.crc32(payload)))
+            f.write(payload)
+        with self.assertRaises(ValueError):
+            self._open()
+        self.assertFalse(_Exploit.ran)
+
+    def test_group_commit(self):
+        """Test that concurrent writers share fsyncs"""
+        repo = self._open()
+        threads = [threading.Thread(target=lambda n=n: [repo.add(self._place(f'{n}-{i}'))
+                                                        for i in range(50)])
+                   for n in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        stats = repo.stats()
+        self.assertEqual(stats['records'], 400)
+        self.assertLessEqual(stats['fsyncs'], 400)
+        repo.close()
+        repo = self._open()
+        self.assertEqual(len(repo), 400)
+        repo.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
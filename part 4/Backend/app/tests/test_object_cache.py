@@ -0,0 +1,152 @@
+import unittest
+from app import create_app, db
+from app.persistence import object_cache, outbox
+from app.persistence.object_cache import ObjectCache, get_cache
+from app.services.facade import HBnBFacade
+
+
+class TestObjectCache(unittest.TestCase):
+    """Test cases for the LRU cache itself"""
+
+    def test_lru_eviction_and_stats(self):
+        """Test that the least recently used entries go first"""
+        cache = ObjectCache('test', max_entries=2)
+        cache.put('a', {'id': 'a'})
+        cache.put('b', {'id': 'b'})
+        self.assertEqual(cache.get('a'), {'id': 'a'})
+        cache.put('c', {'id': 'c'})
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('c'), {'id': 'c'})
+        stats = cache.stats()
+        self.assertEqual((stats['entries'], stats['hits'], stats['misses'], stats['evictions']),
+                         (2, 2, 1, 1))
+
+    def test_byte_budget_and_ttl(self):
+        """Test the size limit and the expiry of entries"""
+        cache = ObjectCache('test', max_bytes=30)
+        cache.put('a', {'v': 'x' * 10})
+        cache.put('b', {'v': 'y' * 10})
+        self.assertIsNone(cache.get('a'))
+        cache.put('big', {'v': 'z' * 100})
+        self.assertIsNone(cache.get('big'))
+
+        expired = ObjectCache('test', ttl=-1)
+        expired.put('a', {'id': 'a'})
+        self.assertIsNone(expired.get('a'))
+
+    def test_load_racing_with_invalidation_is_not_stored(self):
+        """Test that a value invalidated while it was loaded is not cached"""
+        cache = ObjectCache('test')
+
+        def load():
+            cache.invalidate(['a'])
+            return {'id': 'a', 'old': True}
+
+        self.assertEqual(cache.get_or_load('a', load), {'id': 'a', 'old': True})
+        self.assertEqual(cache.get_or_load('a', lambda: {'id': 'a'}), {'id': 'a'})
+        self.assertEqual(cache.get('a'), {'id': 'a'})
+
+
+class TestCachedEndpoints(unittest.TestCase):
+    """Test cases for the invalidation of cached places and users"""
+
+    def setUp(self):
+        """Set up test fixtures before each test method"""
+        self.app = create_app('testing')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        self.client = self.app.test_client()
+        self.facade = HBnBFacade()
+        self.owner = self.facade.create_user({
+            'first_name': 'John',
+            'last_name': 'Doe',
+            'email': 'owner@example.com',
+            'password': 'securepassword123'
+        })
+        self.place = self.facade.create_place({
+            'title': 'Flat',
+            'description': 'Nice',
+            'price': 80.0,
+            'latitude': 45.0,
+            'longitude': 4.0,
+            'owner_id': self.owner.id,
+        })
+
+    def tearDown(self):
+        """Tear down test fixtures after each test method"""
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def _get_place(self, fields=None):
+        query = f'?fields={fields}' if fields else ''
+        return self.client.get(f'/api/v1/places/{self.place.id}{query}').get_json()
+
+    def test_place_is_cached_and_invalidated_on_commit(self):
+        """Test that reads hit the cache until the place changes"""
+        self.assertEqual(self._get_place()['title'], 'Flat')
+        self.assertEqual(self._get_place('id,price'), {'id': self.place.id, 'price': 80.0})
+        stats = get_cache('places').stats()
+        self.assertEqual((stats['hits'], stats['misses']), (1, 1))
+
+        self.facade.update_place(self.place.id, {'title': 'Loft'})
+        self.assertEqual(self._get_place()['title'], 'Loft')
+        self.assertEqual(get_cache('places').stats()['invalidations'], 1)
+
+        amenity = self.facade.create_amenity({'name': 'Wifi'})
+        self.facade.update_place(self.place.id, {'amenities': [amenity.id]})
+        self.assertEqual(self._get_place('amenities'), {'amenities': [amenity.id]})
+
+    def test_deleted_amenity_invalidates_its_places(self):
+        """Test that a deleted amenity is not listed by cached places"""
+        amenity = self.facade.create_amenity({'name': 'Wifi'})
+        self.facade.update_place(self.place.id, {'amenities': [amenity.id]})
+        self.assertEqual(self._get_place('amenities'), {'amenities': [amenity.id]})
+        self.facade.delete_amenity(amenity.id)
+        self.assertEqual(self._get_place('amenities'), {'amenities': []})
+
+        # Deleted by another worker: the event does not name the places
+        object_cache._apply_foreign_changes([outbox.OutboxEvent(
+            1, 'amenities', amenity.id, outbox.DELETE, 'otherhost:1:0')])
+        self.assertEqual(get_cache('places').stats()['entries'], 0)
+
+    def test_deletes_and_rollbacks(self):
+        """Test that a deleted object is not served, and a rollback drops nothing"""
+        self._get_place()
+        place = self.facade.get_place(self.place.id)
+        place.title = 'Not saved'
+        db.session.flush()
+        db.session.rollback()
+        self.assertEqual(get_cache('places').stats()['entries'], 1)
+
+        self.facade.delete_place(self.place.id)
+        response = self.client.get(f'/api/v1/places/{self.place.id}')
+        self.assertEqual(response.status_code, 404)
+
+    def test_users_and_owner_checks(self):
+        """Test the user cache and its use by create_place"""
+        self.assertEqual(self.client.get(f'/api/v1/users/{self.owner.id}').get_json()['first_name'],
+                         'John')
+        self.facade.update_user(self.owner.id, {'first_name': 'Jane'})
+        response = self.client.get(f'/api/v1/users/{self.owner.id}?fields=first_name')
+        self.assertEqual(response.get_json(), {'first_name': 'Jane'})
+        self.assertTrue(self.facade.user_exists(self.owner.id))
+        self.assertFalse(self.facade.user_exists('nope'))
+        with self.assertRaises(ValueError):
+            self.facade.create_place({'title': 'X', 'description': '', 'price': 1.0,
+                                      'latitude': 0.0, 'longitude': 0.0, 'owner_id': 'nope'})
+
+    def test_can_be_disabled(self):
+        """Test OBJECT_CACHE_RESOURCES"""
+        self.app.config['OBJECT_CACHE_RESOURCES'] = ('users',)
+        # The caches are built on first use (create_place in setUp)
+        self.app.extensions.pop('object_caches')
+        self.assertEqual(self._get_place()['title'], 'Flat')
+        self.assertIsNone(get_cache('places'))
+        health = self.client.get('/api/v1/health/').get_json()
+        self.assertEqual(list(health['object_cache']), ['users'])
+
+
+if __name__ == '__main__':
+    unittest.main()
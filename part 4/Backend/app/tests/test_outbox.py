@@ -0,0 +1,121 @@
+import time
+import unittest
+from datetime import datetime
+from sqlalchemy import create_engine, insert, inspect, select
+from app import create_app, db
+from app.models.associations import place_amenity
+from app.persistence import outbox
+from app.persistence.amenity_index import get_amenity_index
+from app.services.facade import HBnBFacade
+
+
+class TestOutbox(unittest.TestCase):
+    """Test cases for the transactional outbox and its tailer"""
+
+    def setUp(self):
+        """Set up test fixtures before each test method"""
+        self.app = create_app('testing')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+
+        self.facade = HBnBFacade()
+        self.user = self.facade.create_user({
+            'first_name': 'John',
+            'last_name': 'Doe',
+            'email': 'john.doe@example.com',
+            'password': 'securepassword123'
+        })
+        self.wifi = self.facade.create_amenity({'name': 'WiFi'})
+        self.place = self.facade.create_place({
+            'title': 'Flat',
+            'description': 'Nice',
+            'price': 80.0,
+            'latitude': 45.0,
+            'longitude': 4.0,
+            'owner_id': self.user.id,
+        })
+        self.received = []
+        outbox.register(self.received.append)
+
+    def tearDown(self):
+        """Tear down test fixtures after each test method"""
+        outbox.unregister(self.received.append)
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def _rows(self):
+        return db.session.execute(
+            select(outbox.outbox.c.resource, outbox.outbox.c.op).order_by(outbox.outbox.c.id)).all()
+
+    def _foreign_change(self, resource, object_id, op):
+        """Write an outbox row as another worker would"""
+        db.session.execute(insert(outbox.outbox).values(
+            resource=resource, object_id=object_id, op=op,
+            origin='otherhost:1:0', created_at=datetime.utcnow()))
+        db.session.commit()
+
+    def test_writes_are_recorded_with_the_transaction(self):
+        """Test that repository writes append to the outbox, rollbacks do not"""
+        self.assertEqual(self._rows()[:3], [('users', 'add'), ('amenities', 'add'), ('places', 'add')])
+        self.facade.update_place(self.place.id, {'price': 90.0})
+        self.facade.delete_amenity(self.wifi.id)
+        self.assertEqual(self._rows()[-2:], [('places', 'update'), ('amenities', 'delete')])
+
+        count = len(self._rows())
+        self.place.title = 'Changed'
+        db.session.flush()
+        db.session.rollback()
+        self.assertEqual(len(self._rows()), count)
+
+    def test_tailer_dispatches_foreign_changes_only(self):
+        """Test that a worker only replays what the others did"""
+        tailer = outbox.OutboxTailer(self.app)
+        tailer.poll()
+        self.facade.update_place(self.place.id, {'price': 90.0})
+        self._foreign_change('places', self.place.id, outbox.UPDATE)
+        events = tailer.poll()
+        self.assertEqual([(e.resource, e.op) for e in events], [('places', 'update')])
+        self.assertEqual(self.received, [events])
+        self.assertEqual(tailer.poll(), [])
+
+    def test_amenity_index_follows_other_workers(self):
+        """Test that the bitmap index picks up a place changed elsewhere"""
+        index = get_amenity_index()
+        tailer = outbox.OutboxTailer(self.app)
+        tailer.poll()
+        # Another worker links the amenity: this process' session never sees it
+        db.session.execute(insert(place_amenity).values(place_id=self.place.id, amenity_id=self.wifi.id))
+        self._foreign_change('places', self.place.id, outbox.UPDATE)
+        self.assertEqual(index.place_ids([self.wifi.id]), [])
+        tailer.poll()
+        self.assertEqual(index.place_ids([self.wifi.id]), [self.place.id])
+
+        self._foreign_change('places', self.place.id, outbox.DELETE)
+        tailer.poll()
+        self.assertEqual(index.place_ids([self.wifi.id]), [])
+
+    def test_stale_position_resets_caches(self):
+        """Test that a worker forked too long after the cache was built drops it"""
+        index = get_amenity_index()
+        stale = ((0,), time.time() - 2 * outbox.RETENTION_SECONDS)
+        tailer = outbox.OutboxTailer(self.app, position=stale)
+        tailer.poll()
+        self.assertIn(None, self.received)
+        self.assertFalse(index.loaded)
+
+    def test_upgrade_adds_parent_id(self):
+        """Test that an outbox table of an older version gets the parent_id column"""
+        engine = create_engine('sqlite://')
+        with engine.begin() as connection:
+            connection.exec_driver_sql(
+                'CREATE TABLE outbox (id INTEGER PRIMARY KEY AUTOINCREMENT, resource VARCHAR(32), '
+                'object_id VARCHAR(36), op VARCHAR(8), origin VARCHAR(64), created_at DATETIME)')
+        outbox.upgrade(engine)
+        outbox.upgrade(engine)
+        self.assertIn('parent_id', [column['name'] for column in inspect(engine).get_columns('outbox')])
+
+
+if __name__ == '__main__':
+    unittest.main()
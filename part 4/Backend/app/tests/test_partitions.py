@@ -0,0 +1,144 @@
+import os
+import shutil
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+from sqlalchemy import func, insert, select
+from app import create_app, db
+from app.models.review import Review
+from app.persistence import outbox, partitions
+from app.services.facade import HBnBFacade
+from config import TestingConfig
+
+
+class TestReviewPartitions(unittest.TestCase):
+    """Test cases for reviews spread over several SQLite files"""
+
+    def setUp(self):
+        """Set up test fixtures before each test method"""
+        self.tmp_dir = tempfile.mkdtemp()
+        config = type('PartitionedConfig', (TestingConfig,), {
+            'REVIEW_PARTITIONS': 3,
+            'REVIEW_PARTITION_URI': 'sqlite:///' + os.path.join(self.tmp_dir, 'reviews_{index}.db'),
+            'CHANGES_SETTLE_SECONDS': 0,
+        })
+        self.app = create_app(config)
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        self.partitions = partitions.get_partitions()
+
+        self.facade = HBnBFacade()
+        self.owner = self._create_user('owner@example.com')
+        self.guest = self._create_user('guest@example.com')
+        self.places = [self.facade.create_place({
+            'title': f'Place {i}',
+            'description': 'Nice',
+            'price': 80.0,
+            'latitude': 45.0,
+            'longitude': 4.0,
+            'owner_id': self.owner.id,
+        }) for i in range(6)]
+
+    def tearDown(self):
+        """Tear down test fixtures after each test method"""
+        db.session.remove()
+        db.drop_all()
+        self.partitions.remove()
+        self.partitions.dispose()
+        self.app_context.pop()
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def _create_user(self, email):
+        return self.facade.create_user({
+            'first_name': 'John',
+            'last_name': 'Doe',
+            'email': email,
+            'password': 'securepassword123'
+        })
+
+    def _create_review(self, place, text='Great'):
+        return self.facade.create_review({
+            'text': text, 'rating': 4, 'user_id': self.guest.id, 'place_id': place.id})
+
+    def _counts(self):
+        return [self.partitions.session(index).execute(
+            select(func.count()).select_from(Review.__table__)).scalar()
+            for index in range(self.partitions.count)]
+
+    def test_routing(self):
+        """Test that reviews are stored in, and found from, their place's partition"""
+        reviews = [self._create_review(place) for place in self.places]
+        for place, review in zip(self.places, reviews):
+            index = self.partitions.index_of(place.id)
+            self.assertEqual(self.partitions.index_of(review.id), index)
+            self.assertIsNotNone(self.partitions.session(index).get(Review, review.id))
+        self.assertEqual(sum(self._counts()), 6)
+        main = db.session.execute(select(func.count()).select_from(Review.__table__)).scalar()
+        self.assertEqual(main, 0)
+
+        review_id = reviews[0].id
+        self.assertEqual(self.facade.get_review(review_id).place_id, self.places[0].id)
+        self.assertEqual([r.id for r in self.facade.get_reviews_by_place(self.places[0].id)],
+                         [review_id])
+        self.facade.update_review(review_id, {'text': 'Updated'})
+        self.assertEqual(self.facade.get_review(review_id).text, 'Updated')
+
+        listed = self.app.test_client().get('/api/v1/reviews/').get_json()
+        self.assertEqual({r['id'] for r in listed}, {r.id for r in reviews})
+
+    def test_delete_and_changes(self):
+        """Test deletes, purges and the merged delta sync"""
+        reviews = [self._create_review(place) for place in self.places]
+        deleted_id = reviews[0].id
+        self.assertTrue(self.facade.delete_review(deleted_id))
+        self.assertIsNone(self.facade.get_review(deleted_id))
+
+        upserts, deleted, cursor, has_more = self.facade.get_changes('reviews', None)
+        self.assertEqual({row.id for row in upserts}, {r.id for r in reviews[1:]})
+        self.assertEqual(deleted, [deleted_id])
+        self.assertFalse(has_more)
+
+        self.facade.delete_place(self.places[1].id)
+        self.assertEqual(sum(self._counts()), 4)
+        self.facade.delete_user(self.guest.id)
+        self.assertEqual(sum(self._counts()), 0)
+
+    def test_move_existing_reviews(self):
+        """Test moving the reviews of the main database into the partitions"""
+        place = self.places[0]
+        db.session.execute(insert(Review.__table__), [
+            {'id': f'legacy-{i}', 'text': 'Old', 'rating': 3, 'user_id': self.guest.id,
+             'place_id': place.id, 'created_at': place.created_at, 'updated_at': place.updated_at}
+            for i in range(4)])
+        db.session.commit()
+        self.assertEqual(partitions.move_reviews_to_partitions(chunk_size=3), 4)
+        self.assertEqual(self._counts()[self.partitions.index_of(place.id)], 4)
+        # Found even though the id does not hash to the place's partition
+        self.assertEqual(self.facade.get_review('legacy-2').text, 'Old')
+
+    def test_outbox_of_partitions(self):
+        """Test that the tailer reads and prunes the outbox of every partition"""
+        place = self.places[0]
+        session = self.partitions.for_place(place.id)
+        tailer = outbox.OutboxTailer(self.app)
+        tailer.poll()
+        self.assertEqual(len(tailer.feeds()), 1 + self.partitions.count)
+        # Another worker adds a review: its outbox row is in the partition
+        session.execute(insert(outbox.outbox).values(
+            resource='reviews', object_id='review-1', op=outbox.ADD,
+            origin='otherhost:1:0', created_at=datetime.utcnow()))
+        session.commit()
+        events = tailer.poll()
+        self.assertEqual([(e.resource, e.object_id) for e in events], [('reviews', 'review-1')])
+
+        old = datetime.utcnow() - timedelta(seconds=2 * tailer.retention)
+        session.execute(outbox.outbox.update().values(created_at=old))
+        session.commit()
+        tailer.prune()
+        rows = session.execute(select(func.count()).select_from(outbox.outbox)).scalar()
+        self.assertEqual(rows, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
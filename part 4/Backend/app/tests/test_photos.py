@@ -0,0 +1,186 @@
+import io
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+from sqlalchemy import select
+from app import create_app, db
+from app.models.photo import PlacePhoto
+from app.persistence import job_queue
+from app.services import photos, jobs
+from app.services.facade import HBnBFacade
+
+
+def sample_image():
+    """A small JPEG, real when Pillow is installed"""
+    if photos.Image is None:
+        return b'\xff\xd8\xff\xe0' + b'\x00' * 2048
+    buffer = io.BytesIO()
+    photos.Image.new('RGB', (1200, 900), (200, 80, 40)).save(buffer, 'JPEG')
+    return buffer.getvalue()
+
+
+class TestPlacePhotos(unittest.TestCase):
+    """Test cases for photo upload, thumbnails and serving"""
+
+    def setUp(self):
+        """Set up test fixtures before each test method"""
+        self.app = create_app('testing')
+        self.photo_root = tempfile.mkdtemp()
+        self.app.config['PHOTO_ROOT'] = self.photo_root
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        self.client = self.app.test_client()
+
+        self.facade = HBnBFacade()
+        self.user = self.facade.create_user({
+            'first_name': 'John',
+            'last_name': 'Doe',
+            'email': 'john.doe@example.com',
+            'password': 'securepassword123'
+        })
+        self.place = self.facade.create_place({
+            'title': 'Flat',
+            'description': 'Nice',
+            'price': 80.0,
+            'latitude': 45.0,
+            'longitude': 4.0,
+            'owner_id': self.user.id,
+        })
+
+    def tearDown(self):
+        """Tear down test fixtures after each test method"""
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+        shutil.rmtree(self.photo_root, ignore_errors=True)
+
+    def _upload(self, data):
+        photo = self.facade.add_place_photo(self.place.id, io.BytesIO(data))
+        jobs.run_pending()
+        db.session.expire_all()
+        return self.facade.get_place_photo(photo.id)
+
+    def test_upload_is_processed_in_background(self):
+        """Test that the thumbnail job publishes the variants of an upload"""
+        photo = self._upload(sample_image())
+        self.assertEqual(photo.status, 'ready')
+        self.assertEqual(photo.variants[0], 'original.jpg')
+        if photos.Image is not None:
+            self.assertIn('small.webp', photo.variants)
+            self.assertIn('large.jpg', photo.variants)
+
+        # Same bytes, same place: no second photo
+        again = self.facade.add_place_photo(self.place.id, io.BytesIO(sample_image()))
+        self.assertEqual(again.id, photo.id)
+
+    def test_thumbnails_are_a_durable_job(self):
+        """Test that the upload queues its thumbnails in the jobs table"""
+        photo = self.facade.add_place_photo(self.place.id, io.BytesIO(sample_image()))
+        queued = db.session.execute(select(job_queue.jobs.c.name, job_queue.jobs.c.payload)
+                                    .where(job_queue.jobs.c.status == job_queue.QUEUED)).all()
+        self.assertEqual([tuple(job) for job in queued],
+                         [('photos.thumbnails', {'photo_id': photo.id})])
+        self.assertEqual(self.facade.get_place_photo(photo.id).status, 'pending')
+        self.assertEqual(jobs.run_pending(), 1)
+        db.session.expire_all()
+        self.assertEqual(self.facade.get_place_photo(photo.id).status, 'ready')
+
+    def test_rejects_invalid_uploads(self):
+        """Test type sniffing and the size limit"""
+        with self.assertRaises(ValueError):
+            self.facade.add_place_photo(self.place.id, io.BytesIO(b'not an image'))
+        with self.assertRaises(photos.PhotoTooLarge):
+            photos.receive_upload(io.BytesIO(b'\xff\xd8\xff' + b'\x00' * 100), max_bytes=50)
+
+    def test_serve_variant_with_immutable_cache(self):
+        """Test GET /api/v1/photos/<hash>/<variant>"""
+        photo = self._upload(sample_image())
+        url = photos.photo_urls(photo)['original']['jpg']
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, 'image/jpeg')
+        self.assertIn('immutable', response.headers['Cache-Control'])
+        self.assertEqual(response.data, sample_image())
+        response.close()
+
+        etag = response.headers['ETag']
+        response = self.client.get(url, headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+
+        self.assertEqual(self.client.get(f'/api/v1/photos/{photo.content_hash}/x.jpg').status_code, 404)
+        self.assertEqual(self.client.get('/api/v1/photos/..%2F..%2Fetc/original.jpg').status_code, 404)
+
+    def test_place_cover_and_listing(self):
+        """Test the photo field of places and the photos endpoint"""
+        photo = self._upload(sample_image())
+        places = self.client.get('/api/v1/places/').get_json()
+        self.assertEqual(places[0]['photo'], photos.photo_urls(photo))
+
+        listing = self.client.get(f'/api/v1/places/{self.place.id}/photos').get_json()
+        self.assertEqual([p['id'] for p in listing], [photo.id])
+
+    def test_upload_requires_authentication(self):
+        """Test that anonymous uploads are refused"""
+        response = self.client.post(f'/api/v1/places/{self.place.id}/photos',
+                                    data=sample_image(), content_type='image/jpeg')
+        self.assertEqual(response.status_code, 401)
+
+    def test_files_removed_with_last_reference(self):
+        """Test that deleting the place removes its unused files"""
+        photo = self._upload(sample_image())
+        path = photos.variant_path(photo.content_hash, 'original.jpg')
+        self.facade.delete_place(self.place.id)
+        # Removed by a background job
+        self.assertTrue(os.path.exists(path))
+        jobs.run_pending()
+        self.assertFalse(os.path.exists(path))
+
+    def _stored_files(self):
+        return sorted(os.path.relpath(os.path.join(directory, name), self.photo_root)
+                      for directory, _, names in os.walk(self.photo_root) for name in names)
+
+    def test_failed_upload_leaves_no_file(self):
+        """Test that the stored file is removed when the photo is not committed"""
+        with mock.patch.object(jobs, 'enqueue', side_effect=RuntimeError('queue down')):
+            with self.assertRaises(RuntimeError):
+                self.facade.add_place_photo(self.place.id, io.BytesIO(sample_image()))
+        self.assertEqual(self._stored_files(), [])
+        self.assertEqual(db.session.query(PlacePhoto).count(), 0)
+
+    def test_removal_waits_for_concurrent_upload(self):
+        """Test that photos.remove_unused does not delete files a new row references"""
+        photo = self._upload(sample_image())
+        content_hash = photo.content_hash
+        self.facade.delete_place_photo(photo.id)
+        get_by_hash = self.facade.photo_repo.get_by_hash
+        published = threading.Event()
+
+        def slow_get_by_hash(*args):
+            # Files published and lock held, row not inserted yet
+            published.set()
+            time.sleep(0.3)
+            return get_by_hash(*args)
+
+        def upload():
+            with self.app.app_context():
+                facade = HBnBFacade()
+                facade.photo_repo.get_by_hash = slow_get_by_hash
+                facade.add_place_photo(self.place.id, io.BytesIO(sample_image()))
+                db.session.remove()
+
+        thread = threading.Thread(target=upload)
+        thread.start()
+        published.wait(5)
+        self.facade.remove_unused_photo_files([content_hash])
+        thread.join()
+        self.assertTrue(os.path.exists(photos.variant_path(content_hash, 'original.jpg')))
+        self.assertEqual(self.facade.photo_repo.count_by_hash(content_hash), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,141 @@
+import json
+import os
+import tempfile
+import unittest
+from app import create_app, db
+from app.models.user import User
+from app.services import provisioning
+from app.services.facade import HBnBFacade
+
+
+class TestBulkProvisioning(unittest.TestCase):
+    """Test cases for the bulk creation of users"""
+
+    def setUp(self):
+        """Set up test fixtures before each test method"""
+        self.app = create_app('testing')
+        # Cheap hashes: the tests check the flow, not bcrypt
+        self.app.config['BCRYPT_LOG_ROUNDS'] = 4
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        self.facade = HBnBFacade()
+        self.existing = self.facade.create_user({
+            'first_name': 'Jane',
+            'last_name': 'Doe',
+            'email': 'taken@example.com',
+            'password': 'securepassword123'
+        })
+
+    def tearDown(self):
+        """Tear down test fixtures after each test method"""
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def _item(self, email, **extra):
+        return dict({'first_name': 'Host', 'last_name': 'Partner',
+                     'email': email, 'password': 'pw-' + email}, **extra)
+
+    def test_hashes_match_flask_bcrypt(self):
+        """Test that pool hashes verify like the ones of User.hash_password"""
+        hashes = provisioning.hash_passwords(['first', 'second', 'third'], workers=2)
+        user = User('A', 'B', 'a@example.com', 'x')
+        for password, password_hash in zip(['first', 'second', 'third'], hashes):
+            user.password_hash = password_hash
+            self.assertTrue(user.check_password(password))
+            self.assertFalse(user.check_password('wrong'))
+
+    def test_hash_pool_is_reused(self):
+        """Test that requests share one pool, whose processes are not forked"""
+        pool = provisioning.hash_pool(2)
+        provisioning.hash_passwords(['first'], workers=2)
+        self.assertIs(provisioning.hash_pool(2), pool)
+        self.assertNotEqual(pool._mp_context.get_start_method(), 'fork')
+        provisioning.shutdown_hash_pools()
+        self.assertIsNot(provisioning.hash_pool(2), pool)
+        provisioning.shutdown_hash_pools()
+
+    def test_provision_users(self):
+        """Test batched creation with per-item errors"""
+        items = [self._item(f'host{i}@example.com') for i in range(7)]
+        items += [
+            self._item('taken@example.com'),
+            self._item('host1@example.com'),
+            self._item('not-an-email'),
+            {'first_name': 'No', 'email': 'nopw@example.com'},
+            'nope',
+            self._item('admin@example.com', is_admin=True),
+        ]
+        results = self.facade.create_users(items, batch_size=3, workers=1)
+        self.assertEqual([r['index'] for r in results], list(range(len(items))))
+        created = [r for r in results if 'id' in r]
+        self.assertEqual(len(created), 8)
+        errors = {r['index']: r['error'] for r in results if 'error' in r}
+        self.assertEqual(errors[7], "Email already exists")
+        self.assertEqual(errors[8], "Duplicate email in the request")
+        self.assertEqual(errors[9], "Invalid email format")
+        self.assertIn('password', errors[10])
+        self.assertEqual(errors[11], "Expected an object")
+
+        user = self.facade.get_user_by_email('host3@example.com')
+        self.assertEqual(user.id, results[3]['id'])
+        self.assertTrue(user.check_password('pw-host3@example.com'))
+        self.assertTrue(self.facade.get_user_by_email('admin@example.com').is_admin)
+
+    def test_admin_flag_is_parsed_strictly(self):
+        """Test that a JSON string like "false" never grants admin rights"""
+        items = [self._item('s@example.com', is_admin='false'),
+                 self._item('t@example.com', is_admin='TRUE'),
+                 self._item('u@example.com', is_admin=False)]
+        results = self.facade.create_users(items, workers=1)
+        self.assertTrue(all('id' in result for result in results))
+        self.assertFalse(self.facade.get_user_by_email('s@example.com').is_admin)
+        self.assertTrue(self.facade.get_user_by_email('t@example.com').is_admin)
+        self.assertFalse(self.facade.get_user_by_email('u@example.com').is_admin)
+
+        for value in ('nope', 1, ['true']):
+            with self.assertRaises(ValueError):
+                self.facade.create_users([self._item('v@example.com'),
+                                          self._item('w@example.com', is_admin=value)])
+        self.assertIsNone(self.facade.get_user_by_email('v@example.com'))
+
+    def test_conflicting_batch_falls_back_to_single_inserts(self):
+        """Test that an email taken after the check only fails its own item"""
+        items = [self._item('a@example.com'), self._item('b@example.com')]
+        original = provisioning.existing_emails
+        provisioning.existing_emails = lambda emails: set()
+        try:
+            self.facade.create_user(self._item('b@example.com'))
+            results = provisioning.provision_users(items, workers=1)
+        finally:
+            provisioning.existing_emails = original
+        self.assertIn('id', results[0])
+        self.assertEqual(results[1]['error'], "Email already exists")
+        self.assertIsNotNone(self.facade.get_user_by_email('a@example.com'))
+
+    def test_read_users_file(self):
+        """Test the CSV and JSON lines formats of import-users"""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            csv_path = os.path.join(tmp_dir, 'hosts.csv')
+            with open(csv_path, 'w') as f:
+                f.write('first_name,last_name,email,password,is_admin\n'
+                        'Ann,Lee,ann@example.com,secret,true\n')
+            jsonl_path = os.path.join(tmp_dir, 'hosts.jsonl')
+            with open(jsonl_path, 'w') as f:
+                f.write(json.dumps(self._item('x@example.com')) + '\n\n')
+            self.assertEqual(provisioning.read_users_file(csv_path)[0]['is_admin'], True)
+            self.assertEqual(provisioning.read_users_file(jsonl_path)[0]['email'], 'x@example.com')
+
+            result = self.app.test_cli_runner().invoke(args=['import-users', csv_path])
+            self.assertIn('1 users created, 0 failed', result.output)
+
+    def test_bulk_endpoint_requires_admin(self):
+        """Test that the bulk endpoint is not public"""
+        response = self.app.test_client().post('/api/v1/users/bulk',
+                                               json={'users': [self._item('c@example.com')]})
+        self.assertEqual(response.status_code, 401)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,172 @@
+import unittest
+from datetime import datetime
+from sqlalchemy import func, insert, select
+from app import create_app, db
+from app.services.facade import HBnBFacade
+from app.persistence import outbox
+from app.services.pubsub import (Broker, Event, broker, place_reviews_topic,
+                                 subscribe_place_reviews)
+
+
+class TestBroker(unittest.TestCase):
+    """Test cases for the publish/subscribe broker"""
+
+    def test_publish_to_subscribers(self):
+        """Test that only the subscribers of a topic get its events"""
+        b = Broker()
+        subscription = b.subscribe('a')
+        other = b.subscribe('b')
+        b.publish('a', Event('0-1', 'ping', {'n': 1}))
+        event = subscription.get(timeout=0)
+        self.assertEqual(event.type, 'ping')
+        self.assertIn(b'id: 0-1\nevent: ping\ndata: {"n": 1}\n\n', event.encoded)
+        self.assertIsNone(other.get(timeout=0))
+
+    def test_delivered_positions_are_skipped(self):
+        """Test that an event already replayed is not delivered again"""
+        b = Broker()
+        subscription = b.subscribe('a')
+        b.publish('a', Event('0-1', 'ping', {'n': 1}))
+        b.publish('a', Event('1-1', 'ping', {'n': 2}))
+        subscription.skip_until(0, 3)
+        for event_id in ('0-2', '0-3', '0-4'):
+            b.publish('a', Event(event_id, 'ping', {}))
+        received = [subscription.get(timeout=0) for _ in range(3)]
+        self.assertEqual([event and event.id for event in received], ['1-1', '0-4', None])
+
+    def test_slow_subscriber_overflows(self):
+        """Test the per-connection memory cap"""
+        b = Broker(max_bytes=200)
+        subscription = b.subscribe('a')
+        for n in range(10):
+            b.publish('a', Event(f'0-{n + 1}', 'ping', {'text': 'x' * 50, 'n': n}))
+        self.assertTrue(subscription.overflowed)
+        self.assertEqual(subscription.get(timeout=0).data['n'], 0)
+        subscription.close()
+        self.assertEqual(b.subscriber_count('a'), 0)
+
+
+class TestReviewStream(unittest.TestCase):
+    """Test cases for GET /api/v1/places/<id>/reviews/stream"""
+
+    def setUp(self):
+        """Set up test fixtures before each test method"""
+        self.app = create_app('testing')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        self.client = self.app.test_client()
+
+        self.facade = HBnBFacade()
+        self.user = self.facade.create_user({
+            'first_name': 'John',
+            'last_name': 'Doe',
+            'email': 'john.doe@example.com',
+            'password': 'securepassword123'
+        })
+        self.place = self.facade.create_place({
+            'title': 'Flat',
+            'description': 'Nice',
+            'price': 80.0,
+            'latitude': 45.0,
+            'longitude': 4.0,
+            'owner_id': self.user.id,
+        })
+        self.topic = place_reviews_topic(self.place.id)
+
+    def tearDown(self):
+        """Tear down test fixtures after each test method"""
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def _create_review(self, text):
+        return self.facade.create_review({
+            'text': text,
+            'rating': 4,
+            'user_id': self.user.id,
+            'place_id': self.place.id,
+        })
+
+    def test_outbox_feeds_review_streams(self):
+        """Test that the review writes of every worker reach the streams"""
+        tailer = outbox.OutboxTailer(self.app)
+        tailer.poll()
+        subscription = broker.subscribe(self.topic)
+        try:
+            review = self._create_review('Great')
+            self.assertIsNone(subscription.get(timeout=0))
+            tailer.poll()
+            self.facade.update_review(review.id, {'rating': 5})
+            tailer.poll()
+            self.facade.delete_review(review.id)
+            tailer.poll()
+            other = self._create_review('Other')
+            # The same write as seen by the tailer of another worker
+            db.session.execute(outbox.outbox.delete().where(outbox.outbox.c.object_id == other.id))
+            db.session.execute(insert(outbox.outbox).values(
+                resource='reviews', object_id=other.id, op=outbox.ADD, origin='otherhost:1:0',
+                created_at=datetime.utcnow(), parent_id=self.place.id))
+            db.session.commit()
+            tailer.poll()
+            events = [subscription.get(timeout=0) for _ in range(4)]
+        finally:
+            subscription.close()
+        self.assertEqual([event.type for event in events],
+                         ['review.created', 'review.updated', 'review.deleted', 'review.created'])
+        self.assertEqual(events[1].data['rating'], 5)
+        self.assertEqual(events[2].data, {'id': review.id, 'place_id': self.place.id})
+        self.assertEqual(events[3].data['text'], 'Other')
+        self.assertTrue(all(event.id.startswith('0-') for event in events))
+
+    def test_stream_replays_after_last_event_id(self):
+        """Test that the stream resumes from the Last-Event-ID header, from the outbox"""
+        tailer = outbox.OutboxTailer(self.app)
+        tailer.poll()
+        subscription = broker.subscribe(self.topic)
+        self._create_review('First')
+        tailer.poll()
+        first = subscription.get(timeout=0)
+        subscription.close()
+        self._create_review('Second')
+
+        response = self.client.get(f'/api/v1/places/{self.place.id}/reviews/stream',
+                                   headers={'Last-Event-ID': first.id},
+                                   buffered=False)
+        try:
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.mimetype, 'text/event-stream')
+            chunks = iter(response.response)
+            self.assertTrue(next(chunks).startswith(b'retry:'))
+            replayed = next(chunks)
+            self.assertIn(b'event: review.created', replayed)
+            self.assertIn(b'"Second"', replayed)
+        finally:
+            response.close()
+        self.assertEqual(broker.subscriber_count(self.topic), 0)
+
+    def test_pruned_events_ask_for_reset(self):
+        """Test that events lost to pruning are reported instead of silently skipped"""
+        self._create_review('First')
+        last = db.session.execute(select(func.max(outbox.outbox.c.id))).scalar()
+        self._create_review('Second')
+        subscription, missed, complete = subscribe_place_reviews(self.place.id, f'0-{last}')
+        subscription.close()
+        self.assertTrue(complete)
+        self.assertEqual([event.data['text'] for event in missed], ['Second'])
+
+        db.session.execute(outbox.outbox.delete().where(outbox.outbox.c.id <= last + 1))
+        db.session.commit()
+        for event_id in (f'0-{last}', 'otherprocess-1', '7-1'):
+            subscription, missed, complete = subscribe_place_reviews(self.place.id, event_id)
+            subscription.close()
+            self.assertFalse(complete)
+
+    def test_unknown_place(self):
+        """Test that streaming a missing place returns 404"""
+        response = self.client.get('/api/v1/places/unknown/reviews/stream')
+        self.assertEqual(response.status_code, 404)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,122 @@
+import unittest
+from sqlalchemy import event, func, select
+from app import create_app, db
+from app.models.associations import place_amenity
+from app.models.place import Place
+from app.models.review import Review
+from app.persistence import outbox
+from app.persistence.changes import tombstones
+from app.services.facade import HBnBFacade
+
+
+class TestSetBasedDeletes(unittest.TestCase):
+    """Test cases for the set-based deletes of places and users"""
+
+    def setUp(self):
+        """Set up test fixtures before each test method"""
+        self.app = create_app('testing')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+
+        self.facade = HBnBFacade()
+        self.owner = self._create_user('owner@example.com')
+        self.guest = self._create_user('guest@example.com')
+        self.amenity = self.facade.create_amenity({'name': 'WiFi'})
+
+    def tearDown(self):
+        """Tear down test fixtures after each test method"""
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def _create_user(self, email):
+        return self.facade.create_user({
+            'first_name': 'John',
+            'last_name': 'Doe',
+            'email': email,
+            'password': 'securepassword123'
+        })
+
+    def _create_place(self, title='Flat', owner=None):
+        return self.facade.create_place({
+            'title': title,
+            'description': 'Nice',
+            'price': 80.0,
+            'latitude': 45.0,
+            'longitude': 4.0,
+            'owner_id': (owner or self.owner).id,
+            'amenities': [self.amenity.id],
+        })
+
+    def _create_review(self, place, user=None):
+        return self.facade.create_review({
+            'text': 'Great',
+            'rating': 5,
+            'user_id': (user or self.guest).id,
+            'place_id': place.id,
+        })
+
+    def _count(self, table, *conditions):
+        return db.session.execute(select(func.count()).select_from(table).where(*conditions)).scalar()
+
+    def _record_statements(self):
+        statements = []
+
+        def record(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        event.listen(db.engine, 'before_cursor_execute', record)
+        self.addCleanup(event.remove, db.engine, 'before_cursor_execute', record)
+        return statements
+
+    def test_delete_place_is_set_based(self):
+        """Test that deleting a place does not walk its reviews"""
+        place = self._create_place()
+        other = self._create_place('Other')
+        review_ids = {self._create_review(place).id for _ in range(20)}
+        self._create_review(other)
+        place_id, other_id = place.id, other.id
+        db.session.expire_all()
+
+        statements = self._record_statements()
+        self.assertTrue(self.facade.delete_place(place_id))
+        deletes = [s for s in statements if s.startswith('DELETE FROM reviews')]
+        self.assertEqual(len(deletes), 1)
+        self.assertFalse([s for s in statements if s.startswith('SELECT reviews.')])
+
+        self.assertEqual(self._count(Review.__table__, Review.place_id == place_id), 0)
+        self.assertEqual(self._count(Review.__table__, Review.place_id == other_id), 1)
+        self.assertEqual(self._count(place_amenity, place_amenity.c.place_id == place_id), 0)
+        self.assertIsNone(self.facade.get_place(place_id))
+        self.assertFalse(self.facade.delete_place(place_id))
+
+        # Delta sync and the other workers see every deleted row
+        deleted = set(db.session.execute(
+            select(tombstones.c.object_id).where(tombstones.c.resource == 'reviews')).scalars())
+        self.assertEqual(deleted, review_ids)
+        ops = db.session.execute(select(outbox.outbox.c.object_id).where(
+            outbox.outbox.c.resource == 'places', outbox.outbox.c.op == outbox.DELETE)).scalars().all()
+        self.assertEqual(ops, [place_id])
+
+    def test_delete_user_purges_places_and_reviews(self):
+        """Test the chunked purge of a user"""
+        self.app.config['PURGE_CHUNK_SIZE'] = 2
+        places = [self._create_place(f'Place {i}') for i in range(5)]
+        for place in places:
+            self._create_review(place)
+        foreign = self._create_place('Foreign', owner=self.guest)
+        for _ in range(3):
+            self._create_review(foreign, user=self.owner)
+        owner_id, foreign_id = self.owner.id, foreign.id
+
+        self.assertTrue(self.facade.delete_user(owner_id))
+        self.assertIsNone(self.facade.get_user(owner_id))
+        self.assertEqual(self._count(Place.__table__, Place.owner_id == owner_id), 0)
+        self.assertEqual(self._count(Review.__table__), 0)
+        self.assertIsNotNone(self.facade.get_place(foreign_id))
+        self.assertFalse(self.facade.delete_user(owner_id))
+
+
+if __name__ == '__main__':
+    unittest.main()
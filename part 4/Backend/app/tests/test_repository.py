@@ -0,0 +1,312 @@
+import fcntl
+import os
+import shutil
+import tempfile
+import unittest
+from app import create_app, db
+from app.models.place import Place
+from app.models.user import User
+from app.persistence import memory_tier
+from app.persistence.repository import InMemoryRepository
+from app.services.facade import HBnBFacade
+
+
+class TestReadRows(unittest.TestCase):
+    """Test cases for the Core read path of the repositories"""
+
+    def setUp(self):
+        """Set up test fixtures before each test method"""
+        self.app = create_app('testing')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        self.facade = HBnBFacade()
+        self.user = self.facade.create_user({
+            'first_name': 'John',
+            'last_name': 'Doe',
+            'email': 'john.doe@example.com',
+            'password': 'securepassword123'
+        })
+        self.places = [self.facade.create_place({
+            'title': f'Place {i}',
+            'description': 'Nice',
+            'price': 10.0 * (i + 1),
+            'latitude': 45.0,
+            'longitude': 4.0,
+            'owner_id': self.user.id,
+        }) for i in range(3)]
+        self.place_ids = [place.id for place in self.places]
+        db.session.expunge_all()
+
+    def tearDown(self):
+        """Tear down test fixtures after each test method"""
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def test_rows_are_not_orm_instances(self):
+        """Test that list reads leave the identity map empty"""
+        rows = self.facade.list_places()
+        self.assertEqual(len(rows), 3)
+        self.assertEqual(sorted(row.title for row in rows), ['Place 0', 'Place 1', 'Place 2'])
+        self.assertEqual(len(db.session.identity_map), 0)
+
+    def test_projection_always_keeps_id(self):
+        """Test that projected rows only hold id and the asked columns"""
+        rows = self.facade.list_places(fields=['title'])
+        self.assertEqual(set(rows[0]._fields), {'id', 'title'})
+
+    def test_rows_by_ids_keep_order(self):
+        """Test the id-filtered read used by the amenity filter"""
+        ids = [self.place_ids[2], self.place_ids[0]]
+        rows = self.facade.place_repo.read_rows(['price'], ids=ids)
+        self.assertEqual([row.id for row in rows], ids)
+        self.assertEqual([row.price for row in rows], [30.0, 10.0])
+
+    def test_users_rows(self):
+        """Test that the user repository has the same read path"""
+        rows = self.facade.list_users(fields=['email'])
+        self.assertEqual([row.email for row in rows], ['john.doe@example.com'])
+
+
+
+class TestQuerySpec(unittest.TestCase):
+    """Test cases for the query-spec API of SQLAlchemyRepository"""
+
+    setUp = TestReadRows.setUp
+    tearDown = TestReadRows.tearDown
+
+    @property
+    def owner_id(self):
+        return self.facade.place_repo.first().owner_id
+
+    def test_filters_and_operators(self):
+        """Test equality filters, operator suffixes and their combination"""
+        repo = self.facade.place_repo
+        self.assertEqual(len(repo.find(owner_id=self.owner_id)), 3)
+        self.assertEqual([p.price for p in repo.find({'price__gte': 20}, order_by='price')],
+                         [20.0, 30.0])
+        self.assertEqual([p.price for p in repo.find(price__in=[10.0, 30.0], order_by='-price')],
+                         [30.0, 10.0])
+        self.assertEqual(repo.find({'price__lt': 20}, title__ne='Place 0'), [])
+        with self.assertRaises(ValueError):
+            repo.find(price__between=(1, 2))
+
+    def test_keyset_pages(self):
+        """Test that cursor() gives the after value of the next page"""
+        repo = self.facade.place_repo
+        first = repo.find(order_by='-price', limit=2)
+        self.assertEqual([p.price for p in first], [30.0, 20.0])
+        rest = repo.find(order_by='-price', limit=2, after=repo.cursor(first[-1], '-price'))
+        self.assertEqual([p.price for p in rest], [10.0])
+
+    def test_projection_first_count_exists(self):
+        """Test the row projection and the single-statement helpers"""
+        repo = self.facade.place_repo
+        rows = repo.find_rows(order_by='title', fields=['title'])
+        self.assertEqual(set(rows[0]._fields), {'id', 'title'})
+        self.assertEqual(repo.first(order_by='-price').price, 30.0)
+        self.assertIsNone(repo.first(title='Nowhere'))
+        self.assertEqual(repo.count(owner_id=self.owner_id), 3)
+        self.assertEqual(repo.count({'price__gt': 15}), 2)
+        self.assertTrue(self.facade.user_repo.exists(email='john.doe@example.com'))
+        self.assertFalse(self.facade.user_repo.exists(email='john.doe@example.com',
+                                                      id__ne=self.owner_id))
+
+
+class TestInMemoryRepository(unittest.TestCase):
+    """Test cases for the indexed in-memory engine"""
+
+    def setUp(self):
+        """Set up test fixtures before each test method"""
+        self.repo = InMemoryRepository(Place, indexes=('owner_id',), sorted_indexes=('price',))
+        for i, price in enumerate([30.0, 10.0, 20.0, 10.0]):
+            self.repo.add({'id': f'p{i}', 'title': f'Place {i}', 'price': price,
+                           'owner_id': 'u1' if i % 2 else 'u2'})
+
+    def test_records_use_slots(self):
+        """Test that records are compact and hold every column"""
+        record = self.repo.get('p0')
+        self.assertFalse(hasattr(record, '__dict__'))
+        self.assertEqual((record.title, record.price, record.description), ('Place 0', 30.0, None))
+
+    def test_hash_index(self):
+        """Test equality lookups, kept up to date by updates and deletes"""
+        self.assertEqual([r.id for r in self.repo.find('owner_id', 'u1')], ['p1', 'p3'])
+        self.repo.update('p1', {'owner_id': 'u2'})
+        self.assertEqual([r.id for r in self.repo.find('owner_id', 'u1')], ['p3'])
+        self.assertTrue(self.repo.delete('p3'))
+        self.assertIsNone(self.repo.get_by_attribute('owner_id', 'u1'))
+        self.assertEqual(self.repo.count('owner_id', 'u2'), 3)
+        # No index: scan
+        self.assertEqual(self.repo.get_by_attribute('title', 'Place 2').id, 'p2')
+
+    def test_range_queries_and_pages(self):
+        """Test the sorted index: bounds, order, offset and limit"""
+        self.assertEqual([r.id for r in self.repo.range('price', 10.0, 30.0)],
+                         ['p1', 'p3', 'p2'])
+        self.assertEqual([r.id for r in self.repo.range('price', 20.0, 30.0, include_high=True)],
+                         ['p2', 'p0'])
+        self.assertEqual([r.id for r in self.repo.range('price', descending=True, limit=2)],
+                         ['p0', 'p2'])
+        self.assertEqual([r.id for r in self.repo.range('price', offset=1, limit=2)],
+                         ['p3', 'p2'])
+        self.repo.update('p0', {'price': 5.0})
+        self.assertEqual(self.repo.range('price', high=10.0)[0].id, 'p0')
+        with self.assertRaises(ValueError):
+            self.repo.range('title')
+
+        self.assertEqual([r.id for r in self.repo.page(offset=1, limit=2)], ['p1', 'p2'])
+        self.assertEqual([r.id for r in self.repo.page(limit=2, order_by='price')], ['p0', 'p1'])
+
+
+class TestMemoryTier(unittest.TestCase):
+    """Test cases for the read-through tier (MEMORY_TIER)"""
+
+    def setUp(self):
+        """Set up test fixtures before each test method"""
+        self.app = create_app('testing')
+        self.app.config['MEMORY_TIER'] = ('users', 'places')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        self.facade = HBnBFacade()
+        self.user = self.facade.create_user({
+            'first_name': 'John',
+            'last_name': 'Doe',
+            'email': 'john.doe@example.com',
+            'password': 'securepassword123'
+        })
+
+    def tearDown(self):
+        """Tear down test fixtures after each test method"""
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def _create_place(self, title):
+        return self.facade.create_place({
+            'title': title,
+            'description': 'Nice',
+            'price': 50.0,
+            'latitude': 45.0,
+            'longitude': 4.0,
+            'owner_id': self.user.id,
+        })
+
+    def test_lists_follow_commits(self):
+        """Test that the mirrored rows see inserts, updates, deletes and rollbacks"""
+        place = self._create_place('Flat')
+        self.assertEqual([row.title for row in self.facade.list_places()], ['Flat'])
+        self.assertEqual(memory_tier.tier_stats()['places'], {'rows': 1, 'loaded': True})
+
+        self._create_place('Loft')
+        self.facade.update_place(place.id, {'title': 'Studio'})
+        db.session.get(Place, place.id).title = 'Not saved'
+        db.session.flush()
+        db.session.rollback()
+        self.assertEqual(sorted(row.title for row in self.facade.list_places()), ['Loft', 'Studio'])
+
+        # Bulk SQL delete (purge) of a place
+        self.facade.delete_place(place.id)
+        self.assertEqual([row.title for row in self.facade.list_places()], ['Loft'])
+
+    def test_email_lookups(self):
+        """Test that unknown emails are answered from memory"""
+        self.assertEqual(self.facade.get_user_by_email('john.doe@example.com').id, self.user.id)
+        self.assertIsNone(self.facade.get_user_by_email('nobody@example.com'))
+        self.facade.update_user(self.user.id, {'email': 'john@example.com'})
+        self.assertIsNone(self.facade.get_user_by_email('john.doe@example.com'))
+        self.assertIsInstance(self.facade.get_user_by_email('john@example.com'), User)
+
+    def test_foreign_changes(self):
+        """Test that the writes of other workers are replayed from the outbox"""
+        place = self._create_place('Flat')
+        self.facade.list_places()
+        tier = memory_tier.get_tier('places')
+        tier.delete(place.id)
+        memory_tier._apply_foreign_changes([
+            memory_tier.outbox.OutboxEvent(1, 'places', place.id, 'update', 'other')])
+        self.assertEqual([row.id for row in tier.read_rows()], [place.id])
+
+
+class TestDurableMemoryTier(unittest.TestCase):
+    """Test cases for the tier kept on disk (MEMORY_TIER_DIR)"""
+
+    def setUp(self):
+        """Set up test fixtures before each test method"""
+        self.tmp_dir = tempfile.mkdtemp()
+        self.app = self._app()
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        self.facade = HBnBFacade()
+        self.user = self.facade.create_user({
+            'first_name': 'John',
+            'last_name': 'Doe',
+            'email': 'john.doe@example.com',
+            'password': 'securepassword123'
+        })
+        self.owner_id = self.user.id
+
+    def tearDown(self):
+        """Tear down test fixtures after each test method"""
+        memory_tier.close_tiers(self.app)
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def _app(self):
+        app = create_app('testing')
+        app.config.update(MEMORY_TIER=('places',), MEMORY_TIER_DIR=self.tmp_dir,
+                          MEMORY_TIER_FSYNC=False)
+        return app
+
+    def _create_place(self, title):
+        return self.facade.create_place({
+            'title': title,
+            'description': 'Nice',
+            'price': 50.0,
+            'latitude': 45.0,
+            'longitude': 4.0,
+            'owner_id': self.owner_id,
+        })
+
+    def test_restart_replays_and_catches_up(self):
+        """Test that a restarted process replays its log, then the changes made meanwhile"""
+        flat, loft = self._create_place('Flat'), self._create_place('Loft')
+        flat_id, loft_id = flat.id, loft.id
+        memory_tier.warm_up(self.app)
+        self.facade.update_place(flat_id, {'price': 70.0})
+        memory_tier.close_tiers(self.app)
+
+        # Written while the process is down
+        villa_id = self._create_place('Villa').id
+        self.facade.delete_place(loft_id)
+
+        restarted = self._app()
+        memory_tier.warm_up(restarted)
+        with restarted.app_context():
+            stats = memory_tier.tier_stats()['places']
+            self.assertEqual(stats['recovered'], 2)
+            self.assertGreaterEqual(stats['caught_up'], 2)
+            rows = memory_tier.get_tier('places').read_rows()
+        self.assertEqual(sorted(row.id for row in rows), sorted([flat_id, villa_id]))
+        self.assertEqual({row.id: row.price for row in rows}[flat_id], 70.0)
+        memory_tier.close_tiers(restarted)
+
+    def test_directory_per_process(self):
+        """Test that a process keeps its directory locked until it closes the tier"""
+        memory_tier.warm_up(self.app)
+        with self.app.app_context():
+            self.assertEqual(memory_tier._tier_directory(), os.path.join(self.tmp_dir, '0'))
+        with open(os.path.join(self.tmp_dir, '0.lock'), 'a') as other:
+            # What another worker would try
+            with self.assertRaises(OSError):
+                fcntl.flock(other, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            memory_tier.close_tiers(self.app)
+            fcntl.flock(other, fcntl.LOCK_EX | fcntl.LOCK_NB)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -259,6 +259,15 @@ class TestReviewFacade(unittest.TestCase):
         with self.assertRaises(ValueError):
             self.facade.create_review(invalid_review_data)
 
+    def test_update_review_invalid_rating(self):
+        """Test that an update with an invalid rating changes nothing"""
+        created_review = self.facade.create_review(self.review_data)
+        with self.assertRaises(ValueError):
+            self.facade.update_review(created_review.id, {'text': 'Changed', 'rating': 9})
+        db.session.expire_all()
+        review = self.facade.get_review(created_review.id)
+        self.assertEqual((review.text, review.rating), ('Great place to stay!', 5))
+
     def test_get_nonexistent_review(self):
         """Test getting a review that doesn't exist"""
         fake_id = str(uuid.uuid4())
@@ -0,0 +1,133 @@
+import unittest
+from app import create_app, db
+from app.persistence import search
+from app.services.facade import HBnBFacade
+
+
+class TestPlaceSearch(unittest.TestCase):
+    """Test cases for the FTS5 place search"""
+
+    def setUp(self):
+        """Set up test fixtures before each test method"""
+        self.app = create_app('testing')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        self.client = self.app.test_client()
+
+        self.facade = HBnBFacade()
+        self.user = self.facade.create_user({
+            'first_name': 'John',
+            'last_name': 'Doe',
+            'email': 'john.doe@example.com',
+            'password': 'securepassword123'
+        })
+        self.loft = self._create_place('Loft in Paris', 'Bright loft near the Louvre')
+        self.cabin = self._create_place('Mountain cabin', 'Quiet cabin, view over Paris valley')
+        self.villa = self._create_place('Seaside villa', 'Pool and garden')
+
+    def tearDown(self):
+        """Tear down test fixtures after each test method"""
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def _create_place(self, title, description):
+        return self.facade.create_place({
+            'title': title,
+            'description': description,
+            'price': 100.0,
+            'latitude': 48.85,
+            'longitude': 2.35,
+            'owner_id': self.user.id,
+        })
+
+    def test_build_match_query(self):
+        """Test that user input is quoted and the last word is a prefix"""
+        self.assertEqual(search.build_match_query('paris loft'), '"paris" "loft"*')
+        self.assertEqual(search.build_match_query('a OR b', prefix=False), '"a" "OR" "b"')
+        self.assertIsNone(search.build_match_query('  *** '))
+
+    def test_title_match_ranks_first(self):
+        """Test that BM25 favours matches in the title"""
+        results, has_more = self.facade.search_places('paris')
+        self.assertEqual([r['id'] for r in results], [self.loft.id, self.cabin.id])
+        self.assertFalse(has_more)
+        self.assertIn('<mark>Paris</mark>', results[0]['title_highlight'])
+        self.assertIn('<mark>Paris</mark>', results[1]['snippet'])
+
+    def test_highlights_are_escaped(self):
+        """Test that user-written text cannot inject markup through the highlights"""
+        self._create_place('<script>alert(1)</script> Castle', 'A castle <b>by</b> the lake')
+        results, _ = self.facade.search_places('castle')
+        self.assertEqual(results[0]['title_highlight'],
+                         '&lt;script&gt;alert(1)&lt;/script&gt; <mark>Castle</mark>')
+        self.assertEqual(results[0]['snippet'],
+                         'A <mark>castle</mark> &lt;b&gt;by&lt;/b&gt; the lake')
+        self.assertEqual(results[0]['title'], '<script>alert(1)</script> Castle')
+
+    def test_prefix_match(self):
+        """Test search-as-you-type prefix matching"""
+        results, _ = self.facade.search_places('sea')
+        self.assertEqual([r['id'] for r in results], [self.villa.id])
+
+    def test_index_follows_updates_and_deletes(self):
+        """Test that the triggers keep the index in sync"""
+        self.facade.update_place(self.villa.id, {'title': 'Seaside house in Paris'})
+        results, _ = self.facade.search_places('paris')
+        self.assertIn(self.villa.id, [r['id'] for r in results])
+
+        self.facade.delete_place(self.loft.id)
+        results, _ = self.facade.search_places('loft')
+        self.assertEqual(results, [])
+
+    def test_pagination(self):
+        """Test page/per_page and has_more"""
+        first, has_more = self.facade.search_places('paris', page=1, per_page=1)
+        second, has_more_after = self.facade.search_places('paris', page=2, per_page=1)
+        self.assertEqual(len(first), 1)
+        self.assertTrue(has_more)
+        self.assertEqual(len(second), 1)
+        self.assertFalse(has_more_after)
+        self.assertNotEqual(first[0]['id'], second[0]['id'])
+
+    def test_filtered_pagination(self):
+        """Test that place_ids/exclude_ids filter before the page is cut"""
+        self._create_place('Studio in Paris', 'Small studio')
+        allowed = {self.loft.id, self.cabin.id}
+        first, has_more = search.search_places('paris', per_page=1, place_ids=allowed)
+        second, has_more_after = search.search_places('paris', page=2, per_page=1,
+                                                      place_ids=allowed)
+        self.assertTrue(has_more)
+        self.assertFalse(has_more_after)
+        self.assertEqual({first[0]['id'], second[0]['id']}, allowed)
+
+        results, has_more = search.search_places('paris', page=2, per_page=1,
+                                                 exclude_ids={self.loft.id})
+        self.assertFalse(has_more)
+        self.assertEqual(len(results), 1)
+        self.assertNotEqual(results[0]['id'], self.loft.id)
+        self.assertEqual(search.search_places('paris', place_ids=set())[0], [])
+
+    def test_rebuild_index(self):
+        """Test that a rebuild restores an emptied index"""
+        db.session.execute(db.text("INSERT INTO places_fts(places_fts) VALUES ('delete-all')"))
+        db.session.commit()
+        self.assertEqual(self.facade.search_places('paris')[0], [])
+        self.assertEqual(search.rebuild_search_index(), 3)
+        self.assertEqual(len(self.facade.search_places('paris')[0]), 2)
+
+    def test_search_endpoint(self):
+        """Test GET /api/v1/places/search"""
+        response = self.client.get('/api/v1/places/search?q=cabin')
+        self.assertEqual(response.status_code, 200)
+        data = response.get_json()
+        self.assertEqual(data['results'][0]['id'], self.cabin.id)
+        self.assertFalse(data['has_more'])
+
+        response = self.client.get('/api/v1/places/search?q=%20')
+        self.assertEqual(response.status_code, 400)
+
+
+if __name__ == '__main__':
+    unittest.main()
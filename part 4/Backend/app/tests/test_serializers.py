@@ -0,0 +1,122 @@
+import json
+import unittest
+from sqlalchemy import event
+from app import create_app, db
+from app.api.serializers import Serializer, dumps
+from app.services.facade import HBnBFacade
+
+
+class Row:
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+
+
+class TestSerializer(unittest.TestCase):
+    """Test cases for the compiled serializers"""
+
+    def test_compiled_fields(self):
+        """Test attributes, converters and computed fields"""
+        serializer = Serializer('Thing', {
+            'id': 'id',
+            'price': ('price', float),
+            'tags': lambda obj, context: context[obj.id],
+        })
+        row = Row(id='a', price=3, secret='hidden')
+        self.assertEqual(serializer.one(row, {'a': ['x']}), {'id': 'a', 'price': 3.0, 'tags': ['x']})
+        self.assertEqual(serializer.one(Row(id='b', price=None), {'b': []})['price'], None)
+
+    def test_dumps_is_compact_json(self):
+        """Test that the encoder returns JSON bytes"""
+        body = dumps({'a': [1, 2.5, None]})
+        self.assertIsInstance(body, bytes)
+        self.assertEqual(json.loads(body), {'a': [1, 2.5, None]})
+
+
+class TestSerializedEndpoints(unittest.TestCase):
+    """Test cases for the endpoints using the serializers"""
+
+    def setUp(self):
+        """Set up test fixtures before each test method"""
+        self.app = create_app('testing')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        self.client = self.app.test_client()
+        self.facade = HBnBFacade()
+        self.user = self.facade.create_user({
+            'first_name': 'John',
+            'last_name': 'Doe',
+            'email': 'john.doe@example.com',
+            'password': 'securepassword123'
+        })
+        self.wifi = self.facade.create_amenity({'name': 'WiFi'})
+        self.place = self.facade.create_place({
+            'title': 'Flat',
+            'description': 'Nice',
+            'price': 80,
+            'latitude': 45.0,
+            'longitude': 4.0,
+            'owner_id': self.user.id,
+            'amenities': [self.wifi.id],
+        })
+
+    def tearDown(self):
+        """Tear down test fixtures after each test method"""
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def test_places_list(self):
+        """Test the place list output"""
+        response = self.client.get('/api/v1/places/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json(), [{
+            'id': self.place.id,
+            'title': 'Flat',
+            'description': 'Nice',
+            'price': 80.0,
+            'latitude': 45.0,
+            'longitude': 4.0,
+            'owner_id': self.user.id,
+            'amenities': [self.wifi.id],
+            'photo': None,
+        }])
+
+    def test_single_resources(self):
+        """Test that single resources expose only their public fields"""
+        place = self.client.get(f'/api/v1/places/{self.place.id}').get_json()
+        self.assertEqual(place['amenities'], [self.wifi.id])
+        user = self.client.get(f'/api/v1/users/{self.user.id}').get_json()
+        self.assertEqual(set(user), {'id', 'first_name', 'last_name', 'email'})
+        amenities = self.client.get('/api/v1/amenities/').get_json()
+        self.assertEqual(amenities, [{'id': self.wifi.id, 'name': 'WiFi'}])
+
+    def test_sparse_fieldset(self):
+        """Test that ?fields= limits both the payload and the SELECT"""
+        statements = []
+
+        def record(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        event.listen(db.engine, 'before_cursor_execute', record)
+        try:
+            response = self.client.get('/api/v1/places/?fields=id,title,price')
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', record)
+        self.assertEqual(response.get_json(), [{'id': self.place.id, 'title': 'Flat', 'price': 80.0}])
+        selects = [s for s in statements if s.lstrip().startswith('SELECT') and 'FROM places' in s]
+        self.assertTrue(selects)
+        self.assertNotIn('places.description', selects[-1])
+        # amenities were not requested: no place_amenity lookup
+        self.assertFalse([s for s in statements if 'place_amenity' in s])
+
+    def test_unknown_field(self):
+        """Test that unknown fields are rejected"""
+        response = self.client.get(f'/api/v1/users/{self.user.id}?fields=id,password_hash')
+        self.assertEqual(response.status_code, 400)
+        user = self.client.get(f'/api/v1/users/{self.user.id}?fields=first_name').get_json()
+        self.assertEqual(user, {'first_name': 'John'})
+
+
+if __name__ == '__main__':
+    unittest.main()
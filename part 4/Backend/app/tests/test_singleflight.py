@@ -0,0 +1,175 @@
+import threading
+import time
+import unittest
+from app import create_app, db
+from app.services.facade import HBnBFacade
+from app.services.singleflight import SingleFlight, group
+
+
+class TestSingleFlight(unittest.TestCase):
+    """Test cases for the coalescing of identical concurrent calls"""
+
+    def _run_concurrently(self, flight, key, func, count):
+        results, errors = [], []
+        started = threading.Barrier(count)
+
+        def call():
+            started.wait()
+            try:
+                results.append(flight.do(key, func))
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=call) for _ in range(count)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results, errors
+
+    def test_concurrent_calls_share_one_execution(self):
+        """Test that callers arriving during a call get its result"""
+        flight = SingleFlight()
+        executions = []
+
+        def slow():
+            executions.append(1)
+            time.sleep(0.2)
+            return {'id': 'p1'}
+
+        results, errors = self._run_concurrently(flight, ('places.get', 'p1'), slow, 8)
+        self.assertEqual(errors, [])
+        self.assertEqual(len(executions), 1)
+        self.assertEqual(results, [{'id': 'p1'}] * 8)
+        stats = flight.stats()['places.get']
+        self.assertEqual((stats['requests'], stats['executions'], stats['collapsed']), (8, 1, 7))
+        self.assertEqual(stats['in_flight'], 0)
+
+        # Done: the next call runs again (nothing is cached)
+        flight.do(('places.get', 'p1'), slow)
+        self.assertEqual(len(executions), 2)
+
+    def test_errors_are_shared(self):
+        """Test that the waiting callers get the exception of the call"""
+        flight = SingleFlight()
+
+        def failing():
+            time.sleep(0.2)
+            raise ValueError("boom")
+
+        results, errors = self._run_concurrently(flight, ('users.get', 'u1'), failing, 4)
+        self.assertEqual(results, [])
+        self.assertEqual([str(e) for e in errors], ["boom"] * 4)
+        self.assertEqual(flight.stats()['users.get']['executions'], 1)
+
+    def test_follower_timeout(self):
+        """Test that a follower runs the call itself when the leader is too slow"""
+        flight = SingleFlight()
+        release = threading.Event()
+        leader = threading.Thread(target=flight.do, args=(('k',), release.wait))
+        leader.start()
+        while not flight.stats().get('k', {}).get('in_flight'):
+            time.sleep(0.01)
+        self.assertEqual(flight.do(('k',), lambda: 'own', timeout=0.05), 'own')
+        release.set()
+        leader.join()
+        self.assertEqual(flight.stats()['k']['executions'], 2)
+
+    def test_calls_started_before_a_commit_are_not_joined(self):
+        """Test that a caller arriving after a commit gets a call of its own"""
+        flight = SingleFlight()
+        release = threading.Event()
+        results = []
+
+        def stale():
+            release.wait()
+            return 'stale'
+
+        def join():
+            results.append(flight.do(('k',), lambda: 'unused'))
+
+        leader = threading.Thread(target=lambda: results.append(flight.do(('k',), stale)))
+        leader.start()
+        while not flight.stats().get('k', {}).get('in_flight'):
+            time.sleep(0.01)
+        follower = threading.Thread(target=join)
+        follower.start()
+        while flight.stats()['k']['collapsed'] < 1:
+            time.sleep(0.01)
+        flight.invalidate()
+        self.assertEqual(flight.do(('k',), lambda: 'fresh'), 'fresh')
+        release.set()
+        leader.join()
+        follower.join()
+        self.assertEqual(results, ['stale', 'stale'])
+        self.assertEqual(flight.stats()['k']['executions'], 2)
+
+
+class TestCoalescedEndpoints(unittest.TestCase):
+    """Test cases for the coalesced GET endpoints"""
+
+    def setUp(self):
+        """Set up test fixtures before each test method"""
+        self.app = create_app('testing')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        self.client = self.app.test_client()
+        facade = HBnBFacade()
+        owner = facade.create_user({
+            'first_name': 'John',
+            'last_name': 'Doe',
+            'email': 'owner@example.com',
+            'password': 'securepassword123'
+        })
+        self.place = facade.create_place({
+            'title': 'Flat',
+            'description': 'Nice',
+            'price': 80.0,
+            'latitude': 45.0,
+            'longitude': 4.0,
+            'owner_id': owner.id,
+        })
+        group.reset()
+
+    def tearDown(self):
+        """Tear down test fixtures after each test method"""
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def test_place_detail(self):
+        """Test that each request gets its own response, and the counters"""
+        first = self.client.get(f'/api/v1/places/{self.place.id}')
+        second = self.client.get(f'/api/v1/places/{self.place.id}?fields=id,title')
+        self.assertEqual(first.get_json()['title'], 'Flat')
+        self.assertEqual(second.get_json(), {'id': self.place.id, 'title': 'Flat'})
+        self.assertEqual(self.client.get('/api/v1/places/nope').status_code, 404)
+
+        health = self.client.get('/api/v1/health/').get_json()
+        stats = health['coalescing']['places.get']
+        self.assertEqual((stats['requests'], stats['executions']), (3, 3))
+
+    def test_commits_start_new_flights(self):
+        """Test that a read arriving after a write does not join an older read"""
+        release = threading.Event()
+        key = ('places.get', self.place.id, ())
+        leader = threading.Thread(target=group.do, args=(key, release.wait))
+        leader.start()
+        while not group.stats().get('places.get', {}).get('in_flight'):
+            time.sleep(0.01)
+        HBnBFacade().update_place(self.place.id, {'title': 'Loft'})
+        self.assertEqual(group.do(key, lambda: 'after the write'), 'after the write')
+        release.set()
+        leader.join()
+
+    def test_can_be_disabled(self):
+        """Test the SINGLE_FLIGHT switch"""
+        self.app.config['SINGLE_FLIGHT'] = False
+        response = self.client.get(f'/api/v1/places/{self.place.id}')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('places.get', group.stats())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,68 @@
+import io
+import unittest
+from app import create_app, db
+from app.persistence import schema
+from app.startup import StartupTimer
+
+
+class TestSchemaVersion(unittest.TestCase):
+    """Test cases for the schema version check done at boot"""
+
+    def setUp(self):
+        """Set up test fixtures before each test method"""
+        self.app = create_app('testing')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.drop_all()
+
+    def tearDown(self):
+        """Tear down test fixtures after each test method"""
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def test_ensure_schema_runs_once(self):
+        """Test that tables are only created when the version changes"""
+        self.assertIsNone(schema.current_schema_version())
+        self.assertTrue(schema.ensure_schema())
+        self.assertEqual(schema.current_schema_version(), schema.SCHEMA_VERSION)
+        self.assertFalse(schema.ensure_schema())
+
+    def test_newer_schema_is_refused(self):
+        """Test that old code refuses to run on a newer schema"""
+        schema.ensure_schema()
+        db.session.execute(schema.schema_info.update().values(version=schema.SCHEMA_VERSION + 1))
+        db.session.commit()
+        with self.assertRaises(RuntimeError):
+            schema.ensure_schema()
+
+
+class TestStartupTimer(unittest.TestCase):
+    """Test cases for the startup timing report"""
+
+    def test_nested_phases(self):
+        """Test that child time is excluded from the parent's self time"""
+        timer = StartupTimer(enabled=True)
+        with timer.phase('outer'):
+            with timer.phase('inner'):
+                pass
+        (depth_inner, name_inner, _, total_inner), (depth_outer, name_outer, own_outer, total_outer) = timer.records
+        self.assertEqual((depth_inner, name_inner), (1, 'inner'))
+        self.assertEqual((depth_outer, name_outer), (0, 'outer'))
+        self.assertAlmostEqual(own_outer + total_inner, total_outer)
+
+        stream = io.StringIO()
+        timer.report(stream)
+        self.assertIn('startup: self [us] | cumulative | phase', stream.getvalue())
+        self.assertIn('    inner', stream.getvalue())
+
+    def test_disabled_timer_records_nothing(self):
+        """Test that the timer is free when disabled"""
+        timer = StartupTimer()
+        with timer.phase('outer'):
+            pass
+        self.assertEqual(timer.records, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
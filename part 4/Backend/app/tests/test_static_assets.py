@@ -0,0 +1,88 @@
+import gzip
+import os
+import shutil
+import tempfile
+import unittest
+from app.services.static_assets import build_assets, create_static_app
+
+
+class TestStaticAssets(unittest.TestCase):
+    """Test cases for the fingerprinted Frontend build and its server"""
+
+    def setUp(self):
+        """Build a small site in a temporary directory"""
+        self.root = tempfile.mkdtemp()
+        self.source = os.path.join(self.root, 'Frontend')
+        os.makedirs(os.path.join(self.source, 'images'))
+        self._write('images/logo.png', b'\x89PNG\r\n\x1a\nlogo')
+        self._write('styles.css', b'.logo { background: url("images/logo.png"); }\n' * 20)
+        self._write('scripts.js', b'const img = `<img src="/images/logo.png">`;\n' * 20)
+        self._write('index.html', b'<link rel="stylesheet" href="styles.css">'
+                                  b'<script src="scripts.js"></script>'
+                                  b'<a href="index.html">Home</a>' + b' ' * 300)
+        self._write('run.py', b'# not part of the site')
+        self.dest = os.path.join(self.source, 'dist')
+        self.manifest = build_assets(self.source, self.dest)
+        self.client = create_static_app(self.dest).test_client()
+
+    def tearDown(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def _write(self, name, content):
+        with open(os.path.join(self.source, name), 'wb') as f:
+            f.write(content)
+
+    def _read(self, name):
+        with open(os.path.join(self.dest, name), 'rb') as f:
+            return f.read()
+
+    def test_build_fingerprints_and_rewrites(self):
+        """Test hashed names and rewritten references"""
+        self.assertEqual(sorted(self.manifest), ['images/logo.png', 'scripts.js', 'styles.css'])
+        logo = self.manifest['images/logo.png']
+        self.assertRegex(logo, r'^images/logo\.[0-9a-f]{10}\.png$')
+        self.assertIn(f'url("{logo}")'.encode(), self._read(self.manifest['styles.css']))
+        self.assertIn(f'src="/{logo}"'.encode(), self._read(self.manifest['scripts.js']))
+        index = self._read('index.html')
+        self.assertIn(f'href="{self.manifest["styles.css"]}"'.encode(), index)
+        self.assertIn(b'href="index.html"', index)
+        self.assertFalse(os.path.exists(os.path.join(self.dest, 'run.py')))
+        # Precompressed once, images left alone
+        self.assertEqual(gzip.decompress(self._read('index.html.gz')), index)
+        self.assertFalse(os.path.exists(os.path.join(self.dest, logo + '.gz')))
+
+    def test_fingerprinted_assets_are_immutable(self):
+        """Test cache headers and content negotiation"""
+        name = self.manifest['scripts.js']
+        response = self.client.get(f'/{name}', headers={'Accept-Encoding': 'gzip'})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('immutable', response.headers['Cache-Control'])
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        self.assertEqual(response.headers['Vary'], 'Accept-Encoding')
+        self.assertNotIn('Content-Disposition', response.headers)
+        self.assertEqual(gzip.decompress(response.data), self._read(name))
+        response.close()
+
+        response = self.client.get(f'/{name}')
+        self.assertNotIn('Content-Encoding', response.headers)
+        self.assertEqual(response.data, self._read(name))
+        response.close()
+
+    def test_pages_revalidate(self):
+        """Test that HTML (and old unversioned URLs) are not cached forever"""
+        response = self.client.get('/')
+        self.assertEqual(response.headers['Cache-Control'], 'no-cache')
+        etag = response.headers['ETag']
+        response.close()
+        self.assertEqual(self.client.get('/', headers={'If-None-Match': etag}).status_code, 304)
+
+        response = self.client.get('/scripts.js')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers['Cache-Control'], 'no-cache')
+        response.close()
+        self.assertEqual(self.client.get('/manifest.json').status_code, 404)
+        self.assertEqual(self.client.get('/../config.py').status_code, 404)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Durable in-memory repository (app.persistence.journal) against SQLite:
+write latency of single-object writes with concurrent writers (each write
+fsynced before it returns, one transaction per write for SQLite), and
+restart time (snapshot + log replay) of a large store.  Files are in a
+temporary directory.
+
+    python benchmarks/bench_memory_journal.py [--writes 2000] [--threads 8] [--objects 1000000]
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app, db  # noqa: E402
+from app.models import User, Place  # noqa: E402
+from app.persistence.journal import DurableRepository  # noqa: E402
+from config import TestingConfig  # noqa: E402
+
+
+def place_values(owner_id, i):
+    return {'id': str(uuid.uuid4()), 'title': f'Place {i}', 'description': 'Nice flat',
+            'price': 10.0 + i % 500, 'latitude': 45.0, 'longitude': 4.0, 'owner_id': owner_id}
+
+
+def concurrently(threads, per_thread, write):
+    latencies = []
+    lock = threading.Lock()
+
+    def writer(number):
+        own = []
+        for i in range(per_thread):
+            start = time.perf_counter()
+            write(number * per_thread + i)
+            own.append(time.perf_counter() - start)
+        with lock:
+            latencies.extend(own)
+
+    workers = [threading.Thread(target=writer, args=(n,)) for n in range(threads)]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return len(latencies) / elapsed, latencies[len(latencies) // 2], latencies[len(latencies) * 99 // 100]
+
+
+def bench_sqlite(tmp_dir, writes, threads):
+    config = type('BenchmarkConfig', (TestingConfig,), {
+        'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + os.path.join(tmp_dir, 'bench.db'),
+    })
+    app = create_app(config)
+    with app.app_context():
+        db.create_all()
+        user = User(first_name='Bench', last_name='User', email='bench@example.com', password='x')
+        db.session.add(user)
+        db.session.commit()
+        owner_id = user.id
+
+    def write(i):
+        with app.app_context():
+            db.session.add(Place(**{k: v for k, v in place_values(owner_id, i).items()
+                                    if k != 'id'}))
+            db.session.commit()
+
+    result = concurrently(threads, writes // threads, write)
+    with app.app_context():
+        db.engine.dispose()
+    return result
+
+
+def bench_journal(tmp_dir, writes, threads):
+    repo = DurableRepository(os.path.join(tmp_dir, 'writes', 'places'), Place,
+                             indexes=('owner_id',), sorted_indexes=('price',))
+    result = concurrently(threads, writes // threads, lambda i: repo.add(place_values('u1', i)))
+    repo.close()
+    return result
+
+
+def bench_restart(tmp_dir, objects, tail):
+    path = os.path.join(tmp_dir, 'restart', 'places')
+    repo = DurableRepository(path, Place, indexes=('owner_id',), sorted_indexes=('price',),
+                             fsync=False, snapshot_log_bytes=None)
+    repo.load(place_values(f'u{i % 1000}', i) for i in range(objects))
+    repo.snapshot()
+    for i in range(tail):
+        repo.add(place_values('u1', i))
+    repo.close()
+    start = time.perf_counter()
+    repo = DurableRepository(path, Place, indexes=('owner_id',), sorted_indexes=('price',))
+    elapsed = time.perf_counter() - start
+    count = len(repo)
+    repo.close()
+    return count, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--writes', type=int, default=2000)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--objects', type=int, default=1000000)
+    parser.add_argument('--tail', type=int, default=10000, help='writes logged after the snapshot')
+    args = parser.parse_args()
+
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        print(f"{args.writes} writes, {args.threads} writer threads")
+        print(f"{'backend':>8} {'writes/s':>9} {'p50 ms':>7} {'p99 ms':>7}")
+        for name, bench in (('sqlite', bench_sqlite), ('journal', bench_journal)):
+            rate, p50, p99 = bench(tmp_dir, args.writes, args.threads)
+            print(f"{name:>8} {rate:>9.0f} {p50 * 1000:>7.2f} {p99 * 1000:>7.2f}")
+        count, elapsed = bench_restart(tmp_dir, args.objects, args.tail)
+        print(f"restart: {count} objects in {elapsed:.2f}s")
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+"""
+Microbenchmarks of the hot paths, checked against stored baselines:
+model construction and validation, place serialization (one place, 1000
+places), repository get/add/update, password hashing and JWT
+encode/decode.  Runs offline against in-memory SQLite.
+
+    python benchmarks/bench_micro.py [--only place_init,jwt_decode] [--threshold 0.3] [--save]
+
+Each benchmark reports the best time per operation over ``--rounds``
+rounds.  The repository benchmarks start every round with an empty
+session, so a result does not depend on the benchmarks run before it.  Without ``--save`` the times are compared with
+``benchmarks/baselines.json`` and the script exits with status 1 when one
+is slower than its baseline by more than the threshold (``--threshold``,
+else the ``threshold`` of the benchmark in the file, else the file's
+default).  A benchmark over the threshold is measured again
+(``--retries``) before being reported, as one slow series is usually
+noise.  Baselines depend on the machine: record them with ``--save`` on
+the machine that runs the check.
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import sys
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask_jwt_extended import create_access_token, decode_token  # noqa: E402
+from app import create_app, db  # noqa: E402
+from app.models import User, Place, Amenity  # noqa: E402
+from app.api.v1 import places as places_api  # noqa: E402
+from app.persistence.repository import SQLAlchemyRepository  # noqa: E402
+from config import TestingConfig  # noqa: E402
+
+BASELINES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baselines.json')
+DEFAULT_THRESHOLD = 0.3
+
+
+class BenchmarkConfig(TestingConfig):
+    SQLALCHEMY_DATABASE_URI = 'sqlite://'
+
+
+def place_values(owner_id, i):
+    return {'title': f'Place {i}', 'description': 'Lorem ipsum ' * 20, 'price': 50.0 + i % 200,
+            'latitude': 45.0, 'longitude': 4.0, 'owner_id': owner_id}
+
+
+def populate(count):
+    owner = User(first_name='Bench', last_name='Mark', email='bench@example.com', password='x')
+    amenities = [Amenity(name=f'Amenity {i}') for i in range(10)]
+    db.session.add(owner)
+    db.session.add_all(amenities)
+    for i in range(count):
+        place = Place(id=str(uuid.uuid4()), **place_values(owner.id, i))
+        db.session.add(place)
+        for amenity in amenities[i % 3:i % 3 + 3]:
+            place.amenities.append(amenity)
+    db.session.commit()
+    return owner
+
+
+def benchmarks(places, owner):
+    """name -> (function of the iteration number, operations per round, setup of a round)"""
+    repo = SQLAlchemyRepository(Place)
+    ids = [place.id for place in places]
+    context = places_api.places_context(places)
+    one = places[0]
+    user = User(first_name='Bench', last_name='Hash', email='hash@example.com',
+                password_hash='x', password=None)
+    owner_id = owner.id
+    token = create_access_token(identity=owner_id, additional_claims={'is_admin': False})
+    # The populated places stay loaded for the serializers, out of the
+    # session: a commit would otherwise expire every one of them
+    db.session.expunge_all()
+    empty_session = db.session.expunge_all
+
+    def repo_get(i):
+        # Read from the database, not from the identity map
+        db.session.expunge_all()
+        return repo.get(ids[i % len(ids)])
+
+    def repo_add(i):
+        return repo.add(Place(**place_values(owner_id, i)))
+
+    def repo_update(i):
+        return repo.update(ids[i % len(ids)], {'price': 50.0 + i % 200})
+
+    return {
+        'place_init': (lambda i: Place(**place_values(owner_id, i)), 2000, None),
+        'serialize_place': (lambda i: places_api.place_serializer.one(one, context), 2000, None),
+        'serialize_1k_places': (
+            lambda i: places_api.place_serializer.list_response(places, context=context), 20,
+            None),
+        'repo_get': (repo_get, 500, empty_session),
+        'repo_add': (repo_add, 200, empty_session),
+        'repo_update': (repo_update, 200, empty_session),
+        'hash_password': (lambda i: user.hash_password('securepassword123'), 1, None),
+        'jwt_encode': (lambda i: create_access_token(
+            identity=owner_id, additional_claims={'is_admin': False}), 2000, None),
+        'jwt_decode': (lambda i: decode_token(token), 2000, None),
+    }
+
+
+def best_per_op(func, number, rounds, setup=None):
+    """
+    Best time per call over ``rounds`` rounds of ``number`` calls, without
+    GC pauses; ``setup()`` runs, untimed, before the warm-up and every round
+    """
+    if setup is not None:
+        setup()
+    for i in range(min(number, 100)):
+        func(i)  # warm-up
+    best = None
+    for _ in range(rounds):
+        if setup is not None:
+            setup()
+        gc.collect()
+        gc.disable()
+        try:
+            start = time.perf_counter()
+            for i in range(number):
+                func(i)
+            elapsed = (time.perf_counter() - start) / number
+        finally:
+            gc.enable()
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def load_baselines(path):
+    if not os.path.exists(path):
+        return {'threshold': DEFAULT_THRESHOLD, 'benchmarks': {}}
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_baselines(path, baselines, results):
+    for name, seconds in results.items():
+        entry = baselines['benchmarks'].setdefault(name, {})
+        entry['us'] = round(seconds * 1e6, 3)
+    baselines['machine'] = f"{platform.machine()} Python {platform.python_version()}"
+    with open(path, 'w') as f:
+        json.dump(baselines, f, indent=2, sort_keys=True)
+        f.write('\n')
+
+
+def limit_for(baselines, name, threshold=None):
+    """Allowed slowdown of a benchmark: the option, else its own, else the file's"""
+    if threshold is not None:
+        return threshold
+    entry = baselines['benchmarks'].get(name, {})
+    return entry.get('threshold', baselines.get('threshold', DEFAULT_THRESHOLD))
+
+
+def regressed(baselines, name, seconds, threshold=None):
+    entry = baselines['benchmarks'].get(name)
+    return (entry is not None
+            and seconds * 1e6 / entry['us'] - 1 > limit_for(baselines, name, threshold))
+
+
+def compare(baselines, results, threshold=None):
+    """Print the results against the baselines; return the names of the regressions"""
+    regressions = []
+    print(f"{'benchmark':<20} {'us/op':>11} {'baseline':>11} {'change':>8}")
+    for name, seconds in results.items():
+        us = seconds * 1e6
+        entry = baselines['benchmarks'].get(name)
+        if entry is None:
+            print(f"{name:<20} {us:>11.2f} {'-':>11} {'new':>8}")
+            continue
+        limit = limit_for(baselines, name, threshold)
+        change = us / entry['us'] - 1
+        status = ''
+        if regressed(baselines, name, seconds, threshold):
+            regressions.append(name)
+            status = f'  REGRESSION (> {limit:+.0%})'
+        print(f"{name:<20} {us:>11.2f} {entry['us']:>11.2f} {change:>+8.1%}{status}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--only', help='comma-separated benchmark names')
+    parser.add_argument('--places', type=int, default=1000)
+    parser.add_argument('--rounds', type=int, default=7)
+    parser.add_argument('--threshold', type=float,
+                        help='allowed slowdown, e.g. 0.25 for 25%% (overrides the file)')
+    parser.add_argument('--retries', type=int, default=3,
+                        help='series measured again before reporting a regression')
+    parser.add_argument('--baselines', default=BASELINES)
+    parser.add_argument('--save', action='store_true', help='record the results as baselines')
+    args = parser.parse_args()
+
+    app = create_app(BenchmarkConfig)
+    with app.app_context(), app.test_request_context():
+        db.create_all()
+        owner = populate(args.places)
+        places = Place.query.all()
+        cases = benchmarks(places, owner)
+        names = args.only.split(',') if args.only else list(cases)
+        unknown = [name for name in names if name not in cases]
+        if unknown:
+            parser.error(f"unknown benchmarks: {', '.join(unknown)}")
+        baselines = load_baselines(args.baselines)
+        results = {}
+        for name in names:
+            func, number, setup = cases[name]
+            results[name] = best_per_op(func, number, args.rounds, setup)
+            for _ in range(0 if args.save else args.retries):
+                if not regressed(baselines, name, results[name], args.threshold):
+                    break
+                # A slow run can be noise: keep the best of another series
+                results[name] = min(results[name],
+                                    best_per_op(func, number, args.rounds, setup))
+
+    if args.save:
+        save_baselines(args.baselines, baselines, results)
+        print(f"baselines written to {args.baselines}")
+    regressions = compare(baselines, results, args.threshold)
+    if regressions and not args.save:
+        print(f"{len(regressions)} regression(s): {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
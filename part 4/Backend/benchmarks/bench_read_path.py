@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+Compare loading places as ORM instances with the Core read path
+(repository read_rows()), against in-memory SQLite: CPU time and memory
+allocated per row.
+
+    python benchmarks/bench_read_path.py [--places 10000] [--repeat 5]
+"""
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app, db  # noqa: E402
+from app.models import Place  # noqa: E402
+from app.repositories.place_repository import PlaceRepository  # noqa: E402
+from bench_serialization import BenchmarkConfig, populate  # noqa: E402
+
+
+def measure(func, repeat):
+    best = None
+    for _ in range(repeat):
+        db.session.expunge_all()
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    db.session.expunge_all()
+    tracemalloc.start()
+    result = func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best, peak, len(result)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--places', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    app = create_app(BenchmarkConfig)
+    with app.app_context():
+        db.create_all()
+        populate(args.places)
+        repo = PlaceRepository()
+        columns = ['id', 'title', 'price']
+        paths = (
+            ('orm all columns', lambda: Place.query.all()),
+            ('rows all columns', lambda: repo.read_rows()),
+            ('orm id,title,price', lambda: repo.get_all(fields=columns)),
+            ('rows id,title,price', lambda: repo.read_rows(columns)),
+        )
+        print(f"{args.places} places, best of {args.repeat}")
+        print(f"{'path':<22} {'per row [us]':>13} {'peak per row [B]':>17}")
+        for name, func in paths:
+            elapsed, peak, count = measure(func, args.repeat)
+            print(f"{name:<22} {elapsed / count * 1e6:>13.2f} {peak / count:>17.0f}")
+
+
+if __name__ == '__main__':
+    main()
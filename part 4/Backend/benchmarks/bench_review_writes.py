@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Review insert throughput with concurrent writers, with the reviews in the
+main SQLite file and spread over review partitions (REVIEW_PARTITIONS).
+Each insert is its own transaction, as in the API; databases are files in
+a temporary directory (one writer lock per file).
+
+    python benchmarks/bench_review_writes.py [--reviews 2000] [--threads 8] [--partitions 1 4]
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app, db  # noqa: E402
+from app.models import User, Place, Review  # noqa: E402
+from app.persistence import partitions  # noqa: E402
+from app.repositories.review_repository import ReviewRepository  # noqa: E402
+from config import TestingConfig  # noqa: E402
+
+
+def make_app(tmp_dir, count):
+    config = type('BenchmarkConfig', (TestingConfig,), {
+        'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + os.path.join(tmp_dir, f'main_{count}.db'),
+        'REVIEW_PARTITIONS': count,
+        'REVIEW_PARTITION_URI': 'sqlite:///' + os.path.join(tmp_dir, f'p{count}_reviews_{{index}}.db'),
+    })
+    return create_app(config)
+
+
+def populate(places):
+    user = User(first_name='Bench', last_name='User', email='bench@example.com', password='x')
+    db.session.add(user)
+    db.session.flush()
+    place_ids = []
+    for i in range(places):
+        place = Place(title=f'Place {i}', description='', price=10.0, latitude=0.0,
+                      longitude=0.0, owner_id=user.id)
+        db.session.add(place)
+        place_ids.append(place.id)
+    db.session.commit()
+    return user.id, place_ids
+
+
+def run(app, reviews, threads, places):
+    with app.app_context():
+        db.create_all()
+        user_id, place_ids = populate(places)
+    per_thread = reviews // threads
+    errors = []
+
+    def writer(number):
+        repo = ReviewRepository()
+        with app.app_context():
+            for i in range(per_thread):
+                place_id = place_ids[(number * per_thread + i) % len(place_ids)]
+                try:
+                    repo.add(Review(text='Bench', rating=4, user_id=user_id, place_id=place_id))
+                except Exception as e:  # database is locked
+                    db.session.rollback()
+                    errors.append(e)
+
+    workers = [threading.Thread(target=writer, args=(n,)) for n in range(threads)]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - start
+    partitions.dispose_engines(app)
+    with app.app_context():
+        db.engine.dispose()
+    return per_thread * threads - len(errors), elapsed, len(errors)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--reviews', type=int, default=2000)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--places', type=int, default=100)
+    parser.add_argument('--partitions', type=int, nargs='+', default=[1, 4])
+    args = parser.parse_args()
+
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        print(f"{args.reviews} reviews, {args.threads} writer threads")
+        print(f"{'partitions':>10} {'inserts/s':>10} {'errors':>7}")
+        for count in args.partitions:
+            inserted, elapsed, errors = run(make_app(tmp_dir, count), args.reviews,
+                                            args.threads, args.places)
+            print(f"{count:>10} {inserted / elapsed:>10.0f} {errors:>7}")
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
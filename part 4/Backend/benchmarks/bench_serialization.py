@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Compare the legacy place serialization (vars() copy + lazy amenities +
+marshal_with) with the precompiled serializers, against in-memory SQLite.
+
+    python benchmarks/bench_serialization.py [--places 1000] [--repeat 5]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask_restx import marshal  # noqa: E402
+from app import create_app, db  # noqa: E402
+from app.models import User, Place, Amenity  # noqa: E402
+from app.api.v1 import places as places_api  # noqa: E402
+from config import TestingConfig  # noqa: E402
+
+
+class BenchmarkConfig(TestingConfig):
+    SQLALCHEMY_DATABASE_URI = 'sqlite://'
+
+
+def legacy_serialize_place(place):
+    """The serialize_place() helper used before the compiled serializers"""
+    place_data = vars(place).copy()
+    place_data.pop('_sa_instance_state', None)
+    if hasattr(place, 'amenities') and place.amenities:
+        place_data['amenities'] = [amenity.id for amenity in place.amenities]
+    else:
+        place_data['amenities'] = []
+    return place_data
+
+
+def legacy_list(places):
+    data = marshal([legacy_serialize_place(place) for place in places], places_api.place_model)
+    return json.dumps(data).encode('utf-8')
+
+
+def compiled_list(places):
+    return places_api.places_response(places).get_data()
+
+
+def populate(count):
+    owner = User(first_name='Bench', last_name='Mark', email='bench@example.com', password='x')
+    amenities = [Amenity(name=f'Amenity {i}') for i in range(10)]
+    db.session.add(owner)
+    db.session.add_all(amenities)
+    for i in range(count):
+        place = Place(title=f'Place {i}', description='Lorem ipsum ' * 20, price=50 + i % 200,
+                      latitude=45.0, longitude=4.0, owner_id=owner.id, id=str(uuid.uuid4()))
+        db.session.add(place)
+        for amenity in amenities[i % 3:i % 3 + 3]:
+            place.amenities.append(amenity)
+    db.session.commit()
+
+
+def best_of(repeat, func, *args):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--places', type=int, default=1000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    app = create_app(BenchmarkConfig)
+    with app.app_context():
+        db.create_all()
+        populate(args.places)
+        places = Place.query.all()
+
+        print(f"{args.places} places, best of {args.repeat}")
+        print(f"{'path':<12} {'per item [us]':>14} {'endpoint req/s':>15}")
+        client = app.test_client()
+
+        def legacy_endpoint():
+            db.session.expire_all()
+            return legacy_list(Place.query.all())
+
+        def new_endpoint():
+            db.session.expire_all()
+            return client.get('/api/v1/places/').get_data()
+
+        for name, func, endpoint in (('legacy', legacy_list, legacy_endpoint),
+                                     ('compiled', compiled_list, new_endpoint)):
+            with app.test_request_context():
+                elapsed = best_of(args.repeat, func, places)
+            request_time = best_of(args.repeat, endpoint)
+            print(f"{name:<12} {elapsed / args.places * 1e6:>14.2f} {1 / request_time:>15.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -5,6 +5,8 @@ class Config:
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'your-secret-key-here'
     JWT_SECRET_KEY = os.environ.get('JWT_SECRET_KEY') or 'jwt-secret-key-here'
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    # Nombre de fichiers SQLite entre lesquels les reviews sont réparties
+    REVIEW_PARTITIONS = int(os.environ.get('HBNB_REVIEW_PARTITIONS', 1))
     
 class DevelopmentConfig(Config):
     """Configuration pour le développement"""
@@ -0,0 +1,76 @@
+"""
+Gunicorn configuration for production.
+
+    gunicorn -c gunicorn.conf.py
+
+- pre-forks HBNB_WORKERS workers (default: one per CPU core) from a master
+  that has already imported and warmed the app (``preload_app``);
+- ``kill -HUP <master>`` starts new workers and gracefully stops the old
+  ones once their in-flight requests are done (zero downtime).  Because the
+  app is preloaded, HUP keeps the code loaded in the master; to deploy new
+  code without downtime send USR2 (starts a new master), then WINCH and
+  QUIT to the old one;
+- each worker is recycled after HBNB_MAX_REQUESTS requests (+ jitter so
+  they do not all restart at once);
+- workers are threaded (HBNB_THREADS per worker, ``gthread``): a review
+  stream (Server-Sent Events) holds one thread for as long as the client
+  stays connected, so a sync worker would be blocked by a single browser;
+- each worker tails the database outbox to drop what other workers
+  changed from its in-process caches (amenity index, ...);
+- each worker runs HBNB_JOB_THREADS background job threads (default 1,
+  0 to leave the queue to ``flask jobs-work`` processes);
+- every worker reports its own counters on ``GET /api/v1/health`` and logs
+  them when it exits.
+"""
+import multiprocessing
+import os
+
+wsgi_app = 'wsgi:app'
+bind = os.environ.get('HBNB_BIND', '0.0.0.0:8000')
+workers = int(os.environ.get('HBNB_WORKERS', multiprocessing.cpu_count()))
+preload_app = True
+worker_class = 'gthread'
+threads = int(os.environ.get('HBNB_THREADS', 8))
+
+max_requests = int(os.environ.get('HBNB_MAX_REQUESTS', 5000))
+max_requests_jitter = int(os.environ.get('HBNB_MAX_REQUESTS_JITTER', max_requests // 10))
+
+timeout = int(os.environ.get('HBNB_TIMEOUT', 30))
+graceful_timeout = int(os.environ.get('HBNB_GRACEFUL_TIMEOUT', 30))
+keepalive = 5
+
+accesslog = os.environ.get('HBNB_ACCESS_LOG', '-')
+errorlog = '-'
+
+
+def post_fork(server, worker):
+    """Give the new worker its own DB connections and fresh counters"""
+    from app import db
+    from app.persistence import memory_tier, outbox, partitions
+    from app.services import health, jobs
+    from wsgi import app
+
+    with app.app_context():
+        # close=False: ne pas fermer les sockets qui appartiennent au maître
+        db.engine.dispose(close=False)
+    partitions.dispose_engines(app, close=False)
+    health.reset_worker_stats(max_requests=worker.max_requests)
+    outbox.start_tailer(app)
+    # Each worker mirrors MEMORY_TIER in its own process (and directory)
+    memory_tier.warm_up(app)
+    jobs.start_workers(app, int(os.environ.get('HBNB_JOB_THREADS', jobs.JOB_THREADS)))
+    server.log.info("Worker %s ready (max_requests=%s)", worker.pid, worker.max_requests)
+
+
+def worker_exit(server, worker):
+    """Stop the password hashing processes and log what the worker did before it is replaced"""
+    from app.persistence import memory_tier
+    from app.services import health, provisioning
+    from wsgi import app
+
+    provisioning.shutdown_hash_pools()
+    # Frees the MEMORY_TIER_DIR directory for the replacement worker
+    memory_tier.close_tiers(app)
+    stats = health.worker_stats()
+    server.log.info("Worker %s exiting: %s requests, %s errors, up %.0fs",
+                    worker.pid, stats['requests'], stats['errors'], stats['uptime'])
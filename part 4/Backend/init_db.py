@@ -5,6 +5,7 @@ Script pour initialiser la base de données et créer les tables
 
 from app import create_app, db
 from app.models import User, Place, Review, Amenity
+from app.persistence.schema import ensure_schema
 import uuid
 
 def init_database():
@@ -12,9 +13,11 @@ def init_database():
     app = create_app()
     
     with app.app_context():
-        # Créer toutes les tables
-        db.create_all()
-        print("Tables créées avec succès!")
+        # Créer toutes les tables (si la version du schéma a changé)
+        if ensure_schema():
+            print("Tables créées avec succès!")
+        else:
+            print("Schéma déjà à jour!")
         
         # Créer un utilisateur administrateur
         admin_id = str(uuid.uuid4())
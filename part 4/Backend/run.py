@@ -1,11 +1,38 @@
+import os
 from app import create_app, db
-from app.models import User, Place, Review, Amenity
+from app.startup import timer
+from app.persistence.schema import ensure_schema
+from app.persistence.amenity_index import get_amenity_index
+from app.persistence.availability import get_availability_index
+from app.persistence.facets import get_facet_index
+from app.persistence import memory_tier, outbox
+from app.services import jobs
 
 app = create_app()
 
-# Créer les tables au démarrage de l'application
+# Vérifie la version du schéma (create_all seulement si elle a changé)
 with app.app_context():
-    db.create_all()
+    with timer.phase('schema check'):
+        ensure_schema()
+    # Construit l'index bitmap des amenities avant la première requête
+    position = outbox.current_position()
+    with timer.phase('amenity index'):
+        get_amenity_index()
+    with timer.phase('availability index'):
+        get_availability_index()
+    with timer.phase('facet index'):
+        get_facet_index()
+timer.report()
 
 if __name__ == '__main__':
+    # Seulement pour le serveur : `flask --app run <commande>` importe ce
+    # module et ne doit lancer aucun thread. Avec le reloader, seul le
+    # processus enfant (WERKZEUG_RUN_MAIN) sert les requêtes.
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        # Applique les écritures des autres processus (CLI, autres workers)
+        outbox.start_tailer(app, position)
+        # Rejoue les tables MEMORY_TIER durables (MEMORY_TIER_DIR)
+        memory_tier.warm_up(app)
+        # Exécute les jobs en arrière-plan (suppression de fichiers, purges, ...)
+        jobs.start_workers(app)
     app.run(debug=True)
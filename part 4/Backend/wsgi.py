@@ -0,0 +1,45 @@
+"""
+Point d'entrée WSGI de production.
+
+    gunicorn -c gunicorn.conf.py
+
+Gunicorn importe ce module une seule fois dans le processus maître
+(``preload_app``) : l'application est créée et chauffée avant le fork, et
+les workers en héritent par copy-on-write au lieu de tout recharger.
+"""
+import os
+from app import create_app, db
+from app.startup import timer
+from app.persistence.schema import ensure_schema
+from app.persistence.amenity_index import get_amenity_index
+from app.persistence.availability import get_availability_index
+from app.persistence.facets import get_facet_index
+from app.persistence import outbox, partitions
+
+app = create_app(os.environ.get('HBNB_CONFIG', 'production'))
+
+
+def warm_up(app):
+    """Build everything a first request would otherwise pay for"""
+    with app.app_context():
+        with timer.phase('schema check'):
+            ensure_schema()
+        # Les workers rejoueront l'outbox depuis ce point (voir post_fork)
+        app.extensions['outbox_position'] = outbox.current_position()
+        with timer.phase('amenity index'):
+            get_amenity_index()
+        with timer.phase('availability index'):
+            get_availability_index()
+        with timer.phase('facet index'):
+            get_facet_index()
+        db.session.remove()
+        # Aucune connexion ouverte ne doit être partagée avec les workers
+        db.engine.dispose()
+        partitions.dispose_engines(app)
+    # Compile les règles de routage une fois pour toutes
+    with timer.phase('url map'):
+        app.url_map.bind('localhost').match('/api/v1/places/', method='GET')
+
+
+warm_up(app)
+timer.report()
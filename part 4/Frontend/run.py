@@ -1,6 +1,22 @@
-from app import create_app
+"""
+Serve the Frontend with fingerprinted, precompressed assets.
 
-app = create_app()
+The site is rebuilt into ``dist/`` at startup (see
+``Backend/app/services/static_assets.py``), then served on port 5500.
+The API still runs separately (``Backend/run.py``).
+"""
+import os
+import sys
+
+FRONTEND_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(FRONTEND_DIR, '..', 'Backend'))
+
+from app.services.static_assets import build_assets, create_static_app  # noqa: E402
+
+DIST_DIR = os.path.join(FRONTEND_DIR, 'dist')
+
+build_assets(FRONTEND_DIR, DIST_DIR)
+app = create_static_app(DIST_DIR)
 
 if __name__ == '__main__':
-    app.run(debug=True)
\ No newline at end of file
+    app.run(port=int(os.environ.get('FRONTEND_PORT', 5500)), debug=True)
@@ -122,6 +122,23 @@ async function fetchPlaces(token) {
     }
 }
 
+/**
+ * Builds the image of a place: its cover photo (WebP with a JPEG
+ * fallback) when it has one, the default picture otherwise
+ * @param {Object} place - Place object from API
+ * @param {string} size - Photo variant (small, medium or large)
+ * @returns {string} HTML markup
+ */
+function placeImageMarkup(place, size) {
+    const photo = place.photo && (place.photo[size] || place.photo.original);
+    if (!photo) {
+        return `<img src="/images/appart.jpg" alt="${place.title}" class="place-image">`;
+    }
+    const webp = photo.webp ? `<source srcset="http://localhost:5000${photo.webp}" type="image/webp">` : '';
+    const fallback = photo.jpg || photo.png || photo.webp;
+    return `<picture>${webp}<img src="http://localhost:5000${fallback}" alt="${place.title}" class="place-image" loading="lazy"></picture>`;
+}
+
 /**
  * Renders places list in the DOM
  * @param {Array} places - Array of place objects from API
@@ -150,7 +167,7 @@ function displayPlaces(places) {
         }
         
         placeDiv.innerHTML = `
-            <img src="/images/appart.jpg" alt="${place.title}" class="place-image">
+            ${placeImageMarkup(place, 'small')}
             <h3>${place.title}</h3>
             <p>${place.description}</p>
             <p>Location: ${place.latitude}, ${place.longitude}</p>
@@ -162,21 +179,49 @@ function displayPlaces(places) {
     });
 }
 
+/**
+ * Fetches the price histogram of the catalog for the price filter
+ * Falls back to fixed thresholds when the facets cannot be loaded
+ * @returns {Promise<Array>} Price buckets ({from, to, count})
+ */
+async function fetchPriceBuckets() {
+    try {
+        const response = await fetch('http://localhost:5000/api/v1/places/facets');
+        if (response.ok) {
+            const facets = await response.json();
+            return facets.price.buckets;
+        }
+    } catch (error) {
+        console.error('Error fetching facets:', error);
+    }
+    return [10, 50, 100].map(to => ({ to, count: null }));
+}
+
 /**
  * Initializes price filter dropdown and adds event handler
- * Filters places by maximum price threshold
+ * Options are the upper edges of the price histogram, with the number of
+ * places under each; filters places below the selected price
  */
-function setupPriceFilter() {
+async function setupPriceFilter() {
     const priceFilter = document.getElementById('price-filter');
     if (priceFilter && priceFilter.options.length === 0) {
-        ['All', 10, 50, 100].forEach(val => {
-            const opt = document.createElement('option');
-            opt.value = val;
-            opt.textContent = val;
-            // Default to "All" option
-            if (val === 'All') {
-                opt.selected = true;
+        const all = document.createElement('option');
+        all.value = 'All';
+        all.textContent = 'All';
+        // Default to "All" option
+        all.selected = true;
+        priceFilter.appendChild(all);
+        let below = 0;
+        (await fetchPriceBuckets()).forEach(bucket => {
+            below += bucket.count || 0;
+            if (bucket.to === null) {
+                return;
             }
+            const opt = document.createElement('option');
+            opt.value = bucket.to;
+            opt.textContent = bucket.count === null
+                ? `< ${bucket.to} €`
+                : `< ${bucket.to} € (${below})`;
             priceFilter.appendChild(opt);
         });
     }
@@ -185,7 +230,7 @@ function setupPriceFilter() {
             const selected = event.target.value;
             document.querySelectorAll('.place-card').forEach(card => {
                 const price = parseFloat(card.getAttribute('data-price'));
-                if (selected === 'All' || price <= parseFloat(selected)) {
+                if (selected === 'All' || price < parseFloat(selected)) {
                     card.style.display = 'block';
                 } else {
                     card.style.display = 'none';
@@ -255,7 +300,7 @@ async function fetchPlaceDetails(token, placeId) {
  */
 async function fetchOwnerDetails(token, ownerId) {
     try {
-        const response = await fetch(`http://localhost:5000/api/v1/users/${ownerId}`, {
+        const response = await fetch(`http://localhost:5000/api/v1/users/${ownerId}?fields=first_name,last_name`, {
             method: 'GET',
             headers: token ? { 'Authorization': `Bearer ${token}` } : {}
         });
@@ -300,7 +345,7 @@ async function fetchPlaceReviews(token, placeId) {
  */
 async function fetchUserDetails(token, userId) {
     try {
-        const response = await fetch(`http://localhost:5000/api/v1/users/${userId}`, {
+        const response = await fetch(`http://localhost:5000/api/v1/users/${userId}?fields=first_name,last_name`, {
             method: 'GET',
             headers: token ? { 'Authorization': `Bearer ${token}` } : {}
         });
@@ -322,7 +367,7 @@ async function fetchUserDetails(token, userId) {
  */
 async function fetchAmenityDetails(token, amenityId) {
     try {
-        const response = await fetch(`http://localhost:5000/api/v1/amenities/${amenityId}`, {
+        const response = await fetch(`http://localhost:5000/api/v1/amenities/${amenityId}?fields=name`, {
             method: 'GET',
             headers: token ? { 'Authorization': `Bearer ${token}` } : {}
         });
@@ -369,6 +414,26 @@ async function fetchAmenitiesNames(token, amenityIds) {
     }
 }
 
+/**
+ * Builds (or refreshes) the card of one review
+ * @param {string} token - JWT authentication token
+ * @param {Object} review - Review object from API or from the live stream
+ * @param {HTMLElement} [reviewDiv] - Existing card to update
+ * @returns {Promise<HTMLElement>} Review card element
+ */
+async function renderReviewCard(token, review, reviewDiv) {
+    const userName = await fetchUserDetails(token, review.user_id);
+    reviewDiv = reviewDiv || document.createElement('div');
+    reviewDiv.className = 'review-card';
+    reviewDiv.dataset.reviewId = review.id;
+    reviewDiv.innerHTML = `
+        <p>${review.text}</p>
+        <p>User: ${userName}</p>
+        <p>Rating: ${review.rating}/5</p>
+    `;
+    return reviewDiv;
+}
+
 /**
  * Renders reviews section with user names and ratings
  * @param {string} token - JWT authentication token
@@ -384,15 +449,7 @@ async function displayReviews(token, placeId) {
         
         if (reviews && reviews.length > 0) {
             for (const review of reviews) {
-                const userName = await fetchUserDetails(token, review.user_id);
-                const reviewDiv = document.createElement('div');
-                reviewDiv.className = 'review-card';
-                reviewDiv.innerHTML = `
-                    <p>${review.text}</p>
-                    <p>User: ${userName}</p>
-                    <p>Rating: ${review.rating}/5</p>
-                `;
-                reviewsSection.appendChild(reviewDiv);
+                reviewsSection.appendChild(await renderReviewCard(token, review));
             }
         } else {
             reviewsSection.innerHTML = '<p>No reviews yet.</p>';
@@ -400,6 +457,55 @@ async function displayReviews(token, placeId) {
     }
 }
 
+let reviewStream = null;
+
+/**
+ * Keeps the reviews section up to date with Server-Sent Events.
+ * EventSource reconnects by itself and sends Last-Event-ID, so only the
+ * missed changes are replayed; a "reset" event means they were lost and
+ * the whole list is reloaded.
+ * @param {string} token - JWT authentication token
+ * @param {string} placeId - Place identifier for reviews
+ */
+function subscribeToReviews(token, placeId) {
+    if (!window.EventSource || reviewStream) {
+        return;
+    }
+    reviewStream = new EventSource(`http://localhost:5000/api/v1/places/${placeId}/reviews/stream`);
+
+    const findCard = (reviewId) =>
+        document.querySelector(`.reviews .review-card[data-review-id="${reviewId}"]`);
+
+    reviewStream.addEventListener('review.created', async (event) => {
+        const review = JSON.parse(event.data);
+        const reviewsSection = document.querySelector('.reviews');
+        if (!reviewsSection || findCard(review.id)) {
+            return;
+        }
+        if (!reviewsSection.querySelector('.review-card')) {
+            reviewsSection.innerHTML = '';
+        }
+        reviewsSection.appendChild(await renderReviewCard(token, review));
+    });
+
+    reviewStream.addEventListener('review.updated', async (event) => {
+        const review = JSON.parse(event.data);
+        const reviewDiv = findCard(review.id);
+        if (reviewDiv) {
+            await renderReviewCard(token, review, reviewDiv);
+        }
+    });
+
+    reviewStream.addEventListener('review.deleted', (event) => {
+        const reviewDiv = findCard(JSON.parse(event.data).id);
+        if (reviewDiv) {
+            reviewDiv.remove();
+        }
+    });
+
+    reviewStream.addEventListener('reset', () => displayReviews(token, placeId));
+}
+
 /**
  * Renders place details including owner info, amenities, and reviews
  * @param {Object} place - Place object from API
@@ -426,7 +532,7 @@ async function displayPlaceDetails(place) {
         }
         
         detailsSection.innerHTML = `
-            <img src="/images/appart.jpg" alt="${place.title}" class="place-image">
+            ${placeImageMarkup(place, 'large')}
             <h2>${place.title}</h2>
             <div class="place-info">
                 <p>Host: ${ownerName}</p>
@@ -442,6 +548,7 @@ async function displayPlaceDetails(place) {
     const token = getCookie('token');
     const placeId = getPlaceIdFromURL();
     await displayReviews(token, placeId);
+    subscribeToReviews(token, placeId);
 }
 
 /**